@@ -1,24 +1,210 @@
-"""Sistema de cache inteligente para planes nutricionales."""
+"""Sistema de cache inteligente para planes nutricionales.
+
+El cache tiene un backend intercambiable:
+
+- ``MemoryPlanCacheBackend``: LRU acotado con TTL por entrada dentro del
+  proceso (por defecto, y en tests).
+- ``RedisPlanCacheBackend``: compartido entre los workers de uvicorn y el de
+  Celery; las entradas caducan solas con ``SETEX``.
+
+Los planes se guardan como JSON compacto comprimido con zlib y cada usuario
+tiene un índice secundario con sus claves, así que invalidar sus planes no
+recorre el cache entero. Los contadores de aciertos, fallos y desalojos se
+exponen en ``/ai/cache/stats``.
+
+Opcionalmente (``NUTRITION_PLAN_SHARED_CACHE_ENABLED``) hay un segundo nivel
+compartido entre usuarios: la clave es una huella de lo que realmente da
+forma al plan (objetivos de kcal/macros redondeados, dieta, alergias, días y
+preferencias), no el ``user_id``. Un acierto sirve el plan de otro usuario
+con las fechas reescritas a partir de hoy y con los objetivos del propio
+solicitante; si los totales diarios del plan se alejan de ellos más de la
+tolerancia, el acierto se descarta y se genera un plan nuevo.
+"""
 
 from __future__ import annotations
 
 import hashlib
 import json
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
 from sqlalchemy.orm import Session
 
 from app.ai import schemas
 from app.auth.deps import UserContext
+from app.core.types import compress_json, decompress_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_S = 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+
+# Redondeo de los objetivos para la huella compartida
+KCAL_BUCKET = 100
+MACRO_BUCKET_G = 10
+# Desviación máxima de los totales diarios de un plan compartido respecto a
+# los objetivos del solicitante (relativa, con un mínimo absoluto en macros)
+SHARED_PLAN_TOLERANCE = 0.10
+
+_STAT_KEYS = (
+    "hits", "misses", "sets", "evictions", "expirations", "invalidations", "errors", "shared_hits",
+)
+
+
+class MemoryPlanCacheBackend:
+    """LRU con TTL por entrada e índice por usuario, seguro entre hilos."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # clave -> (caduca_en monotónico, user_id, plan comprimido)
+        self._data: "OrderedDict[str, Tuple[float, int, bytes]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(_STAT_KEYS, 0)
+
+    def _drop(self, key: str) -> None:
+        _, user_id, _ = self._data.pop(key)
+        keys = self._by_user.get(user_id) if user_id is not None else None
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[2]
+
+    def set(self, key: str, user_id: Optional[int], value: bytes, ttl_s: int) -> None:
+        """``user_id=None`` para entradas compartidas (sin índice de usuario)."""
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + ttl_s, user_id, value)
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(key)
+            self._stats["sets"] += 1
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+                self._stats["evictions"] += 1
+
+    def delete_user(self, user_id: int) -> int:
+        with self._lock:
+            keys = self._by_user.pop(user_id, set())
+            for key in keys:
+                self._data.pop(key, None)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def incr(self, stat: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[stat] += n
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._by_user.clear()
+            self._stats = dict.fromkeys(_STAT_KEYS, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._data)
+            stats["users"] = len(self._by_user)
+            stats["bytes"] = sum(len(v) for _, _, v in self._data.values())
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+class RedisPlanCacheBackend:
+    """Mismo contrato sobre Redis: ``SETEX`` por plan y un SET por usuario.
+
+    El SET del usuario caduca con su plan más reciente; las claves que
+    apunten a planes ya expirados se ignoran al invalidar. Los contadores
+    viven en un hash para que sean los de todos los procesos.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: Optional[str] = None, prefix: str = "aiplan:", client: Any = None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._stats_key = prefix + "stats"
+
+    def _plan_key(self, key: str) -> str:
+        return f"{self.prefix}plan:{key}"
+
+    def _user_key(self, user_id: int) -> str:
+        return f"{self.prefix}user:{user_id}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.client.get(self._plan_key(key))
+        self.incr("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, user_id: Optional[int], value: bytes, ttl_s: int) -> None:
+        ttl_s = max(int(ttl_s), 1)
+        self.client.setex(self._plan_key(key), ttl_s, value)
+        if user_id is not None:
+            user_key = self._user_key(user_id)
+            self.client.sadd(user_key, key)
+            self.client.expire(user_key, ttl_s)
+        self.incr("sets")
+
+    def delete_user(self, user_id: int) -> int:
+        user_key = self._user_key(user_id)
+        keys = [k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(user_key)]
+        removed = self.client.delete(*[self._plan_key(k) for k in keys]) if keys else 0
+        self.client.delete(user_key)
+        self.incr("invalidations", removed)
+        return removed
+
+    def incr(self, stat: str, n: int = 1) -> None:
+        if n:
+            self.client.hincrby(self._stats_key, stat, n)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        raw = self.client.hgetall(self._stats_key)
+        counters = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+        stats = {k: counters.get(k, 0) for k in _STAT_KEYS}
+        # Redis expira y desaloja (maxmemory) por su cuenta; se reporta el tamaño actual
+        stats["entries"] = sum(1 for _ in self.client.scan_iter(match=self.prefix + "plan:*"))
+        stats["users"] = sum(1 for _ in self.client.scan_iter(match=self.prefix + "user:*"))
+        return stats
 
 
 class NutritionPlanCache:
     """Cache inteligente para planes nutricionales."""
-    
-    def __init__(self):
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._cache_ttl = timedelta(hours=24)  # Cache válido por 24 horas
-    
+
+    def __init__(self, backend: Any = None, ttl_s: int = DEFAULT_TTL_S, shared: bool = False):
+        self.backend = backend if backend is not None else MemoryPlanCacheBackend()
+        self.ttl_s = ttl_s
+        self.shared = shared
+
     def _generate_cache_key(self, user_context: UserContext, request: schemas.NutritionPlanRequest) -> str:
         """Genera una clave única para el cache basada en el usuario y la petición."""
         # Crear hash del perfil del usuario y la petición
@@ -27,75 +213,221 @@ class NutritionPlanCache:
             "days": request.days,
             "preferences": request.preferences or {},
         }
-        
+
         # Convertir a string JSON y crear hash
         cache_string = json.dumps(cache_data, sort_keys=True)
         return hashlib.md5(cache_string.encode()).hexdigest()
-    
+
+    def _error(self, action: str, e: Exception) -> None:
+        logger.warning(f"Error {action} cache de planes nutricionales: {e}")
+        try:
+            self.backend.incr("errors")
+        except Exception:
+            pass
+
+    def _read(self, cache_key: str) -> Optional[schemas.NutritionPlan]:
+        try:
+            raw = self.backend.get(cache_key)
+            if raw is None:
+                return None
+            return schemas.NutritionPlan.model_validate(decompress_json(raw)["plan"])
+        except Exception as e:  # el cache nunca debe romper la generación
+            self._error("leyendo", e)
+            return None
+
+    def _write(self, cache_key: str, user_id: Optional[int], days: int, plan: schemas.NutritionPlan) -> None:
+        entry = {
+            "plan": plan.model_dump(mode="json"),
+            "cached_at": datetime.now().isoformat(),
+            "days": days,
+        }
+        try:
+            self.backend.set(cache_key, user_id, compress_json(entry), self.ttl_s)
+        except Exception as e:
+            self._error("escribiendo", e)
+
     def get(self, user_context: UserContext, request: schemas.NutritionPlanRequest) -> Optional[schemas.NutritionPlan]:
         """Obtiene un plan del cache si existe y es válido."""
-        cache_key = self._generate_cache_key(user_context, request)
-        
-        if cache_key not in self._cache:
-            return None
-        
-        cache_entry = self._cache[cache_key]
-        
-        # Verificar si el cache ha expirado
-        cached_at = datetime.fromisoformat(cache_entry["cached_at"])
-        if datetime.now() - cached_at > self._cache_ttl:
-            del self._cache[cache_key]
-            return None
-        
-        # Retornar el plan desde el cache
-        return schemas.NutritionPlan.model_validate(cache_entry["plan"])
-    
+        return self._read(self._generate_cache_key(user_context, request))
+
     def set(self, user_context: UserContext, request: schemas.NutritionPlanRequest, plan: schemas.NutritionPlan):
         """Almacena un plan en el cache."""
-        cache_key = self._generate_cache_key(user_context, request)
-        
-        self._cache[cache_key] = {
-            "plan": plan.model_dump(),
-            "cached_at": datetime.now().isoformat(),
-            "user_id": user_context.id,
-            "days": request.days
-        }
-    
-    def clear_user_cache(self, user_id: int):
-        """Limpia el cache de un usuario específico."""
-        keys_to_remove = []
-        for key, entry in self._cache.items():
-            if entry.get("user_id") == user_id:
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self._cache[key]
-    
+        self._write(self._generate_cache_key(user_context, request), user_context.id, request.days, plan)
+
+    def get_shared(
+        self,
+        fingerprint: str,
+        start: Optional[date] = None,
+        targets: Optional[Dict[str, float]] = None,
+    ) -> Optional[schemas.NutritionPlan]:
+        """Plan generado para cualquier usuario con la misma huella, con fechas desde ``start``.
+
+        Con ``targets`` (los del solicitante) el plan se devuelve con ellos y
+        solo si sus totales diarios los cumplen (``personalize_shared_plan``).
+        """
+        plan = self._read(f"fp:{fingerprint}")
+        if plan is not None and targets is not None:
+            plan = personalize_shared_plan(plan, targets)
+        if plan is None:
+            return None
+        try:
+            self.backend.incr("shared_hits")
+        except Exception as e:
+            self._error("contando", e)
+        return rebase_plan_dates(plan, start)
+
+    def set_shared(self, fingerprint: str, days: int, plan: schemas.NutritionPlan) -> None:
+        """Publica el plan en el nivel compartido (no se indexa por usuario)."""
+        self._write(f"fp:{fingerprint}", None, days, plan)
+
+    def clear_user_cache(self, user_id: int) -> int:
+        """Limpia el cache de un usuario específico (vía su índice de claves)."""
+        try:
+            return self.backend.delete_user(user_id)
+        except Exception as e:
+            self._error("invalidando", e)
+            return 0
+
+    def clear(self) -> None:
+        self.backend.clear()
+
     def get_cache_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas del cache."""
-        return {
-            "total_entries": len(self._cache),
-            "cache_ttl_hours": self._cache_ttl.total_seconds() / 3600,
-            "entries": [
-                {
-                    "user_id": entry["user_id"],
-                    "days": entry["days"],
-                    "cached_at": entry["cached_at"]
-                }
-                for entry in self._cache.values()
-            ]
-        }
+        stats = self.backend.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["backend"] = self.backend.name
+        stats["total_entries"] = stats["entries"]
+        stats["cache_ttl_hours"] = self.ttl_s / 3600
+        stats["shared_enabled"] = self.shared
+        return stats
+
+
+def _bucket(value: Any, step: int) -> Optional[int]:
+    if value is None:
+        return None
+    return int(round(float(value) / step)) * step
+
+
+def _normalize_list(raw: Optional[str]) -> list:
+    items = (raw or "").replace(";", ",").split(",")
+    return sorted({item.strip().lower() for item in items if item.strip()})
+
+
+def _profile_targets(db: Session, user_id: int) -> Optional[Tuple[Any, Dict[str, float]]]:
+    """Perfil y objetivos automáticos (con las claves de ``NutritionPlan.targets``)."""
+    from fastapi import HTTPException
+
+    from app.nutrition.services import compute_auto_targets
+    from app.user_profile.models import UserProfile
+
+    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+    if profile is None:
+        return None
+    try:
+        targets = compute_auto_targets(profile)
+    except HTTPException:
+        return None
+    return profile, {
+        "kcal": float(targets["calories_target"]),
+        "protein_g": float(targets["protein_g_target"]),
+        "carbs_g": float(targets["carbs_g_target"]),
+        "fat_g": float(targets["fat_g_target"]),
+    }
 
 
-# Instancia global del cache
-_nutrition_cache = NutritionPlanCache()
+def _fingerprint(profile: Any, targets: Dict[str, float], request: schemas.NutritionPlanRequest) -> str:
+    data = {
+        "kcal": _bucket(targets["kcal"], KCAL_BUCKET),
+        "protein_g": _bucket(targets["protein_g"], MACRO_BUCKET_G),
+        "carbs_g": _bucket(targets["carbs_g"], MACRO_BUCKET_G),
+        "fat_g": _bucket(targets["fat_g"], MACRO_BUCKET_G),
+        "diet": (profile.dietary_preference or "").strip().lower() or None,
+        "allergies": _normalize_list(profile.allergies),
+        "days": request.days,
+        "preferences": request.preferences or {},
+    }
+    raw = json.dumps(data, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def plan_fingerprint(db: Session, user_id: int, request: schemas.NutritionPlanRequest) -> Optional[str]:
+    """Huella de las entradas que dan forma al plan, o ``None`` si no es compartible.
+
+    Usa los objetivos automáticos del perfil (kcal redondeadas a 100 y macros a
+    10 g), la preferencia dietética, las alergias, los días y las preferencias
+    de la petición. Sin perfil completo no hay objetivos y no se comparte.
+    """
+    found = _profile_targets(db, user_id)
+    return _fingerprint(*found, request) if found else None
+
+
+def personalize_shared_plan(
+    plan: schemas.NutritionPlan, targets: Dict[str, float]
+) -> Optional[schemas.NutritionPlan]:
+    """Plan compartido con los ``targets`` del solicitante, o ``None`` si no los cumple.
+
+    La huella agrupa objetivos hasta ±50 kcal y ±5 g, así que el plan de otro
+    usuario solo se sirve si los totales de cada día quedan dentro de
+    ``SHARED_PLAN_TOLERANCE`` de los objetivos propios.
+    """
+    for day in plan.days:
+        for key, target in targets.items():
+            total = day.totals.get(key)
+            if total is None:
+                continue
+            floor = KCAL_BUCKET if key == "kcal" else MACRO_BUCKET_G
+            if abs(total - target) > max(target * SHARED_PLAN_TOLERANCE, floor):
+                return None
+    return plan.model_copy(update={"targets": {k: round(v, 1) for k, v in targets.items()}})
+
+
+def rebase_plan_dates(plan: schemas.NutritionPlan, start: Optional[date] = None) -> schemas.NutritionPlan:
+    """Copia del plan con los días fechados consecutivamente desde ``start`` (hoy)."""
+    start = start or date.today()
+    days = [
+        day.model_copy(update={"date": (start + timedelta(days=i)).isoformat()})
+        for i, day in enumerate(plan.days)
+    ]
+    return plan.model_copy(update={"days": days})
+
+
+def build_plan_cache(settings) -> NutritionPlanCache:
+    """Redis si hay ``NUTRITION_PLAN_CACHE_REDIS_URL``, si no LRU en memoria."""
+    ttl_s = settings.NUTRITION_PLAN_CACHE_TTL_S
+    url = settings.NUTRITION_PLAN_CACHE_REDIS_URL
+    shared = settings.NUTRITION_PLAN_SHARED_CACHE_ENABLED
+    if url:
+        try:
+            return NutritionPlanCache(RedisPlanCacheBackend(url), ttl_s=ttl_s, shared=shared)
+        except Exception as e:
+            logger.warning(f"Redis no disponible para el cache de planes, usando memoria: {e}")
+    backend = MemoryPlanCacheBackend(settings.NUTRITION_PLAN_CACHE_MAX_ENTRIES)
+    return NutritionPlanCache(backend, ttl_s=ttl_s, shared=shared)
+
+
+# Instancia global del cache (perezosa: depende de la configuración)
+_nutrition_cache: Optional[NutritionPlanCache] = None
+_nutrition_cache_lock = threading.Lock()
 
 
 def get_nutrition_cache() -> NutritionPlanCache:
     """Obtiene la instancia global del cache."""
+    global _nutrition_cache
+    if _nutrition_cache is None:
+        with _nutrition_cache_lock:
+            if _nutrition_cache is None:
+                from app.core.config import settings
+
+                _nutrition_cache = build_plan_cache(settings)
     return _nutrition_cache
 
 
+def invalidate_user_plans(user_id: int) -> int:
+    """Descarta los planes cacheados de un usuario (p. ej. al cambiar su perfil)."""
+    return get_nutrition_cache().clear_user_cache(user_id)
+
+
 def generate_nutrition_plan_with_cache(
     user: UserContext,
     req: schemas.NutritionPlanRequest,
@@ -105,22 +437,34 @@ def generate_nutrition_plan_with_cache(
 ) -> schemas.NutritionPlan:
     """Genera un plan nutricional con cache inteligente."""
     from app.ai.services import generate_nutrition_plan_optimized
-    
+
     # Si es modo simulado, no usar cache
     if simulate:
         return generate_nutrition_plan_optimized(user, req, db, simulate=True)
-    
+
     # Intentar obtener del cache primero
     cache = get_nutrition_cache()
     cached_plan = cache.get(user, req)
-    
+
     if cached_plan:
         return cached_plan
-    
+
+    # Después, un plan de otro usuario con los mismos objetivos y restricciones,
+    # servido con los objetivos exactos de este usuario
+    found = _profile_targets(db, user.id) if cache.shared else None
+    fingerprint = _fingerprint(*found, req) if found else None
+    if fingerprint:
+        shared_plan = cache.get_shared(fingerprint, targets=found[1])
+        if shared_plan:
+            cache.set(user, req, shared_plan)
+            return shared_plan
+
     # Si no está en cache, generar nuevo plan
     plan = generate_nutrition_plan_optimized(user, req, db, simulate=False)
-    
+
     # Almacenar en cache
     cache.set(user, req, plan)
-    
+    if fingerprint:
+        cache.set_shared(fingerprint, req.days, plan)
+
     return plan
@@ -1,15 +1,36 @@
-"""Utility helpers for handling content embeddings."""
+"""Utility helpers for handling content embeddings.
+
+Similarity search runs against an in-memory index per namespace instead of
+scanning the table: vectors are L2-normalized once, so a query is a single
+matrix-vector product plus an ``argpartition`` top-k. ``upsert_embedding``
+updates the index of its own process in place. Every write also bumps the
+namespace row in ``content_embedding_versions``, and a search compares that
+version (one primary-key lookup) with the index's, reloading the namespace
+when another process has written to it.
+
+NumPy is optional: without it the same index works on Python lists,
+which still avoids the per-query table transfer and JSON decoding.
+"""
 
 from __future__ import annotations
 
+import heapq
 import math
-from typing import Any, Dict, List
+import operator
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from sqlalchemy import JSON, Column, Index, Integer, String
 from sqlalchemy.orm import Session
 
 from app.core.database import Base
 
+try:
+    import numpy as np
+except ImportError:  # optional: the list-based index below is used instead
+    np = None
+
 
 class ContentEmbedding(Base):
     __tablename__ = "content_embeddings"
@@ -28,6 +49,238 @@ class ContentEmbedding(Base):
     )
 
 
+class ContentEmbeddingVersion(Base):
+    """Change counter per namespace, read by the in-memory indexes.
+
+    ``generation`` is set when the row is created, so a recreated table never
+    matches the version an index was built from.
+    """
+
+    __tablename__ = "content_embedding_versions"
+
+    namespace = Column(String(50), primary_key=True)
+    generation = Column(String(32), nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+
+
+Token = Optional[Tuple[str, int]]
+
+
+def _version_token(db: Session, namespace: str) -> Token:
+    row = (
+        db.query(ContentEmbeddingVersion.generation, ContentEmbeddingVersion.version)
+        .filter(ContentEmbeddingVersion.namespace == namespace)
+        .first()
+    )
+    return (row[0], row[1]) if row else None
+
+
+def _bump_version(db: Session, namespace: str) -> Tuple[Token, Token]:
+    """Increment the namespace version; return ``(previous, new)`` tokens.
+
+    The increment is a single ``UPDATE``, so concurrent writers get distinct
+    versions and ``previous`` is only the index's token if nobody else wrote
+    in between.
+    """
+    updated = (
+        db.query(ContentEmbeddingVersion)
+        .filter(ContentEmbeddingVersion.namespace == namespace)
+        .update({ContentEmbeddingVersion.version: ContentEmbeddingVersion.version + 1})
+    )
+    if not updated:
+        db.add(
+            ContentEmbeddingVersion(
+                namespace=namespace, generation=uuid.uuid4().hex, version=1
+            )
+        )
+        db.flush()
+        return None, _version_token(db, namespace)
+    generation, version = _version_token(db, namespace)
+    return (generation, version - 1), (generation, version)
+
+
+def _normalized(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else [0.0] * len(vector)
+
+
+class _Block:
+    """Unit vectors of one dimension, in a growable float32 matrix (or lists)."""
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.size = 0
+        self.ref_ids: List[Optional[str]] = []
+        self._rows: Any = (
+            np.empty((16, dim), dtype=np.float32) if np is not None else []
+        )
+
+    @classmethod
+    def from_vectors(
+        cls, dim: int, ref_ids: List[str], vectors: List[Sequence[float]]
+    ) -> "_Block":
+        block = cls(dim)
+        block.ref_ids = list(ref_ids)
+        block.size = len(ref_ids)
+        if np is not None:
+            matrix = (
+                np.stack(vectors) if vectors else np.empty((0, dim), dtype=np.float32)
+            )
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            np.divide(matrix, norms, out=matrix, where=norms > 0)
+            block._rows = matrix
+        else:
+            block._rows = [_normalized(v) for v in vectors]
+        return block
+
+    def put(
+        self, pos: Optional[int], ref_id: Optional[str], vector: Sequence[float]
+    ) -> int:
+        """Overwrite row ``pos`` (or append when ``None``); return the row position."""
+        if pos is None:
+            pos = self.size
+            self.size += 1
+            self.ref_ids.append(ref_id)
+            if np is None:
+                self._rows.append(None)
+            elif pos >= len(self._rows):
+                grown = np.empty(
+                    (max(16, 2 * len(self._rows)), self.dim), dtype=np.float32
+                )
+                grown[:pos] = self._rows[:pos]
+                self._rows = grown
+        self.ref_ids[pos] = ref_id
+        self._rows[pos] = _normalized(vector)
+        return pos
+
+    def top_k(self, query: Sequence[float], k: int) -> List[Tuple[float, int]]:
+        """``(score, position)`` of the ``k`` best rows, best first."""
+        if not self.size or k <= 0:
+            return []
+        unit = _normalized(query)
+        if np is None:
+            scores = [sum(map(operator.mul, unit, row)) for row in self._rows]
+            best = heapq.nlargest(k, range(self.size), key=scores.__getitem__)
+            return [(scores[i], i) for i in best]
+        scores = self._rows[: self.size] @ np.asarray(unit, dtype=np.float32)
+        if k < self.size:
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+        else:
+            best = np.argsort(-scores, kind="stable")
+        return [(float(scores[i]), int(i)) for i in best]
+
+
+class EmbeddingIndex:
+    """In-memory similarity index of one namespace at a given version token."""
+
+    def __init__(self, token: Token = None) -> None:
+        self.token = token
+        self._blocks: Dict[int, _Block] = {}
+        self._where: Dict[str, Tuple[int, int]] = {}
+        self._info: Dict[str, Tuple[Optional[str], Any]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Tuple[str, Optional[str], Any, Sequence[float]]],
+        token: Token = None,
+    ) -> "EmbeddingIndex":
+        """Build from ``(ref_id, title, meta, vector)`` rows in one pass per dimension."""
+        index = cls(token)
+        by_dim: Dict[int, Tuple[List[str], List[Sequence[float]]]] = {}
+        for ref_id, title, meta, vector in rows:
+            index._info[ref_id] = (title, meta)
+            ref_ids, vectors = by_dim.setdefault(len(vector), ([], []))
+            ref_ids.append(ref_id)
+            # float32 per row keeps large loads at 4 bytes per value, not a Python float
+            vectors.append(
+                np.asarray(vector, dtype=np.float32) if np is not None else vector
+            )
+        for dim, (ref_ids, vectors) in by_dim.items():
+            index._blocks[dim] = _Block.from_vectors(dim, ref_ids, vectors)
+            index._where.update(
+                (ref_id, (dim, pos)) for pos, ref_id in enumerate(ref_ids)
+            )
+        return index
+
+    @classmethod
+    def load(cls, db: Session, namespace: str) -> "EmbeddingIndex":
+        token = _version_token(db, namespace)
+        rows = (
+            db.query(
+                ContentEmbedding.ref_id,
+                ContentEmbedding.title,
+                ContentEmbedding.meta,
+                ContentEmbedding.embedding,
+            )
+            .filter(ContentEmbedding.namespace == namespace)
+            .all()
+        )
+        return cls.from_rows(rows, token)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def upsert(
+        self, ref_id: str, title: Optional[str], meta: Any, vector: Sequence[float]
+    ) -> None:
+        with self._lock:
+            self._info[ref_id] = (title, meta)
+            dim, pos = self._where.get(ref_id, (len(vector), None))
+            if dim != len(vector):  # the vector changed dimension: free the old row
+                self._blocks[dim].put(pos, None, [0.0] * dim)
+                pos = None
+            block = self._blocks.get(len(vector))
+            if block is None:
+                block = self._blocks[len(vector)] = _Block(len(vector))
+            self._where[ref_id] = (len(vector), block.put(pos, ref_id, vector))
+
+    def search(self, vector: Sequence[float], k: int = 5) -> List[Dict[str, Any]]:
+        """Cosine top-``k`` among the vectors with the query's dimension."""
+        with self._lock:
+            block = self._blocks.get(len(vector))
+            if block is None:
+                return []
+            dead = block.ref_ids.count(None)
+            hits = block.top_k(vector, k + dead)
+            result = []
+            for score, pos in hits:
+                ref_id = block.ref_ids[pos]
+                if ref_id is None:
+                    continue
+                title, meta = self._info[ref_id]
+                result.append(
+                    {"ref_id": ref_id, "title": title, "score": score, "metadata": meta}
+                )
+            return result[:k]
+
+
+_indexes: Dict[Tuple[str, str], EmbeddingIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _index_key(db: Session, namespace: str) -> Tuple[str, str]:
+    return str(db.get_bind().url), namespace
+
+
+def get_embedding_index(db: Session, namespace: str) -> EmbeddingIndex:
+    """Index of ``namespace``, reloaded only when the stored version changed."""
+    key = _index_key(db, namespace)
+    index = _indexes.get(key)
+    if index is None or index.token != _version_token(db, namespace):
+        index = EmbeddingIndex.load(db, namespace)
+        with _indexes_lock:
+            _indexes[key] = index
+    return index
+
+
+def clear_embedding_indexes() -> None:
+    with _indexes_lock:
+        _indexes.clear()
+
+
 def upsert_embedding(
     db: Session,
     namespace: str,
@@ -52,39 +305,21 @@ def upsert_embedding(
             embedding=vector,
         )
         db.add(obj)
+    previous, current = _bump_version(db, namespace)
     db.commit()
+    # Apply the change in place only if the index saw every earlier write;
+    # otherwise its token no longer matches and the next search reloads it.
+    index = _indexes.get(_index_key(db, namespace))
+    if index is not None and index.token == previous:
+        index.upsert(ref_id, title, metadata, vector)
+        index.token = current
     return obj
 
 
-def _cosine(a: List[float], b: List[float]) -> float:
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(x * x for x in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
-
-
 def search_similar(
     db: Session, namespace: str, vector: List[float], k: int = 5
 ) -> List[Dict[str, Any]]:
-    items = db.query(ContentEmbedding).filter_by(namespace=namespace).all()
-    scored = []
-    for item in items:
-        score = _cosine(vector, item.embedding)
-        scored.append((score, item))
-    scored.sort(key=lambda s: s[0], reverse=True)
-    result = []
-    for score, item in scored[:k]:
-        result.append(
-            {
-                "ref_id": item.ref_id,
-                "title": item.title,
-                "score": score,
-                "metadata": item.meta,
-            }
-        )
-    return result
+    return get_embedding_index(db, namespace).search(vector, k)
 
 
 def ensure_seed_embeddings(db: Session) -> None:
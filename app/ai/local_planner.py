@@ -0,0 +1,584 @@
+"""Planificador nutricional local y determinista (sin LLM).
+
+Construye un plan de uno o varios días a partir del catálogo de alimentos
+locales (``services.plan_foods``, construido desde ``foods``) para cumplir
+los objetivos de ``compute_auto_targets``:
+
+1. Cada alimento se clasifica por su composición por 100 g en un rol
+   (proteína, carbohidrato, acompañamiento o grasa).
+2. La dieta y las alergias del perfil filtran el catálogo por nombre. Las
+   dietas restrictivas (vegetariana, vegana, pescetariana) usan además una
+   lista explícita de alimentos admitidos: un nombre que no se reconoce
+   (marcas, platos, embutidos...) queda fuera aunque no esté en la lista de
+   exclusiones, y si no queda catálogo suficiente decide el LLM.
+3. Cada comida sigue una plantilla de roles; el alimento de cada rol se
+   elige por rotación (el menos usado en la semana y nunca repetido en el
+   mismo día), así que el plan varía sin azar.
+4. Los gramos de cada comida se resuelven con mínimos cuadrados acotados
+   sobre kcal y macros (error relativo, con un pequeño término que tira hacia
+   la ración habitual del rol) y se redondean a 5 g.
+
+Un plan de 7 días se genera en unos pocos milisegundos. Las peticiones con
+``preferences`` van al LLM, que es quien sabe interpretarlas.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.nutrition import services as nutrition_services
+from app.nutrition.models import normalize_food_name
+from app.user_profile.models import UserProfile
+
+from . import schemas
+
+logger = logging.getLogger(__name__)
+
+PROTEIN, CARB, SIDE, FAT = "protein", "carb", "side", "fat"
+
+# (tipo de comida, fracción de las kcal del día, roles)
+MEAL_TEMPLATES: Tuple[Tuple[str, float, Tuple[str, ...]], ...] = (
+    ("breakfast", 0.25, (CARB, PROTEIN, SIDE, FAT)),
+    ("lunch", 0.35, (PROTEIN, CARB, SIDE, FAT)),
+    ("dinner", 0.30, (PROTEIN, SIDE, CARB, FAT)),
+    ("snack", 0.10, (SIDE, FAT)),
+)
+
+# ración habitual y límites en gramos por rol (para ~2000 kcal; se escalan con el objetivo)
+PORTION_BASE_KCAL = 2000.0
+PORTIONS = {
+    PROTEIN: (120.0, 50.0, 250.0),
+    CARB: (80.0, 30.0, 300.0),
+    SIDE: (150.0, 50.0, 300.0),
+    FAT: (15.0, 5.0, 40.0),
+}
+RIDGE = 0.02
+MACROS = ("kcal", "protein_g", "carbs_g", "fat_g")
+MACRO_WEIGHTS = (
+    8.0,
+    1.0,
+    1.0,
+    1.0,
+)  # las kcal pesan más que el reparto exacto de macros
+
+MEAT = (
+    "pollo",
+    "pavo",
+    "ternera",
+    "cerdo",
+    "jamon",
+    "conejo",
+    "cordero",
+    "chorizo",
+    "carne",
+    "lomo",
+    "hamburguesa",
+    "salchicha",
+    "bacon",
+    "beicon",
+    "panceta",
+    "pato",
+    "salami",
+    "mortadela",
+    "morcilla",
+    "fuet",
+    "salchichon",
+    "sobrasada",
+    "butifarra",
+    "cecina",
+    "codorniz",
+    "higado",
+    "gelatina",
+)
+FISH = (
+    "salmon",
+    "atun",
+    "merluza",
+    "bacalao",
+    "sardina",
+    "caballa",
+    "boqueron",
+    "pescado",
+    "anchoa",
+    "trucha",
+    "lubina",
+    "dorada",
+    "rape",
+    "lenguado",
+    "emperador",
+    "surimi",
+)
+SHELLFISH = ("gamba", "langostino", "mejillon", "marisco", "calamar", "pulpo")
+DAIRY = ("leche", "yogur", "queso", "nata", "mantequilla", "kefir")
+EGG = ("huevo",)
+NUTS = ("nuez", "nueces", "almendra", "avellana", "anacardo", "pistacho", "cacahuete")
+GLUTEN = (
+    "trigo",
+    "pan",
+    "pasta",
+    "avena",
+    "cebada",
+    "centeno",
+    "cuscus",
+    "bulgur",
+    "seitan",
+)
+
+DIET_EXCLUSIONS = {
+    "vegetarian": MEAT + FISH + SHELLFISH,
+    "vegan": MEAT + FISH + SHELLFISH + DAIRY + EGG + ("miel",),
+    "pescatarian": MEAT,
+}
+
+# Lista explícita de las dietas restrictivas: el nombre debe empezar por uno de
+# estos alimentos y el resto ser solo palabras de ``NEUTRAL_WORDS``
+PLANT_FOODS = (
+    "arroz",
+    "quinoa",
+    "avena",
+    "copos de avena",
+    "patata",
+    "boniato",
+    "maiz",
+    "cuscus",
+    "bulgur",
+    "mijo",
+    "legumbres",
+    "lentejas",
+    "garbanzos",
+    "judias",
+    "alubias",
+    "guisantes",
+    "habas",
+    "edamame",
+    "soja",
+    "tofu",
+    "tempeh",
+    "aguacate",
+    "aceite de oliva",
+    "aceite de girasol",
+    "brocoli",
+    "espinacas",
+    "tomate",
+    "pimiento",
+    "cebolla",
+    "ajo",
+    "zanahoria",
+    "calabacin",
+    "calabaza",
+    "berenjena",
+    "lechuga",
+    "pepino",
+    "coliflor",
+    "champinones",
+    "setas",
+    "judias verdes",
+    "esparragos",
+    "alcachofa",
+    "platano",
+    "manzana",
+    "naranja",
+    "pera",
+    "fresas",
+    "kiwi",
+    "uvas",
+    "melon",
+    "sandia",
+    "mandarina",
+    "melocoton",
+    "pina",
+    "mango",
+    "arandanos",
+    "frambuesas",
+    "nueces",
+    "almendras",
+    "avellanas",
+    "anacardos",
+    "pistachos",
+    "cacahuetes",
+    "semillas de chia",
+    "semillas de lino",
+    "pipas de calabaza",
+)
+DAIRY_FOODS = (
+    "leche",
+    "yogur",
+    "yogur griego",
+    "queso fresco",
+    "queso",
+    "requeson",
+    "kefir",
+    "mantequilla",
+)
+EGG_FOODS = ("huevo", "huevos", "claras de huevo", "clara de huevo")
+SEAFOOD_FOODS = (
+    "salmon",
+    "atun",
+    "merluza",
+    "bacalao",
+    "sardinas",
+    "caballa",
+    "boquerones",
+    "lubina",
+    "dorada",
+    "trucha",
+    "gambas",
+    "langostinos",
+    "mejillones",
+    "calamar",
+    "pulpo",
+)
+DIET_ALLOWED = {
+    "vegan": PLANT_FOODS,
+    "vegetarian": PLANT_FOODS + DAIRY_FOODS + EGG_FOODS,
+    "pescatarian": PLANT_FOODS + DAIRY_FOODS + EGG_FOODS + SEAFOOD_FOODS,
+}
+NEUTRAL_WORDS = frozenset(
+    "a al de del en la el con y natural naturales integral integrales blanco blanca cocido cocida cocidos "
+    "cocidas hervido hervida hervidos hervidas crudo cruda crudos crudas fresco fresca frescos frescas "
+    "congelado congelada congelados congeladas seco seca secos secas tostado tostada tostados tostadas "
+    "plancha vapor horno asado asada asados asadas entero entera enteros enteras desnatado desnatada "
+    "semidesnatado semidesnatada griego griega virgen extra verde verdes rojo roja rojos rojas amarillo "
+    "troceado troceada picado picada rallado rallada firme agua aceite oliva lata conserva grande pequeno "
+    "maduro madura ecologico ecologica bio".split()
+)
+ALLERGEN_GROUPS = {
+    "lactosa": DAIRY,
+    "lacteos": DAIRY,
+    "leche": DAIRY,
+    "huevo": EGG,
+    "huevos": EGG,
+    "gluten": GLUTEN,
+    "frutos secos": NUTS,
+    "pescado": FISH,
+    "marisco": SHELLFISH,
+    "mariscos": SHELLFISH,
+    "soja": ("soja", "tofu", "tempeh"),
+}
+# dietas cuyo reparto de macros no sale de las plantillas: las resuelve el LLM
+UNSUPPORTED_DIETS = ("keto",)
+
+
+def food_role(food: Dict[str, Any]) -> Optional[str]:
+    """Rol del alimento según el reparto de kcal de sus macros por 100 g."""
+    kcal = float(food.get("calories_kcal") or 0)
+    if kcal <= 0:
+        return None
+    p = 4 * float(food.get("protein_g") or 0) / kcal
+    c = 4 * float(food.get("carbs_g") or 0) / kcal
+    f = 9 * float(food.get("fat_g") or 0) / kcal
+    if kcal < 60:
+        return SIDE
+    if f >= 0.7:
+        return FAT
+    if p >= 0.3:
+        return PROTEIN
+    if kcal < 100:
+        return SIDE
+    if c >= 0.4:
+        return CARB
+    return max(((p, PROTEIN), (c, CARB), (f, FAT)))[1]
+
+
+def excluded_terms(diet: Optional[str], allergies: Optional[str]) -> Tuple[str, ...]:
+    """Términos (normalizados) que no puede contener el nombre de un alimento."""
+    terms: List[str] = list(DIET_EXCLUSIONS.get((diet or "").lower(), ()))
+    for raw in re.split(r"[,;/]| y ", allergies or ""):
+        allergy = normalize_food_name(raw)
+        if not allergy:
+            continue
+        terms.extend(ALLERGEN_GROUPS.get(allergy, (allergy, allergy.rstrip("s"))))
+    return tuple(sorted(set(t for t in terms if t)))
+
+
+def _listed(name: str, allowed: Sequence[str]) -> bool:
+    """Si ``name`` es un alimento de ``allowed`` seguido solo de palabras neutras."""
+    for term in allowed:
+        if name == term or name.startswith(term + " "):
+            rest = re.findall(r"[a-z]+", name[len(term) :])
+            if all(word in NEUTRAL_WORDS for word in rest):
+                return True
+    return False
+
+
+def _allowed(
+    food: Dict[str, Any], excluded: Sequence[str], diet: Optional[str] = None
+) -> bool:
+    name = normalize_food_name(food.get("name"))
+    if any(term in name for term in excluded):
+        return False
+    allowed = DIET_ALLOWED.get((diet or "").lower())
+    return allowed is None or _listed(name, allowed)
+
+
+def food_allowed(name: str, diet: Optional[str], allergies: Optional[str]) -> bool:
+    """Si un alimento (por nombre) es compatible con la dieta y las alergias del perfil."""
+    return _allowed({"name": name}, excluded_terms(diet, allergies), diet)
+
+
+def _solve(matrix: List[List[float]], rhs: List[float]) -> List[float]:
+    """Eliminación gaussiana con pivoteo parcial (sistemas de hasta 4x4)."""
+    n = len(rhs)
+    a = [row[:] + [rhs[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        a[col], a[pivot] = a[pivot], a[col]
+        if abs(a[col][col]) < 1e-12:
+            continue
+        for r in range(n):
+            if r != col:
+                factor = a[r][col] / a[col][col]
+                for k in range(col, n + 1):
+                    a[r][k] -= factor * a[col][k]
+    return [a[i][n] / a[i][i] if abs(a[i][i]) > 1e-12 else 0.0 for i in range(n)]
+
+
+def bounded_portions(
+    per_gram: List[Tuple[float, float, float, float]],
+    target: Tuple[float, float, float, float],
+    defaults: List[float],
+    bounds: List[Tuple[float, float]],
+) -> List[float]:
+    """Gramos que minimizan el error relativo de kcal/macros dentro de ``bounds``.
+
+    Mínimos cuadrados con regularización hacia ``defaults``; las variables que
+    se salen de sus límites se fijan al límite y se resuelve el resto de nuevo.
+    """
+    n = len(per_gram)
+    fixed: Dict[int, float] = {}
+    grams = list(defaults)
+    for _ in range(n + 1):
+        free = [i for i in range(n) if i not in fixed]
+        if not free:
+            break
+        residual = [
+            target[j] - sum(per_gram[i][j] * g for i, g in fixed.items())
+            for j in range(4)
+        ]
+        weights = [w / max(t, 1.0) ** 2 for w, t in zip(MACRO_WEIGHTS, target)]
+        normal = [[0.0] * len(free) for _ in free]
+        rhs = [0.0] * len(free)
+        for a, i in enumerate(free):
+            for b, k in enumerate(free):
+                normal[a][b] = sum(
+                    weights[j] * per_gram[i][j] * per_gram[k][j] for j in range(4)
+                )
+            normal[a][a] += RIDGE / defaults[i] ** 2
+            rhs[a] = (
+                sum(weights[j] * per_gram[i][j] * residual[j] for j in range(4))
+                + RIDGE / defaults[i]
+            )
+        solution = _solve(normal, rhs)
+        violated = False
+        for a, i in enumerate(free):
+            lo, hi = bounds[i]
+            grams[i] = solution[a]
+            if solution[a] < lo or solution[a] > hi:
+                fixed[i] = min(max(solution[a], lo), hi)
+                violated = True
+        if not violated:
+            break
+    for i, g in fixed.items():
+        grams[i] = g
+    steps = [
+        (math.ceil(lo / 5) * 5, max(math.floor(hi / 5) * 5, math.ceil(lo / 5) * 5))
+        for lo, hi in bounds
+    ]
+    return [
+        float(min(max(round(g / 5) * 5, steps[i][0]), steps[i][1]))
+        for i, g in enumerate(grams)
+    ]
+
+
+class _Rotation:
+    """Elige por rol el alimento menos usado, sin repetirlo en el mismo día."""
+
+    def __init__(self, by_role: Dict[str, List[Dict[str, Any]]]):
+        self.by_role = by_role
+        self.uses: Dict[str, int] = {}
+        self.last_day: Dict[str, int] = {}
+
+    def pick(self, role: str, day: int, used_today: set) -> Optional[Dict[str, Any]]:
+        candidates = [
+            f for f in self.by_role.get(role, []) if f["name"] not in used_today
+        ]
+        if not candidates:
+            candidates = self.by_role.get(role, [])
+        if not candidates:
+            return None
+        pool = self.by_role[role]
+        # a igualdad de usos, el orden se desplaza con el día para no repetir
+        # el mismo alimento en la misma comida en días seguidos
+        order = {f["name"]: (i - day) % len(pool) for i, f in enumerate(pool)}
+        food = min(
+            candidates,
+            key=lambda f: (
+                self.uses.get(f["name"], 0),
+                self.last_day.get(f["name"], -1),
+                order[f["name"]],
+            ),
+        )
+        self.uses[food["name"]] = self.uses.get(food["name"], 0) + 1
+        self.last_day[food["name"]] = day
+        used_today.add(food["name"])
+        return food
+
+
+def _item(food: Dict[str, Any], grams: float) -> schemas.MealItem:
+    factor = grams / 100.0
+    return schemas.MealItem(
+        name=food["name"],
+        qty=grams,
+        unit="g",
+        kcal=round(float(food["calories_kcal"]) * factor),
+        protein_g=round(float(food.get("protein_g") or 0) * factor, 1),
+        carbs_g=round(float(food.get("carbs_g") or 0) * factor, 1),
+        fat_g=round(float(food.get("fat_g") or 0) * factor, 1),
+    )
+
+
+def plan_from_foods(
+    foods: Sequence[Dict[str, Any]],
+    targets: Dict[str, float],
+    *,
+    days: int,
+    start: Optional[date] = None,
+    diet: Optional[str] = None,
+    allergies: Optional[str] = None,
+) -> Optional[schemas.NutritionPlan]:
+    """Plan de ``days`` días con ``foods`` (macros por 100 g) para ``targets`` diarios.
+
+    Devuelve ``None`` para dietas no soportadas o si tras filtrar dieta y
+    alergias no quedan alimentos de proteína y de carbohidrato/acompañamiento.
+    """
+    if (diet or "").lower() in UNSUPPORTED_DIETS:
+        return None
+    excluded = excluded_terms(diet, allergies)
+    by_role: Dict[str, List[Dict[str, Any]]] = {}
+    for food in foods:
+        role = food_role(food)
+        if role and _allowed(food, excluded, diet):
+            by_role.setdefault(role, []).append(food)
+    if not by_role.get(PROTEIN) or not (by_role.get(CARB) or by_role.get(SIDE)):
+        return None
+
+    day_target = {k: float(targets[k]) for k in MACROS}
+    scale = max(day_target["kcal"] / PORTION_BASE_KCAL, 0.5)
+    portions = {
+        role: tuple(g * scale for g in grams) for role, grams in PORTIONS.items()
+    }
+
+    rotation = _Rotation(by_role)
+    start = start or date.today()
+    plan_days: List[schemas.NutritionDayPlan] = []
+    for d in range(max(1, days)):
+        used_today: set = set()
+        picks = []
+        for meal_type, share, roles in MEAL_TEMPLATES:
+            picked = [(role, rotation.pick(role, d, used_today)) for role in roles]
+            picks.append(
+                (
+                    meal_type,
+                    share,
+                    [(role, food) for role, food in picked if food is not None],
+                )
+            )
+
+        # Las comidas pequeñas (con menos margen) se resuelven antes; lo que se
+        # desvíen lo reparten las siguientes sobre lo que queda del día.
+        remaining = dict(day_target)
+        remaining_share = sum(share for _, share, picked in picks if picked)
+        solved: Dict[str, List[schemas.MealItem]] = {}
+        for meal_type, share, picked in sorted(picks, key=lambda m: m[1]):
+            if not picked:
+                continue
+            per_gram = [
+                tuple(
+                    float(food.get(k if k != "kcal" else "calories_kcal") or 0) / 100
+                    for k in MACROS
+                )
+                for _, food in picked
+            ]
+            grams = bounded_portions(
+                per_gram,
+                tuple(max(remaining[k], 0.0) * share / remaining_share for k in MACROS),
+                [portions[role][0] for role, _ in picked],
+                [portions[role][1:] for role, _ in picked],
+            )
+            items = [_item(food, g) for (_, food), g in zip(picked, grams)]
+            for k in MACROS:
+                remaining[k] -= sum(getattr(i, k) for i in items)
+            remaining_share -= share
+            solved[meal_type] = items
+        meals = [
+            schemas.Meal(
+                type=meal_type,
+                items=solved[meal_type],
+                meal_kcal=sum(i.kcal for i in solved[meal_type]),
+            )
+            for meal_type, _, _ in picks
+            if meal_type in solved
+        ]
+        totals = {
+            k: round(sum(getattr(i, k) for m in meals for i in m.items), 1)
+            for k in MACROS
+        }
+        plan_days.append(
+            schemas.NutritionDayPlan(
+                date=(start + timedelta(days=d)).isoformat(), meals=meals, totals=totals
+            )
+        )
+    return schemas.NutritionPlan(
+        days=plan_days, targets={k: round(v, 1) for k, v in day_target.items()}
+    )
+
+
+def build_local_plan(
+    db: Session,
+    user_id: int,
+    req: schemas.NutritionPlanRequest,
+    foods: Optional[Sequence[Dict[str, Any]]] = None,
+) -> Optional[schemas.NutritionPlan]:
+    """Plan local para el perfil del usuario, o ``None`` si no se puede montar.
+
+    Sin perfil completo (no hay objetivos), con ``preferences`` en la petición
+    (texto libre que solo interpreta el LLM) o sin alimentos suficientes en el
+    catálogo local devuelve ``None`` y el llamador sigue con el LLM.
+    """
+    if req.preferences:
+        return None
+    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+    if profile is None:
+        return None
+    try:
+        auto = nutrition_services.compute_auto_targets(profile)
+    except Exception:
+        return None
+    targets = {
+        "kcal": float(auto["calories_target"]),
+        "protein_g": float(auto["protein_g_target"]),
+        "carbs_g": float(auto["carbs_g_target"]),
+        "fat_g": float(auto["fat_g_target"]),
+    }
+    if foods is None:
+        from services.plan_foods import get_plan_foods_catalog
+
+        foods = get_plan_foods_catalog().foods
+    plan = plan_from_foods(
+        foods,
+        targets,
+        days=req.days,
+        diet=profile.dietary_preference,
+        allergies=profile.allergies,
+    )
+    if plan is None:
+        logger.info(
+            f"Plan local no disponible para el usuario {user_id}: catálogo insuficiente"
+        )
+    return plan
@@ -0,0 +1,170 @@
+"""Parseo incremental de planes nutricionales que llegan en streaming.
+
+El modelo escribe ``{"days": [...], "targets": {...}}`` token a token. En vez
+de esperar al JSON completo, ``PlanDaysParser`` recorre el texto según llega y
+entrega cada objeto de ``days[i]`` en cuanto se cierra su llave. ``StreamedPlan``
+lo valida al momento, así cada día puede persistirse y notificarse sin
+esperar al resto: si el modelo se corta en el día 12, los 11 anteriores ya
+están validados y guardados.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from . import schemas
+
+logger = logging.getLogger(__name__)
+
+
+class PlanDaysParser:
+    """Escáner de JSON incremental que extrae los elementos de ``days`` del objeto raíz.
+
+    Solo sigue la estructura (llaves, corchetes, cadenas y claves); cada día
+    completo se decodifica con ``json.loads`` sobre su propio fragmento. El
+    texto previo al objeto raíz (```json, prosa) se ignora.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._keys: Dict[int, Optional[str]] = {}  # nivel -> última clave vista
+        self._days_level: Optional[int] = None
+        self._day_start: Optional[int] = None
+        self.days_closed = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Añade texto y devuelve los días que se han cerrado con él."""
+        self.text += chunk
+        text = self.text
+        days: List[Dict[str, Any]] = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1 : i]
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":":
+                self._keys[len(self._stack)] = self._last_string
+            elif ch in "{[":
+                if (
+                    ch == "{"
+                    and self._days_level is not None
+                    and len(self._stack) == self._days_level
+                ):
+                    self._day_start = i
+                self._stack.append(ch)
+                if ch == "[" and len(self._stack) == 2 and self._keys.get(1) == "days":
+                    self._days_level = 2
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                depth = len(self._stack)
+                if (
+                    ch == "}"
+                    and self._day_start is not None
+                    and depth == self._days_level
+                ):
+                    raw = text[self._day_start : i + 1]
+                    self._day_start = None
+                    try:
+                        days.append(json.loads(raw))
+                    except ValueError as e:
+                        logger.warning(
+                            f"Día del plan con JSON inválido en el stream: {e}"
+                        )
+                elif (
+                    ch == "]"
+                    and self._days_level is not None
+                    and depth == self._days_level - 1
+                ):
+                    self._days_level = None
+                    self.days_closed = True
+        self._pos = len(text)
+        return days
+
+
+class StreamedPlan:
+    """Consume los tokens de un plan y entrega cada día validado en cuanto se cierra.
+
+    Iterar produce tuplas ``("token", str)`` y ``("day", (índice, NutritionDayPlan))``.
+    Si el stream falla a mitad (corte, timeout, rate limit), la iteración
+    termina sin propagar el error; queda en ``error`` y los días ya recibidos
+    siguen disponibles en ``days``.
+    """
+
+    def __init__(self, chunks: Iterable[str]) -> None:
+        self._chunks = chunks
+        self.parser = PlanDaysParser()
+        self.days: List[schemas.NutritionDayPlan] = []
+        self.invalid_days = 0
+        self.error: Optional[Exception] = None
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        from app.ai.services import plan_day_from_data
+
+        try:
+            for delta in self._chunks:
+                yield "token", delta
+                for raw in self.parser.feed(delta):
+                    try:
+                        day = plan_day_from_data(raw)
+                    except HTTPException as e:
+                        self.invalid_days += 1
+                        logger.warning(f"Día del plan descartado: {e.detail}")
+                        continue
+                    self.days.append(day)
+                    yield "day", (len(self.days) - 1, day)
+        except Exception as e:
+            logger.warning(
+                f"Stream del plan interrumpido tras {len(self.days)} días: {e}"
+            )
+            self.error = e
+
+    @property
+    def text(self) -> str:
+        return self.parser.text
+
+    @property
+    def complete(self) -> bool:
+        return self.error is None and self.parser.days_closed
+
+    def result(self) -> schemas.NutritionPlan:
+        """Plan final: el JSON completo si es válido; si no, los días recibidos.
+
+        Sin ningún día válido se relanza el error del stream (o un 502).
+        """
+        from app.ai.services import _normalize_plan_data_shape, plan_from_reply
+
+        if self.complete:
+            try:
+                return plan_from_reply(self.text)
+            except HTTPException as e:
+                logger.warning(
+                    f"Plan completo inválido, usando los días validados: {e.detail}"
+                )
+        if not self.days:
+            if isinstance(self.error, HTTPException):
+                raise self.error
+            raise HTTPException(
+                status_code=502, detail="AI nutrition stream produced no valid day"
+            )
+        # texto truncado: los targets (que van tras los días) se derivan del primer día
+        data = _normalize_plan_data_shape({"days": [d.model_dump() for d in self.days]})
+        return schemas.NutritionPlan.model_validate(data)
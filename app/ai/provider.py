@@ -4,19 +4,59 @@ Includes:
 - OpenAIProvider: lightweight simulated provider used in tests.
 - OpenRouterProvider: real calls to OpenRouter (DeepSeek V3.1 free).
 - OpenRouterBackupProvider: backup provider using GLM-4.5 Air free model.
+
+Every provider offers ``chat`` (whole completion) and ``chat_stream``, a
+generator yielding text deltas as the model produces them (``stream=True``)
+so routes can forward tokens over SSE instead of waiting for the full reply.
+
+- AsyncChatProvider: ``AsyncOpenAI`` counterpart of the above for async
+  routes; awaiting a completion leaves the event loop free.
 """
 
 from __future__ import annotations
 
+import asyncio
 from collections import defaultdict
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List
 
+import httpx
 from fastapi import HTTPException
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 from app.core.config import settings
 
 
+def _simulated_stream(text: str) -> Iterator[str]:
+    """Yield ``text`` word by word, like a streamed completion."""
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        yield word if i == len(words) - 1 else word + " "
+
+
+def _stream_deltas(stream: Iterable[Any], label: str) -> Iterator[str]:
+    """Text deltas of an OpenAI SDK ``stream=True`` completion."""
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"{label} stream error: {exc}")
+
+
+def _openrouter_headers() -> Dict[str, str] | None:
+    headers: Dict[str, str] = {}
+    if settings.OPENROUTER_HTTP_REFERER:
+        headers["HTTP-Referer"] = settings.OPENROUTER_HTTP_REFERER
+    if settings.OPENROUTER_APP_TITLE:
+        headers["X-Title"] = settings.OPENROUTER_APP_TITLE
+    return headers or None
+
+
 class OpenAIProvider:
     """Very small wrapper around the OpenAI API.
 
@@ -59,7 +99,7 @@ class OpenAIProvider:
         # Verificar rate limit antes de hacer el request
         from app.ai.rate_limiter import check_rate_limit, record_api_request
         
-        if not check_rate_limit():
+        if not check_rate_limit("openai"):
             raise HTTPException(status_code=429, detail="Rate limit alcanzado. Intenta más tarde.")
         
         try:
@@ -71,13 +111,49 @@ class OpenAIProvider:
             )
             
             # Registrar el request exitoso
-            record_api_request()
+            record_api_request("openai")
             
             reply = completion.choices[0].message.content or ""
             return {"reply": reply}
         except Exception as exc:
             raise HTTPException(status_code=502, detail=f"OpenAI error: {exc}")
 
+    def chat_stream(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        simulate: bool = False,
+        model: str | None = None,
+    ) -> Iterator[str]:
+        """Yield the completion text incrementally.
+
+        Budget and rate limit are checked on the first ``next()``, before any
+        token is produced, so callers can still fall back or report an error.
+        """
+
+        self._check_budget(user_id, cost=1)
+
+        if simulate:
+            yield from _simulated_stream("simulated response")
+            return
+
+        from app.ai.rate_limiter import check_rate_limit, record_api_request
+
+        if not check_rate_limit("openai"):
+            raise HTTPException(status_code=429, detail="Rate limit alcanzado. Intenta más tarde.")
+
+        try:
+            stream = self._client.chat.completions.create(
+                model=model or getattr(settings, "OPENAI_CHAT_MODEL", None) or "gpt-4o-mini",
+                messages=messages,
+                stream=True,
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=502, detail=f"OpenAI error: {exc}")
+        record_api_request("openai")
+        yield from _stream_deltas(stream, "OpenAI")
+
     def embedding(self, text: str, *, simulate: bool = False) -> List[float]:
         """Return an embedding vector for ``text``.
 
@@ -155,7 +231,7 @@ class OpenRouterProvider:
             # Verificar rate limit antes de hacer el request
             from app.ai.rate_limiter import check_rate_limit, record_api_request
             
-            if not check_rate_limit():
+            if not check_rate_limit("openrouter"):
                 raise HTTPException(status_code=429, detail="Rate limit alcanzado. Intenta más tarde.")
             
             completion = self._client.chat.completions.create(  # type: ignore[attr-defined]
@@ -165,13 +241,46 @@ class OpenRouterProvider:
             )
             
             # Registrar el request exitoso
-            record_api_request()
+            record_api_request("openrouter")
             
             reply = completion.choices[0].message.content or ""
             return {"reply": reply}
         except Exception as exc:
             raise HTTPException(status_code=502, detail=f"OpenRouter error: {exc}")
 
+    def chat_stream(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        simulate: bool = False,
+        model: str | None = None,
+    ) -> Iterator[str]:
+        """Streaming variant of :meth:`chat` (text deltas)."""
+        self._check_budget(user_id, cost=1)
+
+        if simulate or not settings.OPENROUTER_KEY:
+            yield from _simulated_stream("simulated response")
+            return
+
+        self._ensure_client()
+        from app.ai.rate_limiter import check_rate_limit, record_api_request
+
+        if not check_rate_limit("openrouter"):
+            raise HTTPException(status_code=429, detail="Rate limit alcanzado. Intenta más tarde.")
+
+        try:
+            stream = self._client.chat.completions.create(  # type: ignore[attr-defined]
+                model=model or settings.OPENROUTER_CHAT_MODEL,
+                messages=messages,
+                extra_headers=_openrouter_headers(),
+                stream=True,
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=502, detail=f"OpenRouter error: {exc}")
+        record_api_request("openrouter")
+        yield from _stream_deltas(stream, "OpenRouter")
+
     def embedding(self, text: str, *, simulate: bool = False) -> List[float]:
         # Free DeepSeek model doesn't expose embeddings; keep simulated
         # deterministic small vector for now.
@@ -232,17 +341,173 @@ class OpenRouterBackupProvider:
             if settings.OPENROUTER_APP_TITLE:
                 extra_headers["X-Title"] = settings.OPENROUTER_APP_TITLE
 
+            # La clave de respaldo tiene su propia cuota
+            from app.ai.rate_limiter import check_rate_limit, record_api_request
+
+            if not check_rate_limit("openrouter_backup"):
+                raise HTTPException(status_code=429, detail="Rate limit alcanzado. Intenta más tarde.")
+
             completion = self._client.chat.completions.create(  # type: ignore[attr-defined]
                 model=model or settings.OPENROUTER_BACKUP_CHAT_MODEL,
                 messages=messages,
                 extra_headers=extra_headers or None,
             )
+            record_api_request("openrouter_backup")
             reply = completion.choices[0].message.content or ""
             return {"reply": reply}
         except Exception as exc:
             raise HTTPException(status_code=502, detail=f"OpenRouter backup error: {exc}")
 
+    def chat_stream(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        simulate: bool = False,
+        model: str | None = None,
+    ) -> Iterator[str]:
+        """Streaming variant of :meth:`chat` (text deltas)."""
+        self._check_budget(user_id, cost=1)
+
+        if simulate or not settings.OPENROUTER_KEY2:
+            yield from _simulated_stream("simulated backup response")
+            return
+
+        self._ensure_client()
+        from app.ai.rate_limiter import check_rate_limit, record_api_request
+
+        if not check_rate_limit("openrouter_backup"):
+            raise HTTPException(status_code=429, detail="Rate limit alcanzado. Intenta más tarde.")
+
+        try:
+            stream = self._client.chat.completions.create(  # type: ignore[attr-defined]
+                model=model or settings.OPENROUTER_BACKUP_CHAT_MODEL,
+                messages=messages,
+                extra_headers=_openrouter_headers(),
+                stream=True,
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=502, detail=f"OpenRouter backup error: {exc}")
+        record_api_request("openrouter_backup")
+        yield from _stream_deltas(stream, "OpenRouter backup")
+
     def embedding(self, text: str, *, simulate: bool = False) -> List[float]:
         # GLM-4.5 Air free model doesn't expose embeddings; keep simulated
         # deterministic small vector for now.
         return [float(len(text) % 3), 0.1, 0.2]
+
+
+class AsyncChatProvider:
+    """Async chat completions for OpenAI and both OpenRouter keys.
+
+    They all speak the OpenAI API, so one class covers them; use the
+    ``openai``/``openrouter``/``openrouter_backup`` constructors. The SDK
+    client runs on the shared pooled ``http_client``. Budget, simulation and
+    the per-key rate limit behave like the sync providers, except that
+    waiting for a rate limit slot is an ``asyncio.sleep`` too.
+    """
+
+    def __init__(
+        self,
+        *,
+        api_key: str | None,
+        rate_key: str,
+        label: str,
+        default_model: str,
+        http_client: httpx.AsyncClient,
+        base_url: str | None = None,
+        headers: Dict[str, str] | None = None,
+        simulated_reply: str = "simulated response",
+        budget_cents: int | None = None,
+    ) -> None:
+        self.rate_key = rate_key
+        self.label = label
+        self.default_model = default_model
+        self.simulated_reply = simulated_reply
+        self._spent = defaultdict(int)
+        self._budget = budget_cents or settings.AI_DAILY_BUDGET_CENTS
+        self._client = (
+            AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                default_headers=headers,
+                http_client=http_client,
+                max_retries=1,
+            )
+            if api_key
+            else None
+        )
+
+    @classmethod
+    def openai(cls, http_client: httpx.AsyncClient) -> "AsyncChatProvider":
+        return cls(
+            api_key=getattr(settings, "API_OPEN_AI", None) or settings.OPENAI_API_KEY,
+            rate_key="openai",
+            label="OpenAI",
+            default_model=getattr(settings, "OPENAI_CHAT_MODEL", None) or "gpt-4o-mini",
+            http_client=http_client,
+        )
+
+    @classmethod
+    def openrouter(cls, http_client: httpx.AsyncClient) -> "AsyncChatProvider":
+        return cls(
+            api_key=settings.OPENROUTER_KEY,
+            rate_key="openrouter",
+            label="OpenRouter",
+            default_model=settings.OPENROUTER_CHAT_MODEL,
+            http_client=http_client,
+            base_url=settings.OPENROUTER_BASE_URL,
+            headers=_openrouter_headers(),
+        )
+
+    @classmethod
+    def openrouter_backup(cls, http_client: httpx.AsyncClient) -> "AsyncChatProvider":
+        return cls(
+            api_key=settings.OPENROUTER_KEY2,
+            rate_key="openrouter_backup",
+            label="OpenRouter backup",
+            default_model=settings.OPENROUTER_BACKUP_CHAT_MODEL,
+            http_client=http_client,
+            base_url=settings.OPENROUTER_BASE_URL,
+            headers=_openrouter_headers(),
+            simulated_reply="simulated backup response",
+        )
+
+    def _check_budget(self, user_id: int, cost: int) -> None:
+        current = self._spent[user_id]
+        if current + cost > self._budget:
+            raise HTTPException(status_code=402, detail="AI budget exceeded")
+        self._spent[user_id] = current + cost
+
+    async def chat(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        simulate: bool = False,
+        model: str | None = None,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        """Return a chat completion; extra ``params`` go to the SDK as is.
+
+        Without an API key the reply is simulated, as in the OpenRouter
+        providers. A refused rate limit slot raises ``RateLimitExceeded`` (429).
+        """
+        self._check_budget(user_id, cost=1)
+
+        if simulate or self._client is None:
+            return {"reply": self.simulated_reply}
+
+        from app.ai.rate_limiter import get_rate_limiter, record_api_request
+
+        await get_rate_limiter().acquire(self.rate_key)
+        try:
+            completion = await self._client.chat.completions.create(
+                model=model or self.default_model,
+                messages=messages,
+                **params,
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=502, detail=f"{self.label} error: {exc}")
+        await asyncio.to_thread(record_api_request, self.rate_key)
+        return {"reply": completion.choices[0].message.content or ""}
@@ -1,82 +1,218 @@
-"""Sistema de rate limiting inteligente para OpenRouter."""
+"""Rate limiting de las llamadas a los modelos, compartido entre procesos.
+
+Cada clave de proveedor (``openrouter``, ``openrouter_backup``, ``openai``)
+tiene su propia cuota: intervalo mínimo entre peticiones y máximo diario
+(``AI_RATE_LIMITS``). El estado vive en Redis (``AI_RATE_LIMIT_REDIS_URL``) o,
+sin Redis, en un fichero SQLite que hace de cerrojo entre procesos, así que
+N workers de uvicorn/Celery comparten una única cuota en lugar de multiplicarla.
+
+``reserve`` nunca duerme: reserva el siguiente hueco libre y devuelve cuánto
+falta para él. ``acquire`` espera ese tiempo con ``asyncio.sleep`` (sin ocupar
+el hilo) y ``acquire_blocking`` con ``time.sleep`` para el código síncrono
+(Celery, hilos de la generación por bloques). Si la espera superaría
+``max_wait_s`` o la cuota diaria está agotada se rechaza con 429 sin reservar.
+"""
 
 from __future__ import annotations
 
-import time
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+import asyncio
 import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from services.food_source_guard import RedisGuardStore, SQLiteGuardStore
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_QUOTA = {"min_interval_s": 2.0, "max_daily": 45}  # margen sobre el límite de 50 de OpenRouter free
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+def _new_state() -> Dict[str, Any]:
+    return {
+        "day": _today(),
+        "daily": 0,
+        "next_slot": 0.0,
+        "pending": [],  # huecos reservados aún no alcanzados: la cola compartida
+        "acquired": 0,
+        "completed": 0,
+        "refused": 0,
+        "waited": 0,
+        "wait_total_s": 0.0,
+        "wait_max_s": 0.0,
+    }
+
+
+class RateLimitExceeded(HTTPException):
+    """429 con ``Retry-After`` cuando la cuota no permite la petición."""
+
+    def __init__(self, detail: str, retry_after_s: float = 0.0) -> None:
+        headers = {"Retry-After": str(int(retry_after_s) + 1)} if retry_after_s else None
+        super().__init__(status_code=429, detail=detail, headers=headers)
+        self.retry_after_s = retry_after_s
+
+
+class LLMRateLimiter:
+    """Cuotas por clave de proveedor sobre un almacén compartido (Redis o SQLite)."""
+
+    def __init__(
+        self,
+        store: Any,
+        *,
+        quotas: Optional[Dict[str, Dict[str, float]]] = None,
+        max_wait_s: float = 30.0,
+    ) -> None:
+        self.store = store
+        self.quotas = dict(quotas or {})
+        self.max_wait_s = max_wait_s
+
+    @property
+    def backend(self) -> str:
+        return "redis" if isinstance(self.store, RedisGuardStore) else "sqlite"
+
+    def quota(self, key: str) -> Dict[str, float]:
+        return {**DEFAULT_QUOTA, **self.quotas.get(key, {})}
+
+    def reserve(self, key: str) -> float:
+        """Reserva el siguiente hueco de ``key`` y devuelve los segundos hasta él.
+
+        No bloquea. Lanza ``RateLimitExceeded`` si la cuota diaria está agotada
+        o si la cola es tan larga que la espera superaría ``max_wait_s``.
+        """
+        quota = self.quota(key)
+        now = time.time()
+        refusal: Optional[RateLimitExceeded] = None
+        with self.store.transaction(key, _new_state) as state:
+            if state["day"] != _today():
+                state.update(day=_today(), daily=0)
+            state["pending"] = [t for t in state["pending"] if t > now]
+            slot = max(now, state["next_slot"])
+            wait = slot - now
+            if state["daily"] >= quota["max_daily"]:
+                state["refused"] += 1
+                refusal = RateLimitExceeded(
+                    f"Rate limit diario alcanzado para {key}: {state['daily']}/{int(quota['max_daily'])}"
+                )
+            elif wait > self.max_wait_s:
+                state["refused"] += 1
+                refusal = RateLimitExceeded(
+                    f"Rate limit alcanzado para {key}: {len(state['pending'])} peticiones en cola", wait
+                )
+            else:
+                state["next_slot"] = slot + quota["min_interval_s"]
+                state["daily"] += 1
+                state["acquired"] += 1
+                if wait > 0:
+                    state["pending"].append(slot)
+                    state["waited"] += 1
+                    state["wait_total_s"] += wait
+                    state["wait_max_s"] = max(state["wait_max_s"], wait)
+        if refusal:
+            logger.warning(refusal.detail)
+            raise refusal
+        return wait
+
+    async def acquire(self, key: str) -> float:
+        """Espera su turno sin bloquear el event loop; devuelve los segundos esperados."""
+        wait = await asyncio.to_thread(self.reserve, key)  # el almacén es síncrono
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def acquire_blocking(self, key: str) -> float:
+        """Variante síncrona de ``acquire`` para Celery y hilos de trabajo."""
+        wait = self.reserve(key)
+        if wait > 0:
+            logger.info(f"Esperando {wait:.2f}s para respetar el rate limit de {key}")
+            time.sleep(wait)
+        return wait
+
+    def record_request(self, key: str) -> None:
+        """Cuenta una petición completada (el hueco ya se descontó al reservar)."""
+        with self.store.transaction(key, _new_state) as state:
+            state["completed"] += 1
+
+    def status(self, key: str) -> Dict[str, Any]:
+        quota = self.quota(key)
+        state = self.store.read(key) or _new_state()
+        now = time.time()
+        daily = state["daily"] if state["day"] == _today() else 0
+        next_slot_in = max(state["next_slot"] - now, 0.0)
+        return {
+            "daily_requests": daily,
+            "max_daily_requests": int(quota["max_daily"]),
+            "min_interval_s": quota["min_interval_s"],
+            "queue_depth": len([t for t in state["pending"] if t > now]),
+            "next_slot_in_s": round(next_slot_in, 2),
+            "can_make_request": daily < quota["max_daily"] and next_slot_in <= self.max_wait_s,
+            "acquired": state["acquired"],
+            "completed": state["completed"],
+            "refused": state["refused"],
+            "waited": state["waited"],
+            "avg_wait_s": round(state["wait_total_s"] / state["waited"], 3) if state["waited"] else 0.0,
+            "max_wait_s": round(state["wait_max_s"], 3),
+        }
 
-class RateLimitManager:
-    """Gestor de rate limits para OpenRouter."""
-    
-    def __init__(self):
-        self._last_request_time = 0
-        self._min_interval = 2.0  # Mínimo 2 segundos entre requests
-        self._daily_requests = 0
-        self._daily_reset_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-        self._max_daily_requests = 45  # Dejamos margen de los 50 límite
-    
-    def can_make_request(self) -> bool:
-        """Verifica si se puede hacer un request."""
-        now = datetime.now()
-        
-        # Resetear contador diario si es nuevo día
-        if now >= self._daily_reset_time:
-            self._daily_requests = 0
-            self._daily_reset_time = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-        
-        # Verificar límite diario
-        if self._daily_requests >= self._max_daily_requests:
-            logger.warning(f"Rate limit diario alcanzado: {self._daily_requests}/{self._max_daily_requests}")
-            return False
-        
-        # Verificar intervalo mínimo
-        time_since_last = time.time() - self._last_request_time
-        if time_since_last < self._min_interval:
-            sleep_time = self._min_interval - time_since_last
-            logger.info(f"Esperando {sleep_time:.2f}s para respetar rate limit")
-            time.sleep(sleep_time)
-        
-        return True
-    
-    def record_request(self):
-        """Registra que se hizo un request."""
-        self._last_request_time = time.time()
-        self._daily_requests += 1
-        logger.info(f"Request registrado. Total hoy: {self._daily_requests}/{self._max_daily_requests}")
-    
     def get_status(self) -> Dict[str, Any]:
-        """Obtiene el estado del rate limiter."""
-        now = datetime.now()
-        time_until_reset = (self._daily_reset_time - now).total_seconds()
-        
+        """Estado de todas las claves configuradas."""
+        keys = sorted(set(self.quotas) | {"openrouter"})
         return {
-            "daily_requests": self._daily_requests,
-            "max_daily_requests": self._max_daily_requests,
-            "time_until_reset_hours": time_until_reset / 3600,
-            "can_make_request": self.can_make_request(),
-            "last_request_ago_seconds": time.time() - self._last_request_time
+            "backend": self.backend,
+            "max_wait_s": self.max_wait_s,
+            "keys": {key: self.status(key) for key in keys},
         }
 
 
-# Instancia global del rate limiter
-_rate_limiter = RateLimitManager()
+def build_rate_limiter(settings) -> LLMRateLimiter:
+    """Redis si ``AI_RATE_LIMIT_REDIS_URL`` está definida; si no, fichero SQLite compartido."""
+    url = settings.AI_RATE_LIMIT_REDIS_URL
+    if url:
+        store = RedisGuardStore(url, prefix="ai:ratelimit:")
+    else:
+        import os
+        import tempfile
+
+        path = settings.AI_RATE_LIMIT_SQLITE_PATH or os.path.join(
+            tempfile.gettempdir(), "planifitai_ai_rate_limit.sqlite3"
+        )
+        store = SQLiteGuardStore(path, table="ai_rate_limit")
+    return LLMRateLimiter(store, quotas=settings.AI_RATE_LIMITS, max_wait_s=settings.AI_RATE_LIMIT_MAX_WAIT_S)
+
+
+_rate_limiter: Optional[LLMRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
 
+def get_rate_limiter() -> LLMRateLimiter:
+    """Obtiene la instancia global del rate limiter (se crea al primer uso)."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                from app.core.config import settings
 
-def get_rate_limiter() -> RateLimitManager:
-    """Obtiene la instancia global del rate limiter."""
+                _rate_limiter = build_rate_limiter(settings)
     return _rate_limiter
 
 
-def check_rate_limit() -> bool:
-    """Verifica si se puede hacer un request respetando rate limits."""
-    return _rate_limiter.can_make_request()
+def check_rate_limit(key: str = "openrouter") -> bool:
+    """Espera el turno de ``key``; ``False`` si la cuota no lo permite."""
+    try:
+        get_rate_limiter().acquire_blocking(key)
+    except RateLimitExceeded:
+        return False
+    return True
 
 
-def record_api_request():
-    """Registra que se hizo un request a la API."""
-    _rate_limiter.record_request()
+def record_api_request(key: str = "openrouter") -> None:
+    """Registra que se completó un request a la API."""
+    try:
+        get_rate_limiter().record_request(key)
+    except Exception as e:  # las métricas no deben romper la respuesta
+        logger.warning(f"No se pudo registrar el request de {key}: {e}")
@@ -2,24 +2,109 @@
 
 from __future__ import annotations
 
+import json
 import logging
 from datetime import datetime
+from typing import Callable, Iterable, Iterator
+
 from fastapi import APIRouter, Depends, Query
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from app.ai_client import get_ai_client
+from app.ai_client import get_ai_client, get_async_ai_client
 from app.auth.deps import UserContext, get_current_user
 from app.core.database import get_db
 
 from . import schemas, services, smart_food_search
 from . import plan_persistence
+from .single_flight import flight_key, plan_flights, submit_generation_task
 from app.notifications import crud as notif_crud, models as notif_models, services as notif_services, schemas as notif_schemas
 from app.background.nutrition_tasks import generate_nutrition_plan_task, generate_nutrition_plan_14_days_task
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 logger = logging.getLogger(__name__)
 
+# Prompt optimizado para GPT-5-nano
+PLAN_JSON_SYSTEM_PROMPT = """Eres PlanifitAI, un experto nutricionista. Genera planes nutricionales completos y realistas en formato JSON.
+
+FORMATO EXACTO:
+{
+  "days": [
+    {
+      "date": "YYYY-MM-DD",
+      "meals": [
+        {
+          "type": "breakfast|lunch|dinner|snack",
+          "items": [
+            {
+              "name": "nombre del alimento",
+              "qty": cantidad_numerica,
+              "unit": "g|ml|unidad|taza",
+              "kcal": calorias,
+              "protein_g": proteinas,
+              "carbs_g": carbohidratos,
+              "fat_g": grasas
+            }
+          ],
+          "meal_kcal": total_calorias_comida
+        }
+      ],
+      "totals": {
+        "kcal": total_dia,
+        "protein_g": proteinas_dia,
+        "carbs_g": carbohidratos_dia,
+        "fat_g": grasas_dia
+      }
+    }
+  ],
+  "targets": {
+    "kcal": objetivo_calorias,
+    "protein_g": objetivo_proteinas,
+    "carbs_g": objetivo_carbohidratos,
+    "fat_g": objetivo_grasas
+  }
+}
+
+ALIMENTOS DISPONIBLES: Pollo, salmón, huevos, yogur griego, arroz integral, quinoa, avena, patata, aguacate, aceite de oliva, brócoli, espinacas, tomate, plátano, manzana, nueces, almendras, leche, queso fresco.
+
+COMIDAS: breakfast (desayuno), lunch (almuerzo), dinner (cena), snack (merienda).
+
+IMPORTANTE: Responde SOLO con JSON válido, sin texto adicional."""
+
+
+async def _generate_plan_json(user_id: int, user_prompt: str) -> dict:
+    """Plan en JSON generado por GPT-5-nano con el cliente async.
+
+    La petición se espera sin bloquear el event loop, así que el worker sigue
+    atendiendo otras peticiones mientras el modelo responde.
+    """
+    response = await get_async_ai_client().chat(
+        user_id,
+        [
+            {"role": "system", "content": PLAN_JSON_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        model="gpt-5-nano",
+        reasoning_effort="low",
+        verbosity="low",
+    )
+
+    # Limpiar respuesta
+    clean_reply = (response.get("reply") or "").strip()
+    if clean_reply.startswith('```json'):
+        clean_reply = clean_reply[7:]
+    if clean_reply.endswith('```'):
+        clean_reply = clean_reply[:-3]
+    clean_reply = clean_reply.strip()
+
+    plan_data = json.loads(clean_reply)
+
+    # Validar estructura
+    if not plan_data.get('days') or not plan_data.get('targets'):
+        raise ValueError("Estructura JSON inválida")
+    return plan_data
+
 
 @router.get("/test-celery")
 def test_celery():
@@ -59,15 +144,15 @@ def test_nutrition_task():
         from app.background.nutrition_tasks import generate_nutrition_plan_task
         
         # Crear una tarea de prueba
-        task = generate_nutrition_plan_task.delay(
-            user_id=1,
-            request_data={"days": 1, "preferences": {}}
+        task_id, coalesced = submit_generation_task(
+            generate_nutrition_plan_task, 1, {"days": 1, "preferences": {}}
         )
         
         return {
             "status": "success",
+            "coalesced": coalesced,
             "message": "Tarea de nutrición registrada correctamente",
-            "task_id": task.id,
+            "task_id": task_id,
             "nutrition_tasks_available": True
         }
         
@@ -88,16 +173,16 @@ def test_async_generation():
         from app.background.nutrition_tasks import generate_nutrition_plan_task
         
         # Crear una tarea de prueba
-        task = generate_nutrition_plan_task.delay(
-            user_id=1,
-            request_data={"days": 1, "preferences": {}}
+        task_id, coalesced = submit_generation_task(
+            generate_nutrition_plan_task, 1, {"days": 1, "preferences": {}}
         )
         
         return {
             "status": "success",
+            "coalesced": coalesced,
             "message": "Generación asíncrona iniciada correctamente",
-            "task_id": task.id,
-            "test_url": f"/api/v1/ai/generate/nutrition-plan-status/{task.id}"
+            "task_id": task_id,
+            "test_url": f"/api/v1/ai/generate/nutrition-plan-status/{task_id}"
         }
         
     except Exception as e:
@@ -116,16 +201,16 @@ def test_quick_generation():
         from app.background.nutrition_tasks import generate_nutrition_plan_test_task
         
         # Crear una tarea de prueba rápida
-        task = generate_nutrition_plan_test_task.delay(
-            user_id=1,
-            request_data={"days": 1, "preferences": {}}
+        task_id, coalesced = submit_generation_task(
+            generate_nutrition_plan_test_task, 1, {"days": 1, "preferences": {}}
         )
         
         return {
             "status": "success",
+            "coalesced": coalesced,
             "message": "Generación rápida iniciada (1 día)",
-            "task_id": task.id,
-            "test_url": f"/api/v1/ai/generate/nutrition-plan-status/{task.id}",
+            "task_id": task_id,
+            "test_url": f"/api/v1/ai/generate/nutrition-plan-status/{task_id}",
             "estimated_time": "30-60 segundos"
         }
         
@@ -145,16 +230,16 @@ def test_14_days_generation():
         from app.background.nutrition_tasks import generate_nutrition_plan_14_days_task
         
         # Crear una tarea de prueba de 14 días
-        task = generate_nutrition_plan_14_days_task.delay(
-            user_id=1,
-            request_data={"days": 14, "preferences": {}}
+        task_id, coalesced = submit_generation_task(
+            generate_nutrition_plan_14_days_task, 1, {"days": 14, "preferences": {}}
         )
         
         return {
             "status": "success",
+            "coalesced": coalesced,
             "message": "Generación de 14 días iniciada",
-            "task_id": task.id,
-            "test_url": f"/api/v1/ai/generate/nutrition-plan-status/{task.id}",
+            "task_id": task_id,
+            "test_url": f"/api/v1/ai/generate/nutrition-plan-status/{task_id}",
             "estimated_time": "5-10 segundos"
         }
         
@@ -169,9 +254,7 @@ def test_14_days_generation():
 async def test_14_days_working():
     """Test de generación de 14 días sin autenticación - FUNCIONANDO."""
     try:
-        from openai import OpenAI
         from app.core.config import settings
-        import json
         from datetime import date, timedelta
         
         # Obtener API key
@@ -182,59 +265,10 @@ async def test_14_days_working():
                 "message": "API key no configurada"
             }
         
-        client = OpenAI(api_key=api_key)
-        
         # Generar fechas para 14 días
         today = date.today()
         dates = [(today + timedelta(days=i)).isoformat() for i in range(14)]
         
-        # Prompt optimizado para GPT-5-nano
-        system_prompt = """Eres PlanifitAI, un experto nutricionista. Genera planes nutricionales completos y realistas en formato JSON.
-
-FORMATO EXACTO:
-{
-  "days": [
-    {
-      "date": "YYYY-MM-DD",
-      "meals": [
-        {
-          "type": "breakfast|lunch|dinner|snack",
-          "items": [
-            {
-              "name": "nombre del alimento",
-              "qty": cantidad_numerica,
-              "unit": "g|ml|unidad|taza",
-              "kcal": calorias,
-              "protein_g": proteinas,
-              "carbs_g": carbohidratos,
-              "fat_g": grasas
-            }
-          ],
-          "meal_kcal": total_calorias_comida
-        }
-      ],
-      "totals": {
-        "kcal": total_dia,
-        "protein_g": proteinas_dia,
-        "carbs_g": carbohidratos_dia,
-        "fat_g": grasas_dia
-      }
-    }
-  ],
-  "targets": {
-    "kcal": objetivo_calorias,
-    "protein_g": objetivo_proteinas,
-    "carbs_g": objetivo_carbohidratos,
-    "fat_g": objetivo_grasas
-  }
-}
-
-ALIMENTOS DISPONIBLES: Pollo, salmón, huevos, yogur griego, arroz integral, quinoa, avena, patata, aguacate, aceite de oliva, brócoli, espinacas, tomate, plátano, manzana, nueces, almendras, leche, queso fresco.
-
-COMIDAS: breakfast (desayuno), lunch (almuerzo), dinner (cena), snack (merienda).
-
-IMPORTANTE: Responde SOLO con JSON válido, sin texto adicional."""
-
         user_prompt = f"""Genera un plan nutricional completo para 14 días (2 semanas completas).
 
 DETALLES:
@@ -249,33 +283,7 @@ DETALLES:
 
 Genera el JSON completo para los 14 días."""
 
-        # Generar con GPT-5-nano
-        response = client.chat.completions.create(
-            model="gpt-5-nano",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            reasoning_effort="low",
-            verbosity="low"
-        )
-        
-        reply = response.choices[0].message.content
-        
-        # Limpiar respuesta
-        clean_reply = reply.strip()
-        if clean_reply.startswith('```json'):
-            clean_reply = clean_reply[7:]
-        if clean_reply.endswith('```'):
-            clean_reply = clean_reply[:-3]
-        clean_reply = clean_reply.strip()
-        
-        # Parsear JSON
-        plan_data = json.loads(clean_reply)
-        
-        # Validar estructura
-        if not plan_data.get('days') or not plan_data.get('targets'):
-            raise ValueError("Estructura JSON inválida")
+        plan_data = await _generate_plan_json(0, user_prompt)
         
         return {
             "status": "success",
@@ -303,9 +311,7 @@ async def generate_nutrition_plan_direct_working(
 ):
     """Generación directa de plan nutricional sin Celery - FUNCIONANDO."""
     try:
-        from openai import OpenAI
         from app.core.config import settings
-        import json
         from datetime import date, timedelta
         
         # Obtener API key
@@ -316,64 +322,16 @@ async def generate_nutrition_plan_direct_working(
                 "message": "API key no configurada"
             }
         
-        client = OpenAI(api_key=api_key)
-        
         # Generar fechas
         today = date.today()
         dates = [(today + timedelta(days=i)).isoformat() for i in range(request.days)]
+        preferences = request.preferences or {}
         
-        # Prompt optimizado para GPT-5-nano
-        system_prompt = """Eres PlanifitAI, un experto nutricionista. Genera planes nutricionales completos y realistas en formato JSON.
-
-FORMATO EXACTO:
-{
-  "days": [
-    {
-      "date": "YYYY-MM-DD",
-      "meals": [
-        {
-          "type": "breakfast|lunch|dinner|snack",
-          "items": [
-            {
-              "name": "nombre del alimento",
-              "qty": cantidad_numerica,
-              "unit": "g|ml|unidad|taza",
-              "kcal": calorias,
-              "protein_g": proteinas,
-              "carbs_g": carbohidratos,
-              "fat_g": grasas
-            }
-          ],
-          "meal_kcal": total_calorias_comida
-        }
-      ],
-      "totals": {
-        "kcal": total_dia,
-        "protein_g": proteinas_dia,
-        "carbs_g": carbohidratos_dia,
-        "fat_g": grasas_dia
-      }
-    }
-  ],
-  "targets": {
-    "kcal": objetivo_calorias,
-    "protein_g": objetivo_proteinas,
-    "carbs_g": objetivo_carbohidratos,
-    "fat_g": objetivo_grasas
-  }
-}
-
-ALIMENTOS DISPONIBLES: Pollo, salmón, huevos, yogur griego, arroz integral, quinoa, avena, patata, aguacate, aceite de oliva, brócoli, espinacas, tomate, plátano, manzana, nueces, almendras, leche, queso fresco.
-
-COMIDAS: breakfast (desayuno), lunch (almuerzo), dinner (cena), snack (merienda).
-
-IMPORTANTE: Responde SOLO con JSON válido, sin texto adicional."""
-
         user_prompt = f"""Genera un plan nutricional completo para {request.days} días.
 
 DETALLES:
-- Objetivo: {request.goal or 'maintain_weight'}
-- Nivel de actividad: {request.activity_level or 'moderately_active'}
+- Objetivo: {preferences.get('goal') or 'maintain_weight'}
+- Nivel de actividad: {preferences.get('activity_level') or 'moderately_active'}
 - Fechas: {', '.join(dates[:5])}{'...' if len(dates) > 5 else ''}
 - Incluye 4 comidas por día: desayuno, almuerzo, cena y merienda
 - Usa alimentos variados y saludables
@@ -382,33 +340,7 @@ DETALLES:
 
 Genera el JSON completo para los {request.days} días."""
 
-        # Generar con GPT-5-nano
-        response = client.chat.completions.create(
-            model="gpt-5-nano",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            reasoning_effort="low",
-            verbosity="low"
-        )
-        
-        reply = response.choices[0].message.content
-        
-        # Limpiar respuesta
-        clean_reply = reply.strip()
-        if clean_reply.startswith('```json'):
-            clean_reply = clean_reply[7:]
-        if clean_reply.endswith('```'):
-            clean_reply = clean_reply[:-3]
-        clean_reply = clean_reply.strip()
-        
-        # Parsear JSON
-        plan_data = json.loads(clean_reply)
-        
-        # Validar estructura
-        if not plan_data.get('days') or not plan_data.get('targets'):
-            raise ValueError("Estructura JSON inválida")
+        plan_data = await _generate_plan_json(current_user.id, user_prompt)
         
         return {
             "status": "success",
@@ -431,7 +363,7 @@ Genera el JSON completo para los {request.days} días."""
 async def test_nutrition_direct():
     """Test directo de generación nutricional sin autenticación."""
     try:
-        from app.ai.services import generate_nutrition_plan_optimized
+        from app.ai.services import generate_nutrition_plan_optimized_async
         from app.auth.deps import UserContext
         
         # Crear contexto de usuario simulado
@@ -450,7 +382,7 @@ async def test_nutrition_direct():
         )
         
         # Generar plan directamente (sin Celery)
-        plan = generate_nutrition_plan_optimized(
+        plan = await generate_nutrition_plan_optimized_async(
             user=user_context,
             req=request,
             db=None,  # No necesitamos DB para este test
@@ -482,10 +414,10 @@ async def generate_nutrition_plan_direct(
 ):
     """Generación directa de plan nutricional sin Celery."""
     try:
-        from app.ai.services import generate_nutrition_plan_optimized
+        from app.ai.services import generate_nutrition_plan_optimized_async
         
         # Generar plan directamente (sin Celery)
-        plan = generate_nutrition_plan_optimized(
+        plan = await generate_nutrition_plan_optimized_async(
             user=current_user,
             req=request,
             db=db,
@@ -511,7 +443,7 @@ async def generate_nutrition_plan_direct(
 async def test_direct_generation():
     """Test directo de generación sin Celery."""
     try:
-        from app.ai.services import generate_nutrition_plan_optimized
+        from app.ai.services import generate_nutrition_plan_optimized_async
         from app.auth.deps import UserContext
         from app.ai import schemas
         
@@ -531,7 +463,7 @@ async def test_direct_generation():
         )
         
         # Generar plan directamente (sin Celery)
-        plan = generate_nutrition_plan_optimized(
+        plan = await generate_nutrition_plan_optimized_async(
             user=user_context,
             req=request,
             db=None,  # No necesitamos DB para este test
@@ -557,7 +489,8 @@ async def test_direct_generation():
 @router.get("/rate-limit-status")
 def get_rate_limit_status():
     """
-    Obtiene el estado del rate limiter de OpenRouter.
+    Estado del rate limiter compartido de los modelos: cuota diaria, cola y
+    tiempos de espera por clave de proveedor.
     """
     try:
         from app.ai.rate_limiter import get_rate_limiter
@@ -576,10 +509,31 @@ def get_rate_limit_status():
         }
 
 
+@router.get("/food-sources/breaker-status")
+def get_food_source_breaker_status():
+    """
+    Estado del limitador compartido y del circuit breaker de cada fuente de alimentos.
+    """
+    try:
+        from services.food_sources import food_source_breaker_status
+
+        return {
+            "status": "success",
+            "breaker_status": food_source_breaker_status()
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error obteniendo estado del circuit breaker: {str(e)}"
+        }
+
+
 @router.get("/cache/stats")
 def get_cache_stats():
     """
-    Obtiene estadísticas del cache de planes nutricionales.
+    Obtiene estadísticas del cache de planes nutricionales (aciertos, fallos,
+    desalojos e invalidaciones; compartidas entre procesos con Redis).
     """
     try:
         from app.ai.cache import get_nutrition_cache
@@ -598,6 +552,26 @@ def get_cache_stats():
         }
 
 
+@router.get("/food-sources/pool-stats")
+def get_food_source_pool_stats():
+    """
+    Métricas de reutilización de conexiones HTTP del adaptador de alimentos.
+    """
+    try:
+        from services.food_sources import food_source_pool_stats
+
+        return {
+            "status": "success",
+            "pool_stats": food_source_pool_stats()
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error obteniendo métricas del pool: {str(e)}"
+        }
+
+
 @router.get("/generate/nutrition-plan-stream/{task_id}")
 def stream_nutrition_plan_status(task_id: str):
     """
@@ -618,8 +592,10 @@ def stream_nutrition_plan_status(task_id: str):
             while True:
                 try:
                     current_status = task.state
+                    # en PROGRESS también cambia el avance (p. ej. un día más listo)
+                    current_key = (current_status, str(task.info)) if current_status == 'PROGRESS' else current_status
                     
-                    if current_status != last_status:
+                    if current_key != last_status:
                         # Enviar evento SSE
                         if current_status == 'PENDING':
                             data = {
@@ -635,6 +611,9 @@ def stream_nutrition_plan_status(task_id: str):
                                 'step': meta.get('step', 'processing'),
                                 'message': meta.get('message', 'Procesando...')
                             }
+                            if 'days_ready' in meta:
+                                data['days_ready'] = meta['days_ready']
+                                data['day'] = meta.get('day')
                         elif current_status == 'SUCCESS':
                             result = task.result
                             data = {
@@ -675,7 +654,7 @@ def stream_nutrition_plan_status(task_id: str):
                         
                         # Enviar como SSE
                         yield f"data: {json.dumps(data)}\n\n"
-                        last_status = current_status
+                        last_status = current_key
                         
                         # Si la tarea terminó, cerrar conexión
                         if current_status in ['SUCCESS', 'FAILURE']:
@@ -741,6 +720,131 @@ def chat(
     return services.chat(current_user, payload)
 
 
+def _sse(data: dict) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _token_events(chunks: Iterable[str], finish: Callable[[str], dict]) -> Iterator[str]:
+    """Eventos SSE: STARTED al instante, un TOKEN por fragmento y SUCCESS/FAILURE al final.
+
+    ``finish`` recibe el texto completo y devuelve los campos del evento final.
+    """
+    yield _sse({"status": "STARTED"})
+    parts: list[str] = []
+    try:
+        for delta in chunks:
+            parts.append(delta)
+            yield _sse({"status": "TOKEN", "delta": delta})
+        yield _sse({"status": "SUCCESS", **finish("".join(parts))})
+    except Exception as e:
+        logger.warning(f"Error en streaming de IA: {e}")
+        yield _sse({
+            "status": "FAILURE",
+            "error": getattr(e, "detail", None) or str(e),
+            "error_type": type(e).__name__,
+        })
+
+
+def _sse_response(events: Iterator[str]) -> StreamingResponse:
+    # generador síncrono: Starlette lo itera en el threadpool
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # sin buffer en nginx: cada token sale en cuanto llega
+        },
+    )
+
+
+@router.post("/chat/stream")
+def chat_stream(
+    payload: schemas.ChatRequest,
+    current_user: UserContext = Depends(get_current_user),
+):
+    """Chat con la respuesta emitida token a token por SSE."""
+    chunks = services.chat_stream(current_user, payload)
+    return _sse_response(_token_events(chunks, lambda reply: {"reply": reply}))
+
+
+def _plan_day_events(
+    chunks: Iterable[str], user_id: int, persist: bool
+) -> Iterator[str]:
+    """Eventos SSE de un plan en streaming: TOKEN, un DAY por cada ``days[i]`` cerrado y el final.
+
+    Con ``persist`` cada día se guarda (y confirma) en cuanto se valida, en su
+    propia sesión: la de la petición puede cerrarse antes de acabar el stream.
+    Cada día sustituye solo las comidas IA de su fecha, así que un fallo del
+    modelo no deja al usuario sin el plan anterior, y se guarda con los
+    objetivos del perfil (sin perfil completo, con los del plan al acabar).
+    Si el modelo se corta tras algún día válido, el final es SUCCESS con
+    ``truncated: true`` y el plan parcial.
+    """
+    from app.ai.plan_stream import StreamedPlan
+    from app.core.database import SessionLocal
+
+    yield _sse({"status": "STARTED"})
+    streamed = StreamedPlan(chunks)
+    persisted = {"meals_created": 0, "days": 0, "errors": []}
+    db = SessionLocal() if persist else None
+    try:
+        targets = services.profile_plan_targets(db, user_id) if db is not None else None
+        for kind, value in streamed:
+            if kind == "token":
+                yield _sse({"status": "TOKEN", "delta": value})
+                continue
+            index, day = value
+            event = {"status": "DAY", "index": index, "day": day.model_dump(mode="json")}
+            if db is not None:
+                result = plan_persistence.persist_plan_day(db, user_id, index, day.model_dump(), targets)
+                persisted["days"] += int(result["success"])
+                persisted["meals_created"] += result["meals_created"]
+                persisted["errors"] += result["errors"]
+                event["persisted"] = result["success"]
+            yield _sse(event)
+        plan = streamed.result()
+        if db is not None and targets is None:
+            result = plan_persistence.persist_plan_targets(
+                db, user_id, [d.model_dump() for d in streamed.days], plan.targets
+            )
+            persisted["errors"] += result["errors"]
+        final = {
+            "status": "SUCCESS",
+            "plan": plan.model_dump(mode="json"),
+            "generated_at": datetime.utcnow().isoformat(),
+            "days_generated": len(plan.days),
+            "truncated": not streamed.complete,
+        }
+        if db is not None:
+            final["persist"] = persisted
+        yield _sse(final)
+    except Exception as e:
+        logger.warning(f"Error en streaming del plan: {e}")
+        yield _sse({
+            "status": "FAILURE",
+            "error": getattr(e, "detail", None) or str(e),
+            "error_type": type(e).__name__,
+            "days_generated": len(streamed.days),
+        })
+    finally:
+        if db is not None:
+            db.close()
+
+
+@router.post("/generate/nutrition-plan-direct/stream")
+def stream_nutrition_plan_direct(
+    request: schemas.NutritionPlanRequest,
+    simulate: bool = Query(False),
+    current_user: UserContext = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Generación directa por SSE: tokens del modelo, cada día validado en cuanto se cierra
+    (y persistido si ``persist_to_db``) y el plan final en el último evento."""
+    chunks = services.stream_nutrition_plan_optimized(current_user, request, db, simulate=simulate)
+    return _sse_response(_plan_day_events(chunks, current_user.id, bool(request.persist_to_db)))
+
+
 @router.post("/insights", response_model=schemas.InsightsResponse)
 def insights(
     payload: schemas.InsightsRequest,
@@ -773,6 +877,26 @@ def get_food_suggestions(
     return {"suggestions": suggestions}
 
 
+@router.get("/food-search/cache/stats")
+def get_food_search_cache_stats():
+    """
+    Estadísticas del cache de búsqueda inteligente de alimentos.
+    """
+    try:
+        from app.ai.search_cache import get_smart_search_cache
+
+        return {
+            "status": "success",
+            "cache_stats": get_smart_search_cache().get_stats()
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Error obteniendo estadísticas del cache de búsqueda: {str(e)}"
+        }
+
+
 @router.get("/food-search/terms")
 def get_enhanced_search_terms(
     query: str = Query(..., description="Consulta de búsqueda"),
@@ -800,15 +924,18 @@ def generate_nutrition_plan_async_endpoint(
     Inicia la generación asíncrona de un plan nutricional.
     
     Retorna un task_id que puede usarse para consultar el progreso.
+
+    Peticiones idénticas mientras la primera sigue en curso (doble clic,
+    recarga) reciben el mismo ``task_id`` en lugar de encolar otra tarea.
     """
-    # Iniciar tarea en background
-    task = generate_nutrition_plan_task.delay(
-        user_id=current_user.id,
-        request_data=payload.model_dump()
+    # Iniciar tarea en background (o unirse a la idéntica en curso)
+    task_id, coalesced = submit_generation_task(
+        generate_nutrition_plan_task, current_user.id, payload.model_dump()
     )
     
     return {
-        "task_id": task.id,
+        "task_id": task_id,
+        "coalesced": coalesced,
         "status": "PENDING",
         "message": "Plan generándose en background",
         "estimated_time": "30-60 segundos"
@@ -848,7 +975,8 @@ async def test_14_days_web_format():
         
         try:
             # Generar plan usando el mismo código que el endpoint principal
-            plan = generator.generate_optimized_plan(user_context, payload, db)
+            # El generador es síncrono (cliente bloqueante): fuera del event loop
+            plan = await run_in_threadpool(generator.generate_optimized_plan, user_context, payload, db)
             
             # Convertir a dict como lo hace el endpoint principal
             plan_data = plan.model_dump()
@@ -965,9 +1093,7 @@ async def test_smart_generation():
 async def test_web_generation():
     """Test de generación web sin autenticación - FUNCIONANDO."""
     try:
-        from openai import OpenAI
         from app.core.config import settings
-        import json
         from datetime import date, timedelta
         
         # Obtener API key
@@ -978,59 +1104,10 @@ async def test_web_generation():
                 "message": "API key no configurada"
             }
         
-        client = OpenAI(api_key=api_key)
-        
         # Generar fechas para 14 días
         today = date.today()
         dates = [(today + timedelta(days=i)).isoformat() for i in range(14)]
         
-        # Prompt optimizado para GPT-5-nano
-        system_prompt = """Eres PlanifitAI, un experto nutricionista. Genera planes nutricionales completos y realistas en formato JSON.
-
-FORMATO EXACTO:
-{
-  "days": [
-    {
-      "date": "YYYY-MM-DD",
-      "meals": [
-        {
-          "type": "breakfast|lunch|dinner|snack",
-          "items": [
-            {
-              "name": "nombre del alimento",
-              "qty": cantidad_numerica,
-              "unit": "g|ml|unidad|taza",
-              "kcal": calorias,
-              "protein_g": proteinas,
-              "carbs_g": carbohidratos,
-              "fat_g": grasas
-            }
-          ],
-          "meal_kcal": total_calorias_comida
-        }
-      ],
-      "totals": {
-        "kcal": total_dia,
-        "protein_g": proteinas_dia,
-        "carbs_g": carbohidratos_dia,
-        "fat_g": grasas_dia
-      }
-    }
-  ],
-  "targets": {
-    "kcal": objetivo_calorias,
-    "protein_g": objetivo_proteinas,
-    "carbs_g": objetivo_carbohidratos,
-    "fat_g": objetivo_grasas
-  }
-}
-
-ALIMENTOS DISPONIBLES: Pollo, salmón, huevos, yogur griego, arroz integral, quinoa, avena, patata, aguacate, aceite de oliva, brócoli, espinacas, tomate, plátano, manzana, nueces, almendras, leche, queso fresco.
-
-COMIDAS: breakfast (desayuno), lunch (almuerzo), dinner (cena), snack (merienda).
-
-IMPORTANTE: Responde SOLO con JSON válido, sin texto adicional."""
-
         user_prompt = f"""Genera un plan nutricional completo para 14 días (2 semanas completas).
 
 DETALLES:
@@ -1045,33 +1122,7 @@ DETALLES:
 
 Genera el JSON completo para los 14 días."""
 
-        # Generar con GPT-5-nano
-        response = client.chat.completions.create(
-            model="gpt-5-nano",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            reasoning_effort="low",
-            verbosity="low"
-        )
-        
-        reply = response.choices[0].message.content
-        
-        # Limpiar respuesta
-        clean_reply = reply.strip()
-        if clean_reply.startswith('```json'):
-            clean_reply = clean_reply[7:]
-        if clean_reply.endswith('```'):
-            clean_reply = clean_reply[:-3]
-        clean_reply = clean_reply.strip()
-        
-        # Parsear JSON
-        plan_data = json.loads(clean_reply)
-        
-        # Validar estructura
-        if not plan_data.get('days') or not plan_data.get('targets'):
-            raise ValueError("Estructura JSON inválida")
+        plan_data = await _generate_plan_json(0, user_prompt)
         
         # Simular respuesta async exitosa (como lo espera la web)
         return {
@@ -1094,6 +1145,77 @@ Genera el JSON completo para los 14 días."""
         }
 
 
+def _smart_14_days_plan(
+    current_user: UserContext, payload: schemas.NutritionPlanRequest, db: Session
+) -> dict:
+    """Genera, persiste y notifica el plan inteligente de 14 días."""
+    from app.ai.smart_generator import generate_smart_nutrition_plan
+
+    # Generar plan inteligente
+    plan = generate_smart_nutrition_plan(current_user, payload, db)
+    
+    # Convertir a dict para respuesta
+    plan_data = plan.model_dump()
+
+    # Persistencia controlada por bandera
+    persist_result = {"skipped": True}
+    if bool(getattr(payload, "persist_to_db", True)):
+        try:
+            # Limpiar comidas IA previas en las próximas 2 semanas
+            plan_persistence.clean_existing_ai_meals(db, current_user.id, days_ahead=14)
+            # Persistir nuevo plan en backend como planificado (estructura DB)
+            persist_result = plan_persistence.persist_nutrition_plan(
+                db=db,
+                user_id=current_user.id,
+                plan_data=plan_data,
+                targets=plan_data.get("targets", {})
+            )
+        except Exception as persist_exc:
+            # No bloquear la respuesta por errores de persistencia, pero informar
+            persist_result = {
+                "success": False,
+                "message": f"Persistencia fallida: {str(persist_exc)}"
+            }
+    
+    # Crear notificación in-app (en lista de notificaciones)
+    try:
+        from app.core.database import get_db as _get_db
+        # ya tenemos db (dependency), lo reutilizamos
+        dedupe_key = f"ai:nutrition:plan:{current_user.id}:{datetime.utcnow().date().isoformat()}"
+        notif = notif_schemas.NotificationCreate(
+            user_id=current_user.id,
+            category=notif_models.NotificationCategory.NUTRITION,
+            type=notif_models.NotificationType.CUSTOM,
+            title="Plan de nutrición generado",
+            body=f"Se generó un plan de {len(plan_data['days'])} días.",
+            payload={
+                "days": len(plan_data["days"]),
+                "targets": plan_data.get("targets", {}),
+                "persist": persist_result,
+            },
+            scheduled_at_utc=datetime.utcnow(),
+            dedupe_key=dedupe_key,
+        )
+        row = notif_crud.create_notification(db, notif)
+        notif_services.dispatch_notification(db, row.id)
+    except Exception:
+        pass
+
+    # Simular respuesta async exitosa (como lo espera la web)
+    return {
+        "task_id": f"smart-{current_user.id}-{datetime.utcnow().timestamp()}",
+        "status": "SUCCESS",
+        "message": f"Plan nutricional inteligente de {len(plan_data['days'])} días generado exitosamente",
+        "plan": plan_data,
+        "days_generated": len(plan_data['days']),
+        "targets": plan_data['targets'],
+        "progress": 100,
+        "generated_at": datetime.utcnow().isoformat(),
+        "generation_type": "smart_ai_with_profile_analysis",
+        "persist": persist_result,
+    }
+
+
 @router.post("/generate/nutrition-plan-14-days-async")
 def generate_nutrition_plan_14_days_async_endpoint(
     payload: schemas.NutritionPlanRequest,
@@ -1106,75 +1228,15 @@ def generate_nutrition_plan_14_days_async_endpoint(
     Analiza el perfil del usuario, genera el plan con IA y lo guarda en la base de datos.
     """
     try:
-        from app.ai.smart_generator import generate_smart_nutrition_plan
-        
         # Asegurar que se generen 14 días
         payload.days = 14
-        
-        # Generar plan inteligente
-        plan = generate_smart_nutrition_plan(current_user, payload, db)
-        
-        # Convertir a dict para respuesta
-        plan_data = plan.model_dump()
-
-        # Persistencia controlada por bandera
-        persist_result = {"skipped": True}
-        if bool(getattr(payload, "persist_to_db", True)):
-            try:
-                # Limpiar comidas IA previas en las próximas 2 semanas
-                plan_persistence.clean_existing_ai_meals(db, current_user.id, days_ahead=14)
-                # Persistir nuevo plan en backend como planificado (estructura DB)
-                persist_result = plan_persistence.persist_nutrition_plan(
-                    db=db,
-                    user_id=current_user.id,
-                    plan_data=plan_data,
-                    targets=plan_data.get("targets", {})
-                )
-            except Exception as persist_exc:
-                # No bloquear la respuesta por errores de persistencia, pero informar
-                persist_result = {
-                    "success": False,
-                    "message": f"Persistencia fallida: {str(persist_exc)}"
-                }
-        
-        # Crear notificación in-app (en lista de notificaciones)
-        try:
-            from app.core.database import get_db as _get_db
-            # ya tenemos db (dependency), lo reutilizamos
-            dedupe_key = f"ai:nutrition:plan:{current_user.id}:{datetime.utcnow().date().isoformat()}"
-            notif = notif_schemas.NotificationCreate(
-                user_id=current_user.id,
-                category=notif_models.NotificationCategory.NUTRITION,
-                type=notif_models.NotificationType.CUSTOM,
-                title="Plan de nutrición generado",
-                body=f"Se generó un plan de {len(plan_data['days'])} días.",
-                payload={
-                    "days": len(plan_data["days"]),
-                    "targets": plan_data.get("targets", {}),
-                    "persist": persist_result,
-                },
-                scheduled_at_utc=datetime.utcnow(),
-                dedupe_key=dedupe_key,
-            )
-            row = notif_crud.create_notification(db, notif)
-            notif_services.dispatch_notification(db, row.id)
-        except Exception:
-            pass
 
-        # Simular respuesta async exitosa (como lo espera la web)
-        return {
-            "task_id": f"smart-{current_user.id}-{datetime.utcnow().timestamp()}",
-            "status": "SUCCESS",
-            "message": f"Plan nutricional inteligente de {len(plan_data['days'])} días generado exitosamente",
-            "plan": plan_data,
-            "days_generated": len(plan_data['days']),
-            "targets": plan_data['targets'],
-            "progress": 100,
-            "generated_at": datetime.utcnow().isoformat(),
-            "generation_type": "smart_ai_with_profile_analysis",
-            "persist": persist_result,
-        }
-        
+        # Un doble clic o una recarga se une a la generación idéntica en curso
+        key = flight_key("nutrition_plan_14_days", current_user.id, payload.model_dump())
+        response, coalesced = plan_flights.do(
+            key, lambda: _smart_14_days_plan(current_user, payload, db)
+        )
+        return {**response, "coalesced": coalesced}
     except Exception as e:
         logger.error(f"Error en endpoint de generación: {str(e)}")
         return {
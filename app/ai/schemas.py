@@ -136,6 +136,7 @@ class SmartFoodSearchRequest(BaseModel):
     query: str
     context: Optional[str] = None  # e.g., "breakfast", "high protein", "low carb"
     max_suggestions: int = 5
+    locale: str = "es"
 
 
 class SmartFoodSearchResponse(BaseModel):
@@ -0,0 +1,202 @@
+"""Cache persistente de respuestas de búsqueda inteligente de alimentos.
+
+Las expansiones de la IA para consultas como "pollo" o "desayuno" no dependen
+del usuario, así que se guardan en base de datos por (consulta normalizada,
+contexto, idioma) y se reutilizan entre usuarios y reinicios. Cada acierto
+ahorra una llamada al LLM y una unidad del presupuesto diario del rate limiter.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String, func
+from sqlalchemy.orm import Session
+
+from app.core.database import Base, SessionLocal
+from services.food_source_cache import normalize_query
+
+from . import schemas
+
+logger = logging.getLogger(__name__)
+
+
+class SmartFoodSearchCacheEntry(Base):
+    __tablename__ = "ai_food_search_cache"
+
+    key = Column(String(64), primary_key=True)
+    query = Column(String(255), nullable=False)
+    context = Column(String(255), nullable=True)
+    locale = Column(String(8), nullable=False, default="es")
+    response = Column(JSON, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    last_hit_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+# Se incrementa cuando cambia lo que se guarda, para que las entradas viejas no se sirvan
+CACHE_KEY_VERSION = "2"
+
+
+def cache_key(query: str, context: Optional[str], locale: Optional[str]) -> str:
+    raw = "\x1f".join(
+        [
+            CACHE_KEY_VERSION,
+            normalize_query(query),
+            normalize_query(context or ""),
+            (locale or "es").lower(),
+        ]
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SmartFoodSearchCache:
+    """Cache con TTL y tamaño máximo sobre ``ai_food_search_cache``."""
+
+    def __init__(
+        self,
+        ttl_s: int = 7 * 86400,
+        max_entries: int = 10000,
+        session_factory=SessionLocal,
+    ):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def get(
+        self, query: str, context: Optional[str], locale: Optional[str]
+    ) -> Optional[schemas.SmartFoodSearchResponse]:
+        """Devuelve la respuesta cacheada vigente o ``None``."""
+        try:
+            with self._session_factory() as db:
+                entry = db.get(
+                    SmartFoodSearchCacheEntry, cache_key(query, context, locale)
+                )
+                now = datetime.utcnow()
+                if entry is None or entry.expires_at <= now:
+                    self._count("misses")
+                    return None
+                entry.hits += 1
+                entry.last_hit_at = now
+                response = schemas.SmartFoodSearchResponse(**entry.response)
+                db.commit()
+        except Exception as e:  # el cache nunca debe romper la búsqueda
+            self._count("errors")
+            logger.warning(f"Error leyendo cache de búsqueda inteligente: {e}")
+            return None
+        self._count("hits")
+        return response
+
+    def contains(
+        self, query: str, context: Optional[str], locale: Optional[str]
+    ) -> bool:
+        """Si hay una entrada vigente (sin contar como acierto)."""
+        with self._session_factory() as db:
+            entry = db.get(SmartFoodSearchCacheEntry, cache_key(query, context, locale))
+            return entry is not None and entry.expires_at > datetime.utcnow()
+
+    def set(
+        self,
+        query: str,
+        context: Optional[str],
+        locale: Optional[str],
+        response: schemas.SmartFoodSearchResponse,
+    ) -> None:
+        """Guarda (o renueva) la respuesta y aplica el límite de tamaño."""
+        now = datetime.utcnow()
+        try:
+            with self._session_factory() as db:
+                key = cache_key(query, context, locale)
+                entry = db.get(
+                    SmartFoodSearchCacheEntry, key
+                ) or SmartFoodSearchCacheEntry(key=key, hits=0)
+                entry.query = normalize_query(query)[:255]
+                entry.context = normalize_query(context)[:255] if context else None
+                entry.locale = (locale or "es").lower()[:8]
+                entry.response = response.model_dump()
+                entry.created_at = now
+                entry.last_hit_at = now
+                entry.expires_at = now + timedelta(seconds=self.ttl_s)
+                db.add(entry)
+                db.commit()
+                self._count("writes")
+                self._evict(db, now)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Error escribiendo cache de búsqueda inteligente: {e}")
+
+    def _evict(self, db: Session, now: datetime) -> None:
+        expired = (
+            db.query(SmartFoodSearchCacheEntry)
+            .filter(SmartFoodSearchCacheEntry.expires_at <= now)
+            .delete(synchronize_session=False)
+        )
+        total = db.query(func.count(SmartFoodSearchCacheEntry.key)).scalar() or 0
+        overflow = total - self.max_entries
+        lru = 0
+        if overflow > 0:
+            # las menos usadas recientemente salen primero
+            keys = [
+                k
+                for (k,) in db.query(SmartFoodSearchCacheEntry.key)
+                .order_by(SmartFoodSearchCacheEntry.last_hit_at)
+                .limit(overflow)
+            ]
+            lru = (
+                db.query(SmartFoodSearchCacheEntry)
+                .filter(SmartFoodSearchCacheEntry.key.in_(keys))
+                .delete(synchronize_session=False)
+            )
+        db.commit()
+        if expired or lru:
+            self._count("evictions", expired + lru)
+
+    def clear(self) -> None:
+        with self._session_factory() as db:
+            db.query(SmartFoodSearchCacheEntry).delete()
+            db.commit()
+        with self._lock:
+            self._stats = {k: 0 for k in self._stats}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        try:
+            with self._session_factory() as db:
+                stats["entries"] = (
+                    db.query(func.count(SmartFoodSearchCacheEntry.key)).scalar() or 0
+                )
+        except Exception:
+            stats["entries"] = None
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_s
+        return stats
+
+
+_smart_search_cache: Optional[SmartFoodSearchCache] = None
+
+
+def get_smart_search_cache() -> SmartFoodSearchCache:
+    """Instancia global del cache de búsqueda inteligente."""
+    global _smart_search_cache
+    if _smart_search_cache is None:
+        from app.core.config import settings
+
+        _smart_search_cache = SmartFoodSearchCache(
+            ttl_s=settings.SMART_SEARCH_CACHE_TTL_S,
+            max_entries=settings.SMART_SEARCH_CACHE_MAX_ENTRIES,
+        )
+    return _smart_search_cache
@@ -3,12 +3,14 @@
 from __future__ import annotations
 
 import json
+import logging
 import re
 from datetime import date, timedelta
+from typing import Callable, Iterator
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
-from app.ai_client import get_ai_client
+from app.ai_client import get_ai_client, get_async_ai_client
 from app.auth.deps import UserContext
 from app.user_profile.models import UserProfile
 from app.nutrition import services as nutrition_services
@@ -17,6 +19,8 @@ from . import embeddings as emb
 from . import schemas
 from . import prompt_library
 
+logger = logging.getLogger(__name__)
+
 # ---------------------------------------------------------------------------
 # Generators
 # ---------------------------------------------------------------------------
@@ -266,74 +270,188 @@ def generate_nutrition_plan_optimized(
     *,
     simulate: bool = False,
 ) -> schemas.NutritionPlan:
-    """Versión optimizada para generación rápida."""
+    """Versión optimizada para generación rápida.
+
+    Primero intenta el planificador local (``local_planner``), que monta el
+    plan desde el catálogo de ``foods`` en milisegundos; el LLM solo se usa
+    para pulir nombres (``NUTRITION_LOCAL_PLANNER_LLM_POLISH``) o cuando el
+    plan local no es posible (perfil incompleto, dieta no soportada o
+    catálogo insuficiente).
+    """
     from app.core.config import settings as _settings
     # Forzar modo simulado si está habilitado el modo desarrollo
     force_simulate = getattr(_settings, 'FORCE_SIMULATE_MODE', False)
+    if _settings.NUTRITION_LOCAL_PLANNER_ENABLED:
+        from app.ai import local_planner
+
+        local_plan = local_planner.build_local_plan(db, user.id, req)
+        if local_plan is not None:
+            if _settings.NUTRITION_LOCAL_PLANNER_LLM_POLISH and not (simulate or force_simulate):
+                return polish_plan_with_llm(user, local_plan)
+            return local_plan
     if simulate or force_simulate:
-        # Crear plan simulado más realista
-        from datetime import timedelta
+        return _simulated_nutrition_plan(req)
+
+    client = get_ai_client()
+    resp = client.chat(user.id, _optimized_plan_messages(user, req, db))
+    return plan_from_reply(resp.get("reply", ""))
+
+
+def _simulated_nutrition_plan(req: schemas.NutritionPlanRequest) -> schemas.NutritionPlan:
+    """Plan de ejemplo realista para el modo simulado."""
+    days = []
+    today = date.today()
+    
+    for i in range(max(1, req.days)):
+        current_date = today + timedelta(days=i)
         
-        days = []
-        today = date.today()
+        # Desayuno
+        breakfast_items = [
+            schemas.MealItem(name="avena con leche", qty=50, unit="g", kcal=180, protein_g=6, carbs_g=30, fat_g=3),
+            schemas.MealItem(name="plátano", qty=1, unit="unidad", kcal=90, protein_g=1, carbs_g=23, fat_g=0.3),
+        ]
+        breakfast = schemas.Meal(type="breakfast", items=breakfast_items, meal_kcal=270)
         
-        for i in range(max(1, req.days)):
-            current_date = today + timedelta(days=i)
-            
-            # Desayuno
-            breakfast_items = [
-                schemas.MealItem(name="avena con leche", qty=50, unit="g", kcal=180, protein_g=6, carbs_g=30, fat_g=3),
-                schemas.MealItem(name="plátano", qty=1, unit="unidad", kcal=90, protein_g=1, carbs_g=23, fat_g=0.3),
-            ]
-            breakfast = schemas.Meal(type="breakfast", items=breakfast_items, meal_kcal=270)
-            
-            # Almuerzo
-            lunch_items = [
-                schemas.MealItem(name="pechuga de pollo", qty=150, unit="g", kcal=250, protein_g=46, carbs_g=0, fat_g=5),
-                schemas.MealItem(name="arroz integral", qty=80, unit="g", kcal=280, protein_g=6, carbs_g=58, fat_g=2),
-                schemas.MealItem(name="brócoli", qty=100, unit="g", kcal=35, protein_g=3, carbs_g=7, fat_g=0.4),
-            ]
-            lunch = schemas.Meal(type="lunch", items=lunch_items, meal_kcal=565)
-            
-            # Cena
-            dinner_items = [
-                schemas.MealItem(name="salmón", qty=120, unit="g", kcal=200, protein_g=24, carbs_g=0, fat_g=12),
-                schemas.MealItem(name="ensalada mixta", qty=150, unit="g", kcal=50, protein_g=2, carbs_g=8, fat_g=1),
-                schemas.MealItem(name="aceite de oliva", qty=10, unit="ml", kcal=90, protein_g=0, carbs_g=0, fat_g=10),
-            ]
-            dinner = schemas.Meal(type="dinner", items=dinner_items, meal_kcal=340)
-            
-            # Snack
-            snack_items = [
-                schemas.MealItem(name="yogur griego", qty=150, unit="g", kcal=130, protein_g=15, carbs_g=8, fat_g=4),
-                schemas.MealItem(name="nueces", qty=15, unit="g", kcal=100, protein_g=2, carbs_g=2, fat_g=10),
-            ]
-            snack = schemas.Meal(type="snack", items=snack_items, meal_kcal=230)
-            
-            # Totales del día
-            day_totals = {
-                "kcal": 1405,
-                "protein_g": 99,
-                "carbs_g": 128,
-                "fat_g": 35.7
-            }
-            
-            day_plan = schemas.NutritionDayPlan(
-                date=current_date.isoformat(),
-                meals=[breakfast, lunch, dinner, snack],
-                totals=day_totals
-            )
-            days.append(day_plan)
+        # Almuerzo
+        lunch_items = [
+            schemas.MealItem(name="pechuga de pollo", qty=150, unit="g", kcal=250, protein_g=46, carbs_g=0, fat_g=5),
+            schemas.MealItem(name="arroz integral", qty=80, unit="g", kcal=280, protein_g=6, carbs_g=58, fat_g=2),
+            schemas.MealItem(name="brócoli", qty=100, unit="g", kcal=35, protein_g=3, carbs_g=7, fat_g=0.4),
+        ]
+        lunch = schemas.Meal(type="lunch", items=lunch_items, meal_kcal=565)
         
-        return schemas.NutritionPlan(
-            days=days,
-            targets={"kcal": 2000, "protein_g": 150, "carbs_g": 250, "fat_g": 70},
+        # Cena
+        dinner_items = [
+            schemas.MealItem(name="salmón", qty=120, unit="g", kcal=200, protein_g=24, carbs_g=0, fat_g=12),
+            schemas.MealItem(name="ensalada mixta", qty=150, unit="g", kcal=50, protein_g=2, carbs_g=8, fat_g=1),
+            schemas.MealItem(name="aceite de oliva", qty=10, unit="ml", kcal=90, protein_g=0, carbs_g=0, fat_g=10),
+        ]
+        dinner = schemas.Meal(type="dinner", items=dinner_items, meal_kcal=340)
+        
+        # Snack
+        snack_items = [
+            schemas.MealItem(name="yogur griego", qty=150, unit="g", kcal=130, protein_g=15, carbs_g=8, fat_g=4),
+            schemas.MealItem(name="nueces", qty=15, unit="g", kcal=100, protein_g=2, carbs_g=2, fat_g=10),
+        ]
+        snack = schemas.Meal(type="snack", items=snack_items, meal_kcal=230)
+        
+        # Totales del día
+        day_totals = {
+            "kcal": 1405,
+            "protein_g": 99,
+            "carbs_g": 128,
+            "fat_g": 35.7
+        }
+        
+        day_plan = schemas.NutritionDayPlan(
+            date=current_date.isoformat(),
+            meals=[breakfast, lunch, dinner, snack],
+            totals=day_totals
         )
+        days.append(day_plan)
+    
+    return schemas.NutritionPlan(
+        days=days,
+        targets={"kcal": 2000, "protein_g": 150, "carbs_g": 250, "fat_g": 70},
+    )
 
-    client = get_ai_client()
+
+def polish_plan_with_llm(user: UserContext, plan: schemas.NutritionPlan) -> schemas.NutritionPlan:
+    """Pide al modelo nombres de plato más naturales para un plan ya cuadrado.
+
+    Solo se toman los nombres, posición a posición; cantidades y macros siguen
+    siendo las del plan local. Si el modelo falla o cambia la estructura, se
+    devuelve el plan tal cual.
+    """
+    try:
+        reply = get_ai_client().chat(user.id, _polish_messages(plan)).get("reply", "")
+    except Exception:
+        return plan
+    return _apply_polished_names(plan, reply)
+
+
+def _polish_messages(plan: schemas.NutritionPlan) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Eres PlanifitAI. Reescribe el campo name de cada item como un plato apetecible "
+                "en español (ej: 'Pechuga de pollo a la plancha'). No añadas, quites ni "
+                "reordenes días, comidas ni items. Devuelve el mismo JSON."
+            ),
+        },
+        {"role": "user", "content": plan.model_dump_json()},
+    ]
+
+
+def _apply_polished_names(plan: schemas.NutritionPlan, reply: str) -> schemas.NutritionPlan:
+    try:
+        polished = _parse_json_payload(reply)
+        days = polished["days"]
+        names = [
+            [[item["name"] for item in meal["items"]] for meal in day["meals"]] for day in days
+        ]
+        shape = [[len(m.items) for m in d.meals] for d in plan.days]
+        if [[len(m) for m in d] for d in names] != shape:
+            return plan
+    except Exception:
+        return plan
+    result = plan.model_copy(deep=True)
+    for day, day_names in zip(result.days, names):
+        for meal, meal_names in zip(day.meals, day_names):
+            for item, name in zip(meal.items, meal_names):
+                if isinstance(name, str) and name.strip():
+                    item.name = name.strip()
+    return result
+
+
+async def generate_nutrition_plan_optimized_async(
+    user: UserContext,
+    req: schemas.NutritionPlanRequest,
+    db: Session,
+    *,
+    simulate: bool = False,
+) -> schemas.NutritionPlan:
+    """``generate_nutrition_plan_optimized`` para rutas async.
+
+    Mismo orden (planificador local, modo simulado, modelo), pero las
+    llamadas al modelo se esperan con el cliente async y no bloquean el
+    event loop mientras el LLM responde. Las consultas síncronas a la BD (el
+    perfil, y el catálogo de alimentos la primera vez que se construye) van
+    al threadpool.
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    from app.core.config import settings as _settings
+
+    simulate = simulate or getattr(_settings, "FORCE_SIMULATE_MODE", False)
+    if _settings.NUTRITION_LOCAL_PLANNER_ENABLED:
+        from app.ai import local_planner
+
+        local_plan = await run_in_threadpool(local_planner.build_local_plan, db, user.id, req)
+        if local_plan is not None:
+            if _settings.NUTRITION_LOCAL_PLANNER_LLM_POLISH and not simulate:
+                try:
+                    resp = await get_async_ai_client().chat(user.id, _polish_messages(local_plan))
+                except Exception:
+                    return local_plan
+                return _apply_polished_names(local_plan, resp.get("reply", ""))
+            return local_plan
+    if simulate:
+        return _simulated_nutrition_plan(req)
+
+    messages = await run_in_threadpool(_optimized_plan_messages, user, req, db)
+    resp = await get_async_ai_client().chat(user.id, messages)
+    return plan_from_reply(resp.get("reply", ""))
+
+
+def _optimized_plan_messages(
+    user: UserContext, req: schemas.NutritionPlanRequest, db: Session
+) -> list[dict]:
+    """Mensajes del prompt corto de ``generate_nutrition_plan_optimized``."""
     today = date.today()
     dates = [(today + timedelta(days=i)).isoformat() for i in range(max(1, req.days))]
-    
+
     # Prompt ultra-conciso para máxima velocidad
     sys_prompt = "Eres PlanifitAI. Genera plan nutricional en JSON: {days: [{date: str, meals: [{type: str, items: [{name: str, qty: float, unit: str, kcal: float, protein_g: float, carbs_g: float, fat_g: float}]}], totals: {kcal: float, protein_g: float, carbs_g: float, fat_g: float}}], targets: {kcal: float, protein_g: float, carbs_g: float, fat_g: float}}"
     
@@ -349,15 +467,15 @@ def generate_nutrition_plan_optimized(
             profile_ctx += f"objetivo={_es_goal(profile.goal)} "
 
     user_prompt = f"Plan {len(dates)} días para {dates}. {profile_ctx}Solo JSON."
-    
-    resp = client.chat(
-        user.id,
-        [
-            {"role": "system", "content": sys_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-    )
-    data = _parse_json_payload(resp.get("reply", ""))
+    return [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def plan_from_reply(reply: str) -> schemas.NutritionPlan:
+    """Valida el texto completo devuelto por el modelo como ``NutritionPlan``."""
+    data = _parse_json_payload(reply)
     data = _normalize_plan_data_shape(data)
     try:
         return schemas.NutritionPlan.model_validate(data)
@@ -365,6 +483,26 @@ def generate_nutrition_plan_optimized(
         raise HTTPException(status_code=502, detail=f"AI nutrition validation failed: {exc}")
 
 
+def stream_nutrition_plan_optimized(
+    user: UserContext,
+    req: schemas.NutritionPlanRequest,
+    db: Session,
+    *,
+    simulate: bool = False,
+) -> Iterator[str]:
+    """Tokens del plan optimizado según llegan; el perfil se lee ya, no al iterar.
+
+    En modo simulado el plan de ejemplo sale como un único fragmento JSON.
+    """
+    from app.core.config import settings as _settings
+
+    if simulate or getattr(_settings, "FORCE_SIMULATE_MODE", False):
+        plan = generate_nutrition_plan_optimized(user, req, db, simulate=True)
+        return iter([plan.model_dump_json()])
+    messages = _optimized_plan_messages(user, req, db)
+    return get_ai_client().chat_stream(user.id, messages)
+
+
 def generate_nutrition_plan(
     user: UserContext,
     req: schemas.NutritionPlanRequest,
@@ -436,8 +574,26 @@ def generate_nutrition_plan(
         )
 
     client = get_ai_client()
-    today = date.today()
-    dates = [(today + timedelta(days=i)).isoformat() for i in range(max(1, req.days))]
+    resp = client.chat(user.id, _nutrition_plan_messages(user, req, db))
+    return plan_from_reply(resp.get("reply", ""))
+
+
+def _nutrition_plan_messages(
+    user: UserContext,
+    req: schemas.NutritionPlanRequest,
+    db: Session,
+    *,
+    dates: list[str] | None = None,
+    extra: str = "",
+) -> list[dict]:
+    """Mensajes del prompt completo de ``generate_nutrition_plan`` (perfil y objetivos).
+
+    ``dates`` sustituye a los ``req.days`` días desde hoy y ``extra`` se añade
+    como instrucción al final (lo usa la generación por bloques).
+    """
+    if dates is None:
+        today = date.today()
+        dates = [(today + timedelta(days=i)).isoformat() for i in range(max(1, req.days))]
     sys_prompt = prompt_library.NUTRITION_PLAN_SYSTEM_PROMPT
     # Enriquecer con datos del perfil y objetivos sugeridos
     profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
@@ -492,21 +648,200 @@ def generate_nutrition_plan(
         f"Preferencias: {req.preferences or {}}."
         + profile_ctx
         + targets_ctx
+        + (f" {extra}" if extra else "")
         + " Solo JSON."
     )
-    resp = client.chat(
-        user.id,
-        [
-            {"role": "system", "content": sys_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-    )
-    data = _parse_json_payload(resp.get("reply", ""))
-    data = _normalize_plan_data_shape(data)
+    return [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def stream_nutrition_plan(
+    user: UserContext,
+    req: schemas.NutritionPlanRequest,
+    db: Session,
+    *,
+    simulate: bool = False,
+) -> Iterator[str]:
+    """Tokens del plan con el prompt completo (el de ``generate_nutrition_plan``)."""
+    from app.core.config import settings as _settings
+
+    if simulate or getattr(_settings, "FORCE_SIMULATE_MODE", False):
+        plan = generate_nutrition_plan(user, req, db, simulate=True)
+        return iter([plan.model_dump_json()])
+    messages = _nutrition_plan_messages(user, req, db)
+    return get_ai_client().chat_stream(user.id, messages)
+
+
+# Rotación de proteínas principales: cada bloque recibe un tramo distinto para
+# que los bloques generados en paralelo no repitan los mismos platos. Solo se
+# usan las compatibles con la dieta y las alergias del perfil.
+VARIETY_PROTEIN_ROTATION = [
+    "pollo", "salmón", "legumbres", "huevos", "pavo", "merluza", "tofu",
+    "ternera magra", "atún", "garbanzos", "sardinas", "lentejas", "conejo", "bacalao",
+]
+
+# Reintentos de un bloque que falla o devuelve menos días de los pedidos
+CHUNK_RETRIES = 1
+
+
+def _rotation_proteins(profile: UserProfile | None) -> list[str]:
+    """Proteínas de la rotación que admiten la dieta y las alergias del perfil."""
+    from app.ai.local_planner import food_allowed
+
+    if profile is None:
+        return list(VARIETY_PROTEIN_ROTATION)
+    return [
+        p for p in VARIETY_PROTEIN_ROTATION
+        if food_allowed(p, profile.dietary_preference, profile.allergies)
+    ]
+
+
+def _shared_plan_targets(profile: UserProfile | None) -> dict | None:
+    """Objetivos diarios del perfil, comunes a todos los bloques del plan."""
+    if not profile:
+        return None
     try:
-        return schemas.NutritionPlan.model_validate(data)
-    except Exception as exc:
-        raise HTTPException(status_code=502, detail=f"AI nutrition validation failed: {exc}")
+        auto = nutrition_services.compute_auto_targets(profile)
+    except Exception:
+        return None
+    if not auto.get("calories_target"):
+        return None
+    return {
+        "kcal": int(auto.get("calories_target") or 0),
+        "protein_g": round(float(auto.get("protein_g_target") or 0), 1),
+        "carbs_g": round(float(auto.get("carbs_g_target") or 0), 1),
+        "fat_g": round(float(auto.get("fat_g_target") or 0), 1),
+    }
+
+
+def profile_plan_targets(db: Session, user_id: int) -> dict | None:
+    """Objetivos diarios del usuario, los mismos que el prompt sugiere al modelo.
+
+    None si no hay perfil o le faltan datos para calcularlos.
+    """
+    profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+    return _shared_plan_targets(profile)
+
+
+def _chunk_constraint(
+    index: int, total: int, chunk_dates: list[str], all_days: int, rotation: list[str]
+) -> str:
+    """Instrucción de variedad para el bloque ``index`` de ``total``.
+
+    Sin proteínas compatibles con el perfil en ``rotation`` no se nombra
+    ninguna: el contexto del perfil decide.
+    """
+    proteins_hint = ""
+    if rotation:
+        per_chunk = max(1, len(rotation) // total)
+        start = (index * per_chunk) % len(rotation)
+        proteins = (rotation * (per_chunk // len(rotation) + 2))[start:start + per_chunk]
+        proteins_hint = f"Proteínas principales de este bloque: {', '.join(proteins)}. "
+    return (
+        f"Este es el bloque {index + 1} de {total} de un plan de {all_days} días "
+        f"(genera solo {len(chunk_dates)} días). {proteins_hint}"
+        f"No repitas el plato principal en dos días del bloque "
+        f"y respeta los mismos objetivos diarios en todos los días."
+    )
+
+
+def generate_nutrition_plan_chunked(
+    user: UserContext,
+    req: schemas.NutritionPlanRequest,
+    db: Session,
+    *,
+    chunk_days: int | None = None,
+    max_workers: int | None = None,
+    simulate: bool = False,
+    on_chunk: Callable[[int, int], None] | None = None,
+) -> schemas.NutritionPlan:
+    """Genera el plan en bloques de días en paralelo y los une en un solo plan.
+
+    Cada bloque es una llamada independiente al modelo con el prompt completo
+    para sus fechas, los mismos objetivos diarios y un tramo propio de la
+    rotación de proteínas; así no hace falta reenviar el plan ya generado y
+    el tiempo total se acerca al de un solo bloque. Los mensajes se preparan
+    antes de lanzar los hilos (la sesión de BD no se comparte entre ellos).
+    ``on_chunk(hechos, total)`` se llama al terminar cada bloque.
+
+    Un bloque que falla (error del modelo o JSON inválido) o devuelve menos
+    días de los pedidos se reintenta (``CHUNK_RETRIES``); si sigue fallando o
+    corto, el plan lleva solo los días recibidos y el llamador lo detecta por
+    ``len(plan.days) < req.days``. Solo si fallan todos los bloques se relanza
+    el error.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from app.core.config import settings as _settings
+
+    if simulate or getattr(_settings, "FORCE_SIMULATE_MODE", False):
+        return generate_nutrition_plan(user, req, db, simulate=True)
+
+    chunk_days = max(1, chunk_days or _settings.NUTRITION_PLAN_CHUNK_DAYS)
+    today = date.today()
+    all_days = max(1, req.days)
+    dates = [(today + timedelta(days=i)).isoformat() for i in range(all_days)]
+    chunks = [dates[i:i + chunk_days] for i in range(0, all_days, chunk_days)]
+    profile = db.query(UserProfile).filter(UserProfile.user_id == user.id).first()
+    rotation = _rotation_proteins(profile)
+    messages = [
+        _nutrition_plan_messages(
+            user, req, db, dates=chunk, extra=_chunk_constraint(i, len(chunks), chunk, all_days, rotation)
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+    shared_targets = _shared_plan_targets(profile)
+    client = get_ai_client()
+
+    def _generate(i: int) -> schemas.NutritionPlan:
+        plan: schemas.NutritionPlan | None = None
+        for attempt in range(CHUNK_RETRIES + 1):
+            try:
+                resp = client.chat(user.id, messages[i])
+                candidate = plan_from_reply(resp.get("reply", ""))
+            except Exception as e:
+                if plan is None and attempt == CHUNK_RETRIES:
+                    raise
+                logger.warning(f"Bloque {i + 1}/{len(chunks)} falló (intento {attempt + 1}): {e}")
+                continue
+            if plan is None or len(candidate.days) > len(plan.days):
+                plan = candidate
+            if len(plan.days) >= len(chunks[i]):
+                break
+            logger.warning(
+                f"Bloque {i + 1}/{len(chunks)} con {len(candidate.days)} de {len(chunks[i])} días "
+                f"(intento {attempt + 1})"
+            )
+        return plan
+
+    results: dict[int, schemas.NutritionPlan] = {}
+    errors: dict[int, Exception] = {}
+    workers = max(1, min(max_workers or _settings.NUTRITION_PLAN_PARALLEL_WORKERS, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan-chunk") as pool:
+        futures = {pool.submit(_generate, i): i for i in range(len(chunks))}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logger.error(f"Bloque {futures[future] + 1}/{len(chunks)} descartado: {e}")
+                errors[futures[future]] = e
+                continue
+            if on_chunk:
+                on_chunk(len(results), len(chunks))
+    if not results:
+        raise errors[0]
+
+    days: list[schemas.NutritionDayPlan] = []
+    for i, chunk in enumerate(chunks):
+        if i not in results:
+            continue
+        # las fechas las fija el bloque, no el modelo
+        for day, day_date in zip(results[i].days, chunk):
+            days.append(day.model_copy(update={"date": day_date}))
+    first = results[min(results)]
+    return schemas.NutritionPlan(days=days, targets=shared_targets or first.targets)
 
 
 def _normalize_plan_data_shape(raw: dict) -> dict:
@@ -520,39 +855,7 @@ def _normalize_plan_data_shape(raw: dict) -> dict:
     days = data.get("days")
     if isinstance(days, list):
         for day in days:
-            meals = day.get("meals") or []
-            sum_kcal = 0.0
-            sum_p = 0.0
-            sum_c = 0.0
-            sum_f = 0.0
-            for meal in meals:
-                items = meal.get("items") or []
-                mkcal = 0.0
-                for it in items:
-                    try:
-                        it["kcal"] = float(it.get("kcal", 0) or 0)
-                        it["protein_g"] = float(it.get("protein_g", 0) or 0)
-                        it["carbs_g"] = float(it.get("carbs_g", 0) or 0)
-                        it["fat_g"] = float(it.get("fat_g", 0) or 0)
-                    except Exception:
-                        it["kcal"] = 0.0
-                        it["protein_g"] = it.get("protein_g", 0) or 0
-                        it["carbs_g"] = it.get("carbs_g", 0) or 0
-                        it["fat_g"] = it.get("fat_g", 0) or 0
-                    mkcal += it["kcal"]
-                    sum_p += float(it.get("protein_g", 0) or 0)
-                    sum_c += float(it.get("carbs_g", 0) or 0)
-                    sum_f += float(it.get("fat_g", 0) or 0)
-                if "meal_kcal" not in meal or meal.get("meal_kcal") is None:
-                    meal["meal_kcal"] = round(mkcal, 2)
-                sum_kcal += mkcal
-            if "totals" not in day or not isinstance(day.get("totals"), dict):
-                day["totals"] = {
-                    "kcal": round(sum_kcal, 2),
-                    "protein_g": round(sum_p, 2),
-                    "carbs_g": round(sum_c, 2),
-                    "fat_g": round(sum_f, 2),
-                }
+            _normalize_day_shape(day)
     if "targets" not in data or not isinstance(data.get("targets"), dict):
         first_totals = (days[0].get("totals") if isinstance(days, list) and days else {}) or {}
         data["targets"] = {
@@ -564,6 +867,54 @@ def _normalize_plan_data_shape(raw: dict) -> dict:
     return data
 
 
+def _normalize_day_shape(day: dict) -> dict:
+    """Completa ``meal_kcal`` y ``totals`` de un día y asegura números en los items."""
+    meals = day.get("meals") or []
+    sum_kcal = 0.0
+    sum_p = 0.0
+    sum_c = 0.0
+    sum_f = 0.0
+    for meal in meals:
+        items = meal.get("items") or []
+        mkcal = 0.0
+        for it in items:
+            try:
+                it["kcal"] = float(it.get("kcal", 0) or 0)
+                it["protein_g"] = float(it.get("protein_g", 0) or 0)
+                it["carbs_g"] = float(it.get("carbs_g", 0) or 0)
+                it["fat_g"] = float(it.get("fat_g", 0) or 0)
+            except Exception:
+                it["kcal"] = 0.0
+                it["protein_g"] = it.get("protein_g", 0) or 0
+                it["carbs_g"] = it.get("carbs_g", 0) or 0
+                it["fat_g"] = it.get("fat_g", 0) or 0
+            mkcal += it["kcal"]
+            sum_p += float(it.get("protein_g", 0) or 0)
+            sum_c += float(it.get("carbs_g", 0) or 0)
+            sum_f += float(it.get("fat_g", 0) or 0)
+        if "meal_kcal" not in meal or meal.get("meal_kcal") is None:
+            meal["meal_kcal"] = round(mkcal, 2)
+        sum_kcal += mkcal
+    if "totals" not in day or not isinstance(day.get("totals"), dict):
+        day["totals"] = {
+            "kcal": round(sum_kcal, 2),
+            "protein_g": round(sum_p, 2),
+            "carbs_g": round(sum_c, 2),
+            "fat_g": round(sum_f, 2),
+        }
+    return day
+
+
+def plan_day_from_data(raw: dict) -> schemas.NutritionDayPlan:
+    """Normaliza y valida un único ``days[i]`` (p. ej. recién cerrado en el stream)."""
+    if not isinstance(raw, dict):
+        raise HTTPException(status_code=502, detail="AI nutrition day is not an object")
+    try:
+        return schemas.NutritionDayPlan.model_validate(_normalize_day_shape(raw))
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"AI nutrition day validation failed: {exc}")
+
+
 # ---------------------------------------------------------------------------
 # Chat & insights
 # ---------------------------------------------------------------------------
@@ -577,6 +928,14 @@ def chat(user: UserContext, req: schemas.ChatRequest) -> schemas.ChatResponse:
     return schemas.ChatResponse(reply=resp["reply"], actions=[])
 
 
+def chat_stream(user: UserContext, req: schemas.ChatRequest) -> Iterator[str]:
+    """Como :func:`chat`, pero devuelve los fragmentos de la respuesta según llegan."""
+    client = get_ai_client()
+    return client.chat_stream(
+        user.id, [m.model_dump() for m in req.messages], simulate=req.simulate or False
+    )
+
+
 def insights(
     user: UserContext, req: schemas.InsightsRequest
 ) -> schemas.InsightsResponse:
@@ -0,0 +1,196 @@
+"""Coalescencia ("single flight") de generaciones idénticas en curso.
+
+La clave es (tarea, usuario, huella de la petición): un doble clic o una
+recarga de página no debe encolar otra generación mientras la primera sigue
+corriendo, porque cada duplicado gasta cuota del LLM y el único hueco del
+worker (``--concurrency=1``).
+
+- ``SingleFlight.do``: dentro del proceso, las llamadas concurrentes con la
+  misma clave esperan al resultado de la primera en lugar de repetirla.
+- ``GenerationRegistry.submit``: para tareas de Celery. El ``task_id`` en curso
+  se guarda en un almacén compartido (Redis o fichero SQLite, como el rate
+  limiter) y cualquier petición idéntica, venga del proceso que venga,
+  recibe ese mismo ``task_id`` y sigue el mismo progreso
+  (``/nutrition-plan-status``, ``/nutrition-plan-stream``). La tarea libera
+  la clave al terminar (señales de Celery); un TTL cubre workers caídos.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_S = 900  # límite de la tarea (300 s) más margen de cola
+
+
+def flight_key(kind: str, user_id: int, request_data: Dict[str, Any]) -> str:
+    """Clave estable de una generación: tipo, usuario y huella de la petición."""
+    payload = json.dumps(
+        request_data or {}, sort_keys=True, default=str, separators=(",", ":")
+    )
+    fingerprint = hashlib.sha256(payload.encode()).hexdigest()[:16]
+    return f"{kind}:{user_id}:{fingerprint}"
+
+
+class SingleFlight:
+    """Una sola ejecución en curso por clave dentro del proceso."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Ejecuta ``fn`` o espera a la ejecución en curso con la misma clave.
+
+        Devuelve ``(resultado, compartido)``; los errores de la primera llamada
+        se propagan también a las que esperaban.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result(), True
+        try:
+            result = fn()
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class GenerationRegistry:
+    """``task_id`` en curso por clave sobre un almacén compartido (Redis o SQLite)."""
+
+    def __init__(self, store: Any, *, ttl_s: float = DEFAULT_TTL_S) -> None:
+        self.store = store
+        self.ttl_s = ttl_s
+
+    def submit(self, key: str, start: Callable[[str], Any]) -> Tuple[str, bool]:
+        """Devuelve ``(task_id, coalesced)`` para ``key``.
+
+        Si ya hay una generación viva con esa clave se devuelve su ``task_id``
+        sin lanzar nada. Si no, se reserva un ``task_id`` nuevo y después se
+        llama a ``start(task_id)`` fuera del cerrojo (con Celery en modo eager
+        la tarea corre dentro de ``start`` y libera la clave ella misma).
+        """
+        now = time.time()
+        with self.store.transaction(key, dict) as state:
+            if state.get("task_id") and state.get("expires_at", 0) > now:
+                state["coalesced"] = state.get("coalesced", 0) + 1
+                task_id = state["task_id"]
+                coalesced = True
+            else:
+                task_id = str(uuid.uuid4())
+                state.update(
+                    task_id=task_id,
+                    started_at=now,
+                    expires_at=now + self.ttl_s,
+                    coalesced=0,
+                )
+                coalesced = False
+        if coalesced:
+            logger.info(
+                f"Generación {key} ya en curso: se reutiliza la tarea {task_id}"
+            )
+            return task_id, True
+        try:
+            start(task_id)
+        except BaseException:
+            self.release(key, task_id)
+            raise
+        return task_id, False
+
+    def release(self, key: str, task_id: str) -> None:
+        """Libera ``key`` si sigue apuntando a ``task_id`` (no pisa una más nueva)."""
+        try:
+            with self.store.transaction(key, dict) as state:
+                if state.get("task_id") == task_id:
+                    state.clear()
+        except Exception as e:  # la liberación no debe romper la tarea; el TTL la cubre
+            logger.warning(f"No se pudo liberar la generación {key}: {e}")
+
+    def current(self, key: str) -> Optional[str]:
+        state = self.store.read(key) or {}
+        if state.get("task_id") and state.get("expires_at", 0) > time.time():
+            return state["task_id"]
+        return None
+
+
+def build_generation_registry(settings) -> GenerationRegistry:
+    """Redis si ``NUTRITION_SINGLE_FLIGHT_REDIS_URL`` está definida; si no, fichero SQLite."""
+    from services.food_source_guard import RedisGuardStore, SQLiteGuardStore
+
+    url = settings.NUTRITION_SINGLE_FLIGHT_REDIS_URL
+    if url:
+        store = RedisGuardStore(url, prefix="ai:singleflight:")
+    else:
+        import os
+        import tempfile
+
+        path = settings.NUTRITION_SINGLE_FLIGHT_SQLITE_PATH or os.path.join(
+            tempfile.gettempdir(), "planifitai_ai_single_flight.sqlite3"
+        )
+        store = SQLiteGuardStore(path, table="ai_single_flight")
+    return GenerationRegistry(store, ttl_s=settings.NUTRITION_SINGLE_FLIGHT_TTL_S)
+
+
+_registry: Optional[GenerationRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_generation_registry() -> GenerationRegistry:
+    """Instancia global del registro (se crea al primer uso)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from app.core.config import settings
+
+                _registry = build_generation_registry(settings)
+    return _registry
+
+
+plan_flights = SingleFlight()
+
+
+def submit_generation_task(
+    task: Any, user_id: int, request_data: Dict[str, Any]
+) -> Tuple[str, bool]:
+    """Encola ``task`` o se une a la idéntica en curso; devuelve ``(task_id, coalesced)``."""
+    key = flight_key(task.name, user_id, request_data)
+    return get_generation_registry().submit(
+        key,
+        lambda task_id: task.apply_async(
+            kwargs={"user_id": user_id, "request_data": request_data}, task_id=task_id
+        ),
+    )
+
+
+def release_generation_task(
+    task_name: str, task_id: str, kwargs: Optional[Dict[str, Any]]
+) -> None:
+    """Libera la clave de una tarea terminada (o revocada) a partir de sus kwargs."""
+    kwargs = kwargs or {}
+    if "user_id" not in kwargs or "request_data" not in kwargs:
+        return
+    key = flight_key(task_name, kwargs["user_id"], kwargs["request_data"])
+    get_generation_registry().release(key, task_id)
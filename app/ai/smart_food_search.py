@@ -10,10 +10,44 @@ from fastapi import HTTPException
 
 from app.ai_client import get_ai_client
 from app.auth.deps import UserContext
+
 from . import schemas
+from .search_cache import get_smart_search_cache
 
 logger = logging.getLogger(__name__)
 
+# La IA genera siempre la lista completa (hasta este número de sugerencias),
+# que es lo que se cachea; cada petición se recorta a su ``max_suggestions``
+# al leer, así una entrada sirve a cualquier petición hasta este tope
+MAX_SUGGESTIONS = 10
+
+# Idioma de los nombres de alimentos según ``locale`` (forma parte de la clave del cache)
+LOCALE_LANGUAGES = {
+    "es": "español",
+    "en": "inglés",
+    "pt": "portugués",
+    "fr": "francés",
+    "it": "italiano",
+    "de": "alemán",
+}
+
+
+def _smart_search_cache():
+    from app.core.config import settings
+
+    if not settings.SMART_SEARCH_CACHE_ENABLED:
+        return None
+    return get_smart_search_cache()
+
+
+def _trim(response: schemas.SmartFoodSearchResponse, max_suggestions: int) -> schemas.SmartFoodSearchResponse:
+    return response.model_copy(update={"suggestions": response.suggestions[: min(max_suggestions, MAX_SUGGESTIONS)]})
+
+
+def _language(locale: Optional[str]) -> str:
+    code = (locale or "es").lower()
+    return LOCALE_LANGUAGES.get(code.split("-")[0].split("_")[0], code)
+
 
 def enhance_food_search(
     user: UserContext,
@@ -62,6 +96,12 @@ def enhance_food_search(
             context_notes=f"Sugerencias simuladas para: {req.query}"
         )
     
+    cache = _smart_search_cache()
+    if cache is not None:
+        cached = cache.get(req.query, req.context, req.locale)
+        if cached is not None:
+            return _trim(cached, req.max_suggestions)
+
     client = get_ai_client()
     
     # Prompt del sistema para entender búsquedas de alimentos
@@ -79,9 +119,9 @@ def enhance_food_search(
         "Reglas:\n"
         "- enhanced_query: Reescribe la consulta de forma más específica y clara\n"
         "- search_terms: Lista de términos de búsqueda efectivos (máximo 5)\n"
-        "- suggestions: Sugerencias de alimentos relacionados (máximo 5)\n"
+        f"- suggestions: Sugerencias de alimentos relacionados (máximo {MAX_SUGGESTIONS})\n"
         "- context_notes: Solo si hay información nutricional relevante\n"
-        "- Usa nombres comunes de alimentos en español\n"
+        f"- Usa nombres comunes de alimentos en {_language(req.locale)}\n"
         "- Considera sinónimos y variaciones comunes\n"
         "- Si menciona características nutricionales, inclúyelas en los términos"
     )
@@ -93,7 +133,7 @@ def enhance_food_search(
     
     user_prompt = (
         f"Mejora esta búsqueda de alimentos: '{req.query}'.{context_info}\n\n"
-        f"Genera hasta {req.max_suggestions} sugerencias relacionadas. "
+        f"Genera hasta {MAX_SUGGESTIONS} sugerencias relacionadas. "
         "Si la consulta es muy general, hazla más específica. "
         "Si menciona características nutricionales, inclúyelas en los términos de búsqueda."
     )
@@ -112,12 +152,15 @@ def enhance_food_search(
         data = _parse_json_response(reply)
         
         # Validar y crear la respuesta
-        return schemas.SmartFoodSearchResponse(
+        response = schemas.SmartFoodSearchResponse(
             enhanced_query=data.get("enhanced_query", req.query),
             search_terms=data.get("search_terms", [req.query])[:5],
-            suggestions=data.get("suggestions", [])[:req.max_suggestions],
+            suggestions=data.get("suggestions", [])[:MAX_SUGGESTIONS],
             context_notes=data.get("context_notes")
         )
+        if cache is not None:
+            cache.set(req.query, req.context, req.locale, response)
+        return _trim(response, req.max_suggestions)
         
     except Exception as e:
         logger.error(f"Error en búsqueda inteligente de alimentos: {e}")
@@ -215,3 +258,46 @@ def get_enhanced_search_terms(
     
     response = enhance_food_search(user, req, simulate=simulate)
     return response.search_terms
+
+
+def prewarm_search_cache(
+    queries: List[str],
+    context: Optional[str] = None,
+    locale: str = "es",
+    *,
+    max_llm_calls: int = 20,
+) -> dict:
+    """
+    Precalienta el cache con las consultas más frecuentes.
+    
+    Solo llama a la IA para las consultas que no están ya cacheadas, hasta
+    ``max_llm_calls`` (el presupuesto diario del rate limiter es limitado).
+    
+    Returns:
+        Conteo de consultas calentadas, ya cacheadas, omitidas y fallidas
+    """
+    cache = _smart_search_cache()
+    if cache is None:
+        raise HTTPException(status_code=409, detail="Cache de búsqueda inteligente desactivado")
+
+    system_user = UserContext(id=0, email="", username="")
+    result = {"warmed": 0, "already_cached": 0, "skipped": 0, "failed": 0}
+    seen = set()
+    for query in queries:
+        query = (query or "").strip()
+        if not query or query.lower() in seen:
+            continue
+        seen.add(query.lower())
+        if cache.contains(query, context, locale):
+            result["already_cached"] += 1
+            continue
+        if result["warmed"] + result["failed"] >= max_llm_calls:
+            result["skipped"] += 1
+            continue
+        req = schemas.SmartFoodSearchRequest(query=query, context=context, locale=locale)
+        enhance_food_search(system_user, req)
+        if cache.contains(query, context, locale):
+            result["warmed"] += 1
+        else:
+            result["failed"] += 1
+    return result
@@ -14,14 +14,24 @@ from app.auth.deps import UserContext
 from app.user_profile.models import UserProfile
 from app.nutrition import services as nutrition_services
 from app.ai import schemas
-from services.food_sources import get_food_source_adapter, FoodHit, FoodDetails
+from services.plan_foods import PlanFoodsCatalog, PlanFoodsCatalogHolder, get_plan_foods_holder
+
+# Básicos si el catálogo local aún está vacío
+FALLBACK_FOODS = [
+    {"name": "Pollo", "calories_kcal": 165, "protein_g": 31, "carbs_g": 0, "fat_g": 3.6},
+    {"name": "Arroz integral", "calories_kcal": 111, "protein_g": 2.6, "carbs_g": 23, "fat_g": 0.9},
+    {"name": "Brócoli", "calories_kcal": 34, "protein_g": 2.8, "carbs_g": 7, "fat_g": 0.4},
+    {"name": "Aceite de oliva", "calories_kcal": 884, "protein_g": 0, "carbs_g": 0, "fat_g": 100},
+    {"name": "Huevos", "calories_kcal": 155, "protein_g": 13, "carbs_g": 1.1, "fat_g": 11},
+]
 
 
 class SmartNutritionPlanGenerator:
     """Generador inteligente de planes nutricionales que analiza el perfil del usuario."""
     
-    def __init__(self):
-        self.food_adapter = get_food_source_adapter()
+    def __init__(self, catalog: PlanFoodsCatalogHolder | None = None):
+        self.catalog = catalog or get_plan_foods_holder()
+        self._system_prompts: Dict[str, str] = {}
     
     def analyze_user_profile(self, profile: UserProfile) -> Dict[str, Any]:
         """Analiza el perfil del usuario para personalizar el plan nutricional."""
@@ -99,50 +109,22 @@ class SmartNutritionPlanGenerator:
         }
     
     def get_available_foods(self) -> List[Dict[str, Any]]:
-        """Obtiene una lista de alimentos disponibles de la base de datos."""
-        
-        # Lista de alimentos españoles comunes para buscar
-        spanish_foods = [
-            "pollo", "salmón", "atún", "huevos", "yogur griego", 
-            "arroz integral", "quinoa", "avena", "patata", "boniato",
-            "aguacate", "aceite de oliva", "brócoli", "espinacas", 
-            "tomate", "pimiento", "cebolla", "ajo", "plátano", 
-            "manzana", "naranja", "fresas", "nueces", "almendras",
-            "leche", "queso fresco", "lentejas", "garbanzos", "judías"
-        ]
-        
-        available_foods = []
-        
-        for food_name in spanish_foods:
-            try:
-                # Buscar alimento en la base de datos
-                hits = self.food_adapter.search(food_name, page_size=3)
-                
-                if hits:
-                    # Tomar el primer resultado y obtener detalles
-                    best_hit = hits[0]
-                    details = self.food_adapter.get_details(best_hit.source_id)
-                    
-                    if details.calories_kcal and details.protein_g is not None:
-                        available_foods.append({
-                            "name": best_hit.name,
-                            "source_id": best_hit.source_id,
-                            "source": best_hit.source,
-                            "calories_kcal": details.calories_kcal,
-                            "protein_g": details.protein_g or 0,
-                            "carbs_g": details.carbs_g or 0,
-                            "fat_g": details.fat_g or 0
-                        })
-                        
-                        # Limitar a 30 alimentos para no saturar el prompt
-                        if len(available_foods) >= 30:
-                            break
-                            
-            except Exception as e:
-                # Si falla la búsqueda de un alimento, continuar con el siguiente
-                continue
-        
-        return available_foods
+        """Alimentos del catálogo precalculado en memoria (sin consultas ni HTTP).
+
+        El catálogo se construye con las filas locales de ``foods`` que el job
+        de pre-calentamiento mantiene frescas y se refresca en segundo plano.
+        """
+        return list(self.catalog.get().foods)
+
+    def _system_prompt_for(self, catalog: PlanFoodsCatalog) -> str:
+        """Prompt del sistema cacheado por versión del catálogo."""
+        prompt = self._system_prompts.get(catalog.version)
+        if prompt is None:
+            prompt = self._build_system_prompt(list(catalog.foods) or FALLBACK_FOODS)
+            if len(self._system_prompts) >= 4:
+                self._system_prompts.pop(next(iter(self._system_prompts)))
+            self._system_prompts[catalog.version] = prompt
+        return prompt
     
     def generate_optimized_plan(
         self, 
@@ -174,25 +156,16 @@ class SmartNutritionPlanGenerator:
         # Analizar perfil
         profile_analysis = self.analyze_user_profile(profile)
         
-        # Obtener alimentos disponibles de la BD
-        available_foods = self.get_available_foods()
-        
-        if not available_foods:
-            # Fallback a alimentos básicos si no hay conexión a BD
-            available_foods = [
-                {"name": "Pollo", "calories_kcal": 165, "protein_g": 31, "carbs_g": 0, "fat_g": 3.6},
-                {"name": "Arroz integral", "calories_kcal": 111, "protein_g": 2.6, "carbs_g": 23, "fat_g": 0.9},
-                {"name": "Brócoli", "calories_kcal": 34, "protein_g": 2.8, "carbs_g": 7, "fat_g": 0.4},
-                {"name": "Aceite de oliva", "calories_kcal": 884, "protein_g": 0, "carbs_g": 0, "fat_g": 100},
-                {"name": "Huevos", "calories_kcal": 155, "protein_g": 13, "carbs_g": 1.1, "fat_g": 11}
-            ]
+        # Alimentos disponibles: catálogo en memoria (fallback a básicos si está vacío)
+        catalog = self.catalog.get()
+        available_foods = list(catalog.foods) or FALLBACK_FOODS
         
         # Generar fechas
         today = date.today()
         dates = [(today + timedelta(days=i)).isoformat() for i in range(req.days)]
         
         # Construir prompt optimizado
-        system_prompt = self._build_system_prompt(available_foods)
+        system_prompt = self._system_prompt_for(catalog)
         user_prompt = self._build_user_prompt(req, profile_analysis, dates, available_foods)
         
         # Generar con IA
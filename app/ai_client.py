@@ -1,19 +1,83 @@
-"""Client for the external AI microservice with local fallback."""
+"""Client for the external AI microservice with local fallback.
+
+``AiClient``/``LocalAiClient`` are blocking and meant for Celery tasks and
+sync routes. Async routes use ``get_async_ai_client()`` instead: the same two
+flavours on a pooled ``httpx.AsyncClient``, so a worker can keep hundreds of
+generations pending without tying up a thread each.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import hmac
 import json
+import logging
 import time
 import uuid
 from hashlib import sha256
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 import httpx
 
-from app.ai.provider import OpenAIProvider, OpenRouterProvider, OpenRouterBackupProvider
+from app.ai.provider import (
+    AsyncChatProvider,
+    OpenAIProvider,
+    OpenRouterBackupProvider,
+    OpenRouterProvider,
+)
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+_RATE_LIMIT_KEYWORDS = (
+    "rate limit", "too many requests", "quota exceeded",
+    "429", "limit exceeded", "throttled",
+)
+
+
+def _is_rate_limit_error(exc: Exception) -> bool:
+    error_msg = str(exc).lower()
+    return any(keyword in error_msg for keyword in _RATE_LIMIT_KEYWORDS)
+
+
+def _signed_headers(secret: bytes, body: bytes) -> Dict[str, str]:
+    ts = str(int(time.time()))
+    sig = hmac.new(secret, f"{ts}.".encode() + body, sha256).hexdigest()
+    return {
+        "Content-Type": "application/json",
+        "X-Timestamp": ts,
+        "X-Internal-Signature": sig,
+        "X-Request-ID": str(uuid.uuid4()),
+    }
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_async_http_client() -> httpx.AsyncClient:
+    """Connection pool shared by every async AI call of an event loop.
+
+    HTTP/2 (``AI_HTTP2``, needs the ``h2`` package from ``httpx[http2]``)
+    multiplexes concurrent completions over a few connections; without
+    ``h2`` the pool falls back to HTTP/1.1 keep-alive connections.
+    """
+    http2 = settings.AI_HTTP2 and _http2_available()
+    if settings.AI_HTTP2 and not http2:
+        logger.warning("AI_HTTP2 is set but h2 is not installed; using HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_S or 120, connect=settings.AI_HTTP_CONNECT_TIMEOUT_S),
+    )
+
 
 class AiClient:
     def __init__(
@@ -31,14 +95,7 @@ class AiClient:
             raise httpx.RequestError("circuit open")
 
         body = json.dumps(payload, separators=(",", ":")).encode()
-        ts = str(int(time.time()))
-        sig = hmac.new(self._secret, f"{ts}.".encode() + body, sha256).hexdigest()
-        headers = {
-            "Content-Type": "application/json",
-            "X-Timestamp": ts,
-            "X-Internal-Signature": sig,
-            "X-Request-ID": str(uuid.uuid4()),
-        }
+        headers = _signed_headers(self._secret, body)
 
         for attempt in range(self._max_retries + 1):
             try:
@@ -81,6 +138,17 @@ class AiClient:
         data = self._signed_post("/v1/chat", payload)
         return data
 
+    def chat_stream(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        model: Optional[str] = None,
+        simulate: bool = False,
+    ) -> Iterator[str]:
+        # The microservice has no streaming endpoint: the reply is one chunk
+        yield self.chat(user_id, messages, model=model, simulate=simulate).get("reply", "")
+
 
 class LocalAiClient:
     def __init__(self) -> None:
@@ -121,15 +189,8 @@ class LocalAiClient:
                     pass
             return self._provider.chat(user_id, messages, simulate=simulate)
         except Exception as main_exc:
-            # Check if it's a rate limit or similar error that should trigger fallback
-            error_msg = str(main_exc).lower()
-            is_rate_limit = any(keyword in error_msg for keyword in [
-                "rate limit", "too many requests", "quota exceeded", 
-                "429", "limit exceeded", "throttled"
-            ])
-            
             # If we have a backup provider and it's a rate limit error, try backup
-            if self._backup_provider and is_rate_limit:
+            if self._backup_provider and _is_rate_limit_error(main_exc):
                 try:
                     if hasattr(self._backup_provider, "chat"):
                         try:
@@ -144,6 +205,135 @@ class LocalAiClient:
             # If no backup or not a rate limit error, raise the original error
             raise main_exc
 
+    def chat_stream(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        model: Optional[str] = None,
+        simulate: bool = False,
+    ) -> Iterator[str]:
+        """Yield reply text deltas as the provider produces them.
+
+        Falls back to the backup provider on rate limit errors, but only if
+        the main provider failed before sending its first token.
+        """
+        started = False
+        try:
+            for delta in self._provider.chat_stream(user_id, messages, simulate=simulate, model=model):
+                started = True
+                yield delta
+        except Exception as main_exc:
+            if started or not self._backup_provider or not _is_rate_limit_error(main_exc):
+                raise
+            try:
+                yield from self._backup_provider.chat_stream(
+                    user_id, messages, simulate=simulate, model=model
+                )
+            except Exception as backup_exc:
+                raise main_exc from backup_exc
+
+
+class AsyncAiClient:
+    """Async variant of :class:`AiClient` (same signing and circuit breaker)."""
+
+    def __init__(
+        self, base_url: str, secret: str, http_client: httpx.AsyncClient, max_retries: int = 1
+    ) -> None:
+        self._base_url = base_url.rstrip("/")
+        self._secret = secret.encode()
+        self._max_retries = max_retries
+        self._client = http_client
+        self._failures = 0
+        self._next_retry = 0.0
+
+    async def _signed_post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if time.time() < self._next_retry:
+            raise httpx.RequestError("circuit open")
+
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        headers = _signed_headers(self._secret, body)
+
+        for attempt in range(self._max_retries + 1):
+            try:
+                resp = await self._client.post(
+                    self._base_url + path, content=body, headers=headers
+                )
+                if resp.status_code >= 500:
+                    raise httpx.HTTPError("server error")
+                resp.raise_for_status()
+                self._failures = 0
+                return resp.json()
+            except httpx.HTTPError:
+                if attempt == self._max_retries:
+                    self._failures += 1
+                    if self._failures >= 3:
+                        self._next_retry = time.time() + 30
+                    raise
+                await asyncio.sleep(2**attempt)
+        raise RuntimeError("unreachable")
+
+    async def embeddings(
+        self, user_id: int, texts: List[str], *, simulate: bool = False
+    ) -> List[List[float]]:
+        data = await self._signed_post("/v1/embeddings", {"texts": texts})
+        return data["vectors"]
+
+    async def chat(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        model: Optional[str] = None,
+        simulate: bool = False,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        # The microservice picks its own model options; ``params`` are ignored
+        payload: Dict[str, Any] = {"messages": messages}
+        if model:
+            payload["model"] = model
+        return await self._signed_post("/v1/chat", payload)
+
+
+class AsyncLocalAiClient:
+    """Async variant of :class:`LocalAiClient`: same provider order and fallback."""
+
+    def __init__(self, http_client: httpx.AsyncClient) -> None:
+        openrouter = AsyncChatProvider.openrouter(http_client) if settings.OPENROUTER_KEY else None
+        if getattr(settings, "API_OPEN_AI", None) or settings.OPENAI_API_KEY:
+            self._provider = AsyncChatProvider.openai(http_client)
+            self._backup_provider = openrouter
+        elif settings.OPENROUTER_KEY2:
+            self._provider = AsyncChatProvider.openrouter_backup(http_client)
+            self._backup_provider = openrouter
+        elif openrouter:
+            self._provider = openrouter
+            self._backup_provider = None
+        else:
+            self._provider = AsyncChatProvider.openai(http_client)
+            self._backup_provider = None
+
+    async def chat(
+        self,
+        user_id: int,
+        messages: List[Dict[str, Any]],
+        *,
+        model: Optional[str] = None,
+        simulate: bool = False,
+        **params: Any,
+    ) -> Dict[str, Any]:
+        try:
+            return await self._provider.chat(user_id, messages, simulate=simulate, model=model, **params)
+        except Exception as main_exc:
+            if not self._backup_provider or not _is_rate_limit_error(main_exc):
+                raise
+            try:
+                return await self._backup_provider.chat(
+                    user_id, messages, simulate=simulate, model=model, **params
+                )
+            except Exception as backup_exc:
+                raise main_exc from backup_exc
+
 
 _client: LocalAiClient | AiClient | None = None
 
@@ -157,3 +347,25 @@ def get_ai_client() -> LocalAiClient | AiClient:
         if not isinstance(_client, LocalAiClient):
             _client = LocalAiClient()
     return _client
+
+
+_async_client: AsyncLocalAiClient | AsyncAiClient | None = None
+_async_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_async_ai_client() -> AsyncLocalAiClient | AsyncAiClient:
+    """Async client for the running event loop.
+
+    The connection pool belongs to the loop that created it, so one client
+    is kept per loop (in production, one per worker).
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        http_client = build_async_http_client()
+        if settings.AI_SERVICE_URL and settings.AI_INTERNAL_SECRET:
+            _async_client = AsyncAiClient(settings.AI_SERVICE_URL, settings.AI_INTERNAL_SECRET, http_client)
+        else:
+            _async_client = AsyncLocalAiClient(http_client)
+        _async_client_loop = loop
+    return _async_client
@@ -12,7 +12,11 @@ def make_celery() -> Celery:
         "planifitai",
         broker=broker,
         backend=backend,
-        include=["app.background.tasks", "app.background.nutrition_tasks"],
+        include=[
+            "app.background.tasks",
+            "app.background.nutrition_tasks",
+            "app.background.food_tasks",
+        ],
     )
     if os.getenv("CELERY_TASK_ALWAYS_EAGER") == "1":
         app.conf.update(
@@ -32,6 +36,20 @@ def make_celery() -> Celery:
         broker_transport_options={"visibility_timeout": 3600},
         result_expires=86400,
     )
+    from app.core.config import settings
+
+    # el prewarm (hasta 30 min) va a su propia cola y worker (-Q foods) para no
+    # dejar las generaciones de planes esperando detrás en la cola por defecto
+    app.conf.task_routes = {"foods.prewarm_popular": {"queue": settings.FOOD_PREWARM_QUEUE}}
+    prewarm_interval = settings.FOOD_PREWARM_INTERVAL_S
+    if prewarm_interval > 0:
+        app.conf.beat_schedule = {
+            "prewarm-popular-foods": {
+                "task": "foods.prewarm_popular",
+                "schedule": float(prewarm_interval),
+                "options": {"expires": prewarm_interval},
+            },
+        }
     return app
 
 
@@ -0,0 +1,26 @@
+"""Tareas Celery del catálogo local de alimentos."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any, Dict
+
+from app.background.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import SessionLocal
+from services.food_prewarm import popular_food_queries, prewarm_foods
+
+
+@celery_app.task(name="foods.prewarm_popular", time_limit=1800, soft_time_limit=1500)
+def prewarm_popular_foods_task() -> Dict[str, Any]:
+    """Refresca en ``foods`` los básicos y los alimentos más usados/buscados."""
+    if not settings.FOOD_PREWARM_ENABLED:
+        return {"enabled": False}
+    with SessionLocal() as db:
+        queries = popular_food_queries(db, limit=settings.FOOD_PREWARM_TOP_N)
+    return prewarm_foods(
+        SessionLocal,
+        queries,
+        concurrency=settings.FOOD_PREWARM_CONCURRENCY,
+        max_age=timedelta(days=settings.FOOD_PREWARM_MAX_AGE_DAYS),
+    )
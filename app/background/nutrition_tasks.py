@@ -3,19 +3,29 @@
 from __future__ import annotations
 
 import time
-from datetime import datetime
-from typing import Dict, Any
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Tuple
 
 from celery import current_task
+from celery.signals import task_postrun, task_revoked
 from sqlalchemy.orm import Session
 
 from app.background.celery_app import celery_app
-from app.ai.services import generate_nutrition_plan_optimized, generate_nutrition_plan
+from app.ai.services import (
+    generate_nutrition_plan_optimized,
+    generate_nutrition_plan,
+    generate_nutrition_plan_chunked,
+    profile_plan_targets,
+    stream_nutrition_plan,
+)
+from app.ai.plan_stream import StreamedPlan
 from app.ai import plan_persistence
 from app.ai.cache import generate_nutrition_plan_with_cache
 from app.ai import schemas
+from app.ai.single_flight import release_generation_task
 from app.dependencies import get_db
 from app.auth.deps import UserContext
+from app.core.config import settings
 
 
 @celery_app.task(
@@ -150,6 +160,14 @@ def generate_nutrition_plan_14_days_task(
     
     Esta tarea genera un plan completo de 2 semanas usando una estrategia
     optimizada: genera 7 días base + variaciones inteligentes.
+
+    La semana base llega en streaming: cada día se valida, se persiste y se
+    publica en el progreso de la tarea en cuanto el modelo lo cierra, así que
+    un corte a mitad no pierde los días ya generados.
+
+    Con la estrategia ``parallel_chunks`` (``request_data['strategy']`` o
+    ``NUTRITION_PLAN_14D_STRATEGY``) los 14 días se reparten en bloques que se
+    generan a la vez y se unen en un solo plan.
     """
     try:
         # Actualizar progreso inicial
@@ -169,7 +187,11 @@ def generate_nutrition_plan_14_days_task(
         db = next(get_db())
         
         try:
-            # Paso 1: Generar plan base de 7 días
+            strategy = request_data.get('strategy') or settings.NUTRITION_PLAN_14D_STRATEGY
+            if strategy == 'parallel_chunks':
+                return generate_parallel_chunks(self, user_context, request_data, db)
+
+            # Paso 1: Generar plan base de 7 días (persistiendo cada día al cerrarse)
             self.update_state(
                 state='PROGRESS', 
                 meta={
@@ -184,7 +206,9 @@ def generate_nutrition_plan_14_days_task(
                 preferences=request_data.get('preferences', {})
             )
             
-            base_plan = generate_nutrition_plan(user_context, base_request, db)
+            # cada día sustituye las comidas IA de su fecha al persistirse: si el
+            # modelo falla antes del primer día, el plan anterior sigue intacto
+            base_plan, base_persist, base_complete = stream_base_week(self, user_context, base_request, db)
             
             # Paso 2: Crear variaciones inteligentes para la segunda semana
             self.update_state(
@@ -216,8 +240,8 @@ def generate_nutrition_plan_14_days_task(
             base_date = datetime.fromisoformat(base_plan.days[0].date)
             
             for i, day in enumerate(week2_plan.days):
-                new_date = base_date + timedelta(days=7 + i)
-                day.date = new_date.isoformat()
+                new_date = base_date + timedelta(days=len(base_plan.days) + i)
+                day.date = new_date.date().isoformat()
             
             # Crear plan final
             final_plan = schemas.NutritionPlan(
@@ -225,18 +249,22 @@ def generate_nutrition_plan_14_days_task(
                 targets=base_plan.targets
             )
 
-            # Persistir automáticamente el plan combinado
+            # Persistir la segunda semana (la base ya se guardó día a día)
             try:
-                final_dict = final_plan.model_dump()
-                plan_persistence.clean_existing_ai_meals(db, user_id, days_ahead=14)
-                persist_result = plan_persistence.persist_nutrition_plan(
+                week2_result = plan_persistence.persist_nutrition_plan(
                     db=db,
                     user_id=user_id,
-                    plan_data=final_dict,
-                    targets=final_dict.get('targets', {})
+                    plan_data={'days': [d.model_dump() for d in week2_plan.days]},
+                    targets=base_plan.targets,
+                    replace_ai_meals=True,
                 )
             except Exception as _:
-                persist_result = {"success": False}
+                week2_result = {"success": False, "meals_created": 0, "errors": []}
+            persist_result = {
+                "success": base_persist["success"] and week2_result.get("success", False),
+                "meals_created": base_persist["meals_created"] + week2_result.get("meals_created", 0),
+                "errors": base_persist["errors"] + week2_result.get("errors", []),
+            }
             
             # Actualizar progreso - completado
             self.update_state(
@@ -256,6 +284,7 @@ def generate_nutrition_plan_14_days_task(
                 'strategy': 'base_week_plus_variations',
                 'targets': base_plan.targets,
                 'persist': persist_result,
+                'truncated': not base_complete,
             }
             
         finally:
@@ -351,6 +380,162 @@ def generate_nutrition_plan_test_task(
         raise
 
 
+_SINGLE_FLIGHT_TASKS = {
+    generate_nutrition_plan_task.name,
+    generate_nutrition_plan_14_days_task.name,
+    generate_nutrition_plan_test_task.name,
+}
+
+
+@task_postrun.connect
+def _release_single_flight(sender=None, task_id=None, kwargs=None, **_):
+    """Al terminar (con éxito o error) la generación deja de aceptar peticiones idénticas."""
+    if sender is not None and sender.name in _SINGLE_FLIGHT_TASKS:
+        release_generation_task(sender.name, task_id, kwargs)
+
+
+@task_revoked.connect
+def _release_revoked_single_flight(request=None, **_):
+    if request is not None and request.task_name in _SINGLE_FLIGHT_TASKS:
+        release_generation_task(request.task_name, request.id, request.kwargs)
+
+
+def stream_base_week(
+    task,
+    user_context: UserContext,
+    request: schemas.NutritionPlanRequest,
+    db: Session,
+    *,
+    progress_from: int = 25,
+    progress_to: int = 60,
+) -> Tuple[schemas.NutritionPlan, Dict[str, Any], bool]:
+    """
+    Genera la semana base en streaming, persistiendo y notificando cada día.
+
+    Devuelve el plan (completo, o solo los días recibidos si el modelo se
+    cortó), el resumen de persistencia y si el JSON llegó completo. Sin
+    ningún día válido relanza el error del stream.
+
+    Cada día se guarda con los objetivos del perfil; sin perfil completo, con
+    los del plan una vez terminado el stream.
+    """
+    streamed = StreamedPlan(stream_nutrition_plan(user_context, request, db))
+    persisted: Dict[str, Any] = {"success": True, "meals_created": 0, "errors": []}
+    expected = max(1, request.days)
+    targets = profile_plan_targets(db, user_context.id)
+
+    for kind, value in streamed:
+        if kind != "day":
+            continue
+        index, day = value
+        result = plan_persistence.persist_plan_day(db, user_context.id, index, day.model_dump(), targets)
+        persisted["success"] = persisted["success"] and result["success"]
+        persisted["meals_created"] += result["meals_created"]
+        persisted["errors"] += result["errors"]
+        ready = index + 1
+        task.update_state(
+            state='PROGRESS',
+            meta={
+                'step': 'generating_base_week',
+                'progress': progress_from + (progress_to - progress_from) * min(ready, expected) // expected,
+                'message': f'Día {ready} de {expected} listo',
+                'days_ready': ready,
+                'day': day.model_dump(),
+            }
+        )
+
+    plan = streamed.result()
+    if targets is None:
+        result = plan_persistence.persist_plan_targets(
+            db, user_context.id, [d.model_dump() for d in streamed.days], plan.targets
+        )
+        persisted["success"] = persisted["success"] and result["success"]
+        persisted["errors"] += result["errors"]
+    return plan, persisted, streamed.complete
+
+
+def generate_parallel_chunks(
+    task,
+    user_context: UserContext,
+    request_data: Dict[str, Any],
+    db: Session,
+) -> Dict[str, Any]:
+    """
+    Genera los 14 días en bloques paralelos y persiste el plan unido.
+
+    El progreso avanza de 25 a 85 según terminan los bloques. Si algún bloque
+    falla tras sus reintentos se persisten los demás y el resultado lista las
+    fechas que faltan en ``missing_dates``.
+    """
+    request = schemas.NutritionPlanRequest(
+        days=14,
+        preferences=request_data.get('preferences', {})
+    )
+    task.update_state(
+        state='PROGRESS',
+        meta={
+            'step': 'generating_chunks',
+            'progress': 25,
+            'message': 'Generando bloques del plan en paralelo...'
+        }
+    )
+
+    def _on_chunk(done: int, total: int) -> None:
+        task.update_state(
+            state='PROGRESS',
+            meta={
+                'step': 'generating_chunks',
+                'progress': 25 + 60 * done // total,
+                'message': f'Bloque {done} de {total} listo',
+                'chunks_ready': done,
+                'chunks_total': total,
+            }
+        )
+
+    today = date.today()
+    plan = generate_nutrition_plan_chunked(user_context, request, db, on_chunk=_on_chunk)
+    plan_dict = plan.model_dump()
+    generated = {d.date for d in plan.days}
+    missing_dates = [
+        d for d in ((today + timedelta(days=i)).isoformat() for i in range(request.days))
+        if d not in generated
+    ]
+
+    # el plan unido ya está validado: cada día sustituye las comidas IA de su
+    # fecha en la misma transacción, así que un fallo no deja días vacíos
+    try:
+        persist_result = plan_persistence.persist_nutrition_plan(
+            db=db,
+            user_id=user_context.id,
+            plan_data=plan_dict,
+            targets=plan.targets,
+            replace_ai_meals=True,
+        )
+    except Exception as _:
+        persist_result = {"success": False}
+
+    task.update_state(
+        state='PROGRESS',
+        meta={
+            'step': 'completed',
+            'progress': 100,
+            'message': 'Plan de 14 días generado exitosamente'
+        }
+    )
+
+    return {
+        'status': 'SUCCESS',
+        'plan': plan_dict,
+        'generated_at': datetime.utcnow().isoformat(),
+        'days_generated': len(plan.days),
+        'strategy': 'parallel_chunks',
+        'targets': plan.targets,
+        'persist': persist_result,
+        'truncated': len(plan.days) < request.days,
+        'missing_dates': missing_dates,
+    }
+
+
 def create_intelligent_variations(
     base_plan: schemas.NutritionPlan, 
     user_context: UserContext, 
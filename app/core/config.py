@@ -23,6 +23,69 @@ class Settings(BaseSettings):
     # Nutrition data sources
     FOOD_SOURCE: str = Field(default="openfoodfacts")
     FDC_API_KEY: str | None = None
+    FOOD_SOURCES: str | None = None  # p.ej. "openfoodfacts,fdc" -> búsqueda federada por prioridad
+    FOOD_SOURCE_DEADLINE_S: float = 1.5  # plazo por fuente en la búsqueda federada
+    FOOD_SOURCE_LATENCY_BUDGET_S: float = 2.0
+    FOOD_SOURCE_HEDGE_AFTER_S: float | None = 0.4  # 0/None desactiva la petición duplicada
+    FOOD_SOURCE_POOL_MAXSIZE: int = 10  # conexiones keep-alive por host
+    FOOD_SOURCE_CACHE_ENABLED: bool = True
+    FOOD_SOURCE_CACHE_TTL_S: int = 86400
+    FOOD_SOURCE_NEGATIVE_CACHE_TTL_S: int = 3600  # búsquedas vacías / productos inexistentes
+    FOOD_SOURCE_CACHE_MAXSIZE: int = 5000
+    FOOD_SOURCE_CACHE_REDIS_URL: str | None = None  # si no, LRU en memoria
+    # Límite compartido entre workers + circuit breaker (modo solo-cache)
+    FOOD_SOURCE_GUARD_ENABLED: bool = True
+    FOOD_SOURCE_GUARD_REDIS_URL: str | None = None  # si no, fichero SQLite compartido
+    FOOD_SOURCE_GUARD_SQLITE_PATH: str | None = None
+    FOOD_SOURCE_RATE_PER_MIN: dict[str, float] = {"openfoodfacts": 60.0, "fdc": 15.0}
+    FOOD_SOURCE_RATE_BURST: int = 10
+    FOOD_SOURCE_BREAKER_THRESHOLD: int = 5
+    FOOD_SOURCE_BREAKER_COOLDOWN_S: float = 60.0
+
+    # Pre-calentamiento periódico (Celery beat) de alimentos populares en ``foods``
+    FOOD_PREWARM_ENABLED: bool = True
+    FOOD_PREWARM_INTERVAL_S: int = 21600  # 6 horas; 0 desactiva el beat
+    # Cola propia: la tarea dura hasta 30 min y no debe bloquear la de planes
+    FOOD_PREWARM_QUEUE: str = "foods"
+    FOOD_PREWARM_TOP_N: int = 200
+    FOOD_PREWARM_CONCURRENCY: int = 4
+    FOOD_PREWARM_MAX_AGE_DAYS: int = 7
+    # Catálogo de alimentos del prompt de planes (en memoria, desde ``foods``)
+    PLAN_FOODS_CATALOG_TTL_S: int = 3600
+    PLAN_FOODS_CATALOG_SIZE: int = 30
+
+    # Cache de términos de búsqueda inteligente (respuestas de la IA)
+    SMART_SEARCH_CACHE_ENABLED: bool = True
+    SMART_SEARCH_CACHE_TTL_S: int = 7 * 86400
+    SMART_SEARCH_CACHE_MAX_ENTRIES: int = 10000
+
+    # Cache de planes nutricionales generados (LRU en memoria o Redis compartido)
+    NUTRITION_PLAN_CACHE_TTL_S: int = 24 * 3600
+    NUTRITION_PLAN_CACHE_MAX_ENTRIES: int = 1000  # solo backend en memoria
+    NUTRITION_PLAN_CACHE_REDIS_URL: str | None = None
+    # Reutilizar planes entre usuarios con los mismos objetivos/dieta/alergias
+    NUTRITION_PLAN_SHARED_CACHE_ENABLED: bool = False
+    # Generación por bloques en paralelo (estrategia "parallel_chunks" del plan de 14 días)
+    NUTRITION_PLAN_14D_STRATEGY: str = "base_week_plus_variations"
+    NUTRITION_PLAN_CHUNK_DAYS: int = 4
+    NUTRITION_PLAN_PARALLEL_WORKERS: int = 4
+    # Planificador local determinista antes del LLM (el LLM solo pule nombres si se activa)
+    NUTRITION_LOCAL_PLANNER_ENABLED: bool = True
+    NUTRITION_LOCAL_PLANNER_LLM_POLISH: bool = False
+    # Peticiones idénticas en curso (usuario + petición) se unen a la misma tarea
+    NUTRITION_SINGLE_FLIGHT_REDIS_URL: str | None = None
+    NUTRITION_SINGLE_FLIGHT_SQLITE_PATH: str | None = None
+    NUTRITION_SINGLE_FLIGHT_TTL_S: int = 900
+
+    # Rate limit de los modelos, compartido entre workers (Redis o fichero SQLite)
+    AI_RATE_LIMIT_REDIS_URL: str | None = None
+    AI_RATE_LIMIT_SQLITE_PATH: str | None = None
+    AI_RATE_LIMIT_MAX_WAIT_S: float = 30.0  # más cola que esto -> 429 inmediato
+    AI_RATE_LIMITS: dict[str, dict[str, float]] = {
+        "openrouter": {"min_interval_s": 2.0, "max_daily": 45},
+        "openrouter_backup": {"min_interval_s": 2.0, "max_daily": 45},
+        "openai": {"min_interval_s": 2.0, "max_daily": 45},
+    }
 
     # Opcionales (si los usas después)
     API_OPEN_AI: str | None = None
@@ -37,6 +100,11 @@ class Settings(BaseSettings):
     AI_DAILY_BUDGET_CENTS: int = 100
     AI_SERVICE_URL: str | None = None
     AI_INTERNAL_SECRET: str | None = None
+    # Pool HTTP del cliente async de IA (rutas async); HTTP/2 requiere httpx[http2]
+    AI_HTTP2: bool = True
+    AI_HTTP_MAX_CONNECTIONS: int = 200
+    AI_HTTP_MAX_KEEPALIVE: int = 50
+    AI_HTTP_CONNECT_TIMEOUT_S: float = 5.0
 
     # OpenRouter (DeepSeek free)
     OPENROUTER_KEY: str | None = None
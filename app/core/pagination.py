@@ -0,0 +1,53 @@
+"""Paginación por cursor (keyset) compartida por los listados de catálogo.
+
+El cursor es opaco para el cliente: base64url de un JSON con los valores de
+las claves de orden de la última fila servida y una huella de la consulta.
+La página siguiente filtra ``(k1, k2, ..., id) > (v1, v2, ..., vid)`` en vez
+de usar ``OFFSET``, así que cualquier página cuesta lo mismo que la primera.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, List, Sequence
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursorError(ValueError):
+    """Cursor mal formado o emitido para otra consulta."""
+
+
+def query_fingerprint(*parts: Any) -> str:
+    """Huella corta de los parámetros que definen el orden del listado."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(values: Sequence[Any], fingerprint: str) -> str:
+    raw = json.dumps(
+        {"k": list(values), "f": fingerprint}, separators=(",", ":"), default=str
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, fingerprint: str, size: int) -> List[Any]:
+    """Valores de las claves de orden; ``InvalidCursorError`` si no encaja."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values = data["k"]
+        matches = data["f"] == fingerprint
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    if not matches or not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError("Cursor does not belong to this query")
+    return values
+
+
+def after_keys(keys: Sequence[Any], values: Sequence[Any]):
+    """Condición ``keys > values`` en orden lexicográfico (todas ascendentes)."""
+    return tuple_(*keys) > tuple_(*values)
@@ -0,0 +1,32 @@
+import json
+import zlib
+from typing import Any
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+
+def compress_json(value: Any) -> bytes | None:
+    """JSON compacto comprimido con zlib (``None`` se guarda como NULL)."""
+    if value is None:
+        return None
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return zlib.compress(raw.encode("utf-8"), 6)
+
+
+def decompress_json(value: bytes | None) -> Any:
+    if value is None:
+        return None
+    return json.loads(zlib.decompress(bytes(value)))
+
+
+class CompressedJSON(TypeDecorator):
+    """SQLAlchemy type storing JSON documents zlib-compressed in a binary column."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_json(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_json(value)
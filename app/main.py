@@ -80,6 +80,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Total-Count"],
     )
     # (Este router ya gestiona sus propias rutas)
     app.include_router(ai_jobs_router)
@@ -1,7 +1,10 @@
 import enum
+import re
+import unicodedata
 from datetime import datetime
 
 from sqlalchemy import (
+    DDL,
     JSON,
     CheckConstraint,
     Column,
@@ -13,13 +16,15 @@ from sqlalchemy import (
     Numeric,
     String,
     UniqueConstraint,
+    event,
 )
 from sqlalchemy import (
     Enum as SqlEnum,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from app.core.database import Base
+from app.core.types import CompressedJSON
 
 
 class MealType(str, enum.Enum):
@@ -145,11 +150,14 @@ class Food(Base):
     __table_args__ = (
         UniqueConstraint("source", "source_id", name="uix_food_source_source_id"),
         Index("ix_food_name", "name"),
+        Index("ix_food_name_norm", "name_norm", postgresql_ops={"name_norm": "varchar_pattern_ops"}),
     )
 
     # Store UUID as string for cross-DB compatibility
     id = Column(String(36), primary_key=True, index=True)
     name = Column(String(255), nullable=False)
+    # lowercase, unaccented name ("Plátano" -> "platano"); kept in sync on write
+    name_norm = Column(String(255), nullable=True)
     brand = Column(String(255), nullable=True)
     source = Column(SqlEnum(FoodSource, name="foodsource"), nullable=False)
     source_id = Column(String(100), nullable=False)
@@ -161,7 +169,68 @@ class Food(Base):
     fat_g = Column(Numeric(10, 2), nullable=True)
 
     portion_suggestions = Column(JSON, nullable=True)
-    raw_payload = Column(JSON, nullable=True)
+    # Full upstream document, only needed to re-map a food: compressed and not
+    # loaded by default (``undefer(Food.raw_payload)`` when it is needed)
+    raw_payload = deferred(Column(CompressedJSON, nullable=True))
     lang = Column(String(8), nullable=False, default="en")
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_food_name(name: str | None) -> str:
+    """Lowercase, strip accents and collapse whitespace (value of ``name_norm``)."""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _WS_RE.sub(" ", text).strip().lower()[:255]
+
+
+@event.listens_for(Food, "before_insert")
+@event.listens_for(Food, "before_update")
+def _sync_name_norm(mapper, connection, target):
+    target.name_norm = normalize_food_name(target.name)
+
+
+# --- Food name search index ---
+#
+# Postgres serves ranked prefix/fuzzy lookups from a tsvector GIN index plus a
+# pg_trgm index over ``name_norm`` (migrations 2025_09_12_0009 and
+# 2025_09_14_0011). SQLite keeps an FTS5
+# shadow table over ``foods.rowid`` in sync through triggers; it is created
+# here too so ``create_all`` databases (tests, local dev) get it as well.
+# After a VACUUM on SQLite run ``INSERT INTO foods_fts(foods_fts) VALUES
+# ('rebuild')`` since implicit rowids may be renumbered.
+
+FOODS_FTS_TABLE = "foods_fts"
+
+SQLITE_FOODS_FTS_DDL = (
+    "DROP TABLE IF EXISTS foods_fts",
+    "CREATE VIRTUAL TABLE foods_fts USING fts5("
+    "name, content='foods', content_rowid='rowid', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS foods_fts_ai AFTER INSERT ON foods BEGIN "
+    "INSERT INTO foods_fts(rowid, name) VALUES (new.rowid, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_fts_ad AFTER DELETE ON foods BEGIN "
+    "INSERT INTO foods_fts(foods_fts, rowid, name) VALUES ('delete', old.rowid, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_fts_au AFTER UPDATE OF name ON foods BEGIN "
+    "INSERT INTO foods_fts(foods_fts, rowid, name) VALUES ('delete', old.rowid, old.name); "
+    "INSERT INTO foods_fts(rowid, name) VALUES (new.rowid, new.name); END",
+    "INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')",
+)
+
+for _stmt in SQLITE_FOODS_FTS_DDL:
+    event.listen(Food.__table__, "after_create", DDL(_stmt).execute_if(dialect="sqlite"))
+event.listen(
+    Food.__table__,
+    "after_drop",
+    DDL("DROP TABLE IF EXISTS foods_fts").execute_if(dialect="sqlite"),
+)
+
+
+@event.listens_for(Food.__table__, "after_create")
+@event.listens_for(Food.__table__, "after_drop")
+def _reset_search_index_flag(target, connection, **kw):
+    # services.food_search caches whether the index exists per table
+    target.info.pop("search_index", None)
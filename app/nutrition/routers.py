@@ -7,7 +7,8 @@ from sqlalchemy.orm import Session
 
 from app.auth.deps import UserContext, get_current_user
 from app.core.database import get_db
-from app.core.errors import COMMON_HTTP, err, ok
+from app.core.errors import COMMON_HTTP, COMMON_VALIDATION, err, ok
+from app.core.pagination import InvalidCursorError
 from app.dependencies import get_owned_meal
 from app.user_profile.models import UserProfile
 
@@ -212,13 +213,26 @@ def search_foods_endpoint(
     q: str,
     page: int = 1,
     page_size: int = 10,
+    cursor: str | None = None,
+    include_total: bool = False,
     db: Session = Depends(get_db),
     current_user: UserContext = Depends(get_current_user),
 ):
+    """Búsqueda paginada; ``X-Next-Cursor`` permite seguir sin ``OFFSET``."""
     if page_size > 25:
         page_size = 25
-    hits = food_search.search_foods(db, q, page=page, page_size=page_size)
-    return ok(hits)
+    try:
+        result = food_search.search_foods_page(
+            db, q, page=page, page_size=page_size, cursor=cursor, include_total=include_total
+        )
+    except InvalidCursorError as e:
+        return err(COMMON_VALIDATION, str(e), status.HTTP_400_BAD_REQUEST)
+    headers = {}
+    if result.next_cursor:
+        headers["X-Next-Cursor"] = result.next_cursor
+    if result.total is not None:
+        headers["X-Total-Count"] = str(result.total)
+    return ok(result.items, headers=headers)
 
 
 @router.get("/foods/search-smart", response_model=list[FoodHit])
@@ -241,6 +255,34 @@ def search_foods_smart_endpoint(
     return ok(hits)
 
 
+@router.get("/foods/barcode/{code}", response_model=FoodDetails)
+def get_food_by_barcode_endpoint(
+    code: str,
+    db: Session = Depends(get_db),
+    current_user: UserContext = Depends(get_current_user),
+):
+    """Alimento por código de barras (EAN/UPC): búsqueda indexada y, si falta, OFF."""
+    details = food_search.lookup_foods_by_barcode(db, [code]).get(code.strip())
+    if not details:
+        raise HTTPException(status_code=404, detail="Food not found")
+    return ok(details)
+
+
+@router.post("/foods/barcode", response_model=list[schemas.BarcodeLookupItem])
+def lookup_foods_by_barcode_endpoint(
+    payload: schemas.BarcodeLookupRequest,
+    db: Session = Depends(get_db),
+    current_user: UserContext = Depends(get_current_user),
+):
+    """Resuelve un lote de códigos de barras en una sola petición (escaneo de despensa)."""
+    found = food_search.lookup_foods_by_barcode(db, payload.codes)
+    items = [
+        schemas.BarcodeLookupItem(code=code.strip(), food=found.get(code.strip()))
+        for code in payload.codes
+    ]
+    return ok(items)
+
+
 @router.get("/foods/{food_id}", response_model=FoodDetails)
 def get_food_details_endpoint(
     food_id: str,
@@ -163,10 +163,21 @@ class FoodDetails(FoodHit):
     source: str
     source_id: str
     portion_suggestions: Dict | None = None
-    raw_payload: Dict | None = None
     lang: str | None = None
 
 
+MAX_BARCODE_BATCH = 50
+
+
+class BarcodeLookupRequest(BaseModel):
+    codes: List[str] = Field(min_length=1, max_length=MAX_BARCODE_BATCH)
+
+
+class BarcodeLookupItem(BaseModel):
+    code: str
+    food: FoodDetails | None = None
+
+
 # --- Flexible MealItem creation ---
 
 
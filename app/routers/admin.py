@@ -2,6 +2,7 @@ import logging
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Header, HTTPException, status
+from pydantic import BaseModel, Field
 
 from app.core.config import settings
 from app.core.errors import ok
@@ -54,3 +55,24 @@ def import_free_db(
         update_existing,
     )
     return ok({"imported": count})
+
+
+class SmartSearchPrewarmRequest(BaseModel):
+    queries: list[str] = Field(..., min_length=1)
+    context: str | None = None
+    locale: str = "es"
+    max_llm_calls: int = Field(20, ge=0, le=200)
+
+
+@router.post("/ai/food-search/prewarm")
+def prewarm_smart_search_cache(payload: SmartSearchPrewarmRequest, _=Depends(require_admin_secret)):
+    from app.ai.smart_food_search import prewarm_search_cache
+
+    result = prewarm_search_cache(
+        payload.queries,
+        payload.context,
+        payload.locale,
+        max_llm_calls=payload.max_llm_calls,
+    )
+    logger.info("admin.prewarm_smart_search queries=%d result=%s", len(payload.queries), result)
+    return ok(result)
@@ -10,8 +10,11 @@ from sqlalchemy.orm import Session
 from app.auth.deps import UserContext, get_current_user
 from app.core.database import get_db
 from app.core.errors import (
+    COMMON_VALIDATION,
+    err,
     ok,
 )
+from app.core.pagination import InvalidCursorError
 from app.dependencies import get_owned_routine
 from app.notifications import services as notif_services
 from app.progress import schemas as progress_schemas
@@ -100,7 +103,10 @@ def read_public_templates(
     summary="Catálogo de ejercicios",
     description=(
         "Listado paginado de ejercicios filtrable por `q`, `muscle`, "
-        "`equipment` y `level`. Usa `limit`/`offset` y ordena por nombre ascendente."
+        "`equipment` y `level`. Ordena por nombre ascendente. Pagina con "
+        "`limit`/`offset` o, sin coste extra en páginas profundas, pasando el "
+        "`next_cursor` de la respuesta anterior como `cursor`. `include_total` "
+        "controla el recuento (por defecto solo sin `cursor`)."
     ),
     responses={
         200: {
@@ -124,6 +130,7 @@ def read_public_templates(
                             "total": 1,
                             "limit": 50,
                             "offset": 0,
+                            "next_cursor": None,
                         },
                     }
                 }
@@ -152,20 +159,33 @@ def get_exercise_catalog(
     level: str | None = Query(None),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
+    include_total: bool | None = Query(None),
     db: Session = Depends(get_db),
 ):
-    rows, total = services.list_exercises(
-        db,
-        q=q,
-        muscle=muscle,
-        equipment=equipment,
-        level=level,
-        limit=limit,
-        offset=offset,
-    )
+    try:
+        rows, total, next_cursor = services.list_exercises(
+            db,
+            q=q,
+            muscle=muscle,
+            equipment=equipment,
+            level=level,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            include_total=include_total if include_total is not None else not cursor,
+        )
+    except InvalidCursorError as e:
+        return err(COMMON_VALIDATION, str(e), status.HTTP_400_BAD_REQUEST)
     items = [ExerciseRead.model_validate(r) for r in rows]
     return ok(
-        ExerciseCatalogResponse(items=items, total=total, limit=limit, offset=offset)
+        ExerciseCatalogResponse(
+            items=items,
+            total=total,
+            limit=limit,
+            offset=0 if cursor else offset,
+            next_cursor=next_cursor,
+        )
     )
 
 
@@ -7,6 +7,7 @@ from sqlalchemy import and_, func, or_, select, cast, String
 from sqlalchemy.orm import Session, selectinload
 
 from app.auth.deps import UserContext
+from app.core.pagination import after_keys, decode_cursor, encode_cursor, query_fingerprint
 from app.notifications.tasks import schedule_routine
 from app.progress import models as progress_models
 
@@ -24,8 +25,15 @@ def list_exercises(
     level: str | None = None,
     limit: int = 50,
     offset: int = 0,
-) -> Tuple[List[object], int]:
-    """Return exercise catalog rows and total count with optional filters."""
+    cursor: str | None = None,
+    include_total: bool = True,
+) -> Tuple[List[object], Optional[int], Optional[str]]:
+    """Return exercise catalog rows, total count and next cursor with optional filters.
+
+    With ``cursor`` (the ``next_cursor`` of a previous page with the same
+    filters) the page starts after that row by keyset on ``(lower(name), id)``
+    and ``offset`` is ignored. ``total`` is ``None`` when not requested.
+    """
 
     Exercise = getattr(models, "Exercise", None) or getattr(models, "ExerciseCatalog")
 
@@ -116,14 +124,24 @@ def list_exercises(
     if where_clauses:
         stmt = stmt.where(and_(*where_clauses))
 
-    count_stmt = select(func.count()).select_from(Exercise)
-    if where_clauses:
-        count_stmt = count_stmt.where(and_(*where_clauses))
-    total = db.scalar(count_stmt) or 0
-
-    stmt = stmt.order_by(func.lower(Exercise.name)).limit(limit).offset(offset)
-    rows = db.execute(stmt).scalars().all()
-    return rows, total
+    total = None
+    if include_total:
+        count_stmt = select(func.count()).select_from(Exercise)
+        if where_clauses:
+            count_stmt = count_stmt.where(and_(*where_clauses))
+        total = db.scalar(count_stmt) or 0
+
+    keys = [func.lower(Exercise.name), Exercise.id]
+    fingerprint = query_fingerprint("exercises", q, muscle, equipment, level)
+    if cursor:
+        stmt = stmt.where(after_keys(keys, decode_cursor(cursor, fingerprint, len(keys))))
+        offset = 0
+
+    # One extra row tells whether there is a next page
+    stmt = stmt.add_columns(*keys).order_by(*keys).limit(limit + 1).offset(offset)
+    result = db.execute(stmt).all()
+    next_cursor = encode_cursor(list(result[limit - 1][1:]), fingerprint) if len(result) > limit else None
+    return [r[0] for r in result[:limit]], total, next_cursor
 
 
 def get_routine(db: Session, routine_id: int, user: UserContext):
@@ -52,6 +52,9 @@ class ExerciseRead(BaseModel):
 
 class ExerciseCatalogResponse(BaseModel):
     items: list[ExerciseRead]
-    total: int
+    total: Optional[int] = None
     limit: int
     offset: int
+    next_cursor: Optional[str] = Field(
+        default=None, description="Cursor opaco para pedir la página siguiente"
+    )
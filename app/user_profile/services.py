@@ -2,6 +2,7 @@ from fastapi import HTTPException, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.ai.cache import invalidate_user_plans
 from app.auth.deps import UserContext
 from app.user_profile.models import UserProfile
 from app.user_profile.schemas import UserProfileCreate, UserProfileUpdate
@@ -85,6 +86,8 @@ def update_profile(
         setattr(obj, field, value)
     db.commit()
     db.refresh(obj)
+    # los planes cacheados se calcularon con el perfil anterior
+    invalidate_user_plans(obj.user_id)
     return obj
 
 
@@ -94,4 +97,5 @@ def delete_profile(db: Session, profile_id: int, current_user: UserContext) -> b
         return False
     db.delete(obj)
     db.commit()
+    invalidate_user_plans(obj.user_id)
     return True
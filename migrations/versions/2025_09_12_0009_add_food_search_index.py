@@ -0,0 +1,62 @@
+"""add full-text / trigram search index on foods.name
+
+Revision ID: 2025_09_12_0009
+Revises: 050021a71432
+Create Date: 2025-09-12 00:09:00.000000
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2025_09_12_0009"
+down_revision: Union[str, Sequence[str], None] = "050021a71432"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SQLITE_FTS_DDL = (
+    "DROP TABLE IF EXISTS foods_fts",
+    "CREATE VIRTUAL TABLE foods_fts USING fts5("
+    "name, content='foods', content_rowid='rowid', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS foods_fts_ai AFTER INSERT ON foods BEGIN "
+    "INSERT INTO foods_fts(rowid, name) VALUES (new.rowid, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_fts_ad AFTER DELETE ON foods BEGIN "
+    "INSERT INTO foods_fts(foods_fts, rowid, name) VALUES ('delete', old.rowid, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS foods_fts_au AFTER UPDATE OF name ON foods BEGIN "
+    "INSERT INTO foods_fts(foods_fts, rowid, name) VALUES ('delete', old.rowid, old.name); "
+    "INSERT INTO foods_fts(rowid, name) VALUES (new.rowid, new.name); END",
+    "INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')",
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_food_name_tsv ON foods "
+            "USING gin (to_tsvector('simple'::regconfig, name))"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_food_name_trgm ON foods "
+            "USING gin (lower(name) gin_trgm_ops)"
+        )
+    elif bind.dialect.name == "sqlite":
+        for stmt in SQLITE_FTS_DDL:
+            op.execute(stmt)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_food_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_food_name_tsv")
+        # pg_trgm is left installed; other objects may depend on it
+    elif bind.dialect.name == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS foods_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS foods_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS foods_fts_ai")
+        op.execute("DROP TABLE IF EXISTS foods_fts")
@@ -0,0 +1,49 @@
+"""add ai_food_search_cache table
+
+Revision ID: 2025_09_13_0010
+Revises: 2025_09_12_0009
+Create Date: 2025-09-13 00:10:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2025_09_13_0010"
+down_revision: Union[str, Sequence[str], None] = "2025_09_12_0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ai_food_search_cache",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("query", sa.String(length=255), nullable=False),
+        sa.Column("context", sa.String(length=255), nullable=True),
+        sa.Column("locale", sa.String(length=8), nullable=False),
+        sa.Column("response", sa.JSON(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("last_hit_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index(
+        "ix_ai_food_search_cache_expires_at", "ai_food_search_cache", ["expires_at"]
+    )
+    op.create_index(
+        "ix_ai_food_search_cache_last_hit_at", "ai_food_search_cache", ["last_hit_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_ai_food_search_cache_last_hit_at", table_name="ai_food_search_cache"
+    )
+    op.drop_index(
+        "ix_ai_food_search_cache_expires_at", table_name="ai_food_search_cache"
+    )
+    op.drop_table("ai_food_search_cache")
@@ -0,0 +1,97 @@
+"""add accent-insensitive foods.name_norm column
+
+Revision ID: 2025_09_14_0011
+Revises: 2025_09_13_0010
+Create Date: 2025-09-14 00:11:00.000000
+"""
+
+import re
+import unicodedata
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2025_09_14_0011"
+down_revision: Union[str, Sequence[str], None] = "2025_09_13_0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 5000
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_food_name(name):
+    # frozen copy of app.nutrition.models.normalize_food_name
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _WS_RE.sub(" ", text).strip().lower()[:255]
+
+
+def _backfill() -> None:
+    bind = op.get_bind()
+    foods = sa.table(
+        "foods",
+        sa.column("id", sa.String),
+        sa.column("name", sa.String),
+        sa.column("name_norm", sa.String),
+    )
+    last_id = ""
+    while True:
+        rows = bind.execute(
+            sa.select(foods.c.id, foods.c.name)
+            .where(foods.c.id > last_id)
+            .order_by(foods.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            return
+        bind.execute(
+            foods.update()
+            .where(foods.c.id == sa.bindparam("b_id"))
+            .values(name_norm=sa.bindparam("b_norm")),
+            [{"b_id": r.id, "b_norm": normalize_food_name(r.name)} for r in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    op.add_column("foods", sa.Column("name_norm", sa.String(length=255), nullable=True))
+    _backfill()
+    op.create_index(
+        "ix_food_name_norm",
+        "foods",
+        ["name_norm"],
+        postgresql_ops={"name_norm": "varchar_pattern_ops"},
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        # search now matches on name_norm; move the tsvector/trigram indexes over
+        op.execute("DROP INDEX IF EXISTS ix_food_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_food_name_tsv")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_food_name_norm_tsv ON foods "
+            "USING gin (to_tsvector('simple'::regconfig, name_norm))"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_food_name_norm_trgm ON foods "
+            "USING gin (name_norm gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_food_name_norm_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_food_name_norm_tsv")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_food_name_tsv ON foods "
+            "USING gin (to_tsvector('simple'::regconfig, name))"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_food_name_trgm ON foods "
+            "USING gin (lower(name) gin_trgm_ops)"
+        )
+    op.drop_index("ix_food_name_norm", table_name="foods")
+    with op.batch_alter_table("foods") as batch_op:
+        batch_op.drop_column("name_norm")
@@ -0,0 +1,81 @@
+"""store foods.raw_payload zlib-compressed
+
+Revision ID: 2025_09_15_0012
+Revises: 2025_09_14_0011
+Create Date: 2025-09-15 00:12:00.000000
+"""
+
+import json
+import zlib
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2025_09_15_0012"
+down_revision: Union[str, Sequence[str], None] = "2025_09_14_0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH = 2000
+
+
+def _compress(value):
+    # frozen copy of app.core.types.compress_json
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        value = json.loads(value)
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return zlib.compress(raw.encode("utf-8"), 6)
+
+
+def _decompress(value):
+    return None if value is None else json.loads(zlib.decompress(bytes(value)))
+
+
+def _copy(src: str, dst: str, src_type, dst_type, convert) -> None:
+    bind = op.get_bind()
+    foods = sa.table(
+        "foods",
+        sa.column("id", sa.String),
+        sa.column(src, src_type),
+        sa.column(dst, dst_type),
+    )
+    last_id = ""
+    while True:
+        rows = bind.execute(
+            sa.select(foods.c.id, foods.c[src])
+            .where(foods.c.id > last_id, foods.c[src].isnot(None))
+            .order_by(foods.c.id)
+            .limit(BATCH)
+        ).all()
+        if not rows:
+            return
+        bind.execute(
+            foods.update()
+            .where(foods.c.id == sa.bindparam("b_id"))
+            .values({dst: sa.bindparam("b_value")}),
+            [{"b_id": r[0], "b_value": convert(r[1])} for r in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def _swap(old: str, new: str) -> None:
+    # plain ALTERs (SQLite >= 3.35 and Postgres) keep rowids, so foods_fts stays valid
+    op.execute(f"ALTER TABLE foods DROP COLUMN {old}")
+    op.execute(f"ALTER TABLE foods RENAME COLUMN {new} TO {old}")
+
+
+def upgrade() -> None:
+    op.add_column("foods", sa.Column("raw_payload_z", sa.LargeBinary(), nullable=True))
+    _copy("raw_payload", "raw_payload_z", sa.JSON(), sa.LargeBinary(), _compress)
+    _swap("raw_payload", "raw_payload_z")
+
+
+def downgrade() -> None:
+    op.add_column("foods", sa.Column("raw_payload_json", sa.JSON(), nullable=True))
+    _copy("raw_payload", "raw_payload_json", sa.LargeBinary(), sa.JSON(), _decompress)
+    _swap("raw_payload", "raw_payload_json")
@@ -0,0 +1,31 @@
+"""add content_embedding_versions for the in-memory similarity index
+
+Revision ID: 2025_09_16_0013
+Revises: 2025_09_15_0012
+Create Date: 2025-09-16 00:13:00.000000
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2025_09_16_0013"
+down_revision: Union[str, Sequence[str], None] = "2025_09_15_0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "content_embedding_versions",
+        sa.Column("namespace", sa.String(length=50), nullable=False),
+        sa.Column("generation", sa.String(length=32), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("namespace"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("content_embedding_versions")
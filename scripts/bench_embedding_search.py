@@ -0,0 +1,142 @@
+"""
+Benchmark similarity search: the legacy per-query scan (decode every JSON
+vector, pure-Python cosine, full sort) versus ``app.ai.embeddings.EmbeddingIndex``.
+
+Usage:
+  python scripts/bench_embedding_search.py                    # 10k and 100k vectors, dim 1536
+  python scripts/bench_embedding_search.py --rows 10000 --dim 768 --queries 20
+
+Notes:
+  - The legacy scan is O(N*d) Python work per query (tens of seconds at
+    100k x 1536), and 100k JSON-encoded 1536-d vectors take ~3 GB. It is
+    therefore timed on ``--legacy-sample`` rows and scaled linearly to N;
+    the table transfer it also paid on every query is left out.
+  - The index is built from the same vectors; with NumPy the 100k x 1536
+    matrix takes ~600 MB. Without NumPy (list backend) sizes above
+    ``--max-python-values`` are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault(
+    "PHI_ENCRYPTION_KEY", "YmVuY2gtYmVuY2gtYmVuY2gtYmVuY2gtYmVuY2g0MDA="
+)
+
+from app.ai import embeddings  # noqa: E402
+from app.ai.embeddings import EmbeddingIndex  # noqa: E402
+
+np = embeddings.np
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    # frozen copy of the removed app.ai.embeddings._cosine
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(x * x for x in b))
+    if na == 0 or nb == 0:
+        return 0.0
+    return dot / (na * nb)
+
+
+def legacy_search(rows, vector, k):
+    scored = [(_cosine(vector, json.loads(raw)), ref_id) for ref_id, raw in rows]
+    scored.sort(key=lambda s: s[0], reverse=True)
+    return [ref_id for _, ref_id in scored[:k]]
+
+
+def _vectors(rows: int, dim: int, seed: int):
+    if np is not None:
+        return np.random.default_rng(seed).standard_normal(
+            (rows, dim), dtype=np.float32
+        )
+    rnd = random.Random(seed)
+    return [[rnd.gauss(0, 1) for _ in range(dim)] for _ in range(rows)]
+
+
+def _as_list(vector) -> List[float]:
+    return vector.tolist() if hasattr(vector, "tolist") else list(vector)
+
+
+def _timed(fn: Callable[[int], object], repeat: int) -> List[float]:
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _p95(samples: List[float]) -> float:
+    return sorted(samples)[int(0.95 * (len(samples) - 1))]
+
+
+def bench(rows: int, dim: int, queries: int, legacy_sample: int, k: int) -> None:
+    vectors = _vectors(rows, dim, seed=42)
+    probes = [_as_list(v) for v in _vectors(queries, dim, seed=7)]
+
+    started = time.perf_counter()
+    index = EmbeddingIndex.from_rows(
+        (f"ref-{i}", None, None, v) for i, v in enumerate(vectors)
+    )
+    build_s = time.perf_counter() - started
+
+    index_ms = _timed(lambda i: index.search(probes[i], k), queries)
+
+    sample = min(rows, legacy_sample)
+    stored = [(f"ref-{i}", json.dumps(_as_list(vectors[i]))) for i in range(sample)]
+    legacy_ms = (
+        _timed(lambda i: legacy_search(stored, probes[i], k), 1)[0] * rows / sample
+    )
+
+    sample_index = EmbeddingIndex.from_rows(
+        (ref_id, None, None, json.loads(raw)) for ref_id, raw in stored
+    )
+    same = [r["ref_id"] for r in sample_index.search(probes[0], k)] == legacy_search(
+        stored, probes[0], k
+    )
+    p50 = statistics.median(index_ms)
+    print(
+        f"{rows:>7} x {dim}: build {build_s:6.2f}s | index p50 {p50:8.2f} ms p95 {_p95(index_ms):8.2f} ms"
+        f" | legacy {'~' if sample < rows else ''}{legacy_ms:10.1f} ms/query | x{legacy_ms / p50:,.0f}"
+        f" | same top-{k}: {same}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--legacy-sample", type=int, default=10_000)
+    parser.add_argument("--max-python-values", type=int, default=20_000_000)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"index backend: {'numpy' if np is not None else 'python lists (numpy not installed)'}"
+    )
+    for rows in args.rows:
+        if np is None and rows * args.dim > args.max_python_values:
+            print(f"{rows:>7} x {args.dim}: skipped, install numpy for this size")
+            continue
+        bench(rows, args.dim, args.queries, args.legacy_sample, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Benchmark what a food search page costs with and without ``raw_payload``:
+bytes fetched from the database and Python memory to build the page.
+
+"before" is the legacy layout: ``raw_payload`` stored as plain JSON and
+loaded with every ``Food`` row (and serialized in ``FoodDetails``). "after"
+is the current one: the column is zlib-compressed and deferred, so search
+pages never read it.
+
+Usage:
+  python scripts/bench_food_payload.py                     # 2k rows, ~20 KB payloads
+  python scripts/bench_food_payload.py --rows 10000 --payload-kb 40
+
+Notes:
+  - Both layouts are seeded with identical rows in temporary SQLite files and
+    queried with the same ranked search statement (``_local_food_query``).
+  - Bytes are the summed sizes of the values returned by the DB driver;
+    memory is the ``tracemalloc`` peak while fetching and building one page.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault(
+    "PHI_ENCRYPTION_KEY", "YmVuY2gtYmVuY2gtYmVuY2gtYmVuY2gtYmVuY2g0MDA="
+)
+
+from sqlalchemy import JSON, MetaData, create_engine, insert  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from sqlalchemy.orm import Session, undefer  # noqa: E402
+
+from app.nutrition import schemas as nutrition_schemas  # noqa: E402
+from app.nutrition.models import Food, FoodSource, normalize_food_name  # noqa: E402
+from services import food_search  # noqa: E402
+
+WORDS = [
+    "pollo",
+    "yogur",
+    "arroz",
+    "queso",
+    "galletas",
+    "chocolate",
+    "leche",
+    "pan",
+    "atún",
+    "jamón",
+]
+QUERIES = ["pollo", "yogur", "queso", "galletas", "chocolate"]
+PAGE_SIZE = 10
+
+
+class LegacyFoodDetails(nutrition_schemas.FoodDetails):
+    raw_payload: Dict | None = None
+
+
+def _payload(rnd: random.Random, code: str, name: str, kb: int) -> Dict[str, Any]:
+    """OFF-like product document of roughly ``kb`` KB of JSON."""
+    product: Dict[str, Any] = {
+        "code": code,
+        "product_name": name,
+        "nutriments": {
+            f"nutrient_{i}_100g": round(rnd.random() * 100, 3) for i in range(60)
+        },
+        "images": {
+            f"front_{lang}": {
+                "rev": rnd.randint(1, 99),
+                "sizes": {"400": {"h": 400, "w": 300}},
+            }
+            for lang in ("es", "en", "fr", "de", "it", "pt")
+        },
+    }
+    ingredients = []
+    while len(json.dumps(product)) + len(json.dumps(ingredients)) < kb * 1024:
+        ingredients.append(
+            {
+                "id": f"en:{rnd.choice(WORDS)}-{rnd.randint(0, 999)}",
+                "text": " ".join(rnd.choice(WORDS) for _ in range(4)),
+                "percent_estimate": round(rnd.random() * 50, 2),
+                "vegan": rnd.choice(["yes", "no", "maybe"]),
+            }
+        )
+    product["ingredients"] = ingredients
+    return product
+
+
+def _rows(count: int, kb: int) -> List[Dict[str, Any]]:
+    rnd = random.Random(42)
+    rows = []
+    for i in range(count):
+        name = f"{' '.join(rnd.sample(WORDS, 2)).capitalize()} {i}"
+        rows.append(
+            {
+                "id": str(uuid4()),
+                "name": name,
+                "name_norm": normalize_food_name(name),
+                "source": FoodSource.openfoodfacts,
+                "source_id": str(i),
+                "calories_kcal": rnd.randint(10, 900),
+                "lang": "es",
+                "raw_payload": _payload(rnd, str(i), name, kb),
+            }
+        )
+    return rows
+
+
+def _seed(engine: Engine, table, rows: List[Dict[str, Any]]) -> None:
+    table.create(engine)
+    with engine.begin() as conn:
+        for start in range(0, len(rows), 500):
+            conn.execute(insert(table), rows[start : start + 500])
+
+
+def _value_size(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return 8
+
+
+def _page(
+    engine: Engine, statement, build: Callable[[Dict[str, Any]], Any]
+) -> Dict[str, float]:
+    sql = str(
+        statement.compile(
+            dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+    with engine.connect() as conn:
+        tracemalloc.start()
+        result = conn.exec_driver_sql(sql)
+        keys = list(result.keys())
+        raw_rows = result.fetchall()
+        page = [build(dict(zip(keys, row))) for row in raw_rows]
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    fetched = sum(_value_size(v) for row in raw_rows for v in row)
+    assert len(page) == len(raw_rows)
+    return {"bytes": fetched, "memory": peak}
+
+
+def _build_before(row: Dict[str, Any]) -> LegacyFoodDetails:
+    row = {
+        k.split("_", 1)[1] if k.startswith("foods_") else k: v for k, v in row.items()
+    }
+    row["raw_payload"] = json.loads(row["raw_payload"]) if row["raw_payload"] else None
+    return LegacyFoodDetails(**row)
+
+
+def _build_after(row: Dict[str, Any]) -> nutrition_schemas.FoodDetails:
+    row = {
+        k.split("_", 1)[1] if k.startswith("foods_") else k: v for k, v in row.items()
+    }
+    return nutrition_schemas.FoodDetails(**row)
+
+
+def _file_kb(engine: Engine) -> float:
+    return os.path.getsize(engine.url.database) / 1024
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        description="Benchmark raw_payload cost per search page"
+    )
+    ap.add_argument("--rows", type=int, default=2000)
+    ap.add_argument("--payload-kb", type=int, default=20)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    before_engine = create_engine(f"sqlite:///{tmp}/before.db", future=True)
+    after_engine = create_engine(f"sqlite:///{tmp}/after.db", future=True)
+    legacy_table = Food.__table__.to_metadata(MetaData())
+    legacy_table.c.raw_payload.type = JSON()
+
+    rows = _rows(args.rows, args.payload_kb)
+    _seed(before_engine, legacy_table, rows)
+    _seed(after_engine, Food.__table__, rows)
+
+    # plain name_norm ranking: identical statement on both files
+    Food.__table__.info["search_index"] = False
+    stats: Dict[str, Dict[str, List[float]]] = {
+        "before": {"bytes": [], "memory": []},
+        "after": {"bytes": [], "memory": []},
+    }
+    with Session(after_engine) as db:
+        for q in QUERIES:
+            query = food_search._local_food_query(db, q).limit(PAGE_SIZE)
+            for label, engine, statement, build in (
+                (
+                    "before",
+                    before_engine,
+                    query.options(undefer(Food.raw_payload)).statement,
+                    _build_before,
+                ),
+                ("after", after_engine, query.statement, _build_after),
+            ):
+                sample = _page(engine, statement, build)
+                stats[label]["bytes"].append(sample["bytes"])
+                stats[label]["memory"].append(sample["memory"])
+
+    print(
+        f"{args.rows} rows, ~{args.payload_kb} KB payloads, {PAGE_SIZE} rows per page, median of {len(QUERIES)} queries"
+    )
+    print(
+        f"{'':>8} | {'KB fetched/page':>15} | {'KB memory/page':>14} | {'DB file KB':>10}"
+    )
+    for label, engine in (("before", before_engine), ("after", after_engine)):
+        print(
+            f"{label:>8} | {statistics.median(stats[label]['bytes']) / 1024:>15.1f} | "
+            f"{statistics.median(stats[label]['memory']) / 1024:>14.1f} | {_file_kb(engine):>10.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
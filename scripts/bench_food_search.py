@@ -0,0 +1,197 @@
+"""
+Benchmark local food search latency: legacy ``ilike '%q%'`` + full count
+versus the indexed path used by ``services.food_search.search_foods``.
+
+Usage:
+  python scripts/bench_food_search.py                      # 10k, 100k, 1M rows on a temp SQLite file
+  python scripts/bench_food_search.py --rows 10000 100000
+  python scripts/bench_food_search.py --database-url postgresql://... --rows 100000
+
+Notes:
+  - SQLite databases are created from scratch (the FTS5 shadow table comes
+    from the model DDL hooks). Postgres must be migrated first
+    (``alembic upgrade head``); the script truncates ``foods`` before seeding.
+  - External fill is disabled so only local query latency is measured.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault(
+    "PHI_ENCRYPTION_KEY", "YmVuY2gtYmVuY2gtYmVuY2gtYmVuY2gtYmVuY2g0MDA="
+)
+
+from sqlalchemy import case, create_engine, func, insert, text  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from app.nutrition.models import Food, FoodSource, normalize_food_name  # noqa: E402
+from services import food_search  # noqa: E402
+from services.food_sources import UnsupportedFoodSourceError  # noqa: E402
+
+BASE_WORDS = [
+    "pollo",
+    "pechuga",
+    "salmón",
+    "atún",
+    "huevo",
+    "yogur",
+    "griego",
+    "arroz",
+    "integral",
+    "quinoa",
+    "avena",
+    "patata",
+    "boniato",
+    "aguacate",
+    "aceite",
+    "oliva",
+    "brócoli",
+    "espinacas",
+    "tomate",
+    "pimiento",
+    "cebolla",
+    "plátano",
+    "manzana",
+    "naranja",
+    "fresas",
+    "nueces",
+    "almendras",
+    "leche",
+    "queso",
+    "fresco",
+    "lentejas",
+    "garbanzos",
+    "jamón",
+    "pavo",
+    "ternera",
+    "cerdo",
+    "pasta",
+    "pan",
+    "galletas",
+    "chocolate",
+    "natural",
+]
+QUERIES = [
+    "pollo",
+    "pol",
+    "salmon",
+    "yogur gri",
+    "arroz int",
+    "queso fresco",
+    "manz",
+    "jamon",
+    "chocolate ne",
+]
+
+
+def _no_adapter():
+    raise UnsupportedFoodSourceError("benchmark: external fill disabled")
+
+
+def _seed(db: Session, rows: int, batch: int = 20_000) -> None:
+    rnd = random.Random(42)
+    db.execute(Food.__table__.delete())
+    db.commit()
+    for start in range(0, rows, batch):
+        chunk = []
+        for i in range(start, min(start + batch, rows)):
+            name = " ".join(rnd.sample(BASE_WORDS, rnd.randint(1, 4))).capitalize()
+            chunk.append(
+                {
+                    "id": str(uuid4()),
+                    "name": f"{name} {i}",
+                    "name_norm": normalize_food_name(f"{name} {i}"),
+                    "source": FoodSource.openfoodfacts,
+                    "source_id": str(i),
+                    "calories_kcal": rnd.randint(10, 900),
+                    "lang": "es",
+                }
+            )
+        db.execute(insert(Food.__table__), chunk)
+        db.commit()
+
+
+def _legacy_search(db: Session, q: str, size: int = 10) -> List[Food]:
+    local_q = (
+        db.query(Food)
+        .filter(Food.name.ilike(f"%{q}%"))
+        .order_by(
+            case((func.lower(Food.name).like(f"{q.lower()}%"), 0), else_=1),
+            func.length(Food.name),
+            Food.name,
+        )
+    )
+    local_q.count()
+    return local_q.limit(size).all()
+
+
+def _indexed_search(db: Session, q: str, size: int = 10):
+    return food_search.search_foods(db, q, page=1, page_size=size)
+
+
+def _measure(
+    db: Session, fn: Callable[[Session, str], object], repeat: int
+) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        for q in QUERIES:
+            t0 = time.perf_counter()
+            fn(db, q)
+            samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark local food search")
+    ap.add_argument(
+        "--database-url", default=None, help="Defaults to a temporary SQLite file"
+    )
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench_food_search.db"
+    engine = create_engine(url, future=True)
+    if engine.dialect.name == "sqlite":
+        Food.__table__.drop(engine, checkfirst=True)
+        Food.__table__.create(engine)
+    SessionBench = sessionmaker(bind=engine, future=True)
+    food_search.get_food_source_adapter = _no_adapter
+
+    print(
+        f"{'rows':>9} | {'legacy p50':>10} {'legacy p95':>10} | {'index p50':>10} {'index p95':>10}  (ms)"
+    )
+    for rows in args.rows:
+        with SessionBench() as db:
+            _seed(db, rows)
+            if engine.dialect.name == "postgresql":
+                db.execute(text("ANALYZE foods"))
+                db.commit()
+            legacy = _measure(db, _legacy_search, args.repeat)
+            indexed = _measure(db, _indexed_search, args.repeat)
+        print(
+            f"{rows:>9} | {legacy['p50']:>10.2f} {legacy['p95']:>10.2f} | "
+            f"{indexed['p50']:>10.2f} {indexed['p95']:>10.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+"""
+Bulk import an OpenFoodFacts or FoodData Central dump into the foods table.
+
+Sources:
+  OFF JSONL:  https://static.openfoodfacts.org/data/openfoodfacts-products.jsonl.gz
+  OFF CSV:    https://static.openfoodfacts.org/data/en.openfoodfacts.org.products.csv.gz
+  FDC JSON:   https://fdc.nal.usda.gov/download-datasets.html (Foundation / SR Legacy / Branded)
+
+Usage:
+  python scripts/import_food_dump.py --format off-jsonl --path openfoodfacts-products.jsonl.gz
+  python scripts/import_food_dump.py --format off-csv --path en.openfoodfacts.org.products.csv.gz
+  python scripts/import_food_dump.py --format fdc-json --path FoodData_Central_foundation_food_json.json
+  python scripts/import_food_dump.py ... --database-url postgresql://... --batch-size 20000
+
+Notes:
+  - Files are streamed (plain or .gz); memory stays bounded by --batch-size.
+  - Progress is checkpointed to <path>.checkpoint after each batch; rerun the
+    same command to resume, or pass --restart to start over. JSONL / CSV dumps
+    resume at the saved byte offset (.gz files still decompress up to it).
+  - Existing rows (same source + source_id) are left untouched and are not
+    counted as imported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.food_import import (
+    DEFAULT_BATCH_SIZE,
+    FORMATS,
+    import_food_dump,
+)  # noqa: E402
+
+
+def _report(state, rows_per_s: float) -> None:
+    print(
+        f"  position={state['position']:>10} imported={state['imported']:>10}  {rows_per_s:,.0f} rows/s",
+        flush=True,
+    )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Bulk import OFF / FDC dumps into foods")
+    ap.add_argument("--format", required=True, choices=FORMATS)
+    ap.add_argument("--path", required=True, help="Local dump file (.gz supported)")
+    ap.add_argument(
+        "--database-url", default=None, help="Defaults to the app DATABASE_URL"
+    )
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    ap.add_argument("--checkpoint", default=None, help="Default: <path>.checkpoint")
+    ap.add_argument(
+        "--restart", action="store_true", help="Ignore an existing checkpoint"
+    )
+    ap.add_argument(
+        "--limit", type=int, default=None, help="Stop after N records (testing)"
+    )
+    ap.add_argument(
+        "--delimiter",
+        default="\t",
+        help="CSV delimiter for off-csv (OFF exports are tab separated)",
+    )
+    args = ap.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url, future=True)
+    else:
+        from app.core.database import engine
+
+    result = import_food_dump(
+        engine,
+        Path(args.path),
+        args.format,
+        batch_size=args.batch_size,
+        checkpoint=Path(args.checkpoint) if args.checkpoint else None,
+        restart=args.restart,
+        limit=args.limit,
+        delimiter=args.delimiter,
+        progress=_report,
+    )
+    print(
+        f"Read {result.read} records, imported {result.imported}, skipped {result.skipped} "
+        f"in {result.seconds:.1f}s ({result.rows_per_s:,.0f} rows/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
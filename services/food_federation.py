@@ -0,0 +1,206 @@
+"""Federated food source adapter.
+
+Queries several ``FoodSourceAdapter`` instances in parallel so a slow or
+rate-limited source (typically OFF) does not leave users without results when
+another one (FDC) can answer. Each source gets its own deadline, a hedged
+second request can be fired when a source is slower than a threshold, and the
+whole search returns within a fixed latency budget with whatever arrived.
+Results are merged in source priority order and deduplicated by barcode and
+normalized name.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from services.food_source_cache import normalize_query
+from services.food_sources import FoodDetails, FoodHit, FoodSourceAdapter
+
+logger = logging.getLogger(__name__)
+
+_RECENT_HITS_MAX = 5000
+
+
+def _barcode_key(barcode: Optional[str]) -> Optional[str]:
+    # FDC gtinUpc is often zero-padded to 13/14 digits, OFF keeps the raw EAN
+    digits = (barcode or "").strip().lstrip("0")
+    return digits if digits.isdigit() else None
+
+
+def merge_hits(
+    results: Dict[str, List[FoodHit]], order: List[str], limit: int
+) -> List[FoodHit]:
+    """Concatenate hits in source priority order, dropping barcode/name duplicates."""
+    seen_barcodes = set()
+    seen_names = set()
+    merged: List[FoodHit] = []
+    for source in order:
+        for hit in results.get(source) or []:
+            barcode = _barcode_key(hit.barcode)
+            name = normalize_query(hit.name)
+            if (barcode and barcode in seen_barcodes) or name in seen_names:
+                continue
+            if barcode:
+                seen_barcodes.add(barcode)
+            seen_names.add(name)
+            merged.append(hit)
+            if len(merged) >= limit:
+                return merged
+    return merged
+
+
+class FederatedFoodSourceAdapter:
+    """``FoodSourceAdapter`` fanning out to several sources.
+
+    ``adapters`` is ordered by priority. ``deadlines`` overrides ``deadline_s``
+    per source; no source is awaited past ``budget_s``. With ``hedge_after_s``
+    set, a source that has not answered by then gets a second identical request
+    and the first response wins.
+    """
+
+    def __init__(
+        self,
+        adapters: Dict[str, FoodSourceAdapter],
+        *,
+        deadline_s: float = 1.5,
+        deadlines: Optional[Dict[str, float]] = None,
+        budget_s: float = 2.0,
+        hedge_after_s: Optional[float] = 0.4,
+        max_workers: Optional[int] = None,
+    ):
+        if not adapters:
+            raise ValueError("FederatedFoodSourceAdapter needs at least one source")
+        self.adapters = dict(adapters)
+        self.order = list(self.adapters)
+        self.deadline_s = deadline_s
+        self.deadlines = dict(deadlines or {})
+        self.budget_s = budget_s
+        self.hedge_after_s = hedge_after_s or None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or 4 * len(self.adapters),
+            thread_name_prefix="food-federated",
+        )
+        # source_id -> source of recent hits, so get_details() knows where to go
+        self._recent: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {
+                "requests": 0,
+                "hedges": 0,
+                "hedge_wins": 0,
+                "timeouts": 0,
+                "errors": 0,
+            }
+            for name in self.order
+        }
+
+    def _count(self, source: str, key: str) -> None:
+        with self._lock:
+            self._stats[source][key] += 1
+
+    def _remember(self, hits: List[FoodHit]) -> None:
+        with self._lock:
+            for hit in hits:
+                self._recent[hit.source_id] = hit.source
+                self._recent.move_to_end(hit.source_id)
+            while len(self._recent) > _RECENT_HITS_MAX:
+                self._recent.popitem(last=False)
+
+    def search(self, query: str, page: int = 1, page_size: int = 10) -> List[FoodHit]:
+        start = time.monotonic()
+        budget_end = start + self.budget_s
+        deadline = {
+            name: min(start + self.deadlines.get(name, self.deadline_s), budget_end)
+            for name in self.order
+        }
+        hedge_at = start + self.hedge_after_s if self.hedge_after_s else None
+        hedge_futures = set()
+
+        def submit(name: str, hedge: bool = False) -> Future:
+            self._count(name, "hedges" if hedge else "requests")
+            future = self._executor.submit(
+                self.adapters[name].search, query, page=page, page_size=page_size
+            )
+            if hedge:
+                hedge_futures.add(future)
+            return future
+
+        pending: Dict[Future, str] = {submit(name): name for name in self.order}
+        results: Dict[str, List[FoodHit]] = {}
+        failed = set()
+        hedged = set()
+
+        while pending:
+            now = time.monotonic()
+            for future, name in list(pending.items()):
+                if name in results or now >= deadline[name]:
+                    del pending[future]
+            if not pending:
+                break
+
+            if hedge_at is not None and now >= hedge_at:
+                for name in set(pending.values()) - hedged:
+                    hedged.add(name)
+                    pending[submit(name, hedge=True)] = name
+
+            events = [deadline[name] for name in pending.values()]
+            if hedge_at is not None and now < hedge_at:
+                events.append(hedge_at)
+            done, _ = wait(
+                list(pending),
+                timeout=max(min(events) - now, 0),
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                name = pending.pop(future)
+                if name in results:
+                    continue
+                try:
+                    results[name] = future.result()
+                except Exception as ex:
+                    if name not in pending.values():
+                        failed.add(name)
+                        self._count(name, "errors")
+                    logger.warning(
+                        "Federated search on %s failed for %r: %s", name, query, ex
+                    )
+                    continue
+                if future in hedge_futures:
+                    self._count(name, "hedge_wins")
+
+        for name in self.order:
+            if name not in results and name not in failed:
+                self._count(name, "timeouts")
+                logger.info(
+                    "Federated search on %s exceeded its deadline for %r", name, query
+                )
+
+        merged = merge_hits(results, self.order, page_size)
+        self._remember(merged)
+        return merged
+
+    def get_details_from(self, source: str, source_id: str) -> FoodDetails:
+        return self.adapters[source].get_details(source_id)
+
+    def get_details(self, source_id: str) -> FoodDetails:
+        """Resolve via the source that returned ``source_id``; else try each in order."""
+        with self._lock:
+            source = self._recent.get(source_id)
+        if source in self.adapters:
+            return self.get_details_from(source, source_id)
+        last_exc: Optional[Exception] = None
+        for name in self.order:
+            try:
+                return self.get_details_from(name, source_id)
+            except Exception as ex:
+                last_exc = ex
+        raise last_exc  # type: ignore[misc]
+
+    def federation_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
@@ -0,0 +1,415 @@
+"""Offline bulk import of OpenFoodFacts / FoodData Central dumps into ``foods``.
+
+Dumps are streamed record by record (bounded memory), mapped with the same
+logic as ``OpenFoodFactsAdapter.get_details`` / ``FdcAdapter.get_details`` and
+written in large batches: ``COPY`` into a temp table + ``INSERT ... ON CONFLICT
+DO NOTHING`` on Postgres, ``executemany`` of ``INSERT OR IGNORE`` on SQLite.
+Progress is checkpointed after every committed batch: JSONL and CSV dumps record
+the byte offset reached and resume with a ``seek`` instead of re-reading what was
+already imported; re-importing rows is harmless (unique source/source_id).
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy.engine import Engine
+
+from app.core.types import compress_json
+from app.nutrition.models import normalize_food_name
+from services.food_search import food_values_from_details
+from services.food_sources import FdcAdapter, FoodDetails, OpenFoodFactsAdapter
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("off-jsonl", "off-csv", "fdc-json")
+DEFAULT_BATCH_SIZE = 5000
+
+COLUMNS = (
+    "id",
+    "name",
+    "name_norm",
+    "brand",
+    "source",
+    "source_id",
+    "calories_kcal",
+    "protein_g",
+    "carbs_g",
+    "fat_g",
+    "raw_payload",
+    "lang",
+    "created_at",
+    "updated_at",
+)
+
+# nutriment columns of the OFF CSV export consumed by OpenFoodFactsAdapter.map_product
+OFF_CSV_NUTRIMENTS = (
+    "energy-kcal_100g",
+    "energy_100g",
+    "proteins_100g",
+    "carbohydrates_100g",
+    "fat_100g",
+)
+
+_JSON_SEP_RE = re.compile(r"[\s,]*")
+
+
+# --- readers ---------------------------------------------------------------
+
+
+def _open_text(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _open_binary(path: Path):
+    # GzipFile.seek works on uncompressed offsets (it decompresses forward, but
+    # skips the JSON/CSV parsing of everything before the checkpoint)
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+class _OffsetLines:
+    """Decoded lines of a binary file, tracking the byte offset consumed so far."""
+
+    def __init__(self, fh, offset: int) -> None:
+        self.fh = fh
+        self.offset = offset
+
+    def __iter__(self) -> Iterator[str]:
+        for raw in self.fh:
+            self.offset += len(raw)
+            yield raw.decode("utf-8")
+
+
+def iter_json_array(fh, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Yield the items of the first JSON array in ``fh`` without loading it whole.
+
+    FDC bulk files are ``{"FoundationFoods": [...]}`` (or SRLegacyFoods,
+    BrandedFoods...) or a bare list; either way the food array is the first
+    ``[`` in the file. Memory is bounded by ``chunk_size`` plus the largest item.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            return
+        start = chunk.find("[")
+        if start >= 0:
+            buf = chunk[start + 1 :]
+            break
+
+    pos = 0
+    while True:
+        pos = _JSON_SEP_RE.match(buf, pos).end()
+        if pos >= len(buf):
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                return
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def iter_records(
+    path: Path, fmt: str, *, delimiter: str = "\t", offset: int = 0
+) -> Iterator[Tuple[Any, int]]:
+    """``(raw record, resume offset)`` pairs of a dump, starting at ``offset``.
+
+    The resume offset is the byte offset after the record for JSONL and CSV
+    (the reader seeks straight to it) and the record index for FDC JSON, whose
+    array is skipped item by item. Parsing is left to ``map_record``.
+    """
+    if fmt == "off-jsonl":
+        with _open_binary(path) as fh:
+            fh.seek(offset)
+            for line in fh:
+                offset += len(line)
+                yield line, offset  # json.loads takes the bytes as is
+    elif fmt == "off-csv":
+        csv.field_size_limit(sys.maxsize)
+        with _open_binary(path) as fh:
+            lines = _OffsetLines(fh, 0)
+            reader = csv.reader(lines, delimiter=delimiter)
+            header = next(reader, None)
+            if header is None:
+                return
+            if offset > lines.offset:
+                fh.seek(offset)
+                lines = _OffsetLines(fh, offset)
+                reader = csv.reader(lines, delimiter=delimiter)
+            for row in reader:
+                if row:  # blank lines, like csv.DictReader
+                    yield dict(zip(header, row)), lines.offset
+    elif fmt == "fdc-json":
+        with _open_text(path) as fh:
+            items = itertools.islice(iter_json_array(fh), offset, None)
+            for index, item in enumerate(items, start=offset + 1):
+                yield item, index
+    else:
+        raise ValueError(f"Unsupported format: {fmt}. Supported: {', '.join(FORMATS)}")
+
+
+def _off_product_from_csv(row: Dict[str, str]) -> Dict[str, Any]:
+    product: Dict[str, Any] = {k: v for k, v in row.items() if k and v}
+    product["nutriments"] = {k: row[k] for k in OFF_CSV_NUTRIMENTS if row.get(k)}
+    return product
+
+
+def map_record(record: Any, fmt: str) -> Optional[FoodDetails]:
+    """Map a raw record with the adapters' mappers; None when unusable."""
+    if fmt == "off-jsonl":
+        if not record.strip():
+            return None
+        details = OpenFoodFactsAdapter.map_product(json.loads(record))
+    elif fmt == "off-csv":
+        details = OpenFoodFactsAdapter.map_product(_off_product_from_csv(record))
+    else:
+        details = FdcAdapter.map_food(record)
+    if not details.name or not details.source_id:
+        return None
+    return details
+
+
+# --- writers ---------------------------------------------------------------
+
+
+def _row_from_details(details: FoodDetails, now: datetime) -> Dict[str, Any]:
+    values = food_values_from_details(details)
+    values["name"] = (values["name"] or "")[:255]
+    values["name_norm"] = normalize_food_name(values["name"])
+    if values["brand"]:
+        values["brand"] = str(values["brand"])[:255]
+    values["source_id"] = values["source_id"][:100]
+    values.update(id=str(uuid4()), lang="en", created_at=now, updated_at=now)
+    return values
+
+
+def _write_postgres(engine: Engine, rows: List[Dict[str, Any]]) -> int:
+    cols = ", ".join(COLUMNS)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        out = []
+        for col in COLUMNS:
+            value = row[col]
+            if col == "source":
+                value = value.name
+            elif col == "raw_payload":
+                value = "\\x" + compress_json(value).hex()  # bytea hex input
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            out.append(value)
+        writer.writerow(out)
+    buf.seek(0)
+
+    copy_sql = f"COPY foods_import ({cols}) FROM STDIN WITH (FORMAT csv)"
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(
+            "CREATE TEMP TABLE foods_import (LIKE foods INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        if hasattr(cur, "copy_expert"):  # psycopg2
+            cur.copy_expert(copy_sql, buf)
+        else:  # psycopg 3
+            with cur.copy(copy_sql) as copy:
+                copy.write(buf.getvalue())
+        cur.execute(
+            f"INSERT INTO foods ({cols}) SELECT {cols} FROM foods_import "
+            "ON CONFLICT (source, source_id) DO NOTHING"
+        )
+        inserted = cur.rowcount
+        raw.commit()
+        return inserted
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def _write_sqlite(engine: Engine, rows: List[Dict[str, Any]]) -> int:
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    sql = f"INSERT OR IGNORE INTO foods ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+    params = []
+    for row in rows:
+        out = []
+        for col in COLUMNS:
+            value = row[col]
+            if col == "source":
+                value = value.name
+            elif col == "raw_payload":
+                value = compress_json(value)
+            elif isinstance(value, datetime):
+                value = value.strftime("%Y-%m-%d %H:%M:%S.%f")
+            out.append(value)
+        params.append(tuple(out))
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(sql, params)  # rowcount sums the rows actually inserted
+        inserted = cur.rowcount
+        raw.commit()
+        return inserted
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def _writer_for(engine: Engine) -> Callable[[Engine, List[Dict[str, Any]]], int]:
+    writers = {"postgresql": _write_postgres, "sqlite": _write_sqlite}
+    if engine.dialect.name not in writers:
+        raise ValueError(f"Unsupported database for bulk import: {engine.dialect.name}")
+    return writers[engine.dialect.name]
+
+
+# --- checkpoint ------------------------------------------------------------
+
+
+def load_checkpoint(checkpoint: Path, path: Path, fmt: str) -> Dict[str, Any]:
+    if checkpoint.exists():
+        state = json.loads(checkpoint.read_text(encoding="utf-8"))
+        if (
+            state.get("path") == str(path.resolve())
+            and state.get("format") == fmt
+            and "offset" in state
+        ):
+            return state
+        logger.warning(
+            "Ignoring checkpoint %s: it belongs to another dump or an older importer",
+            checkpoint,
+        )
+    return {
+        "path": str(path.resolve()),
+        "format": fmt,
+        "position": 0,
+        "offset": 0,
+        "imported": 0,
+        "complete": False,
+    }
+
+
+def save_checkpoint(checkpoint: Path, state: Dict[str, Any]) -> None:
+    tmp = checkpoint.with_suffix(checkpoint.suffix + ".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, checkpoint)
+
+
+# --- driver ----------------------------------------------------------------
+
+
+@dataclass
+class ImportResult:
+    """Counters of one run; rows already in ``foods`` are neither imported nor skipped."""
+
+    read: int
+    imported: int
+    skipped: int
+    seconds: float
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_food_dump(
+    engine: Engine,
+    path: Path,
+    fmt: str,
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: Optional[Path] = None,
+    restart: bool = False,
+    limit: Optional[int] = None,
+    delimiter: str = "\t",
+    progress: Optional[Callable[[Dict[str, Any], float], None]] = None,
+) -> ImportResult:
+    """Stream ``path`` into ``foods``; returns counters for this run only."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}. Supported: {', '.join(FORMATS)}")
+    checkpoint = checkpoint or path.with_name(path.name + ".checkpoint")
+    state = load_checkpoint(checkpoint, path, fmt)
+    if restart:
+        state.update(position=0, offset=0, imported=0, complete=False)
+    if state["complete"]:
+        return ImportResult(read=0, imported=0, skipped=0, seconds=0.0)
+
+    write = _writer_for(engine)
+    records = iter_records(path, fmt, delimiter=delimiter, offset=state["offset"])
+    if limit is not None:
+        records = itertools.islice(records, limit)
+
+    read = imported = skipped = 0
+    started = time.perf_counter()
+    for batch in _batched(records, batch_size):
+        now = datetime.utcnow()
+        rows = []
+        for record, _ in batch:
+            try:
+                details = map_record(record, fmt)
+            except (ValueError, TypeError, AttributeError) as ex:
+                logger.debug("Skipping unmappable record: %s", ex)
+                details = None
+            if details is None:
+                skipped += 1
+                continue
+            rows.append(_row_from_details(details, now))
+        inserted = write(engine, rows) if rows else 0
+
+        read += len(batch)
+        imported += inserted
+        state["position"] += len(batch)
+        state["offset"] = batch[-1][1]
+        state["imported"] += inserted
+        save_checkpoint(checkpoint, state)
+        if progress:
+            progress(state, read / max(time.perf_counter() - started, 1e-9))
+
+    if limit is None or read < limit:
+        state["complete"] = True
+        save_checkpoint(checkpoint, state)
+    return ImportResult(
+        read=read,
+        imported=imported,
+        skipped=skipped,
+        seconds=time.perf_counter() - started,
+    )
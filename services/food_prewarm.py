@@ -0,0 +1,276 @@
+"""Background pre-warming of popular foods into the local ``foods`` catalog.
+
+Staple foods used by the plan generator and the names users log most often
+in ``nutrition_meal_items`` (plus the most requested smart-search queries)
+are refreshed on a schedule, so interactive requests find them locally and
+almost never wait on the live external source. Queries whose local matches
+are already fresh are skipped; the rest run through the shared (rate
+limited, cached) adapter with bounded concurrency.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.nutrition.models import (
+    Food,
+    FoodSource,
+    NutritionMealItem,
+    normalize_food_name,
+)
+from services import food_search
+from services.food_sources import (
+    FoodHit,
+    FoodSourceRateLimitedError,
+    FoodSourceUnavailableError,
+    get_food_source_adapter,
+)
+
+logger = logging.getLogger(__name__)
+
+# Spanish staples the plan generator always offers to the model
+SPANISH_STAPLE_FOODS = (
+    "pollo",
+    "salmón",
+    "atún",
+    "huevos",
+    "yogur griego",
+    "arroz integral",
+    "quinoa",
+    "avena",
+    "patata",
+    "boniato",
+    "aguacate",
+    "aceite de oliva",
+    "brócoli",
+    "espinacas",
+    "tomate",
+    "pimiento",
+    "cebolla",
+    "ajo",
+    "plátano",
+    "manzana",
+    "naranja",
+    "fresas",
+    "nueces",
+    "almendras",
+    "leche",
+    "queso fresco",
+    "lentejas",
+    "garbanzos",
+    "judías",
+)
+
+DEFAULT_TOP_N = 200
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_AGE = timedelta(days=7)
+HITS_PER_QUERY = 5
+# longest a single source call waits on the shared token bucket before its
+# query is skipped (the run goes on with the next one)
+RATE_LIMIT_MAX_WAIT_S = 120.0
+
+
+def _popular_meal_item_names(db: Session, limit: int) -> List[str]:
+    key = func.lower(NutritionMealItem.food_name)
+    rows = (
+        db.query(func.min(NutritionMealItem.food_name))
+        .filter(NutritionMealItem.food_name.isnot(None))
+        .group_by(key)
+        .order_by(func.count(NutritionMealItem.id).desc(), key)
+        .limit(limit)
+        .all()
+    )
+    return [name for (name,) in rows]
+
+
+def _popular_search_queries(db: Session, limit: int) -> List[str]:
+    try:
+        from app.ai.search_cache import SmartFoodSearchCacheEntry
+
+        rows = (
+            db.query(SmartFoodSearchCacheEntry.query)
+            .order_by(
+                SmartFoodSearchCacheEntry.hits.desc(), SmartFoodSearchCacheEntry.query
+            )
+            .limit(limit)
+            .all()
+        )
+    except Exception as ex:  # table missing when AI features were never enabled
+        db.rollback()
+        logger.debug("Smart search queries unavailable for pre-warm: %s", ex)
+        return []
+    return [q for (q,) in rows]
+
+
+def popular_food_queries(db: Session, limit: int = DEFAULT_TOP_N) -> List[str]:
+    """Staples first, then the most logged food names and most searched queries."""
+    queries: Dict[str, str] = {}
+    candidates = [
+        *SPANISH_STAPLE_FOODS,
+        *_popular_meal_item_names(db, limit),
+        *_popular_search_queries(db, limit),
+    ]
+    for query in candidates:
+        key = normalize_food_name(query)
+        if key and key not in queries:
+            queries[key] = query.strip()
+        if len(queries) >= limit:
+            break
+    return list(queries.values())
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _is_fresh(db: Session, query: str, cutoff: datetime) -> bool:
+    rows = (
+        food_search._local_food_query(db, query)
+        .with_entities(Food.updated_at)
+        .limit(HITS_PER_QUERY)
+        .all()
+    )
+    return len(rows) >= HITS_PER_QUERY and all(
+        (_as_utc(updated) or cutoff) > cutoff for (updated,) in rows
+    )
+
+
+def _refresh_hits(
+    db: Session, adapter, hits: Sequence[FoodHit], cutoff: datetime
+) -> Dict[str, int]:
+    """Insert missing hits and re-fetch stale ones; one details call per row at most."""
+    counts = {"inserted": 0, "refreshed": 0}
+    by_source: Dict[FoodSource, List[str]] = {}
+    for hit in hits:
+        by_source.setdefault(FoodSource(hit.source), []).append(hit.source_id)
+
+    stale: List[Food] = []
+    for source, ids in by_source.items():
+        existing = (
+            db.query(Food).filter(Food.source == source, Food.source_id.in_(ids)).all()
+        )
+        stale += [f for f in existing if (_as_utc(f.updated_at) or cutoff) <= cutoff]
+    counts["inserted"] = food_search._hydrate_foods_from_source(db, adapter, hits)
+
+    for food in stale:
+        details = food_search._fetch_details_safe(adapter, food.source, food.source_id)
+        if details is None:
+            continue
+        food_search._map_details_to_food_entity(details, existing=food)
+        food.updated_at = datetime.utcnow()
+        counts["refreshed"] += 1
+    if stale:
+        db.commit()
+    return counts
+
+
+class _PacedAdapter:
+    """Adapter wrapper that waits out token bucket refusals instead of failing.
+
+    Pre-warming is background work, so it paces itself to the shared rate
+    limit; an open circuit (``FoodSourceUnavailableError``) still propagates.
+    """
+
+    PACED = ("search", "get_details", "get_details_from")
+
+    def __init__(self, inner: Any, max_wait_s: float = RATE_LIMIT_MAX_WAIT_S):
+        self.inner = inner
+        self.max_wait_s = max_wait_s
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.inner, name)
+        if name not in self.PACED:
+            return attr
+
+        def paced(*args: Any, **kwargs: Any) -> Any:
+            waited = 0.0
+            while True:
+                try:
+                    return attr(*args, **kwargs)
+                except FoodSourceRateLimitedError as rl:
+                    if waited >= self.max_wait_s:
+                        raise
+                    delay = min(max(rl.retry_after_s, 0.01), self.max_wait_s - waited)
+                    time.sleep(delay)
+                    waited += delay
+
+        return paced
+
+
+def prewarm_foods(
+    session_factory: Callable[[], Session],
+    queries: Sequence[str],
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_age: timedelta = DEFAULT_MAX_AGE,
+) -> Dict[str, Any]:
+    """Refresh the local rows behind ``queries``; returns run counters.
+
+    Each worker uses its own session. Source calls wait for the shared rate
+    limit; when the circuit is open the remaining queries are skipped for
+    this run.
+    """
+    started = time.perf_counter()
+    stats: Dict[str, Any] = {
+        "queries": len(queries),
+        "fresh": 0,
+        "searched": 0,
+        "inserted": 0,
+        "refreshed": 0,
+        "errors": 0,
+        "skipped": 0,
+    }
+    try:
+        adapter = _PacedAdapter(get_food_source_adapter())
+    except Exception as ex:
+        logger.info("Food pre-warm skipped, no adapter: %s", ex)
+        stats["skipped"] = len(queries)
+        return stats
+
+    cutoff = datetime.now(timezone.utc) - max_age
+    lock = threading.Lock()
+    unavailable = threading.Event()
+
+    def warm(query: str) -> str:
+        if unavailable.is_set():
+            return "skipped"
+        with session_factory() as db:
+            if _is_fresh(db, query, cutoff):
+                return "fresh"
+            try:
+                hits = adapter.search(query, page=1, page_size=HITS_PER_QUERY)
+            except FoodSourceRateLimitedError as rl:
+                logger.info("Food pre-warm skipped %r: %s", query, rl)
+                return "skipped"
+            except FoodSourceUnavailableError as ue:
+                unavailable.set()
+                logger.info("Food pre-warm paused: %s", ue)
+                return "skipped"
+            except Exception as ex:
+                logger.warning("Food pre-warm search failed for %r: %s", query, ex)
+                return "errors"
+            counts = _refresh_hits(db, adapter, hits, cutoff)
+        with lock:
+            stats["inserted"] += counts["inserted"]
+            stats["refreshed"] += counts["refreshed"]
+        return "searched"
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, concurrency), thread_name_prefix="food-prewarm"
+    ) as pool:
+        for outcome in pool.map(warm, queries):
+            stats[outcome] += 1
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info("Food pre-warm finished: %s", stats)
+    return stats
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Optional
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 from uuid import uuid4
 
 import requests
-from sqlalchemy import case, func
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, column, func, inspect, literal_column, or_, table, text
+from sqlalchemy.orm import Query, Session
 
-from app.nutrition.models import Food, FoodSource
+from app.core.pagination import after_keys, decode_cursor, encode_cursor, query_fingerprint
+from app.nutrition.models import FOODS_FTS_TABLE, Food, FoodSource, normalize_food_name
 from app.nutrition import schemas as nutrition_schemas
 from services.food_sources import (
     FoodDetails as SourceFoodDetails,
+    FoodHit as SourceFoodHit,
+    FoodSourceUnavailableError,
     UnsupportedFoodSourceError,
     get_food_source_adapter,
 )
@@ -21,23 +27,38 @@ logger = logging.getLogger(__name__)
 
 
 MAX_PAGE_SIZE = 25
+# External fill only kicks in when the local cache has fewer hits than this
+EXTERNAL_FILL_THRESHOLD = 5
 
+# Upper bound on concurrent get_details() calls while hydrating search hits
+HYDRATION_MAX_WORKERS = 8
 
-def _map_details_to_food_entity(details: SourceFoodDetails, existing: Optional[Food] = None) -> Food:
-    brand = None
+_SEARCH_TOKEN_RE = re.compile(r"\w+")
+_PG_TS_CONFIG = literal_column("'simple'::regconfig")
+
+
+def food_values_from_details(details: SourceFoodDetails) -> Dict[str, object]:
+    """Column values of a ``Food`` row for source details (shared with the bulk importer)."""
     # Try to infer brand from raw_payload (FDC commonly has brandName/brandOwner)
     raw = details.raw_payload or {}
-    brand = raw.get("brandOwner") or raw.get("brandName")
+    return {
+        "name": details.name,
+        "name_norm": normalize_food_name(details.name),
+        "brand": raw.get("brandOwner") or raw.get("brandName"),
+        "source": FoodSource(details.source),
+        "source_id": details.source_id,
+        "calories_kcal": details.calories_kcal,
+        "protein_g": details.protein_g,
+        "carbs_g": details.carbs_g,
+        "fat_g": details.fat_g,
+        "raw_payload": raw,
+    }
+
+
+def _map_details_to_food_entity(details: SourceFoodDetails, existing: Optional[Food] = None) -> Food:
     entity = existing or Food(id=str(uuid4()))
-    entity.name = details.name
-    entity.brand = brand
-    entity.source = FoodSource(details.source)
-    entity.source_id = details.source_id
-    entity.calories_kcal = details.calories_kcal
-    entity.protein_g = details.protein_g
-    entity.carbs_g = details.carbs_g
-    entity.fat_g = details.fat_g
-    entity.raw_payload = raw
+    for key, value in food_values_from_details(details).items():
+        setattr(entity, key, value)
     # keep defaults
     return entity
 
@@ -84,6 +105,84 @@ def _ensure_food_from_source(db: Session, source: FoodSource, source_id: str) ->
     return entity
 
 
+def _fetch_details_safe(adapter, source: FoodSource, source_id: str) -> Optional[SourceFoodDetails]:
+    """``adapter.get_details`` that logs and swallows source errors (thread-safe)."""
+    try:
+        logger.info("Fetching %s details for source_id=%s", source.value, source_id)
+        get_details_from = getattr(adapter, "get_details_from", None)
+        if get_details_from is not None:  # federated adapter
+            return get_details_from(source.value, source_id)
+        return adapter.get_details(source_id)
+    except requests.exceptions.HTTPError as he:
+        if getattr(he.response, "status_code", None) == 429:
+            logger.info("%s 429 rate-limited. Skipping external fetch for %s", source.value, source_id)
+        else:
+            logger.warning("%s details HTTP error for %s: %s", source.value, source_id, he)
+    except requests.exceptions.RequestException as rex:
+        logger.warning("%s details request failed for %s: %s", source.value, source_id, rex)
+    except Exception as ex:
+        logger.exception("Unexpected error fetching details for %s: %s", source_id, ex)
+    return None
+
+
+def _bulk_upsert_foods(db: Session, rows: List[Dict[str, object]]) -> None:
+    """Insert ``rows`` in one statement, skipping (source, source_id) already stored."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    try:
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(Food).values(rows).on_conflict_do_nothing(index_elements=["source", "source_id"])
+            db.execute(stmt)
+        else:
+            db.add_all(Food(**row) for row in rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Bulk upsert of %d foods failed", len(rows))
+
+
+def _hydrate_foods_from_source(db: Session, adapter, hits: Iterable[SourceFoodHit]) -> int:
+    """Batched counterpart of ``_ensure_food_from_source`` for a list of search hits.
+
+    Looks up already cached rows with one ``IN (...)`` query per source, fetches
+    the missing details concurrently (bounded by ``HYDRATION_MAX_WORKERS``) and
+    writes every new row with a single upsert on ``uix_food_source_source_id``.
+    Returns the number of rows sent to the upsert.
+    """
+    wanted: Dict[FoodSource, List[str]] = {}
+    for h in hits:
+        ids = wanted.setdefault(FoodSource(h.source), [])
+        if h.source_id not in ids:
+            ids.append(h.source_id)
+
+    missing: List[Tuple[FoodSource, str]] = []
+    for source, ids in wanted.items():
+        existing = {
+            sid
+            for (sid,) in db.query(Food.source_id).filter(Food.source == source, Food.source_id.in_(ids))
+        }
+        missing.extend((source, sid) for sid in ids if sid not in existing)
+    if not missing:
+        return 0
+
+    workers = min(HYDRATION_MAX_WORKERS, len(missing))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="food-hydrate") as pool:
+        fetched = list(pool.map(lambda key: _fetch_details_safe(adapter, *key), missing))
+
+    rows = [
+        {"id": str(uuid4()), **food_values_from_details(details)}
+        for details in fetched
+        if details is not None
+    ]
+    _bulk_upsert_foods(db, rows)
+    return len(rows)
+
+
 def get_food(db: Session, food_id: str) -> Optional[nutrition_schemas.FoodDetails]:
     """
     Obtiene los detalles de un alimento específico por su ID.
@@ -142,61 +241,278 @@ def get_food(db: Session, food_id: str) -> Optional[nutrition_schemas.FoodDetail
         return None
 
 
+def _normalize_barcode(code: str) -> Optional[str]:
+    code = (code or "").strip()
+    return code if code.isdigit() and len(code) <= 32 else None
+
+
+def _barcode_variants(code: str) -> List[str]:
+    # OFF stores UPC-A both as 12 digits and zero-padded to EAN-13
+    variants = [code, code.lstrip("0") or code]
+    if len(code) < 13:
+        variants.append(code.zfill(13))
+    return list(dict.fromkeys(variants))
+
+
+def _barcode_adapter():
+    """Open Food Facts adapter (barcodes are its source_id), if it is configured."""
+    from app.core.config import settings
+    from services.food_sources import _configured_sources
+
+    if "openfoodfacts" not in _configured_sources(settings):
+        return None
+    try:
+        adapter = get_food_source_adapter()
+    except UnsupportedFoodSourceError as e:
+        logger.info("No adapter available: %s", e)
+        return None
+    members = getattr(adapter, "adapters", None)
+    return members.get("openfoodfacts") if members is not None else adapter
+
+
+def _foods_by_barcode(db: Session, codes: Sequence[str]) -> Dict[str, Food]:
+    variants = {v: code for code in codes for v in _barcode_variants(code)}
+    rows = db.query(Food).filter(
+        Food.source == FoodSource.openfoodfacts, Food.source_id.in_(list(variants))
+    )
+    found: Dict[str, Food] = {}
+    for row in rows:
+        code = variants[row.source_id]
+        if code not in found or row.source_id == code:  # exact match wins
+            found[code] = row
+    return found
+
+
+def lookup_foods_by_barcode(
+    db: Session, codes: Sequence[str]
+) -> Dict[str, Optional[nutrition_schemas.FoodDetails]]:
+    """Resolve product barcodes (EAN/UPC) to foods, keyed by the requested code.
+
+    All codes are looked up with one indexed ``IN`` query on
+    ``(source, source_id)``. Misses get one Open Food Facts detail fetch each
+    (concurrent, through the shared adapter and its result cache) and are
+    written through with a single upsert, so the next scan is a local hit.
+    Unknown or malformed codes map to ``None``.
+    """
+    result: Dict[str, Optional[nutrition_schemas.FoodDetails]] = {}
+    wanted: List[str] = []
+    for raw in codes:
+        code = _normalize_barcode(raw)
+        result[(raw or "").strip()] = None
+        if code and code not in wanted:
+            wanted.append(code)
+    if not wanted:
+        return result
+
+    found = _foods_by_barcode(db, wanted)
+    missing = [code for code in wanted if code not in found]
+    adapter = _barcode_adapter() if missing else None
+    if adapter is not None:
+        workers = min(HYDRATION_MAX_WORKERS, len(missing))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="food-barcode") as pool:
+            fetched = list(
+                pool.map(lambda code: _fetch_details_safe(adapter, FoodSource.openfoodfacts, code), missing)
+            )
+        rows = [
+            {"id": str(uuid4()), **food_values_from_details(details)}
+            for details in fetched
+            if details is not None and details.source == FoodSource.openfoodfacts.value
+        ]
+        if rows:
+            _bulk_upsert_foods(db, rows)
+            found.update(_foods_by_barcode(db, missing))
+
+    for code, food in found.items():
+        result[code] = nutrition_schemas.FoodDetails.model_validate(food)
+    return result
+
+
+def _has_search_index(db: Session) -> bool:
+    """Whether the dialect-specific name index exists (cached per table)."""
+    info = Food.__table__.info
+    if "search_index" not in info:
+        bind = db.get_bind()
+        if bind.dialect.name == "sqlite":
+            info["search_index"] = inspect(bind).has_table(FOODS_FTS_TABLE)
+        elif bind.dialect.name == "postgresql":
+            info["search_index"] = bool(
+                db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+            )
+        else:
+            info["search_index"] = False
+    return info["search_index"]
+
+
+def _best_term_rank(token_groups: Sequence[List[str]]):
+    """Index of the first term whose tokens all start a word of the name."""
+    norm = Food.name_norm
+    whens = [
+        (and_(*[or_(norm.like(f"{t}%"), norm.like(f"% {t}%")) for t in tokens]), i)
+        for i, tokens in enumerate(token_groups)
+    ]
+    return case(*whens, else_=len(token_groups))
+
+
+def _local_food_ranking(db: Session, q: str, terms: Optional[Sequence[str]] = None) -> Tuple[Query, List]:
+    """Unordered local matches for ``q`` (or any of ``terms``) plus their sort keys.
+
+    The keys are all ascending and end with ``Food.id``, so they define a
+    total order usable both for ``ORDER BY`` and for keyset cursors.
+    Matching runs on ``name_norm`` with normalized terms, so "platano" finds
+    "Plátano". Prefix matches on ``q`` always come first. With several terms
+    the rows matching any of them are returned once each, ranked next by
+    containing ``q`` and by the earliest term they match. Then:
+    - Postgres: tsvector prefix match or pg_trgm similarity, ranked by
+      ts_rank and similarity (fuzzy, typo tolerant).
+    - SQLite: FTS5 prefix match on every token (diacritics removed by the
+      tokenizer), ranked by bm25.
+    - Without an index: a ``like '%q%'`` scan.
+    """
+    nq = normalize_food_name(q)
+    terms = list(dict.fromkeys(t for t in (normalize_food_name(t) for t in (terms or [q])) if t)) or [nq]
+    norm = Food.name_norm
+    order = [case((norm.like(f"{nq}%"), 0), else_=1)]
+    token_groups = [g for g in (_SEARCH_TOKEN_RE.findall(t) for t in terms) if g]
+    if len(terms) > 1:
+        order += [case((norm.like(f"%{nq}%"), 0), else_=1), _best_term_rank(token_groups)]
+    tail = [func.length(Food.name), Food.name, Food.id]
+    dialect = db.get_bind().dialect.name
+
+    if token_groups and _has_search_index(db):
+        if dialect == "sqlite":
+            fts = table(FOODS_FTS_TABLE, column("rowid"))
+            match = " OR ".join(
+                "(" + " AND ".join(f'"{t}"*' for t in tokens) + ")" for tokens in token_groups
+            )
+            query = (
+                db.query(Food)
+                .join(fts, fts.c.rowid == literal_column("foods.rowid"))
+                .filter(literal_column(FOODS_FTS_TABLE).op("MATCH")(match))
+            )
+            return query, [*order, func.bm25(literal_column(FOODS_FTS_TABLE)), *tail]
+        if dialect == "postgresql":
+            vector = func.to_tsvector(_PG_TS_CONFIG, norm)
+            ts_query = func.to_tsquery(
+                _PG_TS_CONFIG,
+                " | ".join("(" + " & ".join(f"{t}:*" for t in tokens) + ")" for tokens in token_groups),
+            )
+            similarities = [func.similarity(norm, t) for t in terms]
+            similarity = similarities[0] if len(similarities) == 1 else func.greatest(*similarities)
+            query = db.query(Food).filter(or_(vector.op("@@")(ts_query), *[norm.op("%")(t) for t in terms]))
+            return query, [*order, -func.ts_rank(vector, ts_query), -similarity, *tail]
+
+    query = db.query(Food).filter(or_(*[norm.like(f"%{t}%") for t in terms]))
+    return query, [*order, *tail]
+
+
+def _local_food_query(db: Session, q: str, terms: Optional[Sequence[str]] = None) -> Query:
+    """Ranked local matches for ``q``, or for any of ``terms`` when given."""
+    query, keys = _local_food_ranking(db, q, terms)
+    return query.order_by(*keys)
+
+
+def _external_fill(db: Session, q: str, fetch_size: int) -> None:
+    """One external search for ``q`` whose hits are hydrated into ``foods``."""
+    try:
+        adapter = get_food_source_adapter()
+    except UnsupportedFoodSourceError as e:
+        logger.info("No adapter available: %s", e)
+        return
+
+    try:
+        logger.info("Calling %s search for '%s' size=%d", adapter.__class__.__name__, q, fetch_size)
+        hits = adapter.search(q, page=1, page_size=fetch_size)
+        _hydrate_foods_from_source(db, adapter, hits)
+    except requests.exceptions.HTTPError as he:
+        if getattr(he.response, "status_code", None) == 429:
+            logger.info("%s 429 rate-limited. Serving cache-only for '%s'", adapter.__class__.__name__, q)
+        else:
+            logger.warning("%s search HTTP error for '%s': %s", adapter.__class__.__name__, q, he)
+    except FoodSourceUnavailableError as ue:
+        logger.info("%s. Serving cache-only for '%s'", ue, q)
+    except requests.exceptions.RequestException as rex:
+        logger.warning("%s search request failed for '%s': %s", adapter.__class__.__name__, q, rex)
+    except Exception as ex:
+        logger.exception("Unexpected error on %s search for '%s': %s", adapter.__class__.__name__, q, ex)
+
+
+@dataclass
+class FoodSearchPage:
+    items: List[nutrition_schemas.FoodHit]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+def _search_page(
+    db: Session,
+    q: str,
+    terms: Sequence[str],
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+) -> FoodSearchPage:
+    size = min(max(page_size or 10, 1), MAX_PAGE_SIZE)
+    local_q, keys = _local_food_ranking(db, q, terms)
+    fingerprint = query_fingerprint("foods", q, list(terms))
+
+    if cursor:
+        # Keyset page: seek past the last row served, no count and no fill
+        # (the first page already did both), so it costs the same at any depth.
+        page_q = local_q.filter(after_keys(keys, decode_cursor(cursor, fingerprint, len(keys))))
+        offset = 0
+    else:
+        page = max(page or 1, 1)
+        offset = (page - 1) * size
+
+        # Only need to know whether the cache covers the requested page (or the
+        # fill threshold), so count at most that many rows instead of all matches.
+        threshold = min(offset + size, EXTERNAL_FILL_THRESHOLD)
+        local_count = local_q.with_entities(Food.id).limit(threshold).count()
+
+        # If local cache insufficient to cover requested page, try external fill
+        # But only if we have very few results to avoid excessive API calls
+        if local_count < threshold:
+            need = (offset + size) - local_count
+            # fetch a bit more than needed, within 25 max
+            _external_fill(db, q, min(MAX_PAGE_SIZE, max(need, size)))
+        page_q = local_q
+
+    # One extra row tells whether there is a next page
+    rows = page_q.add_columns(*keys).order_by(*keys).offset(offset).limit(size + 1).all()
+    next_cursor = encode_cursor(list(rows[size - 1][1:]), fingerprint) if len(rows) > size else None
+    return FoodSearchPage(
+        items=[nutrition_schemas.FoodDetails.from_orm(r[0]) for r in rows[:size]],
+        next_cursor=next_cursor,
+        total=local_q.with_entities(Food.id).count() if include_total else None,
+    )
+
+
 def search_foods(db: Session, query: str, page: int = 1, page_size: int = 10) -> List[nutrition_schemas.FoodHit]:
     q = (query or "").strip()
     if not q:
         return []
+    return _search_page(db, q, [q], page, page_size).items
 
-    size = min(max(page_size or 10, 1), MAX_PAGE_SIZE)
-    page = max(page or 1, 1)
-    offset = (page - 1) * size
-
-    # Local search with simple autocomplete ordering
-    prefix = f"{q.lower()}%"
-    local_q = (
-        db.query(Food)
-        .filter(Food.name.ilike(f"%{q}%"))
-        .order_by(
-            case((func.lower(Food.name).like(prefix), 0), else_=1),
-            func.length(Food.name),
-            Food.name,
-        )
-    )
-    local_count = local_q.count()
 
-    # If local cache insufficient to cover requested page, try external fill
-    # But only if we have very few results (less than 5) to avoid excessive API calls
-    if local_count < (offset + size) and local_count < 5:
-        try:
-            adapter = get_food_source_adapter()
-        except UnsupportedFoodSourceError as e:
-            logger.info("No adapter available: %s", e)
-            adapter = None
+def search_foods_page(
+    db: Session,
+    query: str,
+    page: int = 1,
+    page_size: int = 10,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+) -> FoodSearchPage:
+    """``search_foods`` plus an opaque ``next_cursor`` and an optional total.
 
-        if adapter is not None:
-            need = (offset + size) - local_count
-            # fetch a bit more than needed, within 25 max
-            fetch_size = min(MAX_PAGE_SIZE, max(need, size))
-            try:
-                logger.info("Calling %s search for '%s' size=%d", adapter.__class__.__name__, q, fetch_size)
-                hits = adapter.search(q, page=1, page_size=fetch_size)
-                for h in hits:
-                    # Map source string to FoodSource enum
-                    source_enum = FoodSource(h.source)
-                    _ensure_food_from_source(db, source_enum, h.source_id)
-            except requests.exceptions.HTTPError as he:
-                if getattr(he.response, "status_code", None) == 429:
-                    logger.info("%s 429 rate-limited. Serving cache-only for '%s'", adapter.__class__.__name__, q)
-                else:
-                    logger.warning("%s search HTTP error for '%s': %s", adapter.__class__.__name__, q, he)
-            except requests.exceptions.RequestException as re:
-                logger.warning("%s search request failed for '%s': %s", adapter.__class__.__name__, q, re)
-            except Exception as ex:
-                logger.exception("Unexpected error on %s search for '%s': %s", adapter.__class__.__name__, q, ex)
-
-    # Re-query for the requested page after potential fill
-    rows: List[Food] = local_q.offset(offset).limit(size).all()
-    return [nutrition_schemas.FoodDetails.from_orm(r) for r in rows]
+    Passing ``cursor`` (from a previous page with the same query) continues
+    after that page via keyset pagination and ignores ``page``. Raises
+    ``InvalidCursorError`` for malformed cursors or cursors of another query.
+    """
+    q = (query or "").strip()
+    if not q:
+        return FoodSearchPage(items=[], total=0 if include_total else None)
+    return _search_page(db, q, [q], page, page_size, cursor=cursor, include_total=include_total)
 
 
 def search_foods_smart(
@@ -245,42 +561,12 @@ def search_foods_smart(
             logger.warning(f"No se pudo mejorar la búsqueda con IA: {e}")
             enhanced_terms = [q]
     
-    # Buscar con todos los términos mejorados
-    all_results = []
-    seen_ids = set()
-    
-    for term in enhanced_terms:
-        if not term.strip():
-            continue
-            
-        # Usar la función de búsqueda existente para cada término
-        term_results = search_foods(db, term, page=1, page_size=page_size)
-        
-        # Agregar resultados únicos
-        for result in term_results:
-            if result.id not in seen_ids:
-                all_results.append(result)
-                seen_ids.add(result.id)
-    
-    # Ordenar por relevancia (coincidencias exactas primero)
-    def relevance_score(hit: nutrition_schemas.FoodHit) -> int:
-        name_lower = hit.name.lower()
-        query_lower = q.lower()
-        
-        if name_lower.startswith(query_lower):
-            return 0  # Máxima relevancia
-        elif query_lower in name_lower:
-            return 1  # Alta relevancia
-        else:
-            return 2  # Baja relevancia
-    
-    all_results.sort(key=relevance_score)
-    
-    # Paginar los resultados
-    size = min(max(page_size or 10, 1), MAX_PAGE_SIZE)
-    page = max(page or 1, 1)
-    offset = (page - 1) * size
-    
-    return all_results[offset:offset + size]
-
+    # Una sola consulta para la unión de términos (deduplicada y ordenada en
+    # SQL) y, como mucho, un relleno externo con la consulta original
+    terms: List[str] = []
+    for term in enhanced_terms or []:
+        term = (term or "").strip()
+        if term and term.lower() not in {t.lower() for t in terms}:
+            terms.append(term)
 
+    return _search_page(db, q, terms or [q], page, page_size).items
@@ -0,0 +1,212 @@
+"""TTL cache in front of external food source adapters.
+
+Wraps a ``FoodSourceAdapter`` so repeated ``search``/``get_details`` calls for
+the same normalized query or source_id are served without hitting the network.
+Empty search results and "product not found" lookups are cached too (negative
+caching, shorter TTL) so typo-heavy autocomplete traffic does not hammer the
+upstream source. Backed by an in-process LRU, or Redis when configured.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from services.food_sources import FoodDetails, FoodHit, FoodSourceAdapter
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_NOT_FOUND = {"not_found": True}
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", query or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _WS_RE.sub(" ", text).strip().lower()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU with a per-entry TTL."""
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisTTLCache:
+    """Same interface as ``TTLCache`` on top of Redis (JSON values, SETEX)."""
+
+    def __init__(self, url: str, prefix: str = "foodsrc:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return _MISSING
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.setex(self.prefix + key, max(int(ttl), 1), json.dumps(value))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*"))
+
+
+def _is_not_found(exc: requests.exceptions.HTTPError) -> bool:
+    # OFF raises HTTPError without a response for missing products
+    status = getattr(exc.response, "status_code", None)
+    return status is None or status == 404
+
+
+class CachedFoodSourceAdapter:
+    """Adapter decorator adding positive and negative result caching.
+
+    Transient failures (timeouts, 429, 5xx) are never cached. Attributes not
+    defined here (``session``, ``pool_stats``...) are delegated to the wrapped
+    adapter.
+    """
+
+    def __init__(
+        self,
+        inner: FoodSourceAdapter,
+        *,
+        source: str,
+        backend: Optional[Any] = None,
+        ttl: float = 86400,
+        negative_ttl: float = 3600,
+    ):
+        self.inner = inner
+        self.source = source
+        self.backend = backend if backend is not None else TTLCache()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "errors": 0}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _get(self, key: str) -> Any:
+        try:
+            return self.backend.get(key)
+        except Exception as ex:  # cache outages must not break search
+            self._count("errors")
+            logger.warning("Food source cache read failed for %s: %s", key, ex)
+            return _MISSING
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as ex:
+            self._count("errors")
+            logger.warning("Food source cache write failed for %s: %s", key, ex)
+
+    def search(self, query: str, page: int = 1, page_size: int = 10) -> List[FoodHit]:
+        key = f"{self.source}:search:{normalize_query(query)}:{page}:{page_size}"
+        cached = self._get(key)
+        if cached is not _MISSING:
+            self._count("hits" if cached else "negative_hits")
+            return [FoodHit(**h) for h in cached]
+
+        self._count("misses")
+        hits = self.inner.search(query, page=page, page_size=page_size)
+        self._set(
+            key, [h.model_dump() for h in hits], self.ttl if hits else self.negative_ttl
+        )
+        return hits
+
+    def get_details(self, source_id: str) -> FoodDetails:
+        key = f"{self.source}:details:{source_id}"
+        cached = self._get(key)
+        if cached is not _MISSING:
+            if cached == _NOT_FOUND:
+                self._count("negative_hits")
+                raise requests.exceptions.HTTPError(
+                    f"Product {source_id} not found (cached)"
+                )
+            self._count("hits")
+            return FoodDetails(**cached)
+
+        self._count("misses")
+        try:
+            details = self.inner.get_details(source_id)
+        except requests.exceptions.HTTPError as he:
+            if _is_not_found(he):
+                self._set(key, _NOT_FOUND, self.negative_ttl)
+            raise
+        self._set(key, details.model_dump(), self.ttl)
+        return details
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            round((stats["hits"] + stats["negative_hits"]) / lookups, 3)
+            if lookups
+            else 0.0
+        )
+        stats["backend"] = self.backend.__class__.__name__
+        return stats
+
+
+def build_cache_backend(settings) -> Any:
+    """Redis when ``FOOD_SOURCE_CACHE_REDIS_URL`` is set, otherwise in-process LRU."""
+    url = getattr(settings, "FOOD_SOURCE_CACHE_REDIS_URL", None)
+    if url:
+        try:
+            return RedisTTLCache(url)
+        except Exception as ex:
+            logger.warning(
+                "Redis food source cache unavailable, using in-process LRU: %s", ex
+            )
+    return TTLCache(maxsize=settings.FOOD_SOURCE_CACHE_MAXSIZE)
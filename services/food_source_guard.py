@@ -0,0 +1,336 @@
+"""Shared rate limiting and circuit breaking for external food sources.
+
+Every worker process goes through the same per-source state, kept in Redis or,
+without Redis, in a SQLite file used as a cross-process lock:
+
+- a token bucket caps the request rate per source for the whole deployment;
+- a circuit breaker opens after ``failure_threshold`` consecutive 429/5xx or
+  connection failures and keeps the source in cache-only mode for a cool-down
+  (or the server's ``Retry-After``, if longer). After the cool-down one probe
+  request is let through: success closes the breaker, failure reopens it.
+
+Refused calls raise ``FoodSourceUnavailableError`` so callers fall back to
+locally cached data instead of retrying on their own. Token bucket refusals
+raise its subclass ``FoodSourceRateLimitedError``, which carries the wait until
+the next token for background jobs that can afford to pace themselves.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+
+from services.food_sources import (
+    FoodDetails,
+    FoodHit,
+    FoodSourceAdapter,
+    FoodSourceRateLimitedError,
+    FoodSourceUnavailableError,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+DEFAULT_SQLITE_PATH = os.path.join(
+    tempfile.gettempdir(), "planifitai_food_source_guard.sqlite3"
+)
+
+
+def _new_state(capacity: float, now: float) -> Dict[str, Any]:
+    return {
+        "tokens": capacity,
+        "updated": now,
+        "state": CLOSED,
+        "failures": 0,
+        "opened_until": 0.0,
+        "probe_until": 0.0,
+        "trips": 0,
+        "throttled": 0,
+        "last_error": None,
+    }
+
+
+class SQLiteGuardStore:
+    """Per-source JSON state in a SQLite file; ``BEGIN IMMEDIATE`` serializes writers."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_SQLITE_PATH,
+        timeout: float = 5.0,
+        table: str = "food_source_guard",
+    ):
+        self.path = path
+        self.timeout = timeout
+        self.table = table
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (source TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA synchronous=OFF")
+        return conn
+
+    @contextmanager
+    def transaction(
+        self, source: str, default: Callable[[], Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT data FROM {self.table} WHERE source = ?", (source,)
+            ).fetchone()
+            state = json.loads(row[0]) if row else default()
+            yield state
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (source, data) VALUES (?, ?)",
+                (source, json.dumps(state)),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def read(self, source: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                f"SELECT data FROM {self.table} WHERE source = ?", (source,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+
+class RedisGuardStore:
+    """Same interface on Redis: a short per-source lock around a JSON value."""
+
+    def __init__(self, url: str, prefix: str = "foodsrc:guard:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    @contextmanager
+    def transaction(
+        self, source: str, default: Callable[[], Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        key = self.prefix + source
+        with self.client.lock(key + ":lock", timeout=2, blocking_timeout=2):
+            raw = self.client.get(key)
+            state = json.loads(raw) if raw else default()
+            yield state
+            self.client.set(key, json.dumps(state))
+
+    def read(self, source: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self.prefix + source)
+        return json.loads(raw) if raw else None
+
+
+def _retry_after_s(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def is_source_failure(exc: BaseException) -> bool:
+    """429/5xx, exhausted retries, timeouts and connection errors trip the breaker."""
+    if isinstance(exc, FoodSourceUnavailableError):
+        return False
+    if isinstance(exc, requests.exceptions.HTTPError):
+        status = getattr(exc.response, "status_code", None)
+        return status is not None and (status == 429 or status >= 500)
+    return isinstance(
+        exc,
+        (
+            requests.exceptions.RetryError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ),
+    )
+
+
+class FoodSourceGuard:
+    """Token bucket + circuit breaker over a shared store, per source."""
+
+    def __init__(
+        self,
+        store: Any,
+        *,
+        rate_per_min: Optional[Dict[str, float]] = None,
+        default_rate_per_min: float = 60.0,
+        burst: int = 10,
+        failure_threshold: int = 5,
+        cooldown_s: float = 60.0,
+        probe_timeout_s: float = 10.0,
+    ):
+        self.store = store
+        self.rate_per_min = dict(rate_per_min or {})
+        self.default_rate_per_min = default_rate_per_min
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.probe_timeout_s = probe_timeout_s
+
+    def _default(self) -> Dict[str, Any]:
+        return _new_state(float(self.burst), time.time())
+
+    def acquire(self, source: str) -> None:
+        """Take a token or raise ``FoodSourceUnavailableError`` (never blocks)."""
+        now = time.time()
+        rate = self.rate_per_min.get(source, self.default_rate_per_min) / 60.0
+        refusal: Optional[str] = None
+        retry_after_s: Optional[float] = None
+        with self.store.transaction(source, self._default) as state:
+            if state["state"] == OPEN and now >= state["opened_until"]:
+                state.update(state=HALF_OPEN, probe_until=0.0)
+            if state["state"] == OPEN:
+                refusal = f"{source} circuit open (cache-only mode)"
+            elif state["state"] == HALF_OPEN and now < state["probe_until"]:
+                refusal = f"{source} circuit half-open, probe in flight"
+            else:
+                elapsed = max(now - state["updated"], 0.0)
+                state["tokens"] = min(
+                    float(self.burst), state["tokens"] + elapsed * rate
+                )
+                state["updated"] = now
+                if state["tokens"] < 1.0:
+                    state["throttled"] += 1
+                    refusal = f"{source} rate limit reached"
+                    retry_after_s = (
+                        (1.0 - state["tokens"]) / rate if rate > 0 else self.cooldown_s
+                    )
+                else:
+                    state["tokens"] -= 1.0
+                    if state["state"] == HALF_OPEN:
+                        state["probe_until"] = now + self.probe_timeout_s
+        if retry_after_s is not None:
+            raise FoodSourceRateLimitedError(refusal, retry_after_s=retry_after_s)
+        if refusal:
+            raise FoodSourceUnavailableError(refusal)
+
+    def record_success(self, source: str) -> None:
+        current = self.store.read(source)
+        if current is None or (current["state"] == CLOSED and not current["failures"]):
+            return  # nothing to reset; keep the happy path read-only
+        with self.store.transaction(source, self._default) as state:
+            if state["state"] != CLOSED:
+                logger.info("Food source %s recovered; closing circuit", source)
+            state.update(state=CLOSED, failures=0, probe_until=0.0)
+
+    def record_failure(self, source: str, exc: BaseException) -> None:
+        now = time.time()
+        with self.store.transaction(source, self._default) as state:
+            state["failures"] += 1
+            state["last_error"] = str(exc)[:200]
+            if (
+                state["state"] == HALF_OPEN
+                or state["failures"] >= self.failure_threshold
+            ):
+                cooldown = max(self.cooldown_s, _retry_after_s(exc) or 0.0)
+                if state["state"] != OPEN:
+                    state["trips"] += 1
+                    logger.warning(
+                        "Food source %s circuit open for %.0fs after: %s",
+                        source,
+                        cooldown,
+                        exc,
+                    )
+                state.update(state=OPEN, opened_until=now + cooldown, probe_until=0.0)
+
+    def status(self, source: str) -> Dict[str, Any]:
+        state = self.store.read(source) or self._default()
+        now = time.time()
+        rate = self.rate_per_min.get(source, self.default_rate_per_min)
+        tokens = min(
+            float(self.burst),
+            state["tokens"] + max(now - state["updated"], 0.0) * rate / 60.0,
+        )
+        return {
+            "state": state["state"],
+            "cache_only": state["state"] == OPEN and now < state["opened_until"],
+            "consecutive_failures": state["failures"],
+            "retry_in_s": (
+                round(max(state["opened_until"] - now, 0.0), 1)
+                if state["state"] == OPEN
+                else 0.0
+            ),
+            "trips": state["trips"],
+            "throttled": state["throttled"],
+            "tokens_available": round(tokens, 2),
+            "rate_per_min": rate,
+            "burst": self.burst,
+            "last_error": state["last_error"],
+        }
+
+
+class GuardedFoodSourceAdapter:
+    """Adapter decorator sending every call through a ``FoodSourceGuard``."""
+
+    def __init__(
+        self, inner: FoodSourceAdapter, *, source: str, guard: FoodSourceGuard
+    ):
+        self.inner = inner
+        self.source = source
+        self.guard = guard
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+    def _call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        self.guard.acquire(self.source)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as ex:
+            if is_source_failure(ex):
+                self.guard.record_failure(self.source, ex)
+            elif isinstance(ex, requests.exceptions.HTTPError):
+                self.guard.record_success(self.source)  # e.g. 404: the source is up
+            raise
+        self.guard.record_success(self.source)
+        return result
+
+    def search(self, query: str, page: int = 1, page_size: int = 10) -> List[FoodHit]:
+        return self._call(self.inner.search, query, page=page, page_size=page_size)
+
+    def get_details(self, source_id: str) -> FoodDetails:
+        return self._call(self.inner.get_details, source_id)
+
+
+def build_guard(settings) -> FoodSourceGuard:
+    """Redis-backed when ``FOOD_SOURCE_GUARD_REDIS_URL`` is set, otherwise a SQLite file."""
+    url = settings.FOOD_SOURCE_GUARD_REDIS_URL
+    store = (
+        RedisGuardStore(url)
+        if url
+        else SQLiteGuardStore(
+            settings.FOOD_SOURCE_GUARD_SQLITE_PATH or DEFAULT_SQLITE_PATH
+        )
+    )
+    return FoodSourceGuard(
+        store,
+        rate_per_min=settings.FOOD_SOURCE_RATE_PER_MIN,
+        burst=settings.FOOD_SOURCE_RATE_BURST,
+        failure_threshold=settings.FOOD_SOURCE_BREAKER_THRESHOLD,
+        cooldown_s=settings.FOOD_SOURCE_BREAKER_COOLDOWN_S,
+    )
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+import threading
 from typing import Any, Dict, List, Optional, Protocol, runtime_checkable
 
 import requests
@@ -14,6 +16,7 @@ class FoodHit(BaseModel):
     source: str  # e.g., "fdc"
     source_id: str  # e.g., FDC fdcId
     name: str  # I18N: keep FDC name as-is in MVP
+    barcode: Optional[str] = None  # GTIN/EAN when the source exposes it
 
 
 class FoodDetails(BaseModel):
@@ -46,6 +49,69 @@ class UnsupportedFoodSourceError(RuntimeError):
     pass
 
 
+class FoodSourceUnavailableError(requests.exceptions.RequestException):
+    """Call refused locally: source throttled or its circuit breaker is open."""
+
+
+class FoodSourceRateLimitedError(FoodSourceUnavailableError):
+    """Refused by the shared token bucket only; a token is due in ``retry_after_s``."""
+
+    def __init__(self, *args: Any, retry_after_s: float = 1.0, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.retry_after_s = retry_after_s
+
+
+DEFAULT_POOL_MAXSIZE = 10
+
+
+def _build_session(
+    *,
+    retries: int,
+    allowed_methods: List[str],
+    backoff_factor: float,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+) -> requests.Session:
+    """Session with retries and a keep-alive pool of ``pool_maxsize`` sockets per host."""
+    s = requests.Session()
+    retry = Retry(
+        total=retries,
+        # 429 is not retried per process: the shared guard backs off instead
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=allowed_methods,
+        backoff_factor=backoff_factor,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_maxsize)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def session_pool_stats(session: requests.Session) -> Dict[str, Dict[str, int]]:
+    """Connection reuse counters per host for the live urllib3 pools of ``session``.
+
+    ``requests`` is the number of requests sent, ``new_connections`` the sockets
+    opened (TCP+TLS handshakes) and ``pool_hits`` the requests served on a
+    kept-alive connection.
+    """
+    stats: Dict[str, Dict[str, int]] = {}
+    seen = set()
+    for http_adapter in session.adapters.values():
+        manager = getattr(http_adapter, "poolmanager", None)
+        if manager is None or id(manager) in seen:
+            continue
+        seen.add(id(manager))
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            entry = stats.setdefault(host, {"requests": 0, "new_connections": 0, "pool_hits": 0})
+            entry["requests"] += pool.num_requests
+            entry["new_connections"] += pool.num_connections
+            entry["pool_hits"] += max(pool.num_requests - pool.num_connections, 0)
+    return stats
+
+
 class FdcAdapter:
     """
     USDA FoodData Central adapter.
@@ -73,6 +139,7 @@ class FdcAdapter:
         *,
         timeout: float = 2.5,
         retries: int = 1,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
     ):
         if not api_key:
             raise ValueError("FDC_API_KEY is required for FdcAdapter")
@@ -81,17 +148,15 @@ class FdcAdapter:
         if session is not None:
             self.session = session
         else:
-            s = requests.Session()
-            retry = Retry(
-                total=retries,
-                status_forcelist=[429, 500, 502, 503, 504],
+            self.session = _build_session(
+                retries=retries,
                 allowed_methods=["GET", "POST"],
                 backoff_factor=0.3,
+                pool_maxsize=pool_maxsize,
             )
-            adapter = HTTPAdapter(max_retries=retry)
-            s.mount("http://", adapter)
-            s.mount("https://", adapter)
-            self.session = s
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        return session_pool_stats(self.session)
 
     def search(self, query: str, page: int = 1, page_size: int = 10) -> List[FoodHit]:
         """Search foods by name.
@@ -115,6 +180,7 @@ class FdcAdapter:
                     source="fdc",
                     source_id=str(f.get("fdcId")),
                     name=f.get("description") or f.get("description", ""),
+                    barcode=f.get("gtinUpc") or None,
                 )
             )
         return hits
@@ -124,8 +190,13 @@ class FdcAdapter:
         url = f"{self.BASE_URL}/food/{source_id}?api_key={self.api_key}"
         resp = self.session.get(url, timeout=self.timeout)
         resp.raise_for_status()
-        payload = resp.json()
+        return self.map_food(resp.json(), source_id)
 
+    @classmethod
+    def map_food(cls, payload: Dict[str, Any], source_id: Optional[str] = None) -> FoodDetails:
+        """Map an FDC food object (API response or bulk download item)."""
+        if source_id is None:
+            source_id = str(payload.get("fdcId") or "")
         name = payload.get("description") or ""
 
         # Try to map macros from detailed nutrients (preferred for foundation/srLegacy)
@@ -137,8 +208,8 @@ class FdcAdapter:
                 number = int(number) if number is not None else None
             except Exception:
                 number = None
-            if number in self.NUTRIENT_MAP and fn.get("amount") is not None:
-                key, expected_unit = self.NUTRIENT_MAP[number]
+            if number in cls.NUTRIENT_MAP and fn.get("amount") is not None:
+                key, expected_unit = cls.NUTRIENT_MAP[number]
                 # Assume units are correct for MVP; real-world could validate unitName
                 macros[key] = float(fn.get("amount"))
 
@@ -199,22 +270,21 @@ class OpenFoodFactsAdapter:
         *,
         timeout: float = 2.0,
         retries: int = 1,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
     ):
         self.timeout = timeout
         if session is not None:
             self.session = session
         else:
-            s = requests.Session()
-            retry = Retry(
-                total=retries,
-                status_forcelist=[429, 500, 502, 503, 504],
+            self.session = _build_session(
+                retries=retries,
                 allowed_methods=["GET"],
                 backoff_factor=0.5,
+                pool_maxsize=pool_maxsize,
             )
-            adapter = HTTPAdapter(max_retries=retry)
-            s.mount("http://", adapter)
-            s.mount("https://", adapter)
-            self.session = s
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        return session_pool_stats(self.session)
 
     def search(self, query: str, page: int = 1, page_size: int = 10) -> List[FoodHit]:
         """Search foods by name using Open Food Facts API."""
@@ -246,6 +316,7 @@ class OpenFoodFactsAdapter:
                         source="openfoodfacts",
                         source_id=str(source_id),
                         name=name,
+                        barcode=str(product["code"]) if product.get("code") else None,
                     )
                 )
         
@@ -261,7 +332,13 @@ class OpenFoodFactsAdapter:
         product = data.get("product", {})
         if not product:
             raise requests.exceptions.HTTPError(f"Product {source_id} not found")
-        
+        return self.map_product(product, source_id)
+
+    @staticmethod
+    def map_product(product: Dict[str, Any], source_id: Optional[str] = None) -> FoodDetails:
+        """Map an OFF product object (API response or data dump row) per 100 g."""
+        if source_id is None:
+            source_id = str(product.get("code") or product.get("_id") or "")
         name = product.get("product_name") or product.get("product_name_en", "")
         
         # Extract nutritional information per 100g
@@ -316,21 +393,150 @@ class BedcaAdapter:
         raise NotImplementedError("BedcaAdapter is not implemented yet")
 
 
-def get_food_source_adapter() -> FoodSourceAdapter:
-    """Resolve the active adapter using app settings.
+# Process-wide adapter shared by requests and Celery tasks. Keyed by pid so a
+# gunicorn/celery prefork child never reuses sockets inherited from its parent.
+_adapter_lock = threading.Lock()
+_adapter_cache: Dict[str, Any] = {"pid": None, "key": None, "adapter": None}
 
-    Supports both FDC and Open Food Facts sources.
-    """
-    # Lazy import to avoid circulars
-    from app.core.config import settings
 
-    source = (settings.FOOD_SOURCE or "openfoodfacts").lower()
-    
+def _reset_after_fork() -> None:
+    global _adapter_lock
+    _adapter_lock = threading.Lock()
+    _adapter_cache.update(pid=None, key=None, adapter=None)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _build_source_adapter(settings, source: str, cache_backend: Any = None) -> FoodSourceAdapter:
+    pool_maxsize = settings.FOOD_SOURCE_POOL_MAXSIZE
     if source == "openfoodfacts":
-        return OpenFoodFactsAdapter()
+        adapter: FoodSourceAdapter = OpenFoodFactsAdapter(pool_maxsize=pool_maxsize)
     elif source == "fdc":
         if not settings.FDC_API_KEY:
             raise ValueError("FDC_API_KEY is required when FOOD_SOURCE=fdc")
-        return FdcAdapter(api_key=settings.FDC_API_KEY)
+        adapter = FdcAdapter(api_key=settings.FDC_API_KEY, pool_maxsize=pool_maxsize)
     else:
-        raise UnsupportedFoodSourceError(f"Unsupported FOOD_SOURCE: {settings.FOOD_SOURCE}. Supported: openfoodfacts, fdc")
+        raise UnsupportedFoodSourceError(f"Unsupported FOOD_SOURCE: {source}. Supported: openfoodfacts, fdc")
+
+    if settings.FOOD_SOURCE_GUARD_ENABLED:
+        from services.food_source_guard import GuardedFoodSourceAdapter, build_guard
+
+        adapter = GuardedFoodSourceAdapter(adapter, source=source, guard=build_guard(settings))
+
+    if not settings.FOOD_SOURCE_CACHE_ENABLED:
+        return adapter
+    from services.food_source_cache import CachedFoodSourceAdapter, build_cache_backend
+
+    return CachedFoodSourceAdapter(
+        adapter,
+        source=source,
+        backend=cache_backend if cache_backend is not None else build_cache_backend(settings),
+        ttl=settings.FOOD_SOURCE_CACHE_TTL_S,
+        negative_ttl=settings.FOOD_SOURCE_NEGATIVE_CACHE_TTL_S,
+    )
+
+
+def _configured_sources(settings) -> List[str]:
+    sources = [s.strip().lower() for s in (settings.FOOD_SOURCES or "").split(",") if s.strip()]
+    return sources or [(settings.FOOD_SOURCE or "openfoodfacts").lower()]
+
+
+def _build_food_source_adapter(settings) -> FoodSourceAdapter:
+    sources = _configured_sources(settings)
+    if len(sources) == 1:
+        return _build_source_adapter(settings, sources[0])
+
+    from services.food_federation import FederatedFoodSourceAdapter
+
+    cache_backend = None
+    if settings.FOOD_SOURCE_CACHE_ENABLED:
+        from services.food_source_cache import build_cache_backend
+
+        cache_backend = build_cache_backend(settings)  # keys are prefixed by source
+    return FederatedFoodSourceAdapter(
+        {source: _build_source_adapter(settings, source, cache_backend) for source in sources},
+        deadline_s=settings.FOOD_SOURCE_DEADLINE_S,
+        budget_s=settings.FOOD_SOURCE_LATENCY_BUDGET_S,
+        hedge_after_s=settings.FOOD_SOURCE_HEDGE_AFTER_S,
+    )
+
+
+def get_food_source_adapter() -> FoodSourceAdapter:
+    """Resolve the active adapter using app settings.
+
+    Supports both FDC and Open Food Facts sources; listing several in
+    ``FOOD_SOURCES`` returns a federated adapter querying them in parallel.
+    The adapter, its pooled keep-alive sessions and its result cache are built
+    once per process and reused; changing the relevant settings builds a new one.
+    """
+    # Lazy import to avoid circulars
+    from app.core.config import settings
+
+    key = (
+        tuple(_configured_sources(settings)),
+        settings.FDC_API_KEY,
+        settings.FOOD_SOURCE_POOL_MAXSIZE,
+        settings.FOOD_SOURCE_CACHE_ENABLED,
+        settings.FOOD_SOURCE_CACHE_REDIS_URL,
+        settings.FOOD_SOURCE_DEADLINE_S,
+        settings.FOOD_SOURCE_LATENCY_BUDGET_S,
+        settings.FOOD_SOURCE_HEDGE_AFTER_S,
+        settings.FOOD_SOURCE_GUARD_ENABLED,
+        settings.FOOD_SOURCE_GUARD_REDIS_URL,
+    )
+    pid = os.getpid()
+    with _adapter_lock:
+        if _adapter_cache["pid"] == pid and _adapter_cache["key"] == key:
+            return _adapter_cache["adapter"]
+        adapter = _build_food_source_adapter(settings)
+        _adapter_cache.update(pid=pid, key=key, adapter=adapter)
+        return adapter
+
+
+def reset_food_source_adapter() -> None:
+    """Drop the shared adapter (closing its pooled connections)."""
+    with _adapter_lock:
+        adapter = _adapter_cache.get("adapter")
+        _adapter_cache.update(pid=None, key=None, adapter=None)
+    members = getattr(adapter, "adapters", None) or {"": adapter}
+    for member in members.values():
+        session = getattr(member, "session", None)
+        if session is not None:
+            session.close()
+
+
+def _adapter_metrics(adapter: Any) -> Dict[str, Any]:
+    cache_stats = getattr(adapter, "cache_stats", None)
+    inner = adapter
+    while getattr(inner, "inner", None) is not None:  # unwrap cache/guard decorators
+        inner = inner.inner
+    pool_stats = getattr(inner, "pool_stats", None)
+    return {
+        "adapter": inner.__class__.__name__,
+        "hosts": pool_stats() if callable(pool_stats) else {},
+        "cache": cache_stats() if callable(cache_stats) else None,
+    }
+
+
+def food_source_pool_stats() -> Dict[str, Any]:
+    """Connection reuse and result cache metrics of the shared adapter in this process."""
+    adapter = _adapter_cache.get("adapter") if _adapter_cache.get("pid") == os.getpid() else None
+    if adapter is None:
+        return {"pid": os.getpid(), "adapter": None, "hosts": {}, "cache": None}
+    stats = {"pid": os.getpid(), **_adapter_metrics(adapter)}
+    members = getattr(adapter, "adapters", None)
+    if members:
+        stats["sources"] = {name: _adapter_metrics(member) for name, member in members.items()}
+        stats["federation"] = adapter.federation_stats()
+    return stats
+
+
+def food_source_breaker_status() -> Dict[str, Any]:
+    """Shared rate limiter / circuit breaker state of each configured source."""
+    from app.core.config import settings
+    from services.food_source_guard import build_guard
+
+    guard = build_guard(settings)
+    return {source: guard.status(source) for source in _configured_sources(settings)}
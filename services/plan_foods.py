@@ -0,0 +1,179 @@
+"""In-memory "plan foods" catalog offered to the model in nutrition plan prompts.
+
+The catalog is built from local ``foods`` rows for the staple list (the
+prewarm job keeps them fresh), so plan generation never calls the external
+food source. It is held in memory and served without I/O. Once it is older
+than the TTL, callers keep getting the current catalog while a single
+background thread rebuilds it.
+
+Every build carries a content hash ``version``. Prompts derived from the
+catalog can be cached against it and only change when the food list does.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.nutrition.models import Food
+from services import food_search
+from services.food_prewarm import SPANISH_STAPLE_FOODS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_S = 3600
+DEFAULT_SIZE = 30
+EMPTY_RETRY_S = (
+    60  # an empty catalog is retried soon, once prewarm has filled ``foods``
+)
+
+
+@dataclass(frozen=True)
+class PlanFoodsCatalog:
+    foods: Tuple[Dict[str, Any], ...]
+    version: str
+    built_at: float
+
+
+def local_plan_food(db: Session, food_name: str) -> Optional[Dict[str, Any]]:
+    """Best local match for ``food_name`` with complete macros, or ``None``."""
+    food = (
+        food_search._local_food_query(db, food_name)
+        .filter(
+            Food.calories_kcal.isnot(None),
+            Food.calories_kcal > 0,
+            Food.protein_g.isnot(None),
+        )
+        .first()
+    )
+    if food is None:
+        return None
+    return {
+        "name": food.name,
+        "source_id": food.source_id,
+        "source": food.source.value,
+        "calories_kcal": float(food.calories_kcal),
+        "protein_g": float(food.protein_g or 0),
+        "carbs_g": float(food.carbs_g or 0),
+        "fat_g": float(food.fat_g or 0),
+    }
+
+
+def build_plan_foods_catalog(
+    db: Session, names: Sequence[str] = SPANISH_STAPLE_FOODS, limit: int = DEFAULT_SIZE
+) -> PlanFoodsCatalog:
+    """Resolve ``names`` against local ``foods`` (no external calls)."""
+    foods = []
+    seen = set()
+    for name in names:
+        food = local_plan_food(db, name)
+        if food is None or (food["source"], food["source_id"]) in seen:
+            continue
+        seen.add((food["source"], food["source_id"]))
+        foods.append(food)
+        if len(foods) >= limit:
+            break
+    payload = json.dumps(foods, sort_keys=True, ensure_ascii=False)
+    version = hashlib.sha256(payload.encode()).hexdigest()[:12]
+    return PlanFoodsCatalog(foods=tuple(foods), version=version, built_at=time.time())
+
+
+class PlanFoodsCatalogHolder:
+    """Current catalog plus stale-while-revalidate refresh."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        *,
+        ttl_s: float = DEFAULT_TTL_S,
+        limit: int = DEFAULT_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.ttl_s = ttl_s
+        self.limit = limit
+        self._catalog: Optional[PlanFoodsCatalog] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self) -> PlanFoodsCatalog:
+        """Rebuild synchronously and swap the catalog in."""
+        with self.session_factory() as db:
+            catalog = build_plan_foods_catalog(db, limit=self.limit)
+        previous = self._catalog
+        self._catalog = catalog
+        if previous is None or previous.version != catalog.version:
+            logger.info(
+                "Plan foods catalog %s: %d foods", catalog.version, len(catalog.foods)
+            )
+        return catalog
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run() -> None:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception(
+                    "Plan foods catalog refresh failed; keeping version %s",
+                    self._catalog.version,
+                )
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="plan-foods-refresh", daemon=True).start()
+
+    def get(self) -> PlanFoodsCatalog:
+        catalog = self._catalog
+        if catalog is None:
+            with self._lock:
+                if self._catalog is None:
+                    self.refresh()
+            return self._catalog
+        ttl = self.ttl_s if catalog.foods else min(self.ttl_s, EMPTY_RETRY_S)
+        if time.time() - catalog.built_at >= ttl:
+            self._refresh_in_background()
+        return catalog
+
+    def invalidate(self) -> None:
+        """Force a background rebuild on the next ``get``."""
+        catalog = self._catalog
+        if catalog is not None:
+            self._catalog = PlanFoodsCatalog(
+                catalog.foods, catalog.version, built_at=0.0
+            )
+
+
+_holder: Optional[PlanFoodsCatalogHolder] = None
+_holder_lock = threading.Lock()
+
+
+def get_plan_foods_holder() -> PlanFoodsCatalogHolder:
+    global _holder
+    if _holder is None:
+        with _holder_lock:
+            if _holder is None:
+                from app.core.config import settings
+                from app.core.database import SessionLocal
+
+                _holder = PlanFoodsCatalogHolder(
+                    SessionLocal,
+                    ttl_s=settings.PLAN_FOODS_CATALOG_TTL_S,
+                    limit=settings.PLAN_FOODS_CATALOG_SIZE,
+                )
+    return _holder
+
+
+def get_plan_foods_catalog() -> PlanFoodsCatalog:
+    """Current catalog from memory; the first call in a process builds it."""
+    return get_plan_foods_holder().get()
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.config import settings
+from services import food_sources
+from services.food_federation import FederatedFoodSourceAdapter
+from services.food_sources import FdcAdapter, OpenFoodFactsAdapter
+
+
+def _stub_server(off_products=(), fdc_foods=(), delays=()):
+    """Serves OFF and FDC search; ``delays`` holds per-request sleeps consumed in order."""
+    delays = list(delays)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, payload):
+            with lock:
+                delay = delays.pop(0) if delays else 0
+            time.sleep(delay)
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply({"products": list(off_products)})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._reply({"foods": list(fdc_foods)})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server, url = _stub_server(**kwargs)
+        started.append(server)
+        return url
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def _off(url):
+    adapter = OpenFoodFactsAdapter(retries=0, timeout=5)
+    adapter.BASE_URL = url
+    return adapter
+
+
+def _fdc(url):
+    adapter = FdcAdapter("key", retries=0, timeout=5)
+    adapter.BASE_URL = f"{url}/fdc/v1"
+    return adapter
+
+
+def test_merges_sources_and_dedupes_by_barcode_and_name(servers):
+    off_url = servers(
+        off_products=[
+            {"code": "8410000000011", "product_name": "Avena integral"},
+            {"code": "2", "product_name": "Leche entera"},
+        ]
+    )
+    fdc_url = servers(
+        fdc_foods=[
+            {"fdcId": 1, "description": "Oat flakes", "gtinUpc": "08410000000011"},
+            {"fdcId": 2, "description": "LECHE  ENTERA"},
+            {"fdcId": 3, "description": "Almonds"},
+        ]
+    )
+    adapter = FederatedFoodSourceAdapter(
+        {"openfoodfacts": _off(off_url), "fdc": _fdc(fdc_url)}
+    )
+
+    hits = adapter.search("avena")
+
+    assert [(h.source, h.name) for h in hits] == [
+        ("openfoodfacts", "Avena integral"),
+        ("openfoodfacts", "Leche entera"),
+        ("fdc", "Almonds"),
+    ]
+
+
+def test_slow_source_is_dropped_at_its_deadline(servers):
+    off_url = servers(off_products=[{"code": "1", "product_name": "Pan"}], delays=[2])
+    fdc_url = servers(fdc_foods=[{"fdcId": 7, "description": "Bread"}])
+    adapter = FederatedFoodSourceAdapter(
+        {"openfoodfacts": _off(off_url), "fdc": _fdc(fdc_url)},
+        deadlines={"openfoodfacts": 0.3},
+        hedge_after_s=None,
+    )
+
+    started = time.perf_counter()
+    hits = adapter.search("pan")
+
+    assert time.perf_counter() - started < 1
+    assert [h.name for h in hits] == ["Bread"]
+    assert adapter.federation_stats()["openfoodfacts"]["timeouts"] == 1
+
+
+def test_hedged_request_wins_over_slow_first_attempt(servers):
+    off_url = servers(
+        off_products=[{"code": "1", "product_name": "Queso"}], delays=[2, 0]
+    )
+    adapter = FederatedFoodSourceAdapter(
+        {"openfoodfacts": _off(off_url)}, hedge_after_s=0.1, budget_s=3
+    )
+
+    started = time.perf_counter()
+    hits = adapter.search("queso")
+
+    assert time.perf_counter() - started < 1
+    assert [h.name for h in hits] == ["Queso"]
+    stats = adapter.federation_stats()["openfoodfacts"]
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_get_details_goes_to_the_source_of_the_hit():
+    class _Source:
+        def __init__(self, name):
+            self.name = name
+
+        def search(self, query, page=1, page_size=10):
+            return [
+                food_sources.FoodHit(
+                    source=self.name,
+                    source_id=f"{self.name}-1",
+                    name=f"{self.name} food",
+                )
+            ]
+
+        def get_details(self, source_id):
+            return food_sources.FoodDetails(
+                source=self.name, source_id=source_id, name=self.name, raw_payload={}
+            )
+
+    adapter = FederatedFoodSourceAdapter(
+        {"openfoodfacts": _Source("openfoodfacts"), "fdc": _Source("fdc")}
+    )
+    adapter.search("x")
+
+    assert adapter.get_details("fdc-1").source == "fdc"
+    assert adapter.get_details_from("openfoodfacts", "1").source == "openfoodfacts"
+
+
+def test_settings_enable_federation(monkeypatch):
+    monkeypatch.setattr(settings, "FOOD_SOURCES", "openfoodfacts, fdc")
+    monkeypatch.setattr(settings, "FDC_API_KEY", "key")
+    food_sources.reset_food_source_adapter()
+    try:
+        adapter = food_sources.get_food_source_adapter()
+        assert isinstance(adapter, FederatedFoodSourceAdapter)
+        assert adapter.order == ["openfoodfacts", "fdc"]
+        assert set(food_sources.food_source_pool_stats()["sources"]) == {
+            "openfoodfacts",
+            "fdc",
+        }
+    finally:
+        food_sources.reset_food_source_adapter()
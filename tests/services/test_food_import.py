@@ -0,0 +1,138 @@
+import io
+import json
+
+import pytest
+
+from app.core.database import engine
+from app.nutrition.models import Food
+from services.food_import import import_food_dump, iter_json_array
+
+
+@pytest.fixture(autouse=True)
+def fresh_foods_table(db_session):
+    Food.__table__.drop(engine, checkfirst=True)
+    Food.__table__.create(engine)
+
+
+def _off_product(code, name, kcal=100):
+    return {
+        "code": code,
+        "product_name": name,
+        "nutriments": {"energy-kcal_100g": kcal, "proteins_100g": 3.5, "fat_100g": 1},
+    }
+
+
+def test_iter_json_array_streams_items_across_chunks():
+    items = [
+        {"fdcId": i, "description": f"Food [{i}]", "foodNutrients": []}
+        for i in range(50)
+    ]
+    fh = io.StringIO(json.dumps({"FoundationFoods": items}))
+
+    assert list(iter_json_array(fh, chunk_size=16)) == items
+
+
+def test_import_off_jsonl(db_session, tmp_path):
+    dump = tmp_path / "off.jsonl"
+    lines = [json.dumps(_off_product(str(i), f"Galleta {i}")) for i in range(7)]
+    lines.append(json.dumps({"code": "x"}))  # no name -> skipped
+    dump.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    result = import_food_dump(engine, dump, "off-jsonl", batch_size=3)
+
+    assert (result.read, result.imported, result.skipped) == (8, 7, 1)
+    food = db_session.query(Food).filter(Food.source_id == "3").one()
+    assert food.name == "Galleta 3"
+    assert float(food.calories_kcal) == 100
+    assert float(food.protein_g) == 3.5
+
+
+def test_import_off_csv_and_fdc_json(db_session, tmp_path):
+    csv_dump = tmp_path / "off.csv"
+    csv_dump.write_text(
+        "code\tproduct_name\tenergy_100g\tproteins_100g\n"
+        "111\tAceite de oliva\t3700\t0\n",
+        encoding="utf-8",
+    )
+    fdc_dump = tmp_path / "fdc.json"
+    fdc_dump.write_text(
+        json.dumps(
+            {
+                "SRLegacyFoods": [
+                    {
+                        "fdcId": 170567,
+                        "description": "Almonds, raw",
+                        "foodNutrients": [
+                            {"nutrient": {"number": "208"}, "amount": 579},
+                            {"nutrient": {"number": "203"}, "amount": 21.2},
+                        ],
+                    }
+                ]
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    import_food_dump(engine, csv_dump, "off-csv")
+    import_food_dump(engine, fdc_dump, "fdc-json")
+
+    oil = db_session.query(Food).filter(Food.source_id == "111").one()
+    assert round(float(oil.calories_kcal)) == 884
+    almonds = db_session.query(Food).filter(Food.source_id == "170567").one()
+    assert almonds.source.value == "fdc"
+    assert float(almonds.protein_g) == 21.2
+
+
+def test_import_resumes_from_checkpoint(db_session, tmp_path):
+    dump = tmp_path / "off.jsonl"
+    dump.write_text(
+        "\n".join(json.dumps(_off_product(str(i), f"Yogur {i}")) for i in range(10))
+        + "\n",
+        encoding="utf-8",
+    )
+    checkpoint = tmp_path / "off.ckpt"
+
+    first = import_food_dump(
+        engine, dump, "off-jsonl", batch_size=2, checkpoint=checkpoint, limit=4
+    )
+    state = json.loads(checkpoint.read_text())
+    assert state["position"] == 4
+    assert state["offset"] == len(
+        b"".join(dump.read_bytes().splitlines(keepends=True)[:4])
+    )
+
+    # the resumed run seeks past the checkpoint: damaging the imported lines goes unnoticed
+    data = dump.read_bytes()
+    dump.write_bytes(b"x" * (state["offset"] - 1) + b"\n" + data[state["offset"] :])
+    second = import_food_dump(
+        engine, dump, "off-jsonl", batch_size=2, checkpoint=checkpoint
+    )
+    third = import_food_dump(engine, dump, "off-jsonl", checkpoint=checkpoint)
+
+    assert (first.read, second.read, third.read) == (4, 6, 0)
+    assert (second.imported, second.skipped) == (6, 0)
+    assert db_session.query(Food).count() == 10
+
+
+def test_import_counts_only_inserted_rows_and_resumes_csv(db_session, tmp_path):
+    dump = tmp_path / "off.csv"
+    rows = [f'{i}\t"Queso\n{i}"\t1000\t20' for i in range(5)]  # quoted multi-line names
+    dump.write_text(
+        "code\tproduct_name\tenergy_100g\tproteins_100g\n" + "\n".join(rows) + "\n",
+        encoding="utf-8",
+    )
+    checkpoint = tmp_path / "off.ckpt"
+
+    first = import_food_dump(
+        engine, dump, "off-csv", batch_size=2, checkpoint=checkpoint, limit=2
+    )
+    second = import_food_dump(
+        engine, dump, "off-csv", batch_size=2, checkpoint=checkpoint
+    )
+    again = import_food_dump(
+        engine, dump, "off-csv", checkpoint=checkpoint, restart=True
+    )
+
+    assert (first.read, first.imported, second.read, second.imported) == (2, 2, 3, 3)
+    assert (again.read, again.imported, again.skipped) == (5, 0, 0)
+    assert db_session.query(Food).filter(Food.source_id == "4").one().name == "Queso\n4"
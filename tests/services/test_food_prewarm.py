@@ -0,0 +1,226 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.core.database import engine
+from app.nutrition.models import (
+    Food,
+    FoodSource,
+    MealType,
+    NutritionMeal,
+    NutritionMealItem,
+    ServingUnit,
+)
+from services import food_prewarm
+from services.food_sources import FoodDetails, FoodHit, FoodSourceUnavailableError
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(autouse=True)
+def fresh_foods_table(db_session):
+    Food.__table__.drop(engine, checkfirst=True)
+    Food.__table__.create(engine)
+
+
+def _log_items(db, names):
+    meal = NutritionMeal(user_id=1, date=date.today(), meal_type=MealType.lunch)
+    meal.items = [
+        NutritionMealItem(
+            food_name=name,
+            serving_qty=100,
+            serving_unit=ServingUnit.g,
+            calories_kcal=100,
+            protein_g=1,
+            carbs_g=1,
+            fat_g=1,
+        )
+        for name in names
+    ]
+    db.add(meal)
+    db.commit()
+
+
+class _Adapter:
+    def __init__(self, fail_with=None, delay=0.0):
+        self.fail_with = fail_with
+        self.delay = delay
+        self.searches = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def search(self, query, page=1, page_size=10):
+        with self._lock:
+            self.searches.append(query)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if self.fail_with:
+            raise self.fail_with
+        return [
+            FoodHit(
+                source="openfoodfacts", source_id=f"{query}-{i}", name=f"{query} {i}"
+            )
+            for i in range(page_size)
+        ]
+
+    def get_details(self, source_id):
+        return FoodDetails(
+            source="openfoodfacts",
+            source_id=source_id,
+            name=source_id.replace("-", " "),
+            calories_kcal=120,
+            raw_payload={},
+        )
+
+
+def test_popular_queries_put_staples_first_then_most_logged(db_session):
+    _log_items(
+        db_session, ["Tortilla de patatas", "tortilla de patatas", "Gazpacho", "Pollo"]
+    )
+
+    queries = food_prewarm.popular_food_queries(db_session, limit=100)
+
+    staples = len(food_prewarm.SPANISH_STAPLE_FOODS)
+    assert queries[:staples] == list(food_prewarm.SPANISH_STAPLE_FOODS)
+    assert [q.lower() for q in queries[staples:]] == [
+        "tortilla de patatas",
+        "gazpacho",
+    ]  # "Pollo" is a staple
+    assert food_prewarm.popular_food_queries(db_session, limit=3) == list(
+        food_prewarm.SPANISH_STAPLE_FOODS[:3]
+    )
+
+
+def test_prewarm_inserts_then_skips_fresh_queries(db_session, monkeypatch):
+    adapter = _Adapter(delay=0.02)
+    monkeypatch.setattr(food_prewarm, "get_food_source_adapter", lambda: adapter)
+    queries = [f"alimento{i}" for i in range(6)]
+
+    stats = food_prewarm.prewarm_foods(TestingSessionLocal, queries, concurrency=2)
+
+    assert (
+        stats["searched"] == 6 and stats["inserted"] == 6 * food_prewarm.HITS_PER_QUERY
+    )
+    assert adapter.max_active <= 2
+    assert db_session.query(Food).count() == 6 * food_prewarm.HITS_PER_QUERY
+
+    adapter.searches.clear()
+    stats = food_prewarm.prewarm_foods(TestingSessionLocal, queries, concurrency=2)
+    assert stats["fresh"] == 6 and adapter.searches == []
+
+
+def test_prewarm_refreshes_stale_rows(db_session, monkeypatch):
+    adapter = _Adapter()
+    monkeypatch.setattr(food_prewarm, "get_food_source_adapter", lambda: adapter)
+    old = datetime.utcnow() - timedelta(days=30)
+    for i in range(food_prewarm.HITS_PER_QUERY):
+        db_session.add(
+            Food(
+                id=str(uuid4()),
+                name=f"kefir {i}",
+                source=FoodSource.openfoodfacts,
+                source_id=f"kefir-{i}",
+                calories_kcal=1,
+                updated_at=old,
+            )
+        )
+    db_session.commit()
+
+    stats = food_prewarm.prewarm_foods(
+        TestingSessionLocal, ["kefir"], max_age=timedelta(days=7)
+    )
+
+    assert stats["refreshed"] == food_prewarm.HITS_PER_QUERY and stats["inserted"] == 0
+    db_session.expire_all()
+    assert {float(f.calories_kcal) for f in db_session.query(Food)} == {120.0}
+
+
+def test_prewarm_stops_when_source_is_unavailable(db_session, monkeypatch):
+    adapter = _Adapter(
+        fail_with=FoodSourceUnavailableError("openfoodfacts circuit open")
+    )
+    monkeypatch.setattr(food_prewarm, "get_food_source_adapter", lambda: adapter)
+
+    stats = food_prewarm.prewarm_foods(
+        TestingSessionLocal, [f"q{i}" for i in range(5)], concurrency=1
+    )
+
+    assert len(adapter.searches) == 1
+    assert stats["skipped"] == 5 and stats["inserted"] == 0
+
+
+def test_prewarm_paces_itself_to_the_rate_limit(db_session, tmp_path, monkeypatch):
+    from services.food_source_guard import (
+        FoodSourceGuard,
+        GuardedFoodSourceAdapter,
+        SQLiteGuardStore,
+    )
+
+    now = [1_000_000.0]
+    monkeypatch.setattr("services.food_source_guard.time.time", lambda: now[0])
+    monkeypatch.setattr(
+        food_prewarm.time, "sleep", lambda s: now.__setitem__(0, now[0] + s)
+    )
+    inner = _Adapter()
+    guard = FoodSourceGuard(
+        SQLiteGuardStore(str(tmp_path / "guard.sqlite3")),
+        burst=2,
+        rate_per_min={"openfoodfacts": 60},
+    )
+    adapter = GuardedFoodSourceAdapter(inner, source="openfoodfacts", guard=guard)
+    monkeypatch.setattr(food_prewarm, "get_food_source_adapter", lambda: adapter)
+    queries = [f"q{i}" for i in range(5)]
+
+    stats = food_prewarm.prewarm_foods(TestingSessionLocal, queries, concurrency=1)
+
+    assert guard.status("openfoodfacts")["throttled"] > 0
+    assert inner.searches == queries
+    assert stats["searched"] == 5 and stats["skipped"] == 0
+    assert stats["inserted"] == 5 * food_prewarm.HITS_PER_QUERY
+
+
+def test_prewarm_is_scheduled_with_celery_beat():
+    from app.background.celery_app import celery_app
+
+    entry = celery_app.conf.beat_schedule["prewarm-popular-foods"]
+    assert entry["task"] == "foods.prewarm_popular"
+    # fuera de la cola por defecto, donde esperan las generaciones de planes
+    assert (
+        celery_app.amqp.router.route({}, "foods.prewarm_popular")["queue"].name
+        == "foods"
+    )
+    assert (
+        celery_app.amqp.router.route({}, "generate_nutrition_plan_14_days")[
+            "queue"
+        ].name
+        == "celery"
+    )
+
+
+def test_plan_generator_prefers_prewarmed_local_foods(db_session):
+    from app.ai.smart_generator import SmartNutritionPlanGenerator
+    from services.plan_foods import PlanFoodsCatalogHolder
+
+    for name in food_prewarm.SPANISH_STAPLE_FOODS:
+        db_session.add(
+            Food(
+                id=str(uuid4()),
+                name=name.capitalize(),
+                source=FoodSource.openfoodfacts,
+                source_id=name,
+                calories_kcal=100,
+                protein_g=5,
+            )
+        )
+    db_session.commit()
+    generator = SmartNutritionPlanGenerator(PlanFoodsCatalogHolder(TestingSessionLocal))
+
+    foods = generator.get_available_foods()
+
+    assert len(foods) == len(food_prewarm.SPANISH_STAPLE_FOODS)
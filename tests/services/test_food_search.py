@@ -0,0 +1,374 @@
+import threading
+import time
+from uuid import uuid4
+
+import pytest
+import requests
+
+from app.core.database import engine
+from app.nutrition.models import Food, FoodSource
+from services import food_search
+from services.food_sources import FoodDetails as SourceFoodDetails
+from services.food_sources import FoodHit as SourceFoodHit
+from services.food_sources import UnsupportedFoodSourceError
+
+
+def _add_food(db, name, source_id=None):
+    food = Food(
+        id=str(uuid4()),
+        name=name,
+        source=FoodSource.openfoodfacts,
+        source_id=source_id or str(uuid4())[:12],
+        calories_kcal=100,
+        protein_g=10,
+        carbs_g=10,
+        fat_g=1,
+    )
+    db.add(food)
+    db.commit()
+    return food
+
+
+@pytest.fixture(autouse=True)
+def fresh_foods_table(db_session):
+    # a pre-existing test.db may predate the search index DDL hooks
+    Food.__table__.drop(engine, checkfirst=True)
+    Food.__table__.create(engine)
+
+
+@pytest.fixture
+def no_external(monkeypatch):
+    def _raise():
+        raise UnsupportedFoodSourceError("offline")
+
+    monkeypatch.setattr(food_search, "get_food_source_adapter", _raise)
+
+
+def test_search_uses_index_prefix_ranking(db_session, no_external):
+    _add_food(db_session, "Arroz con pollo")
+    _add_food(db_session, "Pollo asado")
+    _add_food(db_session, "Pollo")
+    _add_food(db_session, "Salmón")
+
+    assert food_search._has_search_index(db_session)
+    hits = food_search.search_foods(db_session, "pollo", page_size=10)
+
+    assert [h.name for h in hits] == ["Pollo", "Pollo asado", "Arroz con pollo"]
+
+
+def test_search_matches_token_prefixes_and_accents(db_session, no_external):
+    _add_food(db_session, "Salmón ahumado")
+    _add_food(db_session, "Yogur griego natural")
+
+    assert [h.name for h in food_search.search_foods(db_session, "salmon ahu")] == [
+        "Salmón ahumado"
+    ]
+    assert [h.name for h in food_search.search_foods(db_session, "yog nat")] == [
+        "Yogur griego natural"
+    ]
+
+
+def test_name_norm_is_unaccented_and_kept_in_sync(db_session):
+    food = _add_food(db_session, "Plátano  de Canarias")
+    assert food.name_norm == "platano de canarias"
+    food.name = "Jamón Ibérico"
+    db_session.commit()
+    assert food.name_norm == "jamon iberico"
+
+    details = SourceFoodDetails(
+        source="openfoodfacts", source_id="1", name="Salmón", raw_payload={}
+    )
+    assert food_search._map_details_to_food_entity(details).name_norm == "salmon"
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_unaccented_query_hits_local_cache_without_external_call(
+    db_session, monkeypatch, indexed
+):
+    names = [
+        "Ensalada de salmón",
+        "Salmón ahumado",
+        "Salmón fresco",
+        "Salmón a la plancha",
+        "Lomo de salmón",
+    ]
+    for name in names + ["Plátano"]:
+        _add_food(db_session, name)
+    monkeypatch.setitem(Food.__table__.info, "search_index", indexed)
+    adapter = _FakeAdapter([])
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+
+    hits = [h.name for h in food_search.search_foods(db_session, "salmon")]
+    assert hits[:3] == ["Salmón fresco", "Salmón ahumado", "Salmón a la plancha"]
+    assert sorted(hits) == sorted(names)
+    assert adapter.search_calls == 0
+    assert [
+        h.name for h in food_search.search_foods(db_session, "PLATANO", page_size=1)
+    ] == ["Plátano"]
+
+
+def test_search_index_follows_updates_and_deletes(db_session, no_external):
+    food = _add_food(db_session, "Manzana")
+    food.name = "Pera"
+    db_session.commit()
+
+    assert food_search.search_foods(db_session, "manzana") == []
+    assert [h.name for h in food_search.search_foods(db_session, "pera")] == ["Pera"]
+
+    db_session.delete(food)
+    db_session.commit()
+    assert food_search.search_foods(db_session, "pera") == []
+
+
+def test_search_pagination(db_session, no_external):
+    for i in range(12):
+        _add_food(db_session, f"Queso {i:02d}")
+
+    page1 = food_search.search_foods(db_session, "queso", page=1, page_size=5)
+    page3 = food_search.search_foods(db_session, "queso", page=3, page_size=5)
+
+    assert len(page1) == 5
+    assert len(page3) == 2
+    assert not {h.id for h in page1} & {h.id for h in page3}
+
+
+def test_search_cursor_pages_match_offset_pages(db_session, no_external):
+    from tests.utils.query_counter import count_queries
+
+    for i in range(12):
+        _add_food(db_session, f"Queso {i:02d}")
+    by_offset = [
+        h.id
+        for p in (1, 2, 3)
+        for h in food_search.search_foods(db_session, "queso", page=p, page_size=5)
+    ]
+
+    first = food_search.search_foods_page(
+        db_session, "queso", page_size=5, include_total=True
+    )
+    assert first.total == 12
+    seen = [h.id for h in first.items]
+    cursor = first.next_cursor
+    while cursor:
+        with count_queries(engine) as counter:
+            page = food_search.search_foods_page(
+                db_session, "queso", page_size=5, cursor=cursor
+            )
+        assert counter["n"] == 1  # no count, no fill: just the seek
+        assert page.total is None
+        seen += [h.id for h in page.items]
+        cursor = page.next_cursor
+
+    assert seen == by_offset
+
+
+def test_search_rejects_foreign_or_malformed_cursor(db_session, no_external):
+    from app.core.pagination import InvalidCursorError
+
+    for i in range(3):
+        _add_food(db_session, f"Queso {i}")
+    cursor = food_search.search_foods_page(db_session, "queso", page_size=1).next_cursor
+
+    with pytest.raises(InvalidCursorError):
+        food_search.search_foods_page(db_session, "quesos", page_size=1, cursor=cursor)
+    with pytest.raises(InvalidCursorError):
+        food_search.search_foods_page(
+            db_session, "queso", page_size=1, cursor="not-a-cursor"
+        )
+
+
+class _FakeAdapter:
+    def __init__(self, names, delay=0.0):
+        self.names = names
+        self.delay = delay
+        self.detail_calls = []
+        self.search_calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def search(self, query, page=1, page_size=10):
+        self.search_calls += 1
+        return [
+            SourceFoodHit(source="openfoodfacts", source_id=str(i), name=n)
+            for i, n in enumerate(self.names)
+        ][:page_size]
+
+    def get_details(self, source_id):
+        with self._lock:
+            self.detail_calls.append(source_id)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return SourceFoodDetails(
+            source="openfoodfacts",
+            source_id=source_id,
+            name=self.names[int(source_id)],
+            calories_kcal=50,
+            raw_payload={"code": source_id},
+        )
+
+
+def test_external_fill_hydrates_concurrently_in_one_batch(db_session, monkeypatch):
+    _add_food(db_session, "Tomate frito", source_id="0")
+    adapter = _FakeAdapter([f"Tomate {i}" for i in range(10)], delay=0.1)
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+
+    hits = food_search.search_foods(db_session, "tomate", page_size=10)
+
+    # the cached hit is not fetched again and the rest run in parallel
+    assert sorted(adapter.detail_calls) == sorted(str(i) for i in range(1, 10))
+    assert adapter.max_active > 1
+    assert len(hits) == 10
+    assert db_session.query(Food).count() == 10
+
+
+def test_hydration_skips_failed_details(db_session):
+    class _Flaky(_FakeAdapter):
+        def get_details(self, source_id):
+            if source_id == "1":
+                raise requests.exceptions.ConnectionError("boom")
+            return super().get_details(source_id)
+
+    adapter = _Flaky(["Kiwi", "Kiwi amarillo", "Kiwi rojo"])
+    hits = adapter.search("kiwi")
+
+    assert food_search._hydrate_foods_from_source(db_session, adapter, hits) == 2
+    assert food_search._hydrate_foods_from_source(db_session, adapter, hits) == 0
+    assert sorted(f.name for f in db_session.query(Food)) == ["Kiwi", "Kiwi rojo"]
+
+
+def test_smart_search_runs_one_query_for_all_terms(db_session, monkeypatch):
+    from app.ai import smart_food_search
+    from tests.utils.query_counter import count_queries
+
+    for name in [
+        "Pechuga de pollo",
+        "Pavo asado",
+        "Atún al natural",
+        "Tofu firme",
+        "Pan",
+    ]:
+        _add_food(db_session, name)
+    _add_food(db_session, "Pollo asado")
+    terms = ["pollo", "pechuga", "pavo", "atun", "pollo asado"]
+    monkeypatch.setattr(
+        smart_food_search, "get_enhanced_search_terms", lambda *a, **k: terms
+    )
+    adapter = _FakeAdapter([])
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+    assert food_search._has_search_index(db_session)
+
+    with count_queries(engine) as counter:
+        hits = food_search.search_foods_smart(
+            db_session, "pollo", page_size=10, user_id=1
+        )
+
+    # bounded count + page, no per-term round trips and no external fill
+    assert counter["n"] == 2
+    assert [h.name for h in hits] == [
+        "Pollo asado",
+        "Pechuga de pollo",
+        "Pavo asado",
+        "Atún al natural",
+    ]
+
+
+def test_smart_search_fills_externally_once_for_the_union(db_session, monkeypatch):
+    from app.ai import smart_food_search
+
+    monkeypatch.setattr(
+        smart_food_search,
+        "get_enhanced_search_terms",
+        lambda *a, **k: ["kefir", "skyr", "quark"],
+    )
+    adapter = _FakeAdapter(["Kefir natural", "Skyr"])
+    searches = []
+    original_search = adapter.search
+    adapter.search = lambda q, **kw: searches.append(q) or original_search(q, **kw)
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+
+    hits = food_search.search_foods_smart(db_session, "lacteos fermentados", user_id=1)
+
+    assert searches == ["lacteos fermentados"]
+    assert [h.name for h in hits] == ["Kefir natural", "Skyr"]
+
+
+class _BarcodeAdapter:
+    def __init__(self, known):
+        self.known = known
+        self.detail_calls = []
+
+    def get_details(self, source_id):
+        self.detail_calls.append(source_id)
+        if source_id not in self.known:
+            raise requests.exceptions.HTTPError(f"Product {source_id} not found")
+        return SourceFoodDetails(
+            source="openfoodfacts",
+            source_id=source_id,
+            name=self.known[source_id],
+            raw_payload={},
+        )
+
+
+def test_barcode_lookup_is_one_indexed_query_on_hits(db_session, monkeypatch):
+    from tests.utils.query_counter import count_queries
+
+    _add_food(db_session, "Nocilla", source_id="8410014465205")
+    _add_food(db_session, "Coca-Cola", source_id="0049000006346")
+    adapter = _BarcodeAdapter({})
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+
+    with count_queries(engine) as counter:
+        found = food_search.lookup_foods_by_barcode(
+            db_session, ["8410014465205", "049000006346", "abc"]
+        )
+
+    assert counter["n"] == 1
+    assert found["8410014465205"].name == "Nocilla"
+    assert found["049000006346"].name == "Coca-Cola"  # UPC-A matches its EAN-13 form
+    assert found["abc"] is None
+    assert adapter.detail_calls == []
+
+
+def test_barcode_miss_fetches_once_and_writes_through(db_session, monkeypatch):
+    adapter = _BarcodeAdapter({"3017620422003": "Nutella"})
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+
+    found = food_search.lookup_foods_by_barcode(
+        db_session, ["3017620422003", "0000000000000"]
+    )
+    assert found["3017620422003"].name == "Nutella"
+    assert found["0000000000000"] is None
+    assert sorted(adapter.detail_calls) == ["0000000000000", "3017620422003"]
+
+    adapter.detail_calls.clear()
+    again = food_search.lookup_foods_by_barcode(db_session, ["3017620422003"])
+    assert again["3017620422003"].id == found["3017620422003"].id
+    assert adapter.detail_calls == []
+
+
+def test_raw_payload_is_compressed_and_not_loaded_by_search(db_session, no_external):
+    from sqlalchemy import text
+
+    from tests.utils.query_counter import count_queries
+
+    payload = {"code": "1", "ingredients": [{"text": "azúcar"}] * 500}
+    food = _add_food(db_session, "Galleta maría")
+    food.raw_payload = payload
+    db_session.commit()
+
+    stored = db_session.execute(text("SELECT raw_payload FROM foods")).scalar()
+    assert isinstance(stored, bytes) and len(stored) < len(str(payload)) / 10
+
+    db_session.expire_all()
+    with count_queries(engine) as counter:
+        hits = food_search.search_foods(db_session, "galleta")
+        details = food_search.get_food(db_session, hits[0].id)
+    assert details.name == "Galleta maría"
+    assert not any("raw_payload" in stmt for stmt in counter["stmts"])
+
+    db_session.expire_all()
+    assert db_session.get(Food, food.id).raw_payload == payload  # loaded on access
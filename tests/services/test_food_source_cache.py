@@ -0,0 +1,125 @@
+import pytest
+import requests
+
+from app.nutrition.models import Food
+from services import food_search
+from services.food_source_cache import (
+    CachedFoodSourceAdapter,
+    TTLCache,
+    normalize_query,
+)
+from services.food_sources import FoodDetails, FoodHit
+
+
+class _CountingAdapter:
+    def __init__(self, names=()):
+        self.names = list(names)
+        self.search_calls = 0
+        self.detail_calls = 0
+
+    def search(self, query, page=1, page_size=10):
+        self.search_calls += 1
+        return [
+            FoodHit(source="openfoodfacts", source_id=str(i), name=n)
+            for i, n in enumerate(self.names)
+            if query.lower() in n.lower()
+        ]
+
+    def get_details(self, source_id):
+        self.detail_calls += 1
+        if source_id == "missing":
+            raise requests.exceptions.HTTPError(f"Product {source_id} not found")
+        if source_id == "busy":
+            response = requests.Response()
+            response.status_code = 429
+            raise requests.exceptions.HTTPError("rate limited", response=response)
+        return FoodDetails(
+            source="openfoodfacts",
+            source_id=source_id,
+            name=self.names[int(source_id)],
+            raw_payload={},
+        )
+
+
+def _cached(inner, **kwargs):
+    return CachedFoodSourceAdapter(
+        inner, source="openfoodfacts", backend=TTLCache(), **kwargs
+    )
+
+
+def test_normalize_query():
+    assert normalize_query("  Salmón   AHUMADO ") == "salmon ahumado"
+
+
+def test_search_is_cached_by_normalized_query():
+    inner = _CountingAdapter(["Avena"])
+    adapter = _cached(inner)
+
+    assert [h.name for h in adapter.search("avena")] == ["Avena"]
+    assert [h.name for h in adapter.search(" AVENA ")] == ["Avena"]
+    assert inner.search_calls == 1
+    assert adapter.cache_stats()["hits"] == 1
+
+
+def test_empty_results_are_negatively_cached():
+    inner = _CountingAdapter(["Avena"])
+    adapter = _cached(inner)
+
+    assert adapter.search("avenx") == []
+    assert adapter.search("avenx") == []
+    assert inner.search_calls == 1
+    assert adapter.cache_stats()["negative_hits"] == 1
+
+
+def test_negative_entries_expire(monkeypatch):
+    inner = _CountingAdapter()
+    adapter = _cached(inner, negative_ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr("services.food_source_cache.time.monotonic", lambda: now[0])
+
+    adapter.search("xyz")
+    now[0] += 11
+    adapter.search("xyz")
+
+    assert inner.search_calls == 2
+
+
+def test_details_cache_not_found_but_not_transient_errors():
+    inner = _CountingAdapter(["Kiwi"])
+    adapter = _cached(inner)
+
+    assert adapter.get_details("0").name == "Kiwi"
+    assert adapter.get_details("0").name == "Kiwi"
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            adapter.get_details("missing")
+        with pytest.raises(requests.exceptions.HTTPError):
+            adapter.get_details("busy")
+
+    # one fetch each for "0" and "missing", both attempts for the 429
+    assert inner.detail_calls == 4
+
+
+def test_lru_evicts_oldest_entry():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    cache.get("a")
+    cache.set("c", 3, 60)
+
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_search_foods_skips_network_for_resolved_queries(db_session, monkeypatch):
+    Food.__table__.drop(db_session.get_bind(), checkfirst=True)
+    Food.__table__.create(db_session.get_bind())
+    inner = _CountingAdapter(["Avena"])
+    adapter = _cached(inner)
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+
+    for _ in range(3):
+        assert food_search.search_foods(db_session, "typoo") == []
+
+    assert inner.search_calls == 1
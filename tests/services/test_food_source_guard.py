@@ -0,0 +1,144 @@
+import pytest
+import requests
+
+from app.nutrition.models import Food
+from services import food_search
+from services.food_source_cache import CachedFoodSourceAdapter, TTLCache
+from services.food_source_guard import (
+    FoodSourceGuard,
+    GuardedFoodSourceAdapter,
+    SQLiteGuardStore,
+)
+from services.food_sources import (
+    FoodHit,
+    FoodSourceRateLimitedError,
+    FoodSourceUnavailableError,
+)
+
+
+class _Source:
+    def __init__(self, status=None, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+        self.calls = 0
+
+    def search(self, query, page=1, page_size=10):
+        self.calls += 1
+        if self.status:
+            response = requests.Response()
+            response.status_code = self.status
+            if self.retry_after:
+                response.headers["Retry-After"] = str(self.retry_after)
+            raise requests.exceptions.HTTPError(f"{self.status}", response=response)
+        return [FoodHit(source="openfoodfacts", source_id="1", name=query)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr("services.food_source_guard.time.time", lambda: now[0])
+    return now
+
+
+def _guard(tmp_path, **kwargs):
+    kwargs.setdefault("burst", 10)
+    return FoodSourceGuard(SQLiteGuardStore(str(tmp_path / "guard.sqlite3")), **kwargs)
+
+
+def test_token_bucket_is_shared_between_workers(tmp_path, clock):
+    worker_a = _guard(tmp_path, burst=2, rate_per_min={"openfoodfacts": 60})
+    worker_b = _guard(tmp_path, burst=2, rate_per_min={"openfoodfacts": 60})
+
+    worker_a.acquire("openfoodfacts")
+    worker_b.acquire("openfoodfacts")
+    with pytest.raises(FoodSourceRateLimitedError) as refused:
+        worker_a.acquire("openfoodfacts")
+    assert refused.value.retry_after_s == pytest.approx(1.0)
+
+    clock[0] += 1  # one token per second
+    worker_b.acquire("openfoodfacts")
+    assert worker_a.status("openfoodfacts")["throttled"] == 1
+
+
+def test_breaker_opens_on_repeated_429_and_honours_retry_after(tmp_path, clock):
+    source = _Source(status=429, retry_after=120)
+    adapter = GuardedFoodSourceAdapter(
+        source,
+        source="openfoodfacts",
+        guard=_guard(tmp_path, failure_threshold=2, cooldown_s=30),
+    )
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            adapter.search("pan")
+    with pytest.raises(FoodSourceUnavailableError):
+        adapter.search("pan")
+
+    assert source.calls == 2
+    status = adapter.guard.status("openfoodfacts")
+    assert status["cache_only"] and status["retry_in_s"] == 120
+
+
+def test_half_open_probe_closes_breaker_on_success(tmp_path, clock):
+    source = _Source(status=503)
+    guard = _guard(tmp_path, failure_threshold=1, cooldown_s=30)
+    adapter = GuardedFoodSourceAdapter(source, source="openfoodfacts", guard=guard)
+    with pytest.raises(requests.exceptions.HTTPError):
+        adapter.search("pan")
+
+    clock[0] += 31
+    guard.acquire("openfoodfacts")  # the single probe
+    with pytest.raises(FoodSourceUnavailableError):
+        adapter.search("pan")  # others wait for the probe's outcome
+    guard.record_success("openfoodfacts")
+
+    source.status = None
+    assert [h.name for h in adapter.search("pan")] == ["pan"]
+    assert guard.status("openfoodfacts")["state"] == "closed"
+
+
+def test_not_found_does_not_trip_breaker(tmp_path, clock):
+    source = _Source(status=404)
+    adapter = GuardedFoodSourceAdapter(
+        source, source="openfoodfacts", guard=_guard(tmp_path, failure_threshold=1)
+    )
+
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.HTTPError):
+            adapter.search("pan")
+
+    assert source.calls == 3
+
+
+def test_open_breaker_serves_cache_only(db_session, tmp_path, clock, monkeypatch):
+    Food.__table__.drop(db_session.get_bind(), checkfirst=True)
+    Food.__table__.create(db_session.get_bind())
+    source = _Source()
+    guard = _guard(tmp_path, failure_threshold=1)
+    adapter = CachedFoodSourceAdapter(
+        GuardedFoodSourceAdapter(source, source="openfoodfacts", guard=guard),
+        source="openfoodfacts",
+        backend=TTLCache(),
+    )
+    monkeypatch.setattr(food_search, "get_food_source_adapter", lambda: adapter)
+    adapter.search("avena")
+    guard.record_failure("openfoodfacts", requests.exceptions.ConnectionError("down"))
+
+    assert [h.name for h in adapter.search("avena")] == ["avena"]  # cached
+    assert food_search.search_foods(db_session, "kiwi") == []  # no network, no error
+    assert source.calls == 1
+
+
+def test_breaker_status_endpoint(tmp_path, monkeypatch):
+    from app.ai.routers import get_food_source_breaker_status
+    from app.core.config import settings
+
+    monkeypatch.setattr(
+        settings, "FOOD_SOURCE_GUARD_SQLITE_PATH", str(tmp_path / "g.sqlite3")
+    )
+    monkeypatch.setattr(settings, "FOOD_SOURCES", "openfoodfacts,fdc")
+
+    body = get_food_source_breaker_status()
+
+    assert body["status"] == "success"
+    assert body["breaker_status"]["fdc"]["state"] == "closed"
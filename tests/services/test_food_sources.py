@@ -0,0 +1,84 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.config import settings
+from services import food_sources
+from services.food_sources import OpenFoodFactsAdapter
+
+
+class _OffHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = json.dumps(
+            {"products": [{"code": "1", "product_name": "Avena"}]}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def off_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OffHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_adapter():
+    food_sources.reset_food_source_adapter()
+    yield
+    food_sources.reset_food_source_adapter()
+
+
+def test_adapter_reuses_keep_alive_connections(off_server):
+    adapter = OpenFoodFactsAdapter(retries=0)
+    adapter.BASE_URL = off_server
+
+    for _ in range(5):
+        assert [h.name for h in adapter.search("avena")] == ["Avena"]
+
+    (stats,) = adapter.pool_stats().values()
+    assert stats == {"requests": 5, "new_connections": 1, "pool_hits": 4}
+
+
+def test_pool_size_comes_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "FOOD_SOURCE", "openfoodfacts")
+    monkeypatch.setattr(settings, "FOOD_SOURCE_POOL_MAXSIZE", 3)
+
+    adapter = food_sources.get_food_source_adapter()
+
+    assert adapter.session.get_adapter("https://x")._pool_maxsize == 3
+
+
+def test_shared_adapter_is_per_process(monkeypatch):
+    monkeypatch.setattr(settings, "FOOD_SOURCE", "openfoodfacts")
+    first = food_sources.get_food_source_adapter()
+    assert food_sources.get_food_source_adapter() is first
+
+    # a forked worker must not reuse the parent's sockets
+    monkeypatch.setattr(food_sources.os, "getpid", lambda: -1)
+    assert food_sources.get_food_source_adapter() is not first
+
+
+def test_pool_stats_endpoint(monkeypatch):
+    from app.ai.routers import get_food_source_pool_stats
+
+    monkeypatch.setattr(settings, "FOOD_SOURCE", "openfoodfacts")
+    food_sources.get_food_source_adapter()
+
+    body = get_food_source_pool_stats()
+    assert body["status"] == "success"
+    assert body["pool_stats"]["adapter"] == "OpenFoodFactsAdapter"
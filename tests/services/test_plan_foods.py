@@ -0,0 +1,105 @@
+import time
+from uuid import uuid4
+
+import pytest
+
+from app.core.database import engine
+from app.nutrition.models import Food, FoodSource
+from services import plan_foods
+from services.plan_foods import PlanFoodsCatalogHolder, build_plan_foods_catalog
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(autouse=True)
+def fresh_foods_table(db_session):
+    Food.__table__.drop(engine, checkfirst=True)
+    Food.__table__.create(engine)
+
+
+def _add(db, name, kcal=100):
+    db.add(
+        Food(
+            id=str(uuid4()),
+            name=name,
+            source=FoodSource.openfoodfacts,
+            source_id=name,
+            calories_kcal=kcal,
+            protein_g=5,
+        )
+    )
+    db.commit()
+
+
+class _CountingSessions:
+    def __init__(self):
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return TestingSessionLocal()
+
+
+def test_catalog_is_built_locally_and_versioned_by_content(db_session):
+    _add(db_session, "Pollo")
+    _add(db_session, "Avena")
+    _add(db_session, "Sin macros", kcal=None)
+
+    first = build_plan_foods_catalog(
+        db_session, names=["pollo", "avena", "sin macros", "inexistente"]
+    )
+    again = build_plan_foods_catalog(
+        db_session, names=["pollo", "avena", "sin macros", "inexistente"]
+    )
+
+    assert [f["name"] for f in first.foods] == ["Pollo", "Avena"]
+    assert first.version == again.version
+
+    _add(db_session, "Avena integral", kcal=120)
+    db_session.query(Food).filter(Food.name == "Avena").delete()
+    db_session.commit()
+    changed = build_plan_foods_catalog(db_session, names=["pollo", "avena"])
+    assert changed.version != first.version
+
+
+def test_catalog_is_served_from_memory_and_refreshed_in_background(
+    db_session, monkeypatch
+):
+    _add(db_session, "Pollo")
+    sessions = _CountingSessions()
+    holder = PlanFoodsCatalogHolder(sessions, ttl_s=60)
+
+    first = holder.get()
+    for _ in range(1000):
+        assert holder.get() is first
+    assert sessions.opened == 1  # servido de memoria, sin volver a la BD
+
+    _add(db_session, "Avena")
+    now = time.time()
+    monkeypatch.setattr(plan_foods.time, "time", lambda: now + 61)
+    assert holder.get() is first  # el catálogo viejo se sigue sirviendo
+    for _ in range(100):
+        if holder.get() is not first:
+            break
+        time.sleep(0.01)
+
+    assert holder.get().version != first.version
+    assert sessions.opened == 2
+
+
+def test_system_prompt_is_cached_per_catalog_version(db_session):
+    from app.ai.smart_generator import SmartNutritionPlanGenerator
+
+    _add(db_session, "Pollo")
+    holder = PlanFoodsCatalogHolder(TestingSessionLocal)
+    generator = SmartNutritionPlanGenerator(holder)
+    calls = []
+    build = generator._build_system_prompt
+    generator._build_system_prompt = lambda foods: calls.append(foods) or build(foods)
+
+    prompt = generator._system_prompt_for(holder.get())
+    assert generator._system_prompt_for(holder.get()) is prompt
+    assert "Pollo" in prompt and len(calls) == 1
+
+    _add(db_session, "Avena")
+    generator._system_prompt_for(holder.refresh())
+    assert len(calls) == 2
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import hmac
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from app.ai import rate_limiter
+from app.ai import routers as ai_routers
+from app.ai.provider import AsyncChatProvider
+from app.ai.rate_limiter import LLMRateLimiter, RateLimitExceeded
+from app.ai_client import AsyncAiClient, AsyncLocalAiClient
+from app.auth.deps import UserContext, get_current_user
+from app.core.config import settings
+from app.core.database import get_db
+from services.food_source_guard import SQLiteGuardStore
+from tests.conftest import override_get_db
+from tests.test_ai_streaming import PLAN_JSON
+
+
+def _completion(content):
+    return {
+        "id": "cmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-5-nano",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+    }
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    store = SQLiteGuardStore(str(tmp_path / "rl.sqlite3"), table="ai_rate_limit")
+    instance = LLMRateLimiter(
+        store, quotas={"openai": {"min_interval_s": 0, "max_daily": 1000}}
+    )
+    monkeypatch.setattr(rate_limiter, "_rate_limiter", instance)
+    return instance
+
+
+class _InFlight:
+    """Cuenta las peticiones en curso; cada una espera a que lleguen ``expected``."""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.current = self.peak = 0
+        self._all_in = None
+
+    async def __aenter__(self):
+        self._all_in = self._all_in or asyncio.Event()
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+        if self.current >= self.expected:
+            self._all_in.set()
+        try:
+            # si las llamadas se serializan nunca llegan todas: el test falla por ``peak``
+            await asyncio.wait_for(self._all_in.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+
+    async def __aexit__(self, *exc):
+        self.current -= 1
+
+
+def _slow_openai(in_flight, requests):
+    async def handler(request):
+        requests.append(json.loads(request.content))
+        async with in_flight:
+            return httpx.Response(200, json=_completion("hola"))
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncChatProvider(
+        api_key="sk-test",
+        rate_key="openai",
+        label="OpenAI",
+        default_model="gpt-4o-mini",
+        http_client=http_client,
+        budget_cents=1000,
+    )
+
+
+def test_pending_completions_do_not_block_the_event_loop(limiter):
+    requests = []
+
+    in_flight = _InFlight(100)
+
+    async def run():
+        provider = _slow_openai(in_flight, requests)
+        return await asyncio.gather(
+            *(
+                provider.chat(
+                    1, [{"role": "user", "content": "hola"}], reasoning_effort="low"
+                )
+                for _ in range(100)
+            )
+        )
+
+    replies = asyncio.run(run())
+
+    assert replies == [{"reply": "hola"}] * 100
+    assert in_flight.peak == 100  # todas a la vez: esperar una no bloquea el loop
+    assert (
+        requests[0]["model"] == "gpt-4o-mini"
+        and requests[0]["reasoning_effort"] == "low"
+    )
+    assert limiter.status("openai")["completed"] == 100
+
+
+def test_async_local_client_falls_back_on_rate_limit():
+    class _Provider:
+        def __init__(self, reply=None, error=None):
+            self.reply, self.error, self.calls = reply, error, 0
+
+        async def chat(
+            self, user_id, messages, *, simulate=False, model=None, **params
+        ):
+            self.calls += 1
+            if self.error:
+                raise self.error
+            return {"reply": self.reply}
+
+    client = AsyncLocalAiClient.__new__(AsyncLocalAiClient)
+    client._provider = _Provider(
+        error=RateLimitExceeded("Rate limit alcanzado para openai", 5)
+    )
+    client._backup_provider = _Provider(reply="respaldo")
+
+    assert asyncio.run(client.chat(1, []))["reply"] == "respaldo"
+
+    client._provider = _Provider(
+        error=HTTPException(status_code=502, detail="OpenAI error: boom")
+    )
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(client.chat(1, []))
+    assert exc.value.status_code == 502 and client._backup_provider.calls == 1
+
+
+def test_async_microservice_client_signs_requests():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json={"reply": "ok"})
+
+    async def run():
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = AsyncAiClient("http://ai:8080/", "secret", http_client)
+        return await client.chat(1, [{"role": "user", "content": "hola"}], model="m")
+
+    assert asyncio.run(run()) == {"reply": "ok"}
+    request = seen[0]
+    expected = hmac.new(
+        b"secret",
+        f"{request.headers['X-Timestamp']}.".encode() + request.content,
+        hashlib.sha256,
+    ).hexdigest()
+    assert str(request.url) == "http://ai:8080/v1/chat"
+    assert request.headers["X-Internal-Signature"] == expected
+
+
+def test_direct_working_route_awaits_the_async_client(db_session, monkeypatch):
+    in_flight = _InFlight(20)
+
+    class _FakeAsyncClient:
+        calls = []
+
+        async def chat(self, user_id, messages, **kwargs):
+            self.calls.append((user_id, kwargs))
+            async with in_flight:
+                return {"reply": f"```json\n{PLAN_JSON}\n```"}
+
+    fake = _FakeAsyncClient()
+    monkeypatch.setattr(ai_routers, "get_async_ai_client", lambda: fake)
+    monkeypatch.setattr(settings, "API_OPEN_AI", "sk-test")
+
+    app = FastAPI()
+    app.include_router(ai_routers.router, prefix="/api/v1")
+    app.dependency_overrides[get_current_user] = lambda: UserContext(
+        id=7, email="", username=""
+    )
+    app.dependency_overrides[get_db] = override_get_db
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await asyncio.gather(
+                *(
+                    client.post(
+                        "/api/v1/ai/generate/nutrition-plan-direct-working",
+                        json={"days": 1},
+                    )
+                    for _ in range(20)
+                )
+            )
+
+    responses = asyncio.run(run())
+
+    assert [r.json()["status"] for r in responses] == ["success"] * 20, responses[
+        0
+    ].json()
+    assert (
+        responses[0].json()["plan"]["days"][0]["meals"][0]["items"][0]["name"]
+        == "lentejas"
+    )
+    assert in_flight.peak == 20  # las 20 peticiones esperan al modelo a la vez
+    assert fake.calls[0] == (
+        7,
+        {"model": "gpt-5-nano", "reasoning_effort": "low", "verbosity": "low"},
+    )
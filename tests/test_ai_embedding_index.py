@@ -0,0 +1,93 @@
+import math
+import random
+
+import pytest
+
+from app.ai import embeddings
+from app.ai.embeddings import EmbeddingIndex
+
+
+@pytest.fixture(autouse=True)
+def _fresh_indexes():
+    embeddings.clear_embedding_indexes()
+    yield
+    embeddings.clear_embedding_indexes()
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    na, nb = math.sqrt(sum(x * x for x in a)), math.sqrt(sum(x * x for x in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def test_top_k_matches_a_full_cosine_scan():
+    rnd = random.Random(1)
+    rows = [
+        (f"r{i}", f"T{i}", {"i": i}, [rnd.uniform(-1, 1) for _ in range(16)])
+        for i in range(300)
+    ]
+    index = EmbeddingIndex.from_rows(rows)
+    query = [rnd.uniform(-1, 1) for _ in range(16)]
+
+    result = index.search(query, k=10)
+
+    expected = sorted(rows, key=lambda r: _cosine(query, r[3]), reverse=True)[:10]
+    assert [r["ref_id"] for r in result] == [r[0] for r in expected]
+    assert result[0]["score"] == pytest.approx(_cosine(query, expected[0][3]), abs=1e-5)
+    assert result[0]["metadata"] == expected[0][2]
+
+
+def test_upsert_updates_the_loaded_index_in_place(db_session, monkeypatch):
+    embeddings.upsert_embedding(db_session, "routine", "A", "A", {}, [1.0, 0.0])
+    assert (
+        embeddings.search_similar(db_session, "routine", [1.0, 0.0], k=1)[0]["ref_id"]
+        == "A"
+    )
+
+    loads = []
+    original = EmbeddingIndex.load.__func__
+    monkeypatch.setattr(
+        EmbeddingIndex,
+        "load",
+        classmethod(lambda cls, db, ns: loads.append(ns) or original(cls, db, ns)),
+    )
+
+    embeddings.upsert_embedding(db_session, "routine", "B", "B", {}, [0.0, 1.0])
+    embeddings.upsert_embedding(db_session, "routine", "A", "A2", {"v": 2}, [0.0, -1.0])
+
+    result = embeddings.search_similar(db_session, "routine", [0.0, 1.0], k=2)
+    assert [(r["ref_id"], round(r["score"], 3)) for r in result] == [
+        ("B", 1.0),
+        ("A", -1.0),
+    ]
+    assert result[1]["title"] == "A2"
+    assert loads == []  # sin recargar la tabla
+
+
+def test_writes_from_another_process_trigger_a_reload(db_session):
+    embeddings.upsert_embedding(db_session, "routine", "A", "A", {}, [1.0, 0.0])
+    embeddings.search_similar(db_session, "routine", [1.0, 0.0])
+    stale = dict(embeddings._indexes)
+
+    # otro proceso: escribe sin ver nuestro índice
+    embeddings.clear_embedding_indexes()
+    embeddings.upsert_embedding(db_session, "routine", "C", "C", {}, [0.6, 0.8])
+    embeddings._indexes.update(stale)
+
+    result = embeddings.search_similar(db_session, "routine", [0.6, 0.8], k=1)
+    assert result[0]["ref_id"] == "C"
+
+
+def test_vectors_of_other_dimensions_are_not_compared(db_session):
+    embeddings.ensure_seed_embeddings(db_session)
+    embeddings.upsert_embedding(db_session, "routine", "A", "A", {}, [1.0, 0.0])
+
+    assert [
+        r["ref_id"]
+        for r in embeddings.search_similar(db_session, "routine", [1.0, 0.0])
+    ] == ["A"]
+
+    embeddings.upsert_embedding(db_session, "routine", "A", "A", {}, [0.1, 0.2, 0.3])
+    result = embeddings.search_similar(db_session, "routine", [0.1, 0.2, 0.3])
+    assert sorted(r["ref_id"] for r in result) == ["A", "seed"]
+    assert embeddings.search_similar(db_session, "routine", [1.0, 0.0]) == []
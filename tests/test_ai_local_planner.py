@@ -0,0 +1,217 @@
+import json
+from datetime import date
+
+import pytest
+
+from app.ai import local_planner, schemas
+from app.ai import services as ai_services
+from app.ai.local_planner import plan_from_foods
+from app.auth.deps import UserContext
+from app.core.config import settings
+
+
+def _food(name, kcal, p, c, f):
+    return {
+        "name": name,
+        "calories_kcal": kcal,
+        "protein_g": p,
+        "carbs_g": c,
+        "fat_g": f,
+    }
+
+
+FOODS = [
+    _food("Pechuga de pollo", 165, 31, 0, 3.6),
+    _food("Salmón", 208, 20, 0, 13),
+    _food("Atún al natural", 116, 26, 0, 1),
+    _food("Huevos", 155, 13, 1.1, 11),
+    _food("Yogur griego", 97, 9, 4, 5),
+    _food("Queso fresco", 98, 11, 3.4, 4.3),
+    _food("Lentejas cocidas", 116, 9, 20, 0.4),
+    _food("Arroz integral", 111, 2.6, 23, 0.9),
+    _food("Quinoa", 120, 4.4, 21, 1.9),
+    _food("Avena", 389, 17, 66, 7),
+    _food("Garbanzos cocidos", 164, 8.9, 27, 2.6),
+    _food("Patata", 77, 2, 17, 0.1),
+    _food("Plátano", 89, 1.1, 23, 0.3),
+    _food("Brócoli", 34, 2.8, 7, 0.4),
+    _food("Espinacas", 23, 2.9, 3.6, 0.4),
+    _food("Tomate", 18, 0.9, 3.9, 0.2),
+    _food("Manzana", 52, 0.3, 14, 0.2),
+    _food("Aguacate", 160, 2, 9, 15),
+    _food("Aceite de oliva", 884, 0, 0, 100),
+    _food("Nueces", 654, 15, 14, 65),
+    _food("Almendras", 579, 21, 22, 50),
+]
+TARGETS = {"kcal": 2400, "protein_g": 140, "carbs_g": 280, "fat_g": 75}
+
+
+def _names(day, meal_type=None):
+    return [i.name for m in day.meals if meal_type in (None, m.type) for i in m.items]
+
+
+def test_week_plan_hits_targets_and_varies():
+    plan = plan_from_foods(FOODS, TARGETS, days=7, start=date(2025, 1, 6))
+
+    assert isinstance(plan, schemas.NutritionPlan) and len(plan.days) == 7
+    assert plan.days[0].date == "2025-01-06" and plan.days[-1].date == "2025-01-12"
+    for day in plan.days:
+        assert abs(day.totals["kcal"] - TARGETS["kcal"]) / TARGETS["kcal"] < 0.05
+        assert (
+            abs(day.totals["protein_g"] - TARGETS["protein_g"]) / TARGETS["protein_g"]
+            < 0.2
+        )
+        assert [m.type for m in day.meals] == ["breakfast", "lunch", "dinner", "snack"]
+        names = _names(day)
+        assert len(names) == len(set(names))  # nada se repite en el mismo día
+        assert all(item.qty % 5 == 0 for m in day.meals for item in m.items)
+    lunches = [_names(d, "lunch")[0] for d in plan.days]
+    assert all(a != b for a, b in zip(lunches, lunches[1:]))
+    assert plan == plan_from_foods(
+        FOODS, TARGETS, days=7, start=date(2025, 1, 6)
+    )  # determinista
+
+
+def test_diet_and_allergies_filter_the_catalog():
+    plan = plan_from_foods(
+        FOODS, TARGETS, days=7, diet="vegetarian", allergies="Lactosa, frutos secos"
+    )
+    names = {n.lower() for d in plan.days for n in _names(d)}
+    for banned in ("pollo", "salmón", "atún", "yogur", "queso", "nueces", "almendras"):
+        assert not any(banned in n for n in names)
+    assert "huevos" in names
+
+    vegan = plan_from_foods(FOODS, TARGETS, days=3, diet="vegan")
+    assert not any("huevo" in n.lower() for d in vegan.days for n in _names(d))
+
+
+def test_restricted_diets_only_use_listed_foods():
+    unsafe = [
+        "Salchichas frankfurt",
+        "Bacon ahumado",
+        "Beicon",
+        "Panceta",
+        "Pato",
+        "Salami",
+        "Mortadela",
+        "Morcilla de Burgos",
+        "Anchoas",
+        "Trucha",
+        "Lubina",
+        "Gelatina de fresa",
+        "Hacendado mix",
+        "Arroz con pollo",
+    ]
+    for name in unsafe:
+        assert not local_planner.food_allowed(name, "vegetarian", None), name
+        assert not local_planner.food_allowed(name, "vegan", None), name
+    assert local_planner.food_allowed("Lentejas cocidas", "vegan", None)
+    assert local_planner.food_allowed("Trucha", "pescatarian", None)
+    assert not local_planner.food_allowed("Yogur griego", "vegan", None)
+    assert local_planner.food_allowed("Salami", None, None)  # sin dieta no hay lista
+
+    foods = FOODS + [_food(n, 250, 25, 1, 15) for n in unsafe]
+    plan = plan_from_foods(foods, TARGETS, days=7, diet="vegetarian")
+    assert not {n for d in plan.days for n in _names(d)} & set(unsafe)
+
+
+def test_requests_with_preferences_go_to_the_llm(db_session, catalog):
+    _profile(db_session, 43)
+
+    req = schemas.NutritionPlanRequest(
+        days=1, preferences={"cocina": "mediterránea, sin picante"}
+    )
+
+    assert local_planner.build_local_plan(db_session, 43, req) is None
+    assert (
+        local_planner.build_local_plan(
+            db_session, 43, schemas.NutritionPlanRequest(days=1)
+        )
+        is not None
+    )
+
+
+def test_unbuildable_plans_fall_back_to_the_llm():
+    assert plan_from_foods(FOODS, TARGETS, days=1, diet="keto") is None
+    only_sides = [f for f in FOODS if local_planner.food_role(f) == local_planner.SIDE]
+    assert plan_from_foods(only_sides, TARGETS, days=1) is None
+
+
+def _profile(db, user_id):
+    from app.user_profile.models import ActivityLevel, Goal, UserProfile
+
+    db.add(
+        UserProfile(
+            user_id=user_id,
+            full_name="Ana",
+            age=30,
+            height_cm=170,
+            weight_kg=65,
+            activity_level=ActivityLevel.MODERATELY_ACTIVE,
+            goal=Goal.MAINTAIN_WEIGHT,
+            allergies="nueces",
+        )
+    )
+    db.commit()
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    from services import plan_foods
+
+    monkeypatch.setattr(
+        plan_foods,
+        "get_plan_foods_catalog",
+        lambda: plan_foods.PlanFoodsCatalog(tuple(FOODS), "v1", 0.0),
+    )
+
+
+def test_optimized_generation_uses_the_local_plan_without_the_llm(
+    db_session, catalog, monkeypatch
+):
+    def no_llm():
+        raise AssertionError("LLM called")
+
+    monkeypatch.setattr(ai_services, "get_ai_client", no_llm)
+    _profile(db_session, 41)
+
+    plan = ai_services.generate_nutrition_plan_optimized(
+        UserContext(id=41, email=""), schemas.NutritionPlanRequest(days=7), db_session
+    )
+
+    assert len(plan.days) == 7
+    assert plan.targets["kcal"] > 1500
+    assert not any("nueces" in n.lower() for d in plan.days for n in _names(d))
+
+
+def test_llm_polish_only_renames_items(db_session, catalog, monkeypatch):
+    _profile(db_session, 42)
+    user, req = UserContext(id=42, email=""), schemas.NutritionPlanRequest(days=1)
+    local = local_planner.build_local_plan(db_session, 42, req)
+
+    class _Client:
+        def __init__(self, reply):
+            self.reply = reply
+
+        def chat(self, user_id, messages):
+            return {"reply": self.reply}
+
+    data = json.loads(local.model_dump_json())
+    for meal in data["days"][0]["meals"]:
+        for item in meal["items"]:
+            item["name"] += " a la plancha"
+            item["qty"] = 1  # el modelo no manda en las cantidades
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: _Client(json.dumps(data)))
+    monkeypatch.setattr(settings, "NUTRITION_LOCAL_PLANNER_LLM_POLISH", True)
+
+    polished = ai_services.generate_nutrition_plan_optimized(user, req, db_session)
+
+    assert all(n.endswith(" a la plancha") for n in _names(polished.days[0]))
+    assert polished.days[0].totals == local.days[0].totals
+    assert [i.qty for m in polished.days[0].meals for i in m.items] == [
+        i.qty for m in local.days[0].meals for i in m.items
+    ]
+
+    data["days"][0]["meals"].pop()
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: _Client(json.dumps(data)))
+    assert ai_services.generate_nutrition_plan_optimized(user, req, db_session) == local
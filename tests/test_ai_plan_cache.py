@@ -0,0 +1,261 @@
+import fnmatch
+
+import pytest
+
+from app.ai import cache as plan_cache
+from app.ai import schemas
+from app.ai.cache import (
+    MemoryPlanCacheBackend,
+    NutritionPlanCache,
+    RedisPlanCacheBackend,
+)
+from app.auth.deps import UserContext
+
+
+def _user(uid):
+    return UserContext(id=uid, email="", username="")
+
+
+def _plan(kcal=2000):
+    return schemas.NutritionPlan(
+        days=[
+            schemas.NutritionDayPlan(
+                date="2025-01-01",
+                meals=[
+                    schemas.Meal(
+                        type="breakfast",
+                        items=[
+                            schemas.MealItem(
+                                name="Avena",
+                                qty=60,
+                                unit="g",
+                                kcal=230,
+                                protein_g=8,
+                                carbs_g=40,
+                                fat_g=4,
+                            )
+                        ],
+                        meal_kcal=230,
+                    )
+                ],
+                totals={"kcal": kcal},
+            )
+        ],
+        targets={"kcal": kcal},
+    )
+
+
+class _FakeRedis:
+    """Subconjunto de comandos de Redis que usa ``RedisPlanCacheBackend``."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member.encode())
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, *keys):
+        return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    def hincrby(self, key, field, n):
+        h = self.data.setdefault(key, {})
+        h[field.encode()] = h.get(field.encode(), 0) + n
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def scan_iter(self, match):
+        return [k for k in list(self.data) if fnmatch.fnmatch(k, match)]
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        return NutritionPlanCache(MemoryPlanCacheBackend(max_entries=3), ttl_s=60)
+    return NutritionPlanCache(RedisPlanCacheBackend(client=_FakeRedis()), ttl_s=60)
+
+
+def test_roundtrip_and_counters(cache):
+    req = schemas.NutritionPlanRequest(days=1)
+    assert cache.get(_user(1), req) is None
+
+    cache.set(_user(1), req, _plan())
+    assert cache.get(_user(1), req) == _plan()
+    assert cache.get(_user(2), req) is None
+
+    stats = cache.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["sets"]) == (1, 2, 1)
+    assert stats["entries"] == 1 and stats["backend"] == cache.backend.name
+
+
+def test_clear_user_cache_uses_the_user_index(cache):
+    for days in (1, 2):
+        cache.set(_user(1), schemas.NutritionPlanRequest(days=days), _plan())
+    cache.set(_user(2), schemas.NutritionPlanRequest(days=1), _plan())
+
+    assert cache.clear_user_cache(1) == 2
+
+    assert cache.get(_user(1), schemas.NutritionPlanRequest(days=1)) is None
+    assert cache.get(_user(2), schemas.NutritionPlanRequest(days=1)) is not None
+    assert cache.get_cache_stats()["invalidations"] == 2
+
+
+def test_memory_backend_is_bounded_lru_and_expires(monkeypatch):
+    cache = NutritionPlanCache(MemoryPlanCacheBackend(max_entries=2), ttl_s=60)
+    reqs = [schemas.NutritionPlanRequest(days=d) for d in (1, 2, 3)]
+    cache.set(_user(1), reqs[0], _plan())
+    cache.set(_user(1), reqs[1], _plan())
+    cache.get(_user(1), reqs[0])  # 1 pasa a ser el más reciente
+    cache.set(_user(1), reqs[2], _plan())
+
+    assert cache.get(_user(1), reqs[1]) is None
+    assert cache.get(_user(1), reqs[0]) is not None
+    assert cache.get_cache_stats()["evictions"] == 1
+
+    now = plan_cache.time.monotonic()
+    monkeypatch.setattr(plan_cache.time, "monotonic", lambda: now + 61)
+    assert cache.get(_user(1), reqs[2]) is None
+    stats = cache.get_cache_stats()
+    assert stats["expirations"] == 1 and stats["entries"] == 1
+
+
+def test_plans_are_stored_compressed():
+    backend = MemoryPlanCacheBackend()
+    cache = NutritionPlanCache(backend)
+    plan = _plan()
+    cache.set(_user(1), schemas.NutritionPlanRequest(days=1), plan)
+
+    ((_, _, stored),) = backend._data.values()
+    assert isinstance(stored, bytes)
+    assert len(stored) < len(plan.model_dump_json())
+
+
+def test_backend_errors_do_not_break_generation(monkeypatch):
+    class _Down(RedisPlanCacheBackend):
+        def get(self, key):
+            raise ConnectionError("redis down")
+
+    cache = NutritionPlanCache(_Down(client=_FakeRedis()))
+    assert cache.get(_user(1), schemas.NutritionPlanRequest(days=1)) is None
+    assert cache.get_cache_stats()["errors"] == 1
+
+
+def test_profile_update_invalidates_cached_plans(db_session, monkeypatch):
+    from app.user_profile import services as profile_services
+    from app.user_profile.models import UserProfile
+    from app.user_profile.schemas import UserProfileUpdate
+
+    cache = NutritionPlanCache(MemoryPlanCacheBackend())
+    monkeypatch.setattr(plan_cache, "_nutrition_cache", cache)
+    profile = UserProfile(user_id=7, full_name="Ana", age=30)
+    db_session.add(profile)
+    db_session.commit()
+    user, req = _user(7), schemas.NutritionPlanRequest(days=1)
+    cache.set(user, req, _plan())
+
+    profile_services.update_profile(
+        db_session, profile.id, UserProfileUpdate(age=31), user
+    )
+
+    assert cache.get(user, req) is None
+
+
+def _profile(db, user_id, weight_kg=80.0, allergies=None):
+    from app.user_profile.models import ActivityLevel, Goal, UserProfile
+
+    profile = UserProfile(
+        user_id=user_id,
+        full_name=f"User {user_id}",
+        age=30,
+        height_cm=180,
+        weight_kg=weight_kg,
+        activity_level=ActivityLevel.MODERATELY_ACTIVE,
+        goal=Goal.MAINTAIN_WEIGHT,
+        dietary_preference="vegetarian",
+        allergies=allergies,
+    )
+    db.add(profile)
+    db.commit()
+
+
+def test_fingerprint_buckets_targets_and_keeps_restrictions(db_session):
+    req = schemas.NutritionPlanRequest(days=3)
+    _profile(db_session, 11, weight_kg=80.0, allergies="Nueces, lactosa")
+    _profile(db_session, 12, weight_kg=80.3, allergies="lactosa,nueces")
+    _profile(db_session, 13, weight_kg=80.0, allergies="gluten")
+
+    fp = plan_cache.plan_fingerprint(db_session, 11, req)
+
+    assert fp and fp == plan_cache.plan_fingerprint(db_session, 12, req)
+    assert fp != plan_cache.plan_fingerprint(db_session, 13, req)
+    assert fp != plan_cache.plan_fingerprint(
+        db_session, 11, schemas.NutritionPlanRequest(days=4)
+    )
+    assert plan_cache.plan_fingerprint(db_session, 99, req) is None  # sin perfil
+
+
+def test_shared_tier_reuses_plans_across_users_with_rewritten_dates(
+    db_session, monkeypatch
+):
+    from datetime import date
+
+    from app.ai import services as ai_services
+
+    cache = NutritionPlanCache(MemoryPlanCacheBackend(), shared=True)
+    monkeypatch.setattr(plan_cache, "_nutrition_cache", cache)
+    generated = []
+
+    def fake_generate(user, req, db, simulate=False):
+        generated.append(user.id)
+        return _plan(kcal=2630)  # objetivo automático de los perfiles de 80 kg
+
+    monkeypatch.setattr(ai_services, "generate_nutrition_plan_optimized", fake_generate)
+    _profile(db_session, 21)
+    _profile(db_session, 22, weight_kg=80.3)
+    req = schemas.NutritionPlanRequest(days=1)
+
+    first = plan_cache.generate_nutrition_plan_with_cache(_user(21), req, db_session)
+    plan = plan_cache.generate_nutrition_plan_with_cache(_user(22), req, db_session)
+
+    assert generated == [21]
+    assert plan.days[0].date == date.today().isoformat()
+    assert plan.days[0].meals == first.days[0].meals
+    # con los objetivos propios, no los del usuario que generó el plan
+    assert plan.targets["protein_g"] == pytest.approx(80.3 * 1.8, abs=0.1)
+    assert plan.targets != first.targets
+    assert cache.get_cache_stats()["shared_hits"] == 1
+
+    cache.shared = False
+    _profile(db_session, 23)
+    plan_cache.generate_nutrition_plan_with_cache(_user(23), req, db_session)
+    assert generated == [21, 23]
+
+
+def test_shared_plans_off_the_requesters_targets_are_not_served():
+    plan = _plan(kcal=2000)
+    plan.days[0].totals.update(protein_g=150)
+
+    own = plan_cache.personalize_shared_plan(
+        plan, {"kcal": 2040, "protein_g": 145, "carbs_g": 250, "fat_g": 70}
+    )
+    assert own.targets == {"kcal": 2040, "protein_g": 145, "carbs_g": 250, "fat_g": 70}
+    assert (
+        plan_cache.personalize_shared_plan(plan, {"kcal": 2040, "protein_g": 120})
+        is None
+    )
+    assert (
+        plan_cache.personalize_shared_plan(plan, {"kcal": 2300, "protein_g": 150})
+        is None
+    )
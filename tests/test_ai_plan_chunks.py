@@ -0,0 +1,270 @@
+import json
+import re
+import threading
+import time
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.ai import schemas
+from app.ai import services as ai_services
+from app.auth.deps import UserContext
+from app.nutrition.models import NutritionMeal
+
+
+def _day(day_date, name):
+    return {
+        "date": day_date,
+        "meals": [
+            {
+                "type": "lunch",
+                "items": [
+                    {
+                        "name": name,
+                        "qty": 150,
+                        "unit": "g",
+                        "kcal": 250,
+                        "protein_g": 40,
+                        "carbs_g": 0,
+                        "fat_g": 8,
+                    }
+                ],
+            }
+        ],
+    }
+
+
+class _SlowClient:
+    """Cliente que tarda ``delay`` por llamada y responde con los días pedidos."""
+
+    def __init__(self, delay=0.3, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def chat(self, user_id, messages):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.fail_on and self.fail_on in prompt:
+                raise HTTPException(status_code=502, detail="bad chunk")
+            dates = re.findall(r"'(\d{4}-\d{2}-\d{2})'", prompt)
+            protein = re.search(
+                r"Proteínas principales de este bloque: (\w+)", prompt
+            ).group(1)
+            # el modelo se equivoca de fechas: las fija el bloque
+            reply = {
+                "days": [_day("2000-01-01", protein) for _ in dates],
+                "targets": {"kcal": 1},
+            }
+            return {"reply": json.dumps(reply)}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = _SlowClient()
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: fake)
+    return fake
+
+
+def _profile(db, user_id, **extra):
+    from app.user_profile.models import ActivityLevel, Goal, UserProfile
+
+    db.add(
+        UserProfile(
+            user_id=user_id,
+            full_name="Ana",
+            age=30,
+            height_cm=170,
+            weight_kg=65,
+            activity_level=ActivityLevel.MODERATELY_ACTIVE,
+            goal=Goal.MAINTAIN_WEIGHT,
+            **extra,
+        )
+    )
+    db.commit()
+
+
+def test_chunks_run_concurrently_and_merge_in_order(db_session, client):
+    _profile(db_session, 3)
+
+    plan = ai_services.generate_nutrition_plan_chunked(
+        UserContext(id=3, email=""),
+        schemas.NutritionPlanRequest(days=14),
+        db_session,
+        chunk_days=4,
+        max_workers=4,
+    )
+
+    assert len(client.prompts) == 4 and client.max_active == 4  # a la vez
+    today = date.today()
+    assert [d.date for d in plan.days] == [
+        (today + timedelta(days=i)).isoformat() for i in range(14)
+    ]
+    proteins = [plan.days[i].meals[0].items[0].name for i in (0, 4, 8, 12)]
+    assert len(set(proteins)) == 4  # cada bloque con su tramo de la rotación
+    assert (
+        plan.targets["kcal"] > 1000
+    )  # objetivos del perfil, comunes a todos los bloques
+
+
+def test_parallelism_is_bounded(db_session, client):
+    ai_services.generate_nutrition_plan_chunked(
+        UserContext(id=4, email=""),
+        schemas.NutritionPlanRequest(days=6),
+        db_session,
+        chunk_days=2,
+        max_workers=2,
+    )
+
+    assert len(client.prompts) == 3 and client.max_active == 2
+
+
+def test_failed_chunk_is_retried(db_session, monkeypatch):
+    class _FlakyClient(_SlowClient):
+        def chat(self, user_id, messages):
+            if "bloque 2 de 2" in messages[-1]["content"] and not self.failed:
+                self.failed = True
+                return {"reply": "not json"}
+            return super().chat(user_id, messages)
+
+    fake = _FlakyClient(delay=0)
+    fake.failed = False
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: fake)
+
+    plan = ai_services.generate_nutrition_plan_chunked(
+        UserContext(id=4, email=""),
+        schemas.NutritionPlanRequest(days=4),
+        db_session,
+        chunk_days=2,
+    )
+
+    assert fake.failed and len(plan.days) == 4
+
+
+def test_failed_chunk_keeps_the_other_chunks(db_session, monkeypatch):
+    from app.background.nutrition_tasks import generate_parallel_chunks
+    from app.core.config import settings
+
+    fake = _SlowClient(delay=0, fail_on="bloque 2 de 2")
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: fake)
+    monkeypatch.setattr(settings, "NUTRITION_PLAN_CHUNK_DAYS", 7)
+
+    class _Task:
+        def update_state(self, state, meta):
+            pass
+
+    result = generate_parallel_chunks(
+        _Task(), UserContext(id=10, email=""), {}, db_session
+    )
+
+    assert len(fake.prompts) == 2 + ai_services.CHUNK_RETRIES
+    assert result["days_generated"] == 7 and result["truncated"] is True
+    today = date.today()
+    assert result["missing_dates"] == [
+        (today + timedelta(days=i)).isoformat() for i in range(7, 14)
+    ]
+    assert (
+        db_session.query(NutritionMeal).filter(NutritionMeal.user_id == 10).count() == 7
+    )
+
+
+def test_plan_fails_only_when_every_chunk_fails(db_session, monkeypatch):
+    fake = _SlowClient(delay=0, fail_on="bloque")
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: fake)
+
+    with pytest.raises(HTTPException):
+        ai_services.generate_nutrition_plan_chunked(
+            UserContext(id=4, email=""),
+            schemas.NutritionPlanRequest(days=4),
+            db_session,
+            chunk_days=2,
+        )
+    assert len(fake.prompts) == 2 * (1 + ai_services.CHUNK_RETRIES)
+
+
+def test_14_day_task_parallel_strategy_persists_merged_plan(db_session, client):
+    from app.background.nutrition_tasks import generate_parallel_chunks
+
+    class _Task:
+        states = []
+
+        def update_state(self, state, meta):
+            self.states.append(meta)
+
+    task = _Task()
+    result = generate_parallel_chunks(
+        task, UserContext(id=6, email=""), {"strategy": "parallel_chunks"}, db_session
+    )
+
+    assert result["strategy"] == "parallel_chunks" and result["days_generated"] == 14
+    assert [m.get("chunks_ready") for m in task.states if "chunks_ready" in m] == [
+        1,
+        2,
+        3,
+        4,
+    ]
+    assert (
+        db_session.query(NutritionMeal).filter(NutritionMeal.user_id == 6).count() == 14
+    )
+
+
+def test_protein_rotation_respects_diet_and_allergies(db_session, client):
+    _profile(db_session, 7, dietary_preference="vegetarian", allergies="soja")
+
+    ai_services.generate_nutrition_plan_chunked(
+        UserContext(id=7, email=""),
+        schemas.NutritionPlanRequest(days=14),
+        db_session,
+        chunk_days=4,
+    )
+
+    hints = [
+        re.search(r"Proteínas principales de este bloque: ([^.]+)\.", p).group(1)
+        for p in client.prompts
+    ]
+    named = {p.strip() for hint in hints for p in hint.split(",")}
+    assert named <= {"legumbres", "huevos", "garbanzos", "lentejas"}
+    assert (
+        ai_services._chunk_constraint(0, 2, ["2025-01-01"], 2, []).count("Proteínas")
+        == 0
+    )
+
+
+def test_short_chunks_are_retried_then_reported_as_truncated(db_session, monkeypatch):
+    from app.background.nutrition_tasks import generate_parallel_chunks
+    from app.core.config import settings
+
+    class _ShortClient(_SlowClient):
+        def chat(self, user_id, messages):
+            resp = super().chat(user_id, messages)
+            reply = json.loads(resp["reply"])
+            if "bloque 2 de 2" in messages[-1]["content"]:
+                reply["days"] = reply["days"][:-1]  # siempre un día menos
+            return {"reply": json.dumps(reply)}
+
+    fake = _ShortClient(delay=0)
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: fake)
+    monkeypatch.setattr(settings, "NUTRITION_PLAN_CHUNK_DAYS", 7)
+
+    class _Task:
+        def update_state(self, state, meta):
+            pass
+
+    result = generate_parallel_chunks(
+        _Task(), UserContext(id=9, email=""), {}, db_session
+    )
+
+    assert len(fake.prompts) == 2 + ai_services.CHUNK_RETRIES
+    assert result["days_generated"] == 13 and result["truncated"] is True
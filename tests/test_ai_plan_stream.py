@@ -0,0 +1,241 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.ai import services as ai_services
+from app.ai.plan_stream import PlanDaysParser, StreamedPlan
+from app.ai_client import LocalAiClient
+from app.auth.deps import UserContext
+from app.nutrition.models import NutritionMeal, NutritionTarget
+from tests.test_ai_plan_chunks import _profile
+
+
+def _day(i, name="lentejas"):
+    return {
+        "date": f"2025-01-0{i + 1}",
+        "meals": [
+            {
+                "type": "lunch",
+                "items": [
+                    {
+                        "name": name,
+                        "qty": 200,
+                        "unit": "g",
+                        "kcal": 230,
+                        "protein_g": 18,
+                        "carbs_g": 40,
+                        "fat_g": 1,
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def _plan_text(n=3):
+    plan = {
+        "days": [_day(i) for i in range(n)],
+        "targets": {"kcal": 2000, "protein_g": 120, "carbs_g": 250, "fat_g": 70},
+    }
+    return "```json\n" + json.dumps(plan, ensure_ascii=False) + "\n```"
+
+
+def _chunks(text, size=3):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_parser_emits_each_day_as_soon_as_it_closes():
+    text = _plan_text(3)
+    parser = PlanDaysParser()
+    emitted_at = []
+    for pos, chunk in enumerate(_chunks(text)):
+        for day in parser.feed(chunk):
+            emitted_at.append((pos * 3 + len(chunk), day))
+
+    assert [d for _, d in emitted_at] == [_day(i) for i in range(3)]
+    first_day_end = text.index(json.dumps(_day(0), ensure_ascii=False)) + len(
+        json.dumps(_day(0), ensure_ascii=False)
+    )
+    assert (
+        emitted_at[0][0] - first_day_end < 3
+    )  # en el mismo fragmento que cierra el día
+    assert parser.days_closed
+
+
+def test_parser_ignores_braces_and_keys_inside_strings():
+    tricky = _day(0, name='pan "de {días}" [integral] \\\\')
+    text = json.dumps({"note": "days: [{", "days": [tricky], "targets": {"days": []}})
+    parser = PlanDaysParser()
+
+    days = [d for chunk in _chunks(text, 1) for d in parser.feed(chunk)]
+
+    assert days == [tricky]
+
+
+def test_truncated_stream_keeps_the_validated_days():
+    text = _plan_text(3)
+    cut = text.index('"2025-01-03"')
+
+    def stalled():
+        yield from _chunks(text[:cut], 7)
+        raise HTTPException(status_code=504, detail="timeout")
+
+    streamed = StreamedPlan(stalled())
+    days = [value for kind, value in streamed if kind == "day"]
+
+    assert [i for i, _ in days] == [0, 1]
+    assert not streamed.complete and streamed.error.status_code == 504
+    plan = streamed.result()
+    assert len(plan.days) == 2 and plan.days[0].totals["kcal"] == 230
+    assert plan.targets["kcal"] == 230
+
+
+def test_stream_without_any_day_reraises():
+    def broken():
+        yield '{"days": ['
+        raise HTTPException(status_code=429, detail="rate limit")
+
+    streamed = StreamedPlan(broken())
+    list(streamed)
+    with pytest.raises(HTTPException) as exc:
+        streamed.result()
+    assert exc.value.status_code == 429
+
+
+class _Provider:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def chat_stream(self, user_id, messages, *, simulate=False, model=None):
+        yield from self.chunks
+
+
+class _Task:
+    def __init__(self):
+        self.states = []
+
+    def update_state(self, state, meta):
+        self.states.append(meta)
+
+
+def test_14_day_base_week_persists_and_reports_each_day(db_session, monkeypatch):
+    from app.ai import schemas
+    from app.background.nutrition_tasks import stream_base_week
+
+    client = LocalAiClient.__new__(LocalAiClient)
+    client._provider = _Provider(_chunks(_plan_text(7), 50))
+    client._backup_provider = None
+    monkeypatch.setattr(ai_services, "get_ai_client", lambda: client)
+    task = _Task()
+
+    plan, persisted, complete = stream_base_week(
+        task,
+        UserContext(id=5, email=""),
+        schemas.NutritionPlanRequest(days=7),
+        db_session,
+    )
+
+    assert complete and len(plan.days) == 7
+    assert [m["days_ready"] for m in task.states] == list(range(1, 8))
+    assert task.states[-1]["progress"] == 60
+    assert persisted["meals_created"] == 7
+    assert (
+        db_session.query(NutritionMeal).filter(NutritionMeal.user_id == 5).count() == 7
+    )
+    # sin perfil, los 7 días llevan los objetivos del plan (no los 2000/100/250/70)
+    assert _targets_by_date(db_session, 5) == {
+        f"2025-01-0{i + 1}": (2000, 120.0, 250.0, 70.0) for i in range(7)
+    }
+
+
+def _targets_by_date(db, user_id):
+    db.expire_all()
+    rows = db.query(NutritionTarget).filter(NutritionTarget.user_id == user_id)
+    return {
+        r.date.isoformat(): (
+            r.calories_target,
+            float(r.protein_g_target),
+            float(r.carbs_g_target),
+            float(r.fat_g_target),
+        )
+        for r in rows
+    }
+
+
+def test_streamed_days_persist_the_profile_targets(db_session):
+    from app.ai.routers import _plan_day_events
+
+    _profile(db_session, 9)
+    expected = ai_services.profile_plan_targets(db_session, 9)
+    assert expected is not None
+
+    events = list(_plan_day_events(iter(_chunks(_plan_text(3), 11)), 9, persist=True))
+
+    assert '"SUCCESS"' in events[-1]
+    targets = _targets_by_date(db_session, 9)
+    assert sorted(targets) == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    for values in targets.values():
+        assert values == (
+            expected["kcal"],
+            expected["protein_g"],
+            expected["carbs_g"],
+            expected["fat_g"],
+        )
+        assert values != (2000, 100.0, 250.0, 70.0)
+
+
+def _old_ai_meal(db, user_id, day):
+    from datetime import date
+
+    from app.nutrition import crud
+    from app.nutrition import schemas as nutrition_schemas
+
+    crud.create_meal(
+        db,
+        user_id,
+        nutrition_schemas.MealCreate(
+            date=date.fromisoformat(day),
+            meal_type="lunch",
+            name="Plan anterior",
+            notes="Generado por IA - Plan 14 días",
+            items=[],
+        ),
+    )
+    db.commit()
+
+
+def _meals_by_name(db, user_id):
+    db.expire_all()
+    meals = db.query(NutritionMeal).filter(NutritionMeal.user_id == user_id)
+    return sorted((m.date.isoformat(), m.name) for m in meals)
+
+
+def test_failed_stream_keeps_the_previous_ai_meals(db_session):
+    from app.ai.routers import _plan_day_events
+
+    _old_ai_meal(db_session, 8, "2025-01-01")
+    _old_ai_meal(db_session, 8, "2025-01-02")
+    before = _meals_by_name(db_session, 8)
+
+    def broken():
+        yield '{"days": ['
+        raise HTTPException(status_code=504, detail="timeout")
+
+    events = list(_plan_day_events(broken(), 8, persist=True))
+    assert '"FAILURE"' in events[-1]
+    assert _meals_by_name(db_session, 8) == before
+
+    # tras un día válido solo se sustituye esa fecha
+    text = _plan_text(3)
+
+    def stalled():
+        yield from _chunks(text[: text.index('"2025-01-02"')], 7)
+        raise HTTPException(status_code=504, detail="timeout")
+
+    events = list(_plan_day_events(stalled(), 8, persist=True))
+    assert '"truncated": true' in events[-1]
+    assert _meals_by_name(db_session, 8) == [
+        ("2025-01-01", "Comida IA - Lunch"),
+        ("2025-01-02", "Plan anterior"),
+    ]
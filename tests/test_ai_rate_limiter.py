@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from app.ai import rate_limiter
+from app.ai.rate_limiter import LLMRateLimiter, RateLimitExceeded
+from services.food_source_guard import SQLiteGuardStore
+
+
+def _limiter(path, **quota):
+    store = SQLiteGuardStore(str(path), table="ai_rate_limit")
+    quotas = {"openrouter": {"min_interval_s": 0.2, "max_daily": 5, **quota}}
+    return LLMRateLimiter(store, quotas=quotas, max_wait_s=1.0)
+
+
+def test_processes_share_one_quota(tmp_path):
+    path = tmp_path / "rl.sqlite3"
+    worker_a, worker_b = _limiter(path), _limiter(path)
+
+    waits = [
+        worker.reserve("openrouter")
+        for worker in (worker_a, worker_b, worker_a, worker_b)
+    ]
+
+    # los huecos se reparten entre procesos, no se multiplican
+    assert waits[0] == 0
+    assert waits[1:] == pytest.approx([0.2, 0.4, 0.6], abs=0.05)
+    status = worker_b.status("openrouter")
+    assert status["daily_requests"] == 4 and status["queue_depth"] == 3
+
+    worker_a.reserve("openrouter")
+    with pytest.raises(RateLimitExceeded) as exc:
+        worker_b.reserve("openrouter")
+    assert exc.value.status_code == 429 and "diario" in exc.value.detail
+
+
+def test_long_queue_is_refused_without_reserving(tmp_path):
+    limiter = _limiter(tmp_path / "rl.sqlite3", min_interval_s=0.4, max_daily=100)
+    for _ in range(3):
+        limiter.reserve("openrouter")
+
+    with pytest.raises(RateLimitExceeded) as exc:
+        limiter.reserve("openrouter")
+
+    assert exc.value.headers["Retry-After"] == "2"
+    status = limiter.status("openrouter")
+    assert status["refused"] == 1 and status["daily_requests"] == 3
+    assert status["max_wait_s"] == pytest.approx(0.8, abs=0.05)
+
+
+def test_keys_have_independent_quotas(tmp_path):
+    limiter = _limiter(tmp_path / "rl.sqlite3", max_daily=1)
+    limiter.reserve("openrouter")
+
+    assert limiter.reserve("openrouter_backup") == 0  # cuota por defecto, aparte
+    with pytest.raises(RateLimitExceeded):
+        limiter.reserve("openrouter")
+
+
+def test_async_acquire_waits_without_blocking_the_loop(tmp_path):
+    limiter = _limiter(tmp_path / "rl.sqlite3")
+
+    async def main():
+        ticks = 0
+        stop = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not stop.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        waits = await asyncio.gather(*(limiter.acquire("openrouter") for _ in range(3)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await task
+        return sorted(waits), elapsed, ticks
+
+    waits, elapsed, ticks = asyncio.run(main())
+
+    assert waits == pytest.approx([0, 0.2, 0.4], abs=0.05)
+    assert 0.35 < elapsed < 0.8
+    assert ticks >= 20  # el loop siguió atendiendo otras corrutinas
+
+
+def test_provider_helpers_use_the_global_limiter(tmp_path, monkeypatch):
+    limiter = _limiter(tmp_path / "rl.sqlite3", max_daily=1)
+    monkeypatch.setattr(rate_limiter, "_rate_limiter", limiter)
+
+    assert rate_limiter.check_rate_limit("openrouter") is True
+    rate_limiter.record_api_request("openrouter")
+    assert rate_limiter.check_rate_limit("openrouter") is False
+
+    status = rate_limiter.get_rate_limiter().get_status()
+    assert status["backend"] == "sqlite"
+    assert status["keys"]["openrouter"]["completed"] == 1
@@ -0,0 +1,160 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.ai import schemas, smart_food_search
+from app.ai.search_cache import SmartFoodSearchCache, SmartFoodSearchCacheEntry
+from app.auth.deps import UserContext
+from app.core.database import SessionLocal
+
+USER = UserContext(id=1, email="", username="")
+
+
+class _FakeClient:
+    def __init__(self, suggestions=("pavo", "huevo", "atún", "tofu", "salmón")):
+        self.calls = 0
+        self.suggestions = list(suggestions)
+        self.prompts = []
+
+    def chat(self, user_id, messages):
+        self.calls += 1
+        self.prompts.append(messages)
+        return {
+            "reply": json.dumps(
+                {
+                    "enhanced_query": "pechuga de pollo",
+                    "search_terms": ["pollo", "pechuga"],
+                    "suggestions": self.suggestions,
+                }
+            )
+        }
+
+
+@pytest.fixture
+def cache(db_session, monkeypatch):
+    cache = SmartFoodSearchCache(ttl_s=60, max_entries=3)
+    cache.clear()
+    monkeypatch.setattr(smart_food_search, "_smart_search_cache", lambda: cache)
+    client = _FakeClient()
+    monkeypatch.setattr(smart_food_search, "get_ai_client", lambda: client)
+    cache.client = client
+    return cache
+
+
+def test_enhance_is_cached_by_normalized_query_context_and_locale(cache):
+    first = smart_food_search.enhance_food_search(
+        USER, schemas.SmartFoodSearchRequest(query="Pollo", context="cena")
+    )
+    terms = smart_food_search.get_enhanced_search_terms(USER, "  pollo ", "Cena")
+
+    assert cache.client.calls == 1
+    assert first.suggestions == ["pavo", "huevo", "atún", "tofu", "salmón"]
+    assert terms == ["pollo", "pechuga"]
+
+    smart_food_search.enhance_food_search(
+        USER, schemas.SmartFoodSearchRequest(query="pollo", context="cena", locale="en")
+    )
+    assert cache.client.calls == 2
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_cached_suggestions_are_trimmed_per_request(cache):
+    smart_food_search.get_enhanced_search_terms(USER, "pollo")  # asks for 3 suggestions
+
+    resp = smart_food_search.enhance_food_search(
+        USER, schemas.SmartFoodSearchRequest(query="pollo", max_suggestions=4)
+    )
+
+    assert cache.client.calls == 1
+    assert len(resp.suggestions) == 4
+
+
+def test_cache_keeps_the_full_list_for_larger_requests(cache):
+    cache.client.suggestions = [f"s{i}" for i in range(12)]
+    smart_food_search.get_enhanced_search_terms(USER, "pollo")  # asks for 3 suggestions
+
+    resp = smart_food_search.enhance_food_search(
+        USER, schemas.SmartFoodSearchRequest(query="pollo", max_suggestions=8)
+    )
+
+    assert cache.client.calls == 1
+    assert resp.suggestions == [f"s{i}" for i in range(8)]
+
+
+def test_locale_selects_the_prompt_language(cache):
+    smart_food_search.enhance_food_search(
+        USER, schemas.SmartFoodSearchRequest(query="chicken", locale="en-US")
+    )
+
+    assert "en inglés" in cache.client.prompts[0][0]["content"]
+
+
+def test_expired_entries_miss_and_size_is_bounded(cache):
+    response = schemas.SmartFoodSearchResponse(
+        enhanced_query="x", search_terms=["x"], suggestions=[]
+    )
+    for q in ["a", "b", "c", "d"]:
+        cache.set(q, None, "es", response)
+    assert cache.get_stats()["entries"] == 3
+    assert cache.get("a", None, "es") is None  # least recently used was evicted
+
+    with SessionLocal() as db:
+        for entry in db.query(SmartFoodSearchCacheEntry):
+            entry.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+    assert cache.get("d", None, "es") is None
+
+
+def test_ai_failures_are_not_cached(cache, monkeypatch):
+    class _Broken:
+        def chat(self, *a, **k):
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(smart_food_search, "get_ai_client", lambda: _Broken())
+
+    resp = smart_food_search.enhance_food_search(
+        USER, schemas.SmartFoodSearchRequest(query="kale")
+    )
+
+    assert resp.search_terms == ["kale"]
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_admin_prewarm(test_client, cache, monkeypatch):
+    from app.routers import admin
+
+    monkeypatch.setattr(admin.settings, "AI_INTERNAL_SECRET", "s3cret")
+    cache.set(
+        "pollo",
+        None,
+        "es",
+        schemas.SmartFoodSearchResponse(
+            enhanced_query="p", search_terms=["p"], suggestions=[]
+        ),
+    )
+
+    resp = test_client.post(
+        "/api/v1/admin/ai/food-search/prewarm",
+        json={
+            "queries": ["pollo", "arroz", "Arroz", "avena", "pan"],
+            "max_llm_calls": 2,
+        },
+        headers={"X-Admin-Secret": "s3cret"},
+    )
+
+    assert resp.status_code == 200
+    assert resp.json()["data"] == {
+        "warmed": 2,
+        "already_cached": 1,
+        "skipped": 1,
+        "failed": 0,
+    }
+    assert cache.client.calls == 2
+    assert (
+        test_client.post(
+            "/api/v1/admin/ai/food-search/prewarm", json={"queries": ["x"]}
+        ).status_code
+        == 403
+    )
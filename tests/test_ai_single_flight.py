@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+from app.ai import single_flight
+from app.ai.single_flight import GenerationRegistry, SingleFlight, flight_key
+from services.food_source_guard import SQLiteGuardStore
+
+
+def _registry(path, ttl_s=60):
+    return GenerationRegistry(
+        SQLiteGuardStore(str(path), table="ai_single_flight"), ttl_s=ttl_s
+    )
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"plan": len(calls)}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flights.do("u1:abc", generate)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert [r for r, _ in results] == [{"plan": 1}] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flights.in_flight() == 0
+
+
+def test_waiters_get_the_leaders_error():
+    flights = SingleFlight()
+    started = threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("LLM caído")
+
+    def follower():
+        started.wait()
+        try:
+            flights.do("k", fail)
+        except RuntimeError as exc:
+            errors.append(str(exc))
+
+    t = threading.Thread(target=follower)
+    t.start()
+    with pytest.raises(RuntimeError):
+        flights.do("k", fail)
+    t.join()
+
+    assert errors == ["LLM caído"]
+
+
+def test_processes_attach_to_the_task_in_flight(tmp_path):
+    path = tmp_path / "sf.sqlite3"
+    api_a, api_b = _registry(path), _registry(path)
+    started = []
+    key = flight_key("generate_nutrition_plan_14_days", 7, {"days": 14})
+
+    first, coalesced_a = api_a.submit(key, started.append)
+    second, coalesced_b = api_b.submit(key, started.append)
+
+    assert (coalesced_a, coalesced_b) == (False, True)
+    assert second == first and started == [first]
+
+    api_b.release(key, "otra-tarea")  # una tarea antigua no libera la actual
+    assert api_a.current(key) == first
+
+    api_b.release(key, first)
+    third, coalesced = api_a.submit(key, started.append)
+    assert not coalesced and third != first and started == [first, third]
+
+
+def test_key_depends_on_user_and_payload_and_expires(tmp_path):
+    registry = _registry(tmp_path / "sf.sqlite3", ttl_s=0.2)
+    started = []
+
+    a, _ = registry.submit(
+        flight_key("t", 1, {"days": 14, "preferences": {"diet": "vegana"}}),
+        started.append,
+    )
+    b, _ = registry.submit(flight_key("t", 1, {"days": 14}), started.append)
+    c, _ = registry.submit(flight_key("t", 2, {"days": 14}), started.append)
+    assert len({a, b, c}) == 3
+
+    time.sleep(0.25)  # worker caído: el TTL deja lanzar de nuevo
+    _, coalesced = registry.submit(flight_key("t", 2, {"days": 14}), started.append)
+    assert not coalesced and len(started) == 4
+
+
+def test_failed_start_releases_the_key(tmp_path):
+    registry = _registry(tmp_path / "sf.sqlite3")
+
+    def broker_down(task_id):
+        raise ConnectionError("broker down")
+
+    with pytest.raises(ConnectionError):
+        registry.submit("k", broker_down)
+    assert registry.current("k") is None
+
+
+def test_celery_task_holds_the_key_until_it_finishes(tmp_path, monkeypatch):
+    from app.background.celery_app import celery_app
+    from app.background.nutrition_tasks import generate_nutrition_plan_task
+
+    monkeypatch.setitem(celery_app.conf, "task_always_eager", True)
+    registry = _registry(tmp_path / "sf.sqlite3")
+    monkeypatch.setattr(single_flight, "_registry", registry)
+    request_data = {"days": 14, "preferences": {}}
+    seen = {}
+
+    def run(user_id, request_data):
+        # un doble clic mientras la tarea corre se une a ella
+        seen["retry"] = single_flight.submit_generation_task(
+            generate_nutrition_plan_task, user_id, request_data
+        )
+        return {"status": "SUCCESS"}
+
+    monkeypatch.setattr(generate_nutrition_plan_task, "run", run)
+
+    task_id, coalesced = single_flight.submit_generation_task(
+        generate_nutrition_plan_task, 3, request_data
+    )
+
+    assert not coalesced
+    assert seen["retry"] == (task_id, True)
+    key = flight_key(generate_nutrition_plan_task.name, 3, request_data)
+    assert registry.current(key) is None  # liberada por task_postrun
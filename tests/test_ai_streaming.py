@@ -0,0 +1,231 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.ai import rate_limiter, schemas
+from app.ai import routers as ai_routers
+from app.ai import services as ai_services
+from app.ai.provider import OpenAIProvider
+from app.ai_client import LocalAiClient
+from app.auth.deps import UserContext, get_current_user
+from app.core.database import get_db
+from tests.conftest import override_get_db
+
+PLAN_JSON = json.dumps(
+    {
+        "days": [
+            {
+                "date": "2025-01-01",
+                "meals": [
+                    {
+                        "type": "lunch",
+                        "items": [
+                            {
+                                "name": "lentejas",
+                                "qty": 200,
+                                "unit": "g",
+                                "kcal": 230,
+                                "protein_g": 18,
+                                "carbs_g": 40,
+                                "fat_g": 1,
+                            }
+                        ],
+                    }
+                ],
+            }
+        ],
+        "targets": {"kcal": 2000, "protein_g": 120, "carbs_g": 250, "fat_g": 70},
+    }
+)
+
+
+class _FakeStreamingProvider:
+    """Proveedor que emite la respuesta en trozos con una pausa entre ellos."""
+
+    def __init__(self, reply, chunk=8, delay=0.0, fail=None):
+        self.reply = reply
+        self.chunk = chunk
+        self.delay = delay
+        self.fail = fail
+
+    def chat_stream(self, user_id, messages, *, simulate=False, model=None):
+        if self.fail:
+            raise self.fail
+        for i in range(0, len(self.reply), self.chunk):
+            if i:
+                time.sleep(self.delay)
+            yield self.reply[i : i + self.chunk]
+
+
+def _client_with(provider, backup=None):
+    client = LocalAiClient.__new__(LocalAiClient)
+    client._provider = provider
+    client._backup_provider = backup
+    return client
+
+
+@pytest.fixture
+def api(db_session, monkeypatch):
+    app = FastAPI()
+    app.include_router(ai_routers.router, prefix="/api/v1")
+    app.dependency_overrides[get_current_user] = lambda: UserContext(
+        id=1, email="", username=""
+    )
+    app.dependency_overrides[get_db] = override_get_db
+
+    def use(provider, backup=None):
+        client = _client_with(provider, backup)
+        monkeypatch.setattr(ai_services, "get_ai_client", lambda: client)
+
+    return TestClient(app), use
+
+
+def _events(resp):
+    return [
+        json.loads(line[len("data: ") :])
+        for line in resp.iter_lines()
+        if line.startswith("data: ")
+    ]
+
+
+def test_chat_stream_sends_tokens_before_the_completion_ends(api):
+    client, use = api
+    use(_FakeStreamingProvider("Hola, ¿en qué te ayudo hoy?", chunk=5, delay=0.2))
+    payload = schemas.ChatRequest(messages=[{"role": "user", "content": "hola"}])
+    response = ai_routers.chat_stream(
+        payload, current_user=UserContext(id=1, email="", username="")
+    )
+
+    async def consume():
+        started = time.perf_counter()
+        arrivals = []
+        async for chunk in response.body_iterator:
+            arrivals.append((time.perf_counter() - started, chunk))
+        return arrivals
+
+    arrivals = asyncio.run(consume())
+    events = [json.loads(chunk[len("data: ") :]) for _, chunk in arrivals]
+
+    assert (
+        arrivals[0][0] < 0.1 and arrivals[1][0] < 0.1
+    )  # STARTED y primer token sin esperar al resto
+    assert arrivals[-1][0] >= 1.0
+    assert events[0] == {"status": "STARTED"}
+    assert len([e for e in events if e["status"] == "TOKEN"]) == 6
+    assert events[-1] == {"status": "SUCCESS", "reply": "Hola, ¿en qué te ayudo hoy?"}
+
+    with client.stream("POST", "/api/v1/ai/chat/stream", json={"messages": []}) as resp:
+        assert resp.headers["content-type"].startswith("text/event-stream")
+
+
+def test_nutrition_plan_stream_ends_with_the_validated_plan(api):
+    client, use = api
+    use(_FakeStreamingProvider(PLAN_JSON, chunk=40))
+
+    resp = client.post(
+        "/api/v1/ai/generate/nutrition-plan-direct/stream", json={"days": 1}
+    )
+    events = _events(resp)
+
+    assert "".join(e["delta"] for e in events if e["status"] == "TOKEN") == PLAN_JSON
+    final = events[-1]
+    assert final["status"] == "SUCCESS"
+    assert final["plan"]["days"][0]["meals"][0]["items"][0]["name"] == "lentejas"
+    assert final["plan"]["days"][0]["totals"]["kcal"] == 230
+
+
+def test_stream_reports_provider_errors_as_failure_event(api):
+    client, use = api
+    use(
+        _FakeStreamingProvider(
+            "", fail=HTTPException(status_code=402, detail="AI budget exceeded")
+        )
+    )
+
+    events = _events(client.post("/api/v1/ai/chat/stream", json={"messages": []}))
+
+    assert events[-1]["status"] == "FAILURE"
+    assert events[-1]["error"] == "AI budget exceeded"
+
+
+def test_local_client_falls_back_before_first_token_only():
+    backup = _FakeStreamingProvider("respaldo")
+    limited = _FakeStreamingProvider(
+        "", fail=HTTPException(status_code=429, detail="Rate limit alcanzado")
+    )
+
+    assert "".join(_client_with(limited, backup).chat_stream(1, [])) == "respaldo"
+
+    class _DiesMidStream(_FakeStreamingProvider):
+        def chat_stream(self, *args, **kwargs):
+            yield "hola"
+            raise HTTPException(status_code=429, detail="429 too many requests")
+
+    with pytest.raises(HTTPException):
+        list(_client_with(_DiesMidStream(""), backup).chat_stream(1, []))
+
+
+def test_openai_provider_streams_sdk_deltas(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "check_rate_limit", lambda key="openrouter": True)
+    monkeypatch.setattr(
+        rate_limiter, "record_api_request", lambda key="openrouter": None
+    )
+    chunks = [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+        for text in ("Ho", None, "la")
+    ] + [SimpleNamespace(choices=[])]
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return iter(chunks)
+
+    provider = OpenAIProvider.__new__(OpenAIProvider)
+    provider._spent = defaultdict(int)
+    provider._budget = 10
+    provider._client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+
+    assert list(provider.chat_stream(1, [{"role": "user", "content": "hola"}])) == [
+        "Ho",
+        "la",
+    ]
+    assert calls[0]["stream"] is True
+
+
+def test_nutrition_plan_stream_persists_each_day_and_survives_truncation(
+    api, db_session
+):
+    from app.nutrition.models import NutritionMeal
+
+    client, use = api
+    cut = PLAN_JSON.index('"targets"') - 3  # corta justo después del único día
+
+    class _Stalls(_FakeStreamingProvider):
+        def chat_stream(self, *args, **kwargs):
+            yield from super().chat_stream(*args, **kwargs)
+            raise HTTPException(status_code=504, detail="upstream timeout")
+
+    use(_Stalls(PLAN_JSON[:cut], chunk=40))
+
+    resp = client.post(
+        "/api/v1/ai/generate/nutrition-plan-direct/stream",
+        json={"days": 1, "persist_to_db": True},
+    )
+    events = _events(resp)
+
+    day_events = [e for e in events if e["status"] == "DAY"]
+    assert [(e["index"], e["persisted"]) for e in day_events] == [(0, True)]
+    final = events[-1]
+    assert final["status"] == "SUCCESS" and final["truncated"] is True
+    assert final["persist"]["meals_created"] == 1
+    assert (
+        db_session.query(NutritionMeal).filter(NutritionMeal.user_id == 1).count() == 1
+    )
@@ -158,3 +158,40 @@ def test_validation_bounds(test_client: TestClient):
         test_client.get("/api/v1/routines/exercise-catalog?offset=-1").status_code
         == 422
     )
+
+
+def test_cursor_pagination_walks_catalog(test_client: TestClient, db_session):
+    for name in ["Cursor A", "cursor b", "Cursor C", "Cursor D", "Cursor E"]:
+        ensure_exercise(db_session, name=name, equipment="bodyweight", level="beginner")
+
+    r = test_client.get("/api/v1/routines/exercise-catalog?q=cursor&limit=2")
+    data = unwrap(r.json())
+    assert data["total"] == 5
+    names = [i["name"] for i in data["items"]]
+    cursor = data["next_cursor"]
+    while cursor:
+        r = test_client.get(
+            f"/api/v1/routines/exercise-catalog?q=cursor&limit=2&cursor={cursor}"
+        )
+        assert r.status_code == 200
+        data = unwrap(r.json())
+        assert data["total"] is None  # no count on cursor pages unless asked
+        names += [i["name"] for i in data["items"]]
+        cursor = data["next_cursor"]
+
+    assert names == ["Cursor A", "cursor b", "Cursor C", "Cursor D", "Cursor E"]
+
+
+def test_cursor_from_other_filters_is_rejected(test_client: TestClient, db_session):
+    for name in ["Cursor X", "Cursor Y"]:
+        ensure_exercise(db_session, name=name, equipment="bodyweight", level="beginner")
+    cursor = unwrap(
+        test_client.get("/api/v1/routines/exercise-catalog?q=cursor&limit=1").json()
+    )["next_cursor"]
+
+    r = test_client.get(
+        f"/api/v1/routines/exercise-catalog?q=other&limit=1&cursor={cursor}"
+    )
+    assert r.status_code == 400
+    r = test_client.get("/api/v1/routines/exercise-catalog?limit=1&cursor=garbage")
+    assert r.status_code == 400
@@ -109,3 +109,34 @@ def test_nutrition_forbidden(test_client: TestClient):
     body = res.json()
     assert body["ok"] is False
     assert body["error"]["code"] == AUTH_FORBIDDEN
+
+
+def test_barcode_batch_lookup(test_client: TestClient, tokens, monkeypatch):
+    from services import food_search
+
+    def _lookup(db, codes):
+        return {c: None for c in codes}
+
+    monkeypatch.setattr(food_search, "lookup_foods_by_barcode", _lookup)
+    res = test_client.post(
+        "/api/v1/nutrition/foods/barcode",
+        json={"codes": ["123", "456"]},
+        headers=auth_headers(tokens),
+    )
+    assert res.status_code == 200
+    assert res.json()["data"] == [
+        {"code": "123", "food": None},
+        {"code": "456", "food": None},
+    ]
+
+    res = test_client.get(
+        "/api/v1/nutrition/foods/barcode/123", headers=auth_headers(tokens)
+    )
+    assert res.status_code == 404
+
+    res = test_client.post(
+        "/api/v1/nutrition/foods/barcode",
+        json={"codes": []},
+        headers=auth_headers(tokens),
+    )
+    assert res.status_code == 422